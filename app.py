@@ -14,6 +14,8 @@ import sys
 from data_loader import load_grid_data, get_anomaly_timestamps
 from agent_setup import create_smart_grid_agent
 from main_analysis import analyze_grid_event, get_event_context
+from app.preanalysis import lookup_analysis
+from app.downsampling import downsample_frame, CHART_MAX_POINTS
 
 
 # Cached functions to prevent re-initialization on every interaction
@@ -272,14 +274,16 @@ def main():
         start_time = end_time - timedelta(days=days_to_show)
         
         plot_df = st.session_state.df.loc[start_time:end_time]
+        # Downsample the line for long windows (anomaly rows are always kept)
+        frequency = downsample_frame(plot_df, ['Grid Frequency (Hz)'], max_points=CHART_MAX_POINTS)['Grid Frequency (Hz)']
         
         # Create figure
         fig_overview = go.Figure()
         
         # Add grid frequency line
         fig_overview.add_trace(go.Scatter(
-            x=plot_df.index,
-            y=plot_df['Grid Frequency (Hz)'],
+            x=frequency.index,
+            y=frequency,
             mode='lines',
             name='Grid Frequency',
             line=dict(color='#3498db', width=1.5),
@@ -399,12 +403,20 @@ def main():
             # Run AI analysis
             st.subheader("🤖 AI Agent Analysis")
             
-            with st.spinner("🧠 AI Agent is analyzing the anomaly... (this may take 30-60 seconds)"):
-                result = analyze_grid_event(
-                    selected_timestamp,
-                    st.session_state.df,
-                    st.session_state.agent
-                )
+            # Use the background pre-analysis when it already covered this event
+            stored = lookup_analysis(st.session_state.df, selected_timestamp)
+            if stored and stored['result'].get('rule_analysis'):
+                result = stored['result']['rule_analysis']
+                agent_report = stored['result'].get('agent_analysis')
+                st.caption(f"⚡ Pre-computed analysis ({stored['created_at']})")
+            else:
+                agent_report = None
+                with st.spinner("🧠 AI Agent is analyzing the anomaly... (this may take 30-60 seconds)"):
+                    result = analyze_grid_event(
+                        selected_timestamp,
+                        st.session_state.df,
+                        st.session_state.agent
+                    )
             
             # Display results
             if result['status'] == 'anomaly':
@@ -413,6 +425,9 @@ def main():
                 # Show agent's analysis
                 st.markdown("### 📊 Agent's Report")
                 st.markdown(result['analysis'])
+                if agent_report:
+                    st.markdown("### 🤖 AI Agent Findings")
+                    st.markdown(agent_report)
                 
             elif result['status'] == 'normal':
                 st.info(result['message'])
@@ -0,0 +1,267 @@
+"""
+Agent Instrumentation
+Per-invocation ReAct metrics and optional JSONL traces
+
+The handler is attached to the AgentExecutor (chain and agent events), to
+the LLM and to every tool, because LangChain only passes an executor's own
+callbacks to its chain-level events. The executor runs its LLM and tool
+calls on the invoking thread, so events are grouped per invocation with a
+thread-local trace.
+
+Recorded per invocation: ReAct iterations, time per LLM call and per tool
+call, prompt/completion tokens (from Ollama metadata), parse errors and
+the stop reason (final_answer, limit, parse_error, error). Aggregates go
+to the metrics registry; with AGENT_TRACE_PATH set, every invocation is
+also appended to a JSONL trace file.
+
+Configuration:
+    AGENT_TRACE_PATH  JSONL trace file (default: unset, no trace)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.llm_client import ollama_response_info
+from app.metrics import registry, LATENCY_BUCKETS
+
+
+AGENT_TRACE_PATH = os.getenv("AGENT_TRACE_PATH")
+
+# Output of an AgentExecutor that hit its iteration or time limit
+STOPPED_OUTPUT_PREFIX = "Agent stopped due to"
+
+ITERATION_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+# Invocations kept in memory for /api/agent/metrics
+RECENT_TRACES = 20
+
+invocation_seconds = registry.histogram(
+    "agent_invocation_seconds", "Wall time of one agent invocation", LATENCY_BUCKETS)
+iterations_histogram = registry.histogram(
+    "agent_iterations", "ReAct iterations per invocation", ITERATION_BUCKETS)
+llm_call_seconds = registry.histogram(
+    "agent_llm_call_seconds", "Wall time of one LLM call", LATENCY_BUCKETS, ("model",))
+tool_call_seconds = registry.histogram(
+    "agent_tool_call_seconds", "Wall time of one tool call", LATENCY_BUCKETS, ("tool",))
+prompt_tokens_histogram = registry.histogram(
+    "agent_prompt_tokens", "Prompt tokens evaluated per invocation", TOKEN_BUCKETS)
+completion_tokens_histogram = registry.histogram(
+    "agent_completion_tokens", "Tokens generated per invocation", TOKEN_BUCKETS)
+parse_errors_total = registry.counter(
+    "agent_parse_errors_total", "LLM outputs the agent could not parse")
+tool_errors_total = registry.counter(
+    "agent_tool_errors_total", "Tool calls that raised", ("tool",))
+invocations_total = registry.counter(
+    "agent_invocations_total", "Agent invocations by stop reason", ("stop_reason",))
+
+
+def _is_parse_error(error: BaseException) -> bool:
+    return "OutputParser" in type(error).__name__ or "output parsing error" in str(error)
+
+
+class AgentInstrumentation(BaseCallbackHandler):
+    """
+    Callback recording per-step timings and counts of agent invocations.
+
+    Args:
+        trace_path: JSONL file receiving one line per invocation (optional)
+    """
+
+    def __init__(self, trace_path: Optional[str] = AGENT_TRACE_PATH):
+        self.trace_path = trace_path
+        self._local = threading.local()
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._trace_lock = threading.Lock()
+        self.recent: deque = deque(maxlen=RECENT_TRACES)
+
+    @property
+    def _trace(self) -> Optional[Dict[str, Any]]:
+        return getattr(self._local, "trace", None)
+
+    # ------------------------------------------------------------------
+    # Invocation (executor chain events)
+    # ------------------------------------------------------------------
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        # A top-level start replaces a trace whose end was never reported
+        if self._trace is not None and parent_run_id is not None:
+            return
+        question = inputs.get("input", "") if isinstance(inputs, dict) else str(inputs)
+        self._local.trace = {
+            "run_id": str(run_id),
+            "root": run_id,
+            "started_at": datetime.now().isoformat(),
+            "start": time.perf_counter(),
+            "input": str(question)[:300],
+            "iterations": 0,
+            "parse_errors": 0,
+            "llm_calls": [],
+            "tool_calls": []
+        }
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        trace = self._trace
+        if trace is None or trace["root"] != run_id:
+            return
+        output = outputs.get("output", "") if isinstance(outputs, dict) else str(outputs)
+        reason = "limit" if str(output).startswith(STOPPED_OUTPUT_PREFIX) else "final_answer"
+        self._finish(trace, reason)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        trace = self._trace
+        if trace is None or trace["root"] != run_id:
+            return
+        if _is_parse_error(error):
+            trace["parse_errors"] += 1
+            self._finish(trace, "parse_error", error)
+        else:
+            self._finish(trace, "error", error)
+
+    def on_agent_action(self, action, **kwargs):
+        trace = self._trace
+        if trace is None:
+            return
+        trace["iterations"] += 1
+        if action.tool == "_Exception":
+            trace["parse_errors"] += 1
+
+    def on_agent_finish(self, finish, **kwargs):
+        trace = self._trace
+        if trace is not None:
+            trace["iterations"] += 1
+
+    # ------------------------------------------------------------------
+    # LLM calls
+    # ------------------------------------------------------------------
+
+    def _llm_begin(self, run_id, kwargs):
+        params = kwargs.get("invocation_params") or {}
+        metadata = kwargs.get("metadata") or {}
+        self._pending[run_id] = {
+            "model": metadata.get("ls_model_name") or params.get("model", "unknown"),
+            "start": time.perf_counter()
+        }
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._llm_begin(run_id, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._llm_begin(run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        pending = self._pending.pop(run_id, None)
+        if pending is None:
+            return
+        seconds = time.perf_counter() - pending["start"]
+        prompt_tokens = completion_tokens = 0
+        for info in ollama_response_info(response):
+            prompt_tokens += int(info.get("prompt_eval_count") or 0)
+            completion_tokens += int(info.get("eval_count") or 0)
+        llm_call_seconds.observe(seconds, pending["model"])
+        if self._trace is not None:
+            self._trace["llm_calls"].append({
+                "model": pending["model"],
+                "ms": round(seconds * 1000, 2),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens
+            })
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        pending = self._pending.pop(run_id, None)
+        if pending is not None and self._trace is not None:
+            self._trace["llm_calls"].append({
+                "model": pending["model"],
+                "ms": round((time.perf_counter() - pending["start"]) * 1000, 2),
+                "error": str(error)[:200]
+            })
+
+    # ------------------------------------------------------------------
+    # Tool calls
+    # ------------------------------------------------------------------
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._pending[run_id] = {
+            "tool": (serialized or {}).get("name", "unknown"),
+            "start": time.perf_counter()
+        }
+
+    def _tool_done(self, run_id, error=None):
+        pending = self._pending.pop(run_id, None)
+        if pending is None:
+            return
+        seconds = time.perf_counter() - pending["start"]
+        tool_call_seconds.observe(seconds, pending["tool"])
+        if error is not None:
+            tool_errors_total.inc(1, pending["tool"])
+        if self._trace is not None:
+            entry = {"tool": pending["tool"], "ms": round(seconds * 1000, 2)}
+            if error is not None:
+                entry["error"] = str(error)[:200]
+            self._trace["tool_calls"].append(entry)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._tool_done(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._tool_done(run_id, error)
+
+    # ------------------------------------------------------------------
+    # Aggregation
+    # ------------------------------------------------------------------
+
+    def _finish(self, trace: Dict[str, Any], reason: str, error: Optional[BaseException] = None):
+        self._local.trace = None
+        seconds = time.perf_counter() - trace.pop("start")
+        trace.pop("root")
+        prompt_tokens = sum(c.get("prompt_tokens", 0) for c in trace["llm_calls"])
+        completion_tokens = sum(c.get("completion_tokens", 0) for c in trace["llm_calls"])
+        trace.update({
+            "duration_ms": round(seconds * 1000, 2),
+            "stop_reason": reason,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "llm_ms": round(sum(c["ms"] for c in trace["llm_calls"]), 2),
+            "tool_ms": round(sum(c["ms"] for c in trace["tool_calls"]), 2)
+        })
+        if error is not None:
+            trace["error"] = f"{type(error).__name__}: {str(error)[:300]}"
+
+        invocation_seconds.observe(seconds)
+        iterations_histogram.observe(trace["iterations"])
+        prompt_tokens_histogram.observe(prompt_tokens)
+        completion_tokens_histogram.observe(completion_tokens)
+        if trace["parse_errors"]:
+            parse_errors_total.inc(trace["parse_errors"])
+        invocations_total.inc(1, reason)
+
+        self.recent.append(trace)
+        if self.trace_path:
+            self._write_trace(trace)
+
+    def _write_trace(self, trace: Dict[str, Any]):
+        with self._trace_lock:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.trace_path)), exist_ok=True)
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"[AGENT TRACE] Could not write trace: {e}")
+
+    def summary(self, recent: int = 5) -> Dict[str, Any]:
+        """Aggregated agent metrics plus the most recent invocation traces."""
+        return {
+            "metrics": registry.snapshot("agent_"),
+            "recent": list(self.recent)[-recent:]
+        }
+
+
+# Process-wide instrumentation shared by every agent, LLM and tool
+agent_instrumentation = AgentInstrumentation()
@@ -7,16 +7,82 @@ from langchain_ollama import ChatOllama
 from langchain_experimental.agents import create_pandas_dataframe_agent
 from langchain.agents.agent_types import AgentType
 import pandas as pd
+import os
+import re
+import threading
+import time
+from collections import deque
 from functools import lru_cache
+from typing import Optional, Dict, Any, Tuple
 
+from app.analysis_tools import build_analysis_tools
+from app.prompt_builder import build_prefix, build_suffix, COMPACT_PROMPT, HEAD_ROWS
+from app.circuit_breaker import llm_breaker
+from app.agent_instrumentation import agent_instrumentation
+from app.conversation_memory import QUESTION_MARKER
+from app.sandbox import SandboxedPythonTool, get_sandbox_pool, SANDBOX_ENABLED
+from app.llm_client import (
+    DEFAULT_MODEL, SMALL_MODEL, OLLAMA_BASE_URL, OLLAMA_KEEP_ALIVE, OLLAMA_NUM_CTX, OLLAMA_NUM_PREDICT,
+    OllamaTimingCallback, client_kwargs, model_available
+)
 
-def initialize_llm(model: str = "llama3:8b-instruct-q4_K_M", temperature: float = 0.0) -> ChatOllama:
+
+# Route short factual queries to SMALL_MODEL (AGENT_ROUTING=0 disables);
+# only used when Ollama actually has SMALL_MODEL installed
+ROUTING_ENABLED = os.getenv("AGENT_ROUTING", "1") != "0"
+
+# Time budget (seconds) for the small model before escalating; also its
+# HTTP timeout, since max_execution_time is only checked between steps
+ROUTING_SLA_SECONDS = float(os.getenv("AGENT_ROUTING_SLA", "20"))
+
+# Calls per model kept in the latency/success table
+ROUTING_WINDOW = 50
+
+# Samples needed before the table may override the complexity rule
+ROUTING_MIN_SAMPLES = 5
+
+# Small-model success rate below which simple queries go to the large model
+ROUTING_MIN_SUCCESS_RATE = 0.7
+
+# While demoted, every Nth simple query still probes the small model
+ROUTING_PROBE_EVERY = 10
+
+# Queries needing multi-step reasoning go to the large model
+COMPLEX_QUERY_PATTERN = re.compile(
+    r"\b(why|root.?cause|caus|analy[sz]|explain|investigat|correlat|compar|impact|"
+    r"recommend|trend|pattern|diagnos|predict|forecast)",
+    re.IGNORECASE
+)
+SIMPLE_QUERY_MAX_WORDS = 20
+
+# Output of an AgentExecutor that hit its iteration or time limit
+STOPPED_OUTPUT_PREFIX = "Agent stopped due to"
+
+
+@lru_cache(maxsize=8)
+def initialize_llm(
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.0,
+    keep_alive: str = OLLAMA_KEEP_ALIVE,
+    num_ctx: int = OLLAMA_NUM_CTX,
+    num_predict: int = OLLAMA_NUM_PREDICT,
+    timeout: Optional[float] = None
+) -> ChatOllama:
     """
     Initialize the ChatOllama LLM for local inference.
     
+    Instances are cached per configuration so every agent shares the same
+    pooled HTTP connection to Ollama instead of opening fresh ones.
+    
     Args:
         model: Ollama model name (default: llama3:8b-instruct-q4_K_M)
         temperature: Temperature for generation (0 = deterministic)
+        keep_alive: How long Ollama keeps the model loaded between calls
+        num_ctx: Context window size in tokens
+        num_predict: Maximum number of tokens generated per call
+        timeout: HTTP timeout per call in seconds (default: OLLAMA_TIMEOUT).
+            An explicit timeout is a latency budget: calls cut off by it are
+            not reported to the circuit breaker.
         
     Returns:
         ChatOllama instance
@@ -26,19 +92,42 @@ def initialize_llm(model: str = "llama3:8b-instruct-q4_K_M", temperature: float
     llm = ChatOllama(
         model=model,
         temperature=temperature,
+        base_url=OLLAMA_BASE_URL,
+        keep_alive=keep_alive,
+        num_ctx=num_ctx,
+        num_predict=num_predict,
+        client_kwargs=client_kwargs(timeout),
+        callbacks=[OllamaTimingCallback(count_read_timeouts=timeout is None), agent_instrumentation],
     )
     
     print("[AGENT SETUP] LLM initialized successfully")
     return llm
 
 
-def create_agent(df: pd.DataFrame, model: str = "llama3:8b-instruct-q4_K_M"):
+def create_agent(
+    df: pd.DataFrame,
+    model: str = "llama3:8b-instruct-q4_K_M",
+    use_tools: bool = True,
+    compact_prompt: bool = COMPACT_PROMPT,
+    use_sandbox: bool = SANDBOX_ENABLED,
+    max_execution_time: float = 60,
+    early_stopping_method: str = "generate",
+    request_timeout: Optional[float] = None
+):
     """
     Create a Pandas DataFrame Agent specialized for grid operations.
     
     Args:
         df: Preprocessed grid data DataFrame
         model: Ollama model name
+        use_tools: Register the typed analysis tools (get_row, compare, ...)
+        compact_prompt: Replace df.head() and long instructions with a
+            schema summary (live statistics go in the suffix)
+        use_sandbox: Run python_repl_ast code in sandboxed worker processes
+        max_execution_time: Wall-clock budget checked between agent steps
+        early_stopping_method: "generate" (final LLM pass) or "force" when
+            the iteration/time limit is hit
+        request_timeout: HTTP timeout for each LLM call (default: OLLAMA_TIMEOUT)
         
     Returns:
         Configured pandas dataframe agent
@@ -46,52 +135,13 @@ def create_agent(df: pd.DataFrame, model: str = "llama3:8b-instruct-q4_K_M"):
     print("[AGENT SETUP] Creating Grid Operator Agent...")
     
     # Initialize LLM
-    llm = initialize_llm(model=model, temperature=0.0)
-    
-    # Get actual column names from the DataFrame
-    column_list = '\n'.join([f"  - {col}" for col in df.columns])
-    
-    # Define the agent's role and context with explicit column names
-    prefix = f"""
-You are an expert grid operator analyzing smart city microgrid data.
-
-Your primary responsibilities:
-1. Analyze correlations between Grid Frequency drops and renewable generation changes
-2. Investigate how weather conditions (Cloud Cover, Wind Speed) impact Solar/Wind generation
-3. Identify curtailment risks and provide actionable recommendations
-4. Calculate percentage changes and trends in the data
-
-When analyzing anomalies:
-- Look for patterns: Does falling Grid Frequency correlate with drops in Solar PV Output or Wind Power Output?
-- Check weather: Did Cloud Cover increase? Did Wind Speed drop?
-- Consider timing: Is this during peak demand hours?
-- Assess risk: Is there a Curtailment Event Flag set?
-
-Always provide:
-1. Data-driven analysis with specific numbers
-2. Root cause identification  
-3. Short, actionable recommendations
-
-CRITICAL: EXACT DataFrame column names (use these EXACTLY as shown):
-{column_list}
-
-IMPORTANT Instructions:
-1. ALWAYS use the python_repl_ast tool to execute Python code
-2. When filtering data, use df.loc[] with proper indexing
-3. The Timestamp is the INDEX - access it with df.index, not df['Timestamp']
-4. When asked to analyze a specific timestamp:
-   a) Use: df.loc['timestamp_value']
-   b) Compare with: df.loc['prior_timestamp']
-   c) Calculate percentage changes
-5. Output your analysis in structured format with clear sections
-
-TOOL USAGE REQUIREMENT:
-- You MUST use Action: python_repl_ast
-- Action Input must be valid Python code as a string
-- Example:
-  Action: python_repl_ast
-  Action Input: "df.loc[:5, ['Grid Frequency (Hz)', 'Solar PV Output (kW)']]"
-"""
+    llm = initialize_llm(model=model, temperature=0.0, timeout=request_timeout)
+    
+    # Render the static prefix (cached per dataset schema so it stays
+    # byte-identical across agents and Ollama can reuse its KV cache)
+    extra_tools = build_analysis_tools(df) if use_tools else []
+    prompt = build_prefix(df, compact=compact_prompt, use_tools=bool(extra_tools))
+    suffix = build_suffix(df, compact=compact_prompt)
     
     # Create the agent with proper error handling
     # Note: handle_parsing_errors is deprecated in newer versions
@@ -101,20 +151,233 @@ TOOL USAGE REQUIREMENT:
         agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
         verbose=True,
         allow_dangerous_code=True,
-        prefix=prefix,
+        prefix=prompt["prefix"],
+        suffix=suffix,
+        # langchain rejects include_df_in_prompt next to a custom suffix
+        include_df_in_prompt=prompt["include_df_in_prompt"] if suffix is None else None,
+        number_of_head_rows=HEAD_ROWS,
+        extra_tools=extra_tools,
+        return_intermediate_steps=True,  # Lets callers count ReAct iterations
         max_iterations=15,  # Increased for complex queries
-        max_execution_time=60,  # 60 seconds timeout
-        early_stopping_method="generate"  # Better error handling
+        max_execution_time=max_execution_time,  # 60 seconds timeout by default
+        early_stopping_method=early_stopping_method  # Better error handling
     )
     
+    # Swap the in-process python_repl_ast for the sandboxed worker pool.
+    # The prompt already lists the tool by name, so only the executor changes.
+    if use_sandbox:
+        sandbox_tool = SandboxedPythonTool(pool=get_sandbox_pool(df))
+        agent.tools = [sandbox_tool if tool.name == sandbox_tool.name else tool for tool in agent.tools]
+    
+    # Per-step instrumentation: executor callbacks only see chain events,
+    # so tools get the handler too (the LLM has it from initialize_llm)
+    agent.callbacks = [agent_instrumentation]
+    for tool in agent.tools:
+        tool.callbacks = [agent_instrumentation]
+    
     print("[AGENT SETUP] Grid Operator Agent created successfully")
     print(f"  - Agent type: Zero-Shot ReAct")
     print(f"  - Max iterations: 10")
+    print(f"  - Typed tools: {len(extra_tools)}")
+    print(f"  - Sandboxed code execution: {use_sandbox}")
+    print(f"  - Prompt mode: {'compact' if compact_prompt else 'full'} (~{prompt['prefix_tokens']} tokens)")
     print(f"  - Dataset shape: {df.shape}")
     
     return agent
 
 
+def classify_query(question: str) -> str:
+    """
+    Classify a question for model routing.
+    
+    Args:
+        question: User question
+        
+    Returns:
+        "complex" for multi-step root-cause questions, else "simple"
+    """
+    if COMPLEX_QUERY_PATTERN.search(question):
+        return "complex"
+    if len(question.split()) > SIMPLE_QUERY_MAX_WORDS:
+        return "complex"
+    return "simple"
+
+
+class ModelStats:
+    """
+    Thread-safe running latency/success table per model.
+    
+    Keeps the last ROUTING_WINDOW outcomes per model so the router adapts
+    when a model recovers or degrades.
+    """
+    
+    def __init__(self, window: int = ROUTING_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._outcomes: Dict[str, deque] = {}
+        self._totals: Dict[str, Dict[str, int]] = {}
+    
+    def record(self, model: str, latency_s: float, success: bool, escalated: bool = False):
+        """Record one agent run on a model."""
+        with self._lock:
+            self._outcomes.setdefault(model, deque(maxlen=self.window)).append((latency_s, success))
+            totals = self._totals.setdefault(model, {"calls": 0, "successes": 0, "escalations": 0})
+            totals["calls"] += 1
+            totals["successes"] += int(success)
+            totals["escalations"] += int(escalated)
+    
+    def snapshot(self, model: str) -> Dict[str, Any]:
+        """Windowed success rate and latency for one model."""
+        with self._lock:
+            outcomes = list(self._outcomes.get(model, ()))
+            totals = dict(self._totals.get(model, {"calls": 0, "successes": 0, "escalations": 0}))
+        latencies = sorted(latency for latency, _ in outcomes)
+        samples = len(outcomes)
+        return dict(
+            totals,
+            samples=samples,
+            success_rate=round(sum(ok for _, ok in outcomes) / samples, 3) if samples else None,
+            avg_latency_s=round(sum(latencies) / samples, 3) if samples else None,
+            p95_latency_s=round(latencies[min(samples - 1, int(samples * 0.95))], 3) if samples else None
+        )
+    
+    def table(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot of every model seen so far."""
+        with self._lock:
+            models = list(self._outcomes)
+        return {model: self.snapshot(model) for model in models}
+    
+    def reset(self):
+        with self._lock:
+            self._outcomes.clear()
+            self._totals.clear()
+
+
+# Process-wide routing table (served by /api/llm/routing)
+routing_stats = ModelStats()
+
+
+class RoutedAgent:
+    """
+    Agent facade routing each question to a small or large model.
+    
+    Simple questions go to the small model with a ROUTING_SLA_SECONDS
+    budget (enforced per LLM call by the HTTP timeout and between steps by
+    max_execution_time); if it raises (e.g., an unparseable action), hits the budget or
+    stops early, the question is re-run on the large model. Complex
+    questions go straight to the large model. Once enough samples exist,
+    the latency/success table can demote the small model.
+    
+    Exposes invoke() and callbacks like the AgentExecutor it wraps.
+    """
+    
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        small_model: str = SMALL_MODEL,
+        large_model: str = DEFAULT_MODEL,
+        sla_seconds: float = ROUTING_SLA_SECONDS,
+        stats: ModelStats = routing_stats,
+        **agent_kwargs
+    ):
+        self.small_model = small_model
+        self.large_model = large_model
+        self.sla_seconds = sla_seconds
+        self.stats = stats
+        self.small = create_agent(df, model=small_model, max_execution_time=sla_seconds,
+                                  early_stopping_method="force", request_timeout=sla_seconds,
+                                  **agent_kwargs)
+        self.large = create_agent(df, model=large_model, **agent_kwargs)
+        self._demoted_queries = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def callbacks(self):
+        return self.large.callbacks
+    
+    @callbacks.setter
+    def callbacks(self, value):
+        self.small.callbacks = value
+        self.large.callbacks = value
+    
+    def choose_route(self, question: str) -> Tuple[str, str]:
+        """
+        Pick the model for a question.
+        
+        Returns:
+            Tuple of (model name, reason)
+        """
+        if classify_query(question) == "complex":
+            return self.large_model, "complex query"
+        
+        small = self.stats.snapshot(self.small_model)
+        if small["samples"] >= ROUTING_MIN_SAMPLES and (
+            small["success_rate"] < ROUTING_MIN_SUCCESS_RATE or small["avg_latency_s"] > self.sla_seconds
+        ):
+            with self._lock:
+                self._demoted_queries += 1
+                probe = self._demoted_queries % ROUTING_PROBE_EVERY == 0
+            if not probe:
+                return self.large_model, (
+                    f"small model below SLA (success {small['success_rate']:.0%}, "
+                    f"avg {small['avg_latency_s']:.1f}s)"
+                )
+            return self.small_model, "probing demoted small model"
+        return self.small_model, "simple query"
+    
+    @staticmethod
+    def _succeeded(response: Any) -> bool:
+        output = response.get("output") if isinstance(response, dict) else response
+        return bool(output) and not str(output).startswith(STOPPED_OUTPUT_PREFIX)
+    
+    def invoke(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Run the question on the routed model, escalating on failure.
+        
+        Returns:
+            AgentExecutor response with an added "routing" entry
+            (model, reason, escalated)
+        
+        Raises:
+            CircuitOpenError: If the LLM circuit breaker is open
+        """
+        llm_breaker.check()
+        question = input.get("input", "") if isinstance(input, dict) else str(input)
+        # Route on the question itself, not the prepended session context
+        question = question.rsplit(QUESTION_MARKER, 1)[-1]
+        model, reason = self.choose_route(question)
+        escalated = False
+        
+        if model == self.small_model:
+            start = time.perf_counter()
+            try:
+                response = self.small.invoke(input, config=config, **kwargs)
+                success = self._succeeded(response)
+                failure = "stopped at the time/iteration limit"
+            except Exception as e:
+                response, success, failure = None, False, f"{type(e).__name__}: {e}"
+            latency = time.perf_counter() - start
+            self.stats.record(self.small_model, latency, success, escalated=not success)
+            if success:
+                response["routing"] = {"model": model, "reason": reason, "escalated": False}
+                return response
+            # Ollama itself is failing: escalating would only wait again
+            llm_breaker.check()
+            print(f"[ROUTER] {self.small_model} failed after {latency:.1f}s ({failure[:120]}); "
+                  f"escalating to {self.large_model}")
+            model, reason, escalated = self.large_model, f"escalated: {failure[:200]}", True
+        
+        start = time.perf_counter()
+        try:
+            response = self.large.invoke(input, config=config, **kwargs)
+        except Exception:
+            self.stats.record(self.large_model, time.perf_counter() - start, False)
+            raise
+        self.stats.record(self.large_model, time.perf_counter() - start, self._succeeded(response))
+        response["routing"] = {"model": model, "reason": reason, "escalated": escalated}
+        return response
+
+
 # Cached version for Chainlit (avoid recreating agent on every message)
 _cached_agent = None
 _cached_df_id = None
@@ -124,6 +387,9 @@ def get_or_create_agent(df: pd.DataFrame, model: str = "llama3:8b-instruct-q4_K_
     """
     Get cached agent or create new one if DataFrame changed.
     
+    With routing enabled and SMALL_MODEL installed in Ollama the cached
+    agent is a RoutedAgent using `model` as the large model.
+    
     Args:
         df: Grid data DataFrame
         model: Ollama model name
@@ -138,7 +404,10 @@ def get_or_create_agent(df: pd.DataFrame, model: str = "llama3:8b-instruct-q4_K_
     
     if _cached_agent is None or _cached_df_id != current_df_id:
         print("[AGENT SETUP] Creating new agent (cache miss or DataFrame changed)")
-        _cached_agent = create_agent(df, model)
+        if ROUTING_ENABLED and model_available(SMALL_MODEL):
+            _cached_agent = RoutedAgent(df, large_model=model)
+        else:
+            _cached_agent = create_agent(df, model)
         _cached_df_id = current_df_id
     else:
         print("[AGENT SETUP] Using cached agent")
@@ -146,6 +415,11 @@ def get_or_create_agent(df: pd.DataFrame, model: str = "llama3:8b-instruct-q4_K_
     return _cached_agent
 
 
+def is_routing_active() -> bool:
+    """Whether the cached agent routes between the small and large model."""
+    return isinstance(_cached_agent, RoutedAgent)
+
+
 if __name__ == "__main__":
     print("This module provides LangChain Ollama agent setup.")
     print("Import and use create_agent(df) to initialize the system.")
@@ -0,0 +1,445 @@
+"""
+Asynchronous Analysis Jobs
+Bounded, severity-prioritized background execution of grid analyses
+
+Requests are queued and executed by a small pool of worker threads, so an
+HTTP call returns a job id immediately instead of holding a connection
+for the 30-60 seconds an agent analysis takes. More severe anomalies
+(higher |Z_Score|) are served first. Finished results are persisted in
+the AnalysisStore and repeated requests are answered from it.
+
+Background (speculative) jobs go to a separate queue served by a single
+thread that only starts work while no interactive job is queued or
+running and Ollama has no call in flight, so they never delay a user.
+
+Configuration:
+    ANALYSIS_WORKERS           Concurrent analyses (default: 2)
+    ANALYSIS_QUEUE_SIZE        Maximum queued jobs (default: 100)
+    ANALYSIS_SHUTDOWN_TIMEOUT  Seconds shutdown waits for running jobs (default: 10)
+"""
+
+import itertools
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Callable
+
+import pandas as pd
+
+from app.analysis_store import AnalysisStore, result_key
+from app.data_loader import get_dataset_version
+from app.llm_client import llm_timings
+from app.circuit_breaker import llm_breaker, CircuitOpenError, rule_based_answer
+from main_analysis import analyze_grid_event
+
+
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "100"))
+ANALYSIS_SHUTDOWN_TIMEOUT = float(os.getenv("ANALYSIS_SHUTDOWN_TIMEOUT", "10"))
+
+# Finished jobs kept in memory for polling
+MAX_FINISHED_JOBS = 500
+
+# Seconds between idle checks of the background worker
+BACKGROUND_POLL_INTERVAL = 1.0
+
+
+class QueueFullError(Exception):
+    """Raised when the analysis queue is at capacity."""
+
+
+class AnalysisJob:
+    """State and progress events of one analysis request."""
+
+    def __init__(self, timestamp: Optional[str], question: Optional[str], severity: float,
+                 key: str, df: pd.DataFrame, dataset_version: str, background: bool = False):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        # The dataset the job was submitted against; set_dataset() does not
+        # change what an already queued job analyzes or where it is stored
+        self.df = df
+        self.dataset_version = dataset_version
+        self.timestamp = timestamp
+        self.question = question
+        self.severity = severity
+        self.background = background
+        self.status = "queued"
+        self.cached = False
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._changed = threading.Condition(threading.RLock())
+        self._listeners: List[Callable[[], None]] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def add_event(self, stage: str, message: str):
+        """Append a progress event and wake up stream listeners."""
+        with self._changed:
+            self.events.append({
+                "stage": stage,
+                "message": message,
+                "time": datetime.now().isoformat()
+            })
+            self._changed.notify_all()
+            for listener in self._listeners:
+                listener()
+
+    def add_listener(self, listener: Callable[[], None]):
+        """
+        Call `listener` (without arguments) after every new event.
+
+        It runs on the thread adding the event with the job lock held, so it
+        must only hand off, e.g. loop.call_soon_threadsafe(event.set).
+        """
+        with self._changed:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]):
+        with self._changed:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def finish(self, status: str, message: str):
+        """Set the final status and its event atomically for stream listeners."""
+        with self._changed:
+            self.finished_at = time.time()
+            self.status = status
+            # Finished jobs are kept for polling; don't pin old datasets
+            self.df = None
+            self.add_event(status, message)
+
+    def wait_for_event(self, seen: int, timeout: float) -> bool:
+        """Block until more than `seen` events exist or the job finished."""
+        with self._changed:
+            return self._changed.wait_for(lambda: len(self.events) > seen or self.finished, timeout)
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "timestamp": self.timestamp,
+            "question": self.question,
+            "severity": round(self.severity, 3),
+            "cached": self.cached,
+            "background": self.background,
+            "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
+            "finished_at": datetime.fromtimestamp(self.finished_at).isoformat() if self.finished_at else None,
+            "progress": self.events[-1] if self.events else None,
+            "error": self.error
+        }
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+class AnalysisJobManager:
+    """
+    Priority queue plus worker threads running analyze_grid_event and the agent.
+
+    Args:
+        df: Grid data DataFrame
+        store: Result store
+        agent_factory: Callable taking the job's DataFrame and returning the
+            agent (default: get_or_create_agent)
+        workers: Number of worker threads
+        max_queue: Queue capacity
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        store: AnalysisStore,
+        agent_factory: Optional[Callable[[pd.DataFrame], Any]] = None,
+        workers: int = ANALYSIS_WORKERS,
+        max_queue: int = ANALYSIS_QUEUE_SIZE
+    ):
+        self.df = df
+        self.store = store
+        self.dataset_version = get_dataset_version(df)
+        self._agent_factory = agent_factory or self._default_agent
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue(maxsize=max_queue)
+        self._background: "queue.PriorityQueue" = queue.PriorityQueue(maxsize=max_queue)
+        self._sequence = itertools.count()
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._inflight: Dict[str, AnalysisJob] = {}
+        self._lock = threading.Lock()
+        self._running = 0
+        self._background_running = 0
+        self._stopping = threading.Event()
+        self._threads = []
+        for i in range(max(1, workers)):
+            thread = threading.Thread(target=self._worker_loop, name=f"analysis-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._background_thread = threading.Thread(
+            target=self._background_loop, name="analysis-background", daemon=True
+        )
+        self._background_thread.start()
+        print(f"[ANALYSIS JOBS] {len(self._threads)} workers ready (queue size {max_queue})")
+
+    @staticmethod
+    def _default_agent(df: pd.DataFrame):
+        from app.agent_setup import get_or_create_agent
+        return get_or_create_agent(df)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def severity_of(self, timestamp: Optional[str], df: Optional[pd.DataFrame] = None) -> float:
+        """|Z_Score| at a timestamp (0 when unknown), in `df` or the current dataset."""
+        if timestamp is None:
+            return 0.0
+        df = self.df if df is None else df
+        ts = pd.Timestamp(timestamp)
+        if ts not in df.index:
+            return 0.0
+        z = df.at[ts, 'Z_Score']
+        return float(abs(z)) if pd.notna(z) else 0.0
+
+    def submit(
+        self,
+        timestamp: Optional[str] = None,
+        question: Optional[str] = None,
+        priority: Optional[float] = None,
+        background: bool = False
+    ) -> AnalysisJob:
+        """
+        Enqueue an analysis, or answer it from the store / an in-flight job.
+
+        Args:
+            timestamp: Event timestamp to analyze
+            question: Question for the agent
+            priority: Override the severity-based priority (higher runs first)
+            background: Run only when the system is idle (speculative work)
+
+        Returns:
+            AnalysisJob (already finished when served from the store)
+
+        Raises:
+            ValueError: If neither timestamp nor question is given, or the
+                timestamp cannot be parsed
+            QueueFullError: If the queue is at capacity
+        """
+        if not timestamp and not question:
+            raise ValueError("Provide a timestamp and/or a question")
+        if timestamp:
+            timestamp = pd.Timestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+        with self._lock:
+            df, dataset_version = self.df, self.dataset_version
+        key = result_key(dataset_version, timestamp, question)
+        severity = priority if priority is not None else self.severity_of(timestamp, df)
+
+        with self._lock:
+            existing = self._inflight.get(key)
+            if existing is not None:
+                if existing.background and not background and existing.status == "queued":
+                    # A user asked for a pending speculative job: promote it
+                    self._enqueue(self._queue, existing, severity)
+                    existing.background = False
+                    existing.add_event("queued", "Promoted to interactive priority")
+                return existing
+
+            job = AnalysisJob(timestamp, question, severity, key, df, dataset_version, background=background)
+            stored = self.store.get(key)
+            if stored is not None:
+                job.cached = True
+                job.result = stored["result"]
+                job.finish("done", "Served from analysis store")
+                self._remember(job)
+                return job
+
+            self._enqueue(self._background if background else self._queue, job, severity)
+            job.add_event("queued", f"Queued {'for background pre-analysis ' if background else ''}"
+                                    f"with severity {severity:.2f}")
+            self._inflight[key] = job
+            self._remember(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        """Look up a job by id."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and worker utilization."""
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "running": self._running,
+                "background_queued": self._background.qsize(),
+                "background_running": self._background_running,
+                "workers": len(self._threads),
+                "tracked_jobs": len(self._jobs)
+            }
+
+    def is_idle(self) -> bool:
+        """True when no interactive job is pending and Ollama is not busy."""
+        with self._lock:
+            busy = self._running > 0 or self._queue.qsize() > 0
+        return not busy and llm_timings.in_flight == 0 and not llm_breaker.is_open
+
+    def set_dataset(self, df: pd.DataFrame):
+        """Run jobs submitted from now on against a new dataset version."""
+        with self._lock:
+            self.df = df
+            self.dataset_version = get_dataset_version(df)
+
+    def shutdown(self, timeout: float = ANALYSIS_SHUTDOWN_TIMEOUT):
+        """
+        Stop the worker threads and wait for their current job.
+
+        Queued jobs are not started. Call this before closing the store or
+        the HTTP client, which a running job may still be using.
+
+        Args:
+            timeout: Seconds to wait for all threads together
+        """
+        self._stopping.set()
+        for _ in self._threads:
+            self._queue.put((float("-inf"), next(self._sequence), None))
+        self._background.put((float("-inf"), next(self._sequence), None))
+
+        deadline = time.monotonic() + timeout
+        for thread in self._threads + [self._background_thread]:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        alive = [t.name for t in self._threads + [self._background_thread] if t.is_alive()]
+        if alive:
+            print(f"[ANALYSIS JOBS] Shutdown timed out waiting for: {', '.join(alive)}")
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def _remember(self, job: AnalysisJob):
+        """Track a job, evicting the oldest finished ones beyond the cap."""
+        self._jobs[job.id] = job
+        if len(self._jobs) > MAX_FINISHED_JOBS:
+            for job_id in [j for j, old in self._jobs.items() if old.finished][:len(self._jobs) - MAX_FINISHED_JOBS]:
+                del self._jobs[job_id]
+
+    def _enqueue(self, target: "queue.PriorityQueue", job: AnalysisJob, severity: float):
+        try:
+            target.put_nowait((-severity, next(self._sequence), job))
+        except queue.Full:
+            raise QueueFullError("Analysis queue is full, retry later")
+
+    def _claim(self, job: AnalysisJob, background: bool) -> bool:
+        """Mark a dequeued job as running unless another lane took it."""
+        with self._lock:
+            if job.status != "queued" or job.background != background:
+                return False
+            job.status = "running"
+            if background:
+                self._background_running += 1
+            else:
+                self._running += 1
+            return True
+
+    def _release(self, job: AnalysisJob, background: bool):
+        with self._lock:
+            if background:
+                self._background_running -= 1
+            else:
+                self._running -= 1
+            self._inflight.pop(job.key, None)
+
+    def _worker_loop(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None or self._stopping.is_set():
+                break
+            if not self._claim(job, background=False):
+                continue
+            try:
+                self._run(job)
+            finally:
+                self._release(job, background=False)
+
+    def _background_loop(self):
+        while True:
+            _, _, job = self._background.get()
+            if job is None or self._stopping.is_set():
+                break
+            # Yield to interactive work: wait until the queue and Ollama are idle
+            while not self._stopping.is_set() and job.background and not self.is_idle():
+                time.sleep(BACKGROUND_POLL_INTERVAL)
+            if self._stopping.is_set():
+                break
+            if not self._claim(job, background=True):
+                continue
+            try:
+                self._run(job)
+            finally:
+                self._release(job, background=True)
+
+    def _cancelled(self, job: AnalysisJob) -> bool:
+        """Abandon a background job once shutdown began (the store may be closed)."""
+        if job.background and self._stopping.is_set():
+            job.finish("failed", "Cancelled: server shutting down")
+            return True
+        return False
+
+    def _run(self, job: AnalysisJob):
+        job.started_at = time.time()
+        job.add_event("running", "Analysis started")
+
+        try:
+            result: Dict[str, Any] = {"rule_analysis": None, "agent_analysis": None}
+            agent_question = job.question
+
+            if job.timestamp:
+                job.add_event("rules", "Running rule-based attribution")
+                rules = analyze_grid_event(job.timestamp, job.df, None)
+                if rules["status"] == "error":
+                    raise ValueError(rules["message"])
+                rules.pop("raw_data", None)
+                result["rule_analysis"] = rules
+                if agent_question is None and rules["status"] == "anomaly":
+                    agent_question = f"Analyze the anomaly at {job.timestamp}"
+                elif agent_question is not None and job.timestamp not in agent_question:
+                    agent_question = f"{agent_question} (timestamp: {job.timestamp})"
+
+            if agent_question:
+                if self._cancelled(job):
+                    return
+                try:
+                    llm_breaker.check()
+                    job.add_event("agent", "Running AI agent analysis")
+                    response = self._agent_factory(job.df).invoke({"input": agent_question})
+                    output = response.get('output', str(response)) if isinstance(response, dict) else str(response)
+                    result["agent_analysis"] = output
+                except CircuitOpenError as e:
+                    # Degraded mode: answer from the rules and don't persist,
+                    # so the event is analyzed properly once the LLM recovers
+                    job.add_event("degraded", f"LLM unavailable, rule-based result only ({e})")
+                    result["degraded"] = True
+                    if result["rule_analysis"] is None:
+                        result["rule_analysis"] = {"analysis": rule_based_answer(agent_question, job.df)}
+                    job.result = result
+                    job.finish("done", "Analysis complete (degraded)")
+                    return
+
+            if self._cancelled(job):
+                return
+            source = "agent" if result["agent_analysis"] else "rules"
+            if job.background:
+                source = f"pre-{source}"
+            self.store.put(job.key, job.dataset_version, job.timestamp, job.question, result, source=source)
+            job.result = result
+            job.finish("done", "Analysis complete")
+        except Exception as e:
+            job.error = str(e)
+            job.finish("failed", f"Analysis failed: {e}")
@@ -0,0 +1,212 @@
+"""
+Analysis Result Store
+Local, indexed persistence for rule-based and agent analysis results
+
+Results are stored in SQLite keyed by (dataset version, timestamp,
+question), so a repeated request for the same event is served from disk
+instead of re-running a 30-60 second agent analysis.
+
+Configuration:
+    ANALYSIS_STORE_PATH  SQLite file (default: data/analysis_results.db)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+
+STORE_PATH = os.getenv("ANALYSIS_STORE_PATH", os.path.join("data", "analysis_results.db"))
+
+
+def result_key(dataset_version: str, timestamp: Optional[str], question: Optional[str]) -> str:
+    """
+    Key identifying one analysis request.
+
+    Args:
+        dataset_version: Fingerprint from get_dataset_version()
+        timestamp: Normalized event timestamp (or None)
+        question: Free-form question (or None)
+
+    Returns:
+        Hex digest
+    """
+    raw = f"{dataset_version}|{timestamp or ''}|{(question or '').strip().lower()}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _json_default(value):
+    """Serialize NumPy/pandas scalars found in analysis results."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+class AnalysisStore:
+    """
+    Thread-safe SQLite store for analysis results.
+
+    Args:
+        path: Database file path (":memory:" for tests)
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_results (
+                key TEXT PRIMARY KEY,
+                dataset_version TEXT NOT NULL,
+                timestamp TEXT,
+                question TEXT,
+                source TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_results_version_ts
+            ON analysis_results (dataset_version, timestamp)
+        """)
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch a stored result by key.
+
+        Returns:
+            Dictionary with the result and metadata, or None (also once closed)
+        """
+        with self._lock:
+            if self._closed:
+                return None
+            row = self._conn.execute(
+                "SELECT timestamp, question, source, result, created_at FROM analysis_results WHERE key = ?",
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "key": key,
+            "timestamp": row[0],
+            "question": row[1],
+            "source": row[2],
+            "result": json.loads(row[3]),
+            "created_at": datetime.fromtimestamp(row[4]).isoformat()
+        }
+
+    def put(self, key: str, dataset_version: str, timestamp: Optional[str],
+            question: Optional[str], result: Dict[str, Any], source: str = "agent"):
+        """
+        Insert or replace a result.
+
+        Args:
+            key: Key from result_key()
+            dataset_version: Dataset fingerprint
+            timestamp: Event timestamp (or None)
+            question: Question text (or None)
+            result: JSON-serializable analysis result
+            source: Origin of the result (e.g., "agent", "rules")
+
+        Writes after close() are dropped: a job that outlived shutdown must
+        not touch a closed connection.
+        """
+        payload = json.dumps(result, default=_json_default)
+        with self._lock:
+            if self._closed:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, dataset_version, timestamp, question, source, payload, time.time())
+            )
+            self._conn.commit()
+
+    def list_for_version(self, dataset_version: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        List stored results for a dataset version (newest event first).
+
+        Returns:
+            List of result metadata dictionaries (without result bodies)
+        """
+        with self._lock:
+            if self._closed:
+                return []
+            rows = self._conn.execute(
+                "SELECT key, timestamp, question, source, created_at FROM analysis_results "
+                "WHERE dataset_version = ? ORDER BY timestamp DESC LIMIT ?",
+                (dataset_version, limit)
+            ).fetchall()
+        return [
+            {"key": r[0], "timestamp": r[1], "question": r[2], "source": r[3],
+             "created_at": datetime.fromtimestamp(r[4]).isoformat()}
+            for r in rows
+        ]
+
+    def carry_forward(self, old_version: str, new_version: str) -> int:
+        """
+        Copy the event analyses of a dataset version to its successor.
+
+        Used when ingested rows are appended: the earlier events are still
+        in the data, so their analyses stay valid. Free-form questions are
+        about the whole dataset and are not copied.
+
+        Returns:
+            Number of entries copied
+        """
+        with self._lock:
+            if self._closed or old_version == new_version:
+                return 0
+            rows = self._conn.execute(
+                "SELECT timestamp, question, source, result, created_at FROM analysis_results "
+                "WHERE dataset_version = ? AND timestamp IS NOT NULL",
+                (old_version,)
+            ).fetchall()
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO analysis_results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(result_key(new_version, ts, question), new_version, ts, question, source, result, created)
+                 for ts, question, source, result, created in rows]
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._conn.close()
+
+
+# Process-wide store shared by the server, job manager and chat UIs
+_default_store: Optional[AnalysisStore] = None
+_default_lock = threading.Lock()
+
+
+def get_analysis_store() -> AnalysisStore:
+    """Get the process-wide AnalysisStore at STORE_PATH, opening it on first use."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = AnalysisStore(STORE_PATH)
+        return _default_store
+
+
+def close_analysis_store():
+    """Close the process-wide store (it is reopened on next use)."""
+    global _default_store
+    with _default_lock:
+        if _default_store is not None:
+            _default_store.close()
+            _default_store = None
@@ -0,0 +1,471 @@
+"""
+Grid Analysis Tools Module
+Typed, precomputed analysis tools registered on the Grid Operator Agent
+
+Each tool is backed by NumPy arrays extracted once from the DataFrame, so a
+timestamp lookup is a binary search on the sorted index instead of a
+full-frame scan. All tools return compact JSON that small local models can
+quote directly, which saves ReAct iterations compared to free-form pandas code.
+"""
+
+import json
+import time
+import httpx
+import numpy as np
+import pandas as pd
+from typing import Optional, Dict, Any, List
+
+from langchain_core.tools import Tool
+
+from app.event_index import get_event_index
+from app.doc_index import get_document_index
+from app.grid_query import get_query_engine, QueryError
+
+
+# Columns reported by default in row/compare/window outputs
+KEY_COLUMNS = [
+    'Grid Frequency (Hz)',
+    'Solar PV Output (kW)',
+    'Wind Power Output (kW)',
+    'Cloud Cover (%)',
+    'Wind Speed (m/s)',
+]
+
+# Upper bound on rows returned by top_events to keep observations short
+MAX_TOP_EVENTS = 20
+
+
+def _round(value: float, digits: int = 4) -> Optional[float]:
+    """Round a float for JSON output, mapping NaN/inf to None."""
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), digits)
+
+
+def _to_json(payload: Dict[str, Any]) -> str:
+    """Serialize a tool result as compact JSON."""
+    return json.dumps(payload, separators=(',', ':'), default=str)
+
+
+class GridAnalysisTools:
+    """
+    Indexed, vectorized implementations of the agent analysis tools.
+
+    Column values are extracted once into float64 arrays and the anomaly
+    severity ranking is precomputed, so every call costs O(log n) for the
+    lookup plus O(window) for aggregates.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        """
+        Precompute arrays and indexes from the grid DataFrame.
+
+        Args:
+            df: Preprocessed grid data DataFrame (sorted Timestamp index)
+        """
+        self.index = df.index
+        self.columns = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+        self.key_columns = [col for col in KEY_COLUMNS if col in df.columns]
+        self._arrays = {col: df[col].to_numpy(dtype=float, na_value=np.nan) for col in self.columns}
+
+        self._is_anomaly = df['Is_Anomaly'].to_numpy(dtype=bool)
+        self._z = df['Z_Score'].to_numpy(dtype=float, na_value=np.nan)
+
+        # Anomaly positions ranked by |Z_Score| (most severe first)
+        anomaly_pos = np.flatnonzero(self._is_anomaly)
+        severity = np.nan_to_num(np.abs(self._z[anomaly_pos]), nan=0.0)
+        self._severity_order = anomaly_pos[np.argsort(-severity, kind='stable')]
+
+        # Lower-cased lookup for tolerant column matching
+        self._column_lookup = {col.lower(): col for col in self.columns}
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _locate(self, ts: str) -> int:
+        """Return the row position of an exact timestamp (binary search)."""
+        target = pd.Timestamp(str(ts).strip().strip('"\''))
+        pos = int(self.index.searchsorted(target))
+        if pos >= len(self.index) or self.index[pos] != target:
+            raise KeyError(f"Timestamp {target} not found in dataset")
+        return pos
+
+    def _resolve_column(self, name: str) -> str:
+        """Resolve a column name, accepting case-insensitive prefixes."""
+        key = str(name).strip().strip('"\'').lower()
+        if key in self._column_lookup:
+            return self._column_lookup[key]
+        matches = [col for low, col in self._column_lookup.items() if low.startswith(key)]
+        if len(matches) == 1:
+            return matches[0]
+        raise KeyError(f"Unknown column '{name}'")
+
+    def _row_values(self, pos: int) -> Dict[str, Any]:
+        """Key column values at a row position."""
+        return {col: _round(self._arrays[col][pos]) for col in self.key_columns}
+
+    def _format_ts(self, pos: int) -> str:
+        return self.index[pos].strftime('%Y-%m-%d %H:%M:%S')
+
+    # ------------------------------------------------------------------
+    # Tools
+    # ------------------------------------------------------------------
+
+    def get_row(self, ts: str) -> Dict[str, Any]:
+        """
+        Get key metrics at an exact timestamp.
+
+        Args:
+            ts: Timestamp string (e.g., "2021-01-01 01:30:00")
+
+        Returns:
+            Dictionary with key column values, anomaly flag and Z-Score
+        """
+        pos = self._locate(ts)
+        return {
+            "timestamp": self._format_ts(pos),
+            "is_anomaly": bool(self._is_anomaly[pos]),
+            "z_score": _round(self._z[pos], 3),
+            "values": self._row_values(pos)
+        }
+
+    def compare(self, ts: str, lag: int = 1) -> Dict[str, Any]:
+        """
+        Compare a timestamp with the row `lag` intervals earlier.
+
+        Args:
+            ts: Timestamp string of the event
+            lag: Number of 30-minute intervals to look back (default: 1)
+
+        Returns:
+            Dictionary with prior/current values, absolute and percent changes
+        """
+        lag = max(1, int(lag))
+        pos = self._locate(ts)
+        prior = pos - lag
+        if prior < 0:
+            raise KeyError(f"No data {lag} interval(s) before {ts}")
+
+        changes = {}
+        for col in self.key_columns:
+            before = self._arrays[col][prior]
+            after = self._arrays[col][pos]
+            pct = (after - before) / before * 100 if before > 0 else None
+            changes[col] = {
+                "prior": _round(before),
+                "current": _round(after),
+                "change": _round(after - before),
+                "change_pct": _round(pct, 2) if pct is not None else None
+            }
+
+        return {
+            "prior_timestamp": self._format_ts(prior),
+            "timestamp": self._format_ts(pos),
+            "is_anomaly": bool(self._is_anomaly[pos]),
+            "changes": changes
+        }
+
+    def window_stats(self, start: str, end: str) -> Dict[str, Any]:
+        """
+        Aggregate statistics over a time window (inclusive).
+
+        Args:
+            start: Start timestamp string
+            end: End timestamp string
+
+        Returns:
+            Dictionary with mean/min/max/std per key column and anomaly count
+        """
+        start_ts = pd.Timestamp(str(start).strip())
+        end_ts = pd.Timestamp(str(end).strip())
+        if start_ts > end_ts:
+            raise ValueError("Start time must be before end time")
+
+        lo = int(self.index.searchsorted(start_ts, side='left'))
+        hi = int(self.index.searchsorted(end_ts, side='right'))
+        if hi <= lo:
+            raise KeyError("No data found in specified range")
+
+        stats = {}
+        for col in self.key_columns:
+            values = self._arrays[col][lo:hi]
+            stats[col] = {
+                "mean": _round(np.nanmean(values)),
+                "min": _round(np.nanmin(values)),
+                "max": _round(np.nanmax(values)),
+                "std": _round(np.nanstd(values))
+            }
+
+        return {
+            "start": self._format_ts(lo),
+            "end": self._format_ts(hi - 1),
+            "rows": hi - lo,
+            "anomalies": int(self._is_anomaly[lo:hi].sum()),
+            "stats": stats
+        }
+
+    def top_events(self, n: int = 5) -> Dict[str, Any]:
+        """
+        Most severe anomaly events ranked by |Z_Score|.
+
+        Args:
+            n: Number of events to return (max: 20)
+
+        Returns:
+            Dictionary with the ranked event list
+        """
+        n = min(max(1, int(n)), MAX_TOP_EVENTS)
+        events = []
+        for pos in self._severity_order[:n]:
+            events.append({
+                "timestamp": self._format_ts(pos),
+                "z_score": _round(self._z[pos], 3),
+                "grid_frequency": _round(self._arrays['Grid Frequency (Hz)'][pos])
+            })
+        return {
+            "total_anomalies": int(len(self._severity_order)),
+            "events": events
+        }
+
+    def correlate(self, col_a: str, col_b: str, start: Optional[str] = None,
+                  end: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Pearson correlation between two columns, optionally within a window.
+
+        Args:
+            col_a: First column name (case-insensitive prefix accepted)
+            col_b: Second column name
+            start: Optional window start timestamp
+            end: Optional window end timestamp
+
+        Returns:
+            Dictionary with the correlation coefficient and sample size
+        """
+        name_a = self._resolve_column(col_a)
+        name_b = self._resolve_column(col_b)
+
+        lo = int(self.index.searchsorted(pd.Timestamp(start.strip()))) if start else 0
+        hi = int(self.index.searchsorted(pd.Timestamp(end.strip()), side='right')) if end else len(self.index)
+
+        a = self._arrays[name_a][lo:hi]
+        b = self._arrays[name_b][lo:hi]
+        valid = ~(np.isnan(a) | np.isnan(b))
+        a, b = a[valid], b[valid]
+
+        corr = None
+        if len(a) > 1 and a.std() > 0 and b.std() > 0:
+            corr = float(np.corrcoef(a, b)[0, 1])
+
+        return {
+            "col_a": name_a,
+            "col_b": name_b,
+            "samples": int(len(a)),
+            "correlation": _round(corr, 4) if corr is not None else None
+        }
+
+
+def _split_args(tool_input: str) -> List[str]:
+    """Split a comma-separated tool input into stripped arguments."""
+    cleaned = str(tool_input).strip().strip('"\'')
+    return [part.strip().strip('"\'') for part in cleaned.split(',') if part.strip()]
+
+
+def _wrap(func):
+    """Adapt a GridAnalysisTools method to a single-string ReAct tool."""
+    def run(tool_input: str) -> str:
+        try:
+            return _to_json(func(*_split_args(tool_input)))
+        except (KeyError, ValueError, TypeError) as e:
+            message = e.args[0] if isinstance(e, KeyError) and e.args else str(e)
+            return _to_json({"error": message})
+    return run
+
+
+def _search_documents(tool_input: str) -> str:
+    """Top passages from the reference document index (query is not split on commas)."""
+    index = get_document_index()
+    if index is None:
+        return _to_json({"error": "Document index not built"})
+    try:
+        return _to_json(index.search(str(tool_input).strip().strip('"\''), 3))
+    except (ValueError, httpx.HTTPError) as e:
+        return _to_json({"error": str(e)})
+
+
+def _query_tool(df: pd.DataFrame):
+    """query_rows tool (the expression is not split on commas)."""
+    engine = get_query_engine(df)
+
+    def run(tool_input: str) -> str:
+        try:
+            return _to_json(engine.summary(str(tool_input).strip().strip('"\'')))
+        except QueryError as e:
+            return _to_json({"error": str(e)})
+    return run
+
+
+def _similar_events_tool(df: pd.DataFrame):
+    """similar_events tool (the index is resolved per call; it is shared and cached by version)."""
+    def similar_events(*args):
+        return get_event_index(df).similar_events(*args)
+    return _wrap(similar_events)
+
+
+def build_analysis_tools(df: pd.DataFrame) -> List[Tool]:
+    """
+    Build the typed analysis tool set for the Grid Operator Agent.
+
+    Zero-Shot ReAct agents only support single-input tools, so each tool
+    takes a comma-separated argument string.
+
+    Args:
+        df: Preprocessed grid data DataFrame
+
+    Returns:
+        List of LangChain Tool instances
+    """
+    tools = GridAnalysisTools(df)
+
+    analysis_tools = [
+        Tool(
+            name="get_row",
+            func=_wrap(tools.get_row),
+            description=(
+                "Get key grid metrics at one exact timestamp. "
+                "Input: timestamp, e.g. 2021-01-01 01:30:00"
+            )
+        ),
+        Tool(
+            name="compare",
+            func=_wrap(tools.compare),
+            description=(
+                "Compare a timestamp with an earlier row and return changes and percent changes. "
+                "Input: timestamp, lag in 30-minute intervals (default 1), "
+                "e.g. 2021-01-01 01:30:00, 1"
+            )
+        ),
+        Tool(
+            name="window_stats",
+            func=_wrap(tools.window_stats),
+            description=(
+                "Mean/min/max/std of key metrics and anomaly count in a time window. "
+                "Input: start, end, e.g. 2021-01-01 00:00:00, 2021-01-02 00:00:00"
+            )
+        ),
+        Tool(
+            name="top_events",
+            func=_wrap(tools.top_events),
+            description=(
+                "Most severe anomaly events ranked by |Z_Score|. "
+                "Input: number of events (max 20), e.g. 5"
+            )
+        ),
+        Tool(
+            name="correlate",
+            func=_wrap(tools.correlate),
+            description=(
+                "Pearson correlation between two columns, optionally within a window. "
+                "Input: column A, column B[, start, end], "
+                "e.g. Solar PV Output (kW), Cloud Cover (%)"
+            )
+        ),
+        Tool(
+            name="similar_events",
+            func=_similar_events_tool(df),
+            description=(
+                "Past anomaly events most similar to the event at a timestamp, "
+                "with their root causes. Input: timestamp, number of events (default 5), "
+                "e.g. 2021-01-01 01:30:00, 5"
+            )
+        ),
+        Tool(
+            name="query_rows",
+            func=_query_tool(df),
+            description=(
+                "Count and list rows matching a condition. Columns: frequency, solar, wind, cloud, "
+                "wind_speed, temperature, humidity, z_score, is_anomaly, time, hour; functions: "
+                "abs, diff(x, \"1h\"), lag, pct_change, rolling_mean. "
+                "Input: condition, e.g. frequency < 49.9 and diff(cloud, \"1h\") > 20"
+            )
+        ),
+    ]
+
+    # Reference documents are only searchable once the offline index exists
+    if get_document_index() is not None:
+        analysis_tools.append(Tool(
+            name="search_documents",
+            func=_search_documents,
+            description=(
+                "Search the NREL microgrid reference reports and return the most relevant passages. "
+                "Input: free-text query, e.g. frequency ride-through requirements"
+            )
+        ))
+
+    return analysis_tools
+
+
+def evaluate_tool_iterations(
+    df: pd.DataFrame,
+    questions: List[str],
+    model: str = "llama3:8b-instruct-q4_K_M"
+) -> Dict[str, Any]:
+    """
+    Compare average ReAct iterations with and without the typed tools.
+
+    Requires a running Ollama server.
+
+    Args:
+        df: Preprocessed grid data DataFrame
+        questions: Questions to ask both agent variants
+        model: Ollama model name
+
+    Returns:
+        Dictionary with average iterations and latency per variant
+    """
+    from app.agent_setup import create_agent
+
+    report = {}
+    for label, use_tools in (("python_repl_only", False), ("typed_tools", True)):
+        agent = create_agent(df, model=model, use_tools=use_tools)
+        iterations = []
+        latencies = []
+        for question in questions:
+            start = time.perf_counter()
+            response = agent.invoke({"input": question})
+            latencies.append(time.perf_counter() - start)
+            iterations.append(len(response.get('intermediate_steps', [])))
+        report[label] = {
+            "questions": len(questions),
+            "avg_iterations": float(np.mean(iterations)) if iterations else 0.0,
+            "avg_latency_s": float(np.mean(latencies)) if latencies else 0.0
+        }
+
+    return report
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    from app.data_loader import load_data
+
+    csv_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join("data", "smart_city_energy_dataset.csv")
+    df = load_data(csv_file)
+
+    anomaly_ts = df.index[df['Is_Anomaly'].to_numpy(dtype=bool)]
+    first = anomaly_ts[0].strftime('%Y-%m-%d %H:%M:%S') if len(anomaly_ts) else df.index[1].strftime('%Y-%m-%d %H:%M:%S')
+
+    questions = [
+        f"What was the grid frequency at {first}?",
+        f"Analyze the anomaly at {first}",
+        "What are the 5 most severe anomalies?",
+        "How correlated are Solar PV Output and Cloud Cover?",
+    ]
+
+    print("\n" + "="*60)
+    print("AGENT ITERATION EVALUATION (before/after typed tools)")
+    print("="*60)
+    report = evaluate_tool_iterations(df, questions)
+    for label, metrics in report.items():
+        print(f"{label:18s} avg iterations: {metrics['avg_iterations']:.2f}  "
+              f"avg latency: {metrics['avg_latency_s']:.1f}s")
@@ -0,0 +1,222 @@
+"""
+Anomaly Index
+Sorted anomaly positions per dataset version for the anomaly listing API
+
+The anomaly rows are located once per dataset version and kept as small
+arrays (row position, timestamp, |Z-Score|, frequency) in two orders:
+by time and by severity (|Z-Score| descending, then time). A listing is
+served from these arrays only, never from the frame:
+
+    - a time window is two binary searches on the timestamps
+    - filters (min |Z|, max frequency) are masks over the anomaly arrays,
+      and the filtered order is cached per filter combination
+    - a page is a slice, resumed from an opaque keyset cursor with a
+      binary search, so fetching page 1000 costs the same as page 1
+
+Cursors hold the sort key of the last returned event rather than an
+offset, so they stay valid when rows are appended to the dataset.
+"""
+
+import base64
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.metrics import cache_requests_total
+
+
+SORT_ORDERS = ("time", "severity")
+
+# Filtered orders kept per index (LRU)
+MAX_CACHED_VIEWS = 64
+
+# Severity of anomalies without a Z-Score (sorted after every scored event)
+UNSCORED_SEVERITY = -1.0
+
+
+class InvalidCursorError(ValueError):
+    """Raised for a cursor that cannot be decoded or belongs to another sort."""
+
+
+def encode_cursor(sort: str, ts_ns: int, severity: float) -> str:
+    """Opaque cursor for the event after (ts_ns, severity) in `sort` order."""
+    key = {"s": sort, "t": int(ts_ns)}
+    if sort == "severity":
+        key["z"] = float(severity)
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[int, float]:
+    """
+    Sort key held by a cursor.
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed or for another sort
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if key["s"] != sort:
+            raise InvalidCursorError(f"Cursor was issued for sort='{key['s']}'")
+        return int(key["t"]), float(key.get("z", 0.0))
+    except InvalidCursorError:
+        raise
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}")
+
+
+class _View:
+    """Anomaly ordinals of one filter combination, in sort order, with their keys."""
+
+    __slots__ = ("ordinals", "ts", "neg_severity")
+
+    def __init__(self, ordinals: np.ndarray, ts: np.ndarray, severity: np.ndarray):
+        self.ordinals = ordinals
+        self.ts = ts[ordinals]
+        self.neg_severity = -severity[ordinals]
+
+
+class AnomalyIndex:
+    """
+    Anomaly positions of a grid DataFrame in time and severity order.
+
+    Args:
+        df: Grid data DataFrame (sorted Timestamp index, Is_Anomaly column)
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.positions = np.flatnonzero(df['Is_Anomaly'].to_numpy(dtype=bool))
+        self.ts = df.index.as_unit('ns').asi8[self.positions]
+        z = df['Z_Score'].to_numpy(dtype=float, na_value=np.nan)[self.positions]
+        self.abs_z = np.abs(z)
+        self.severity = np.where(np.isnan(self.abs_z), UNSCORED_SEVERITY, self.abs_z)
+        self.frequency = df['Grid Frequency (Hz)'].to_numpy(dtype=float, na_value=np.nan)[self.positions]
+        # Severity order: |Z| descending, then time (stable sort keeps time order)
+        self._by_severity = np.argsort(-self.severity, kind='stable')
+        self._views: "OrderedDict[tuple, _View]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def _view(self, sort: str, start_ns: Optional[int], end_ns: Optional[int],
+              min_abs_z: Optional[float], max_frequency: Optional[float]) -> _View:
+        key = (sort, start_ns, end_ns, min_abs_z, max_frequency)
+        with self._lock:
+            view = self._views.get(key)
+            if view is not None:
+                self._views.move_to_end(key)
+                cache_requests_total.inc(1, "anomaly_views", "hit")
+                return view
+        cache_requests_total.inc(1, "anomaly_views", "miss")
+
+        lo = 0 if start_ns is None else int(np.searchsorted(self.ts, start_ns, side='left'))
+        hi = len(self.ts) if end_ns is None else int(np.searchsorted(self.ts, end_ns, side='right'))
+        mask = np.zeros(len(self.ts), dtype=bool)
+        mask[lo:max(lo, hi)] = True
+        if min_abs_z is not None:
+            mask &= self.abs_z >= min_abs_z
+        if max_frequency is not None:
+            mask &= self.frequency <= max_frequency
+
+        order = self._by_severity if sort == "severity" else np.arange(len(self.ts))
+        view = _View(order[mask[order]], self.ts, self.severity)
+        with self._lock:
+            self._views[key] = view
+            while len(self._views) > MAX_CACHED_VIEWS:
+                self._views.popitem(last=False)
+        return view
+
+    @staticmethod
+    def _resume(view: _View, sort: str, ts_ns: int, severity: float) -> int:
+        """Index in `view` of the first event after the cursor key."""
+        if sort == "time":
+            return int(np.searchsorted(view.ts, ts_ns, side='right'))
+        lo = int(np.searchsorted(view.neg_severity, -severity, side='left'))
+        hi = int(np.searchsorted(view.neg_severity, -severity, side='right'))
+        return lo + int(np.searchsorted(view.ts[lo:hi], ts_ns, side='right'))
+
+    def page(self, limit: Optional[int] = None, offset: int = 0, cursor: Optional[str] = None,
+             sort: str = "time", start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None,
+             min_abs_z: Optional[float] = None, max_frequency: Optional[float] = None) -> Dict[str, Any]:
+        """
+        One page of anomalies matching the filters.
+
+        Args:
+            limit: Page size (default: everything after the cursor/offset)
+            offset: Events to skip (ignored when a cursor is given)
+            cursor: next_cursor of a previous page
+            sort: "time" (oldest first) or "severity" (highest |Z| first)
+            start: Earliest timestamp
+            end: Latest timestamp
+            min_abs_z: Minimum |Z-Score|
+            max_frequency: Maximum grid frequency (Hz)
+
+        Returns:
+            Dictionary with the row positions of the page, the number of
+            matching events, the page start and next_cursor
+
+        Raises:
+            ValueError: For an unknown sort order
+            InvalidCursorError: For a bad cursor
+        """
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"sort must be one of: {', '.join(SORT_ORDERS)}")
+        view = self._view(
+            sort,
+            None if start is None else pd.Timestamp(start).value,
+            None if end is None else pd.Timestamp(end).value,
+            None if min_abs_z is None else float(min_abs_z),
+            None if max_frequency is None else float(max_frequency),
+        )
+        total = len(view.ordinals)
+        if cursor:
+            first = self._resume(view, sort, *decode_cursor(cursor, sort))
+        else:
+            first = min(max(0, offset), total)
+        stop = total if limit is None else min(total, first + limit)
+
+        ordinals = view.ordinals[first:stop]
+        next_cursor = None
+        if stop < total and len(ordinals):
+            last = ordinals[-1]
+            next_cursor = encode_cursor(sort, self.ts[last], self.severity[last])
+        return {
+            "positions": self.positions[ordinals],
+            "total": total,
+            "offset": first,
+            "next_cursor": next_cursor
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size and cached filter views."""
+        return {"anomalies": int(len(self.positions)), "cached_views": len(self._views)}
+
+
+_indexes: Dict[str, AnomalyIndex] = {}
+_index_lock = threading.Lock()
+
+
+def get_anomaly_index(df: pd.DataFrame) -> AnomalyIndex:
+    """
+    AnomalyIndex for a DataFrame, cached by dataset version.
+
+    Args:
+        df: Grid data DataFrame
+
+    Returns:
+        Shared AnomalyIndex
+    """
+    from app.data_loader import get_dataset_version
+
+    version = get_dataset_version(df)
+    with _index_lock:
+        index = _indexes.get(version)
+        if index is None:
+            _indexes.clear()
+            index = _indexes[version] = AnomalyIndex(df)
+        return index
@@ -0,0 +1,543 @@
+"""
+Data API Benchmark
+Throughput and peak memory of the grid data endpoints' hot paths
+
+The dataset is tiled (with shifted timestamps) to the requested size, so
+month- and year-long ranges can be measured on the bundled CSV. Each
+variant is timed end to end, to encoded bytes, and peak Python memory is
+taken from tracemalloc.
+
+Usage:
+    python -m app.api_benchmark range --rows 100000 --output bench/range.json
+    python -m app.api_benchmark lookup --timestamps 100000
+    python -m app.api_benchmark stream --clients 10,100,1000 --rate 10
+    python -m app.api_benchmark ingest --rows 200000 --batch-rows 1000
+    python -m app.api_benchmark ingest --url http://localhost:8000
+"""
+
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+from typing import Optional, Callable, Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+
+def tile_dataset(df: pd.DataFrame, rows: int) -> pd.DataFrame:
+    """
+    Repeat a dataset until it has `rows` rows, continuing the time index.
+
+    Args:
+        df: Grid data DataFrame (regular 30-minute index)
+        rows: Target number of rows
+
+    Returns:
+        DataFrame with a continuous index of `rows` rows
+    """
+    repeats = -(-rows // len(df))
+    tiled = pd.concat([df] * repeats).iloc[:rows].copy()
+    tiled.index = pd.date_range(df.index[0], periods=rows, freq='30min', name=df.index.name)
+    return tiled
+
+
+def measure(func: Callable[[], Any], rows: int, repeats: int = 3) -> Dict[str, Any]:
+    """
+    Best-of-N wall time and peak traced memory of one call.
+
+    Args:
+        func: Callable producing the encoded response (bytes or chunks)
+        rows: Rows served per call (for rows/sec)
+        repeats: Timed repetitions
+
+    Returns:
+        Dictionary with seconds, rows_per_sec, peak_mb and output bytes
+    """
+    best, size = float('inf'), 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        size = _consume(func())
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    _consume(func())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "seconds": round(best, 4),
+        "rows_per_sec": int(rows / best) if best > 0 else None,
+        "peak_mb": round(peak / 1e6, 2),
+        "bytes": size
+    }
+
+
+def _consume(result) -> int:
+    if isinstance(result, (bytes, bytearray)):
+        return len(result)
+    return sum(len(chunk) for chunk in result)
+
+
+def legacy_range(df: pd.DataFrame, start: str, end: str) -> bytes:
+    """The previous /api/grid/range path: iterrows + to_dict + FastAPI encoding."""
+    from fastapi.encoders import jsonable_encoder
+
+    range_df = df.loc[pd.to_datetime(start):pd.to_datetime(end)]
+    results = []
+    for ts, row in range_df.iterrows():
+        record = row.to_dict()
+        record['timestamp'] = ts.strftime('%Y-%m-%d %H:%M:%S')
+        results.append(record)
+    payload = {"start": start, "end": end, "count": len(results), "data": results}
+    # Starlette's JSONResponse rejects NaN; allowed here so the baseline completes
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def benchmark_range(df: pd.DataFrame, repeats: int = 3) -> Dict[str, Any]:
+    """
+    Compare the legacy range serializer with the column-wise variants.
+
+    Args:
+        df: Grid data DataFrame
+        repeats: Timed repetitions per variant
+
+    Returns:
+        Per-variant timings and memory
+    """
+    from app.grid_serialization import ColumnStore, dumps
+
+    start = df.index[0].strftime('%Y-%m-%d %H:%M:%S')
+    end = df.index[-1].strftime('%Y-%m-%d %H:%M:%S')
+    rows = len(df)
+
+    build_start = time.perf_counter()
+    store = ColumnStore(df)
+    build_seconds = time.perf_counter() - build_start
+    columns = store.resolve_columns(None)
+    lo, hi = store.bounds(df.index[0], df.index[-1])
+    two_columns = store.resolve_columns('Grid Frequency (Hz),Is_Anomaly')
+
+    def payload(data):
+        return dumps({"start": start, "end": end, "count": hi - lo, "next_cursor": None, "data": data})
+
+    variants = {
+        "legacy_iterrows": lambda: legacy_range(df, start, end),
+        "records": lambda: payload(store.records(lo, hi, columns)),
+        "columns_layout": lambda: payload(store.columnar(lo, hi, columns)),
+        "ndjson_stream": lambda: store.ndjson(lo, hi, columns),
+        "records_projected": lambda: payload(store.records(lo, hi, two_columns)),
+    }
+    try:
+        import pyarrow  # noqa: F401
+        variants["arrow_ipc"] = lambda: store.arrow_ipc(slice(lo, hi), columns)
+        variants["parquet"] = lambda: store.parquet(slice(lo, hi), columns)
+    except ImportError:
+        print("[BENCH] pyarrow not installed, skipping Arrow/Parquet variants")
+    results = {"rows": rows, "column_store_build_seconds": round(build_seconds, 4)}
+    for name, func in variants.items():
+        results[name] = measure(func, rows, repeats)
+        print(f"[BENCH] {name:18s} {results[name]['rows_per_sec']:>10,} rows/s  "
+              f"peak {results[name]['peak_mb']:8.2f} MB")
+    baseline = results["legacy_iterrows"]["seconds"]
+    results["speedup_records"] = round(baseline / results["records"]["seconds"], 1)
+    return results
+
+
+def legacy_lookup(df: pd.DataFrame, timestamps) -> bytes:
+    """One /api/grid/status/{timestamp}-style exact lookup per timestamp."""
+    results = []
+    for timestamp in timestamps:
+        ts = pd.to_datetime(timestamp)
+        if ts in df.index:
+            record = df.loc[ts].to_dict()
+            record['timestamp'] = ts.strftime('%Y-%m-%d %H:%M:%S')
+            results.append(record)
+        else:
+            results.append(None)
+    return json.dumps(results, separators=(',', ':')).encode('utf-8')
+
+
+def benchmark_lookup(df: pd.DataFrame, count: int = 100_000, repeats: int = 3,
+                     legacy_sample: int = 2000) -> Dict[str, Any]:
+    """
+    Bulk as-of lookup of `count` random timestamps, per resolution mode.
+
+    Half the timestamps are on the 30-minute grid and half are jittered off
+    it. Each variant covers parsing the strings, resolving and encoding the
+    column-wise response. The per-request loop is timed on a sample and
+    reported per timestamp.
+
+    Args:
+        df: Grid data DataFrame
+        count: Timestamps per lookup request
+        repeats: Timed repetitions per variant
+        legacy_sample: Timestamps timed with the one-request-per-row loop
+
+    Returns:
+        Per-variant timings and memory
+    """
+    from app.grid_serialization import ColumnStore, dumps, parse_timestamps, LOOKUP_MODES
+
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(df), count)
+    jitter = np.where(rng.random(count) < 0.5, 0, rng.integers(-29, 30, count)) * 60 * 10**9
+    targets = df.index.as_unit('ns').asi8[rows] + jitter
+    timestamps = pd.DatetimeIndex(targets).strftime('%Y-%m-%d %H:%M:%S').tolist()
+
+    store = ColumnStore(df)
+    columns = store.resolve_columns(None)
+    tolerance = pd.Timedelta('15min').value
+
+    def lookup(mode):
+        def run():
+            ns, _ = parse_timestamps(timestamps)
+            positions = store.lookup(ns, mode, None if mode == "exact" else tolerance)
+            return dumps({"mode": mode, "count": count, "matched": int((positions >= 0).sum()),
+                          "data": store.take(positions, columns)})
+        return run
+
+    results = {"rows": len(df), "timestamps": count}
+    for mode in LOOKUP_MODES:
+        results[mode] = measure(lookup(mode), count, repeats)
+        print(f"[BENCH] lookup {mode:9s} {results[mode]['rows_per_sec']:>10,} timestamps/s  "
+              f"peak {results[mode]['peak_mb']:8.2f} MB")
+
+    start = time.perf_counter()
+    ns, _ = parse_timestamps(timestamps)
+    results["parse_seconds"] = round(time.perf_counter() - start, 4)
+    start = time.perf_counter()
+    matched = store.lookup(ns, "nearest", tolerance)
+    results["resolve_seconds"] = round(time.perf_counter() - start, 4)
+    results["nearest_match_rate"] = round(float((matched >= 0).mean()), 4)
+
+    sample = timestamps[:legacy_sample]
+    start = time.perf_counter()
+    legacy_lookup(df, sample)
+    per_timestamp = (time.perf_counter() - start) / len(sample)
+    results["legacy_per_request_loop"] = {
+        "sample": len(sample),
+        "rows_per_sec": int(1 / per_timestamp),
+        "estimated_seconds": round(per_timestamp * count, 2)
+    }
+    print(f"[BENCH] legacy loop      {results['legacy_per_request_loop']['rows_per_sec']:>10,} timestamps/s "
+          f"(excludes HTTP round trips)")
+    results["speedup_exact"] = round(per_timestamp * count / results["exact"]["seconds"], 1)
+    return results
+
+
+def benchmark_stream(df: pd.DataFrame, clients: List[int], rows: int = 2000, rate: float = 10.0,
+                     batch_rows: int = 10) -> Dict[str, Any]:
+    """
+    Live stream fan-out to `clients` in-process subscribers.
+
+    Rows are submitted in batches as fast as the subscribers drain them;
+    each subscriber is a task awaiting its queue, like the SSE/WebSocket
+    handlers without the socket write. Latency is from submit to pickup.
+
+    Args:
+        df: Grid data DataFrame
+        clients: Subscriber counts to measure
+        rows: Rows streamed per measurement
+        rate: Rows per second the live feed produces, for the
+            clients-per-process estimate
+        batch_rows: Rows per submitted batch
+
+    Returns:
+        Per-client-count delivery throughput, latency percentiles, drops and
+        the estimated number of clients one process can serve at `rate`
+    """
+    from app.grid_serialization import get_column_store
+    from app.telemetry_stream import TelemetryBroadcaster, stream_rows
+
+    store = get_column_store(df)
+    rows = min(rows, len(df))
+    payload = stream_rows(store, 0, rows)
+
+    async def run(count: int) -> Dict[str, Any]:
+        broadcaster = TelemetryBroadcaster(max_queue=rows * 2)
+        await broadcaster.start()
+        expected = rows + sum(1 for row in payload if row.get("is_anomaly")) * 2
+        subscribers = [broadcaster.subscribe() for _ in range(count)]
+        latencies = []
+
+        async def consume(subscriber):
+            for _ in range(expected):
+                message = await subscriber.get(timeout=60)
+                if message is None:
+                    return
+                latencies.append(time.perf_counter() - message.created)
+
+        consumers = [asyncio.create_task(consume(s)) for s in subscribers]
+        start = time.perf_counter()
+        for i in range(0, rows, batch_rows):
+            broadcaster.submit(payload[i:i + batch_rows])
+            await asyncio.sleep(0)
+        await asyncio.gather(*consumers)
+        seconds = time.perf_counter() - start
+        await broadcaster.stop()
+
+        latency_ms = np.array(latencies) * 1000
+        deliveries = len(latencies)
+        return {
+            "clients": count,
+            "messages": expected,
+            "seconds": round(seconds, 4),
+            "deliveries_per_sec": int(deliveries / seconds),
+            "latency_ms": {
+                "p50": round(float(np.percentile(latency_ms, 50)), 3),
+                "p99": round(float(np.percentile(latency_ms, 99)), 3)
+            },
+            "dropped": sum(s.dropped for s in subscribers)
+        }
+
+    results = {"rows": rows, "rate": rate, "runs": []}
+    for count in clients:
+        run_result = asyncio.run(run(count))
+        results["runs"].append(run_result)
+        print(f"[BENCH] stream {count:>6,} clients {run_result['deliveries_per_sec']:>12,} deliveries/s  "
+              f"p50 {run_result['latency_ms']['p50']:9.3f} ms  p99 {run_result['latency_ms']['p99']:9.3f} ms")
+
+    best = max(run["deliveries_per_sec"] for run in results["runs"])
+    # Each client receives at least one message per row
+    results["estimated_clients_at_rate"] = int(best / rate)
+    print(f"[BENCH] ~{results['estimated_clients_at_rate']:,} clients per process at {rate:g} rows/s "
+          f"(excludes socket writes)")
+    return results
+
+
+def synthetic_batches(start_ns: int, rows: int, batch_rows: int, anomaly_every: int = 500,
+                      seed: int = 0) -> List[tuple]:
+    """
+    NDJSON ingest batches of synthetic 30-minute rows after `start_ns`.
+
+    Frequencies are drawn around 50 Hz; every `anomaly_every`-th row is a
+    49.5 Hz dip, which the ingest detector flags.
+
+    Returns:
+        List of (body, timestamps of the injected anomalies)
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(pd.Timestamp(start_ns) + pd.Timedelta('30min'), periods=rows, freq='30min')
+    timestamps = index.strftime('%Y-%m-%d %H:%M:%S').tolist()
+    frequency = rng.normal(50.0, 0.01, rows)
+    dips = np.arange(anomaly_every - 1, rows, anomaly_every)
+    frequency[dips] = 49.5
+    solar = rng.uniform(0, 500, rows)
+    wind = rng.uniform(0, 300, rows)
+
+    batches = []
+    for lo in range(0, rows, batch_rows):
+        hi = min(rows, lo + batch_rows)
+        body = "\n".join(
+            json.dumps({"Timestamp": timestamps[i], "Grid Frequency (Hz)": frequency[i],
+                        "Solar PV Output (kW)": solar[i], "Wind Power Output (kW)": wind[i]})
+            for i in range(lo, hi)
+        ).encode("utf-8")
+        alerts = [timestamps[i] for i in dips[(dips >= lo) & (dips < hi)].tolist()]
+        batches.append((body, alerts))
+    return batches
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, Any]:
+    if not latencies:
+        return {"samples": 0}
+    latency_ms = np.array(latencies) * 1000
+    return {
+        "samples": len(latencies),
+        "p50": round(float(np.percentile(latency_ms, 50)), 3),
+        "p99": round(float(np.percentile(latency_ms, 99)), 3),
+        "max": round(float(latency_ms.max()), 3)
+    }
+
+
+def benchmark_ingest(df: pd.DataFrame, rows: int = 200_000, batch_rows: int = 1000,
+                     url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Sustained ingest throughput and ingest-to-alert latency.
+
+    A load generator posts synthetic NDJSON batches back to back, with an
+    injected anomaly every 500 rows, while a subscriber on the live stream
+    times each anomaly_open from the moment its batch was sent.
+
+    In process (default) the batches go through the same parse, validate,
+    score, buffer, fan-out and flush steps as the endpoint, without HTTP.
+    With `url` they are posted to a running server's /api/grid/ingest and
+    alerts are read from its SSE stream.
+
+    Args:
+        df: Grid data DataFrame (the ingested rows continue it)
+        rows: Rows to ingest
+        batch_rows: Rows per batch / request
+        url: Base URL of a running server
+
+    Returns:
+        Rows/sec, batch count and alert latency percentiles
+    """
+    if url:
+        return _benchmark_ingest_http(url, rows, batch_rows)
+
+    from app.ingest import GridIngestor, parse_ndjson
+    from app.telemetry_stream import TelemetryBroadcaster
+
+    batches = synthetic_batches(int(df.index.as_unit('ns').asi8[-1]), rows, batch_rows)
+    expected = sum(len(alerts) for _, alerts in batches)
+
+    async def run() -> Dict[str, Any]:
+        broadcaster = TelemetryBroadcaster()
+        await broadcaster.start()
+        subscriber = broadcaster.subscribe(anomalies_only=True)
+        ingestor = GridIngestor(df)
+        sent: Dict[str, float] = {}
+        latencies: List[float] = []
+
+        async def collect():
+            while len(latencies) < expected:
+                message = await subscriber.get(timeout=10)
+                if message is None:
+                    return
+                if message.type == "anomaly_open":
+                    timestamp = json.loads(message.json)["timestamp"]
+                    if timestamp in sent:
+                        latencies.append(time.perf_counter() - sent[timestamp])
+
+        collector = asyncio.create_task(collect())
+        data = df
+        start = time.perf_counter()
+        for body, alerts in batches:
+            now = time.perf_counter()
+            sent.update((timestamp, now) for timestamp in alerts)
+            result = ingestor.ingest(parse_ndjson(body))
+            broadcaster.submit(result.pop("rows"))
+            if ingestor.needs_flush:
+                data = ingestor.flush(data)
+            await asyncio.sleep(0)
+        data = ingestor.flush(data)
+        seconds = time.perf_counter() - start
+        await collector
+        await broadcaster.stop()
+        return {
+            "mode": "in_process",
+            "rows": rows,
+            "batch_rows": batch_rows,
+            "seconds": round(seconds, 4),
+            "rows_per_sec": int(rows / seconds),
+            "flushes": ingestor.flushes,
+            "alerts_expected": expected,
+            "alert_latency_ms": _latency_summary(latencies)
+        }
+
+    results = asyncio.run(run())
+    _print_ingest(results)
+    return results
+
+
+def _benchmark_ingest_http(url: str, rows: int, batch_rows: int) -> Dict[str, Any]:
+    import threading
+    import httpx
+
+    with httpx.Client(base_url=url, timeout=60) as client:
+        stats = client.get("/api/grid/ingest/stats").raise_for_status().json()
+        batches = synthetic_batches(pd.Timestamp(stats["last_timestamp"]).value, rows, batch_rows)
+        expected = sum(len(alerts) for _, alerts in batches)
+        sent: Dict[str, float] = {}
+        latencies: List[float] = []
+        ready = threading.Event()
+
+        def listen():
+            with httpx.Client(base_url=url, timeout=None) as listener:
+                with listener.stream("GET", "/api/grid/stream", params={"anomalies_only": "true"}) as response:
+                    ready.set()
+                    event = None
+                    for line in response.iter_lines():
+                        if line.startswith("event: "):
+                            event = line[7:]
+                        elif line.startswith("data: ") and event == "anomaly_open":
+                            timestamp = json.loads(line[6:])["timestamp"]
+                            if timestamp in sent:
+                                latencies.append(time.perf_counter() - sent[timestamp])
+                            if len(latencies) >= expected:
+                                return
+
+        listener = threading.Thread(target=listen, daemon=True)
+        listener.start()
+        ready.wait(10)
+
+        headers = {"Content-Type": "application/x-ndjson"}
+        start = time.perf_counter()
+        for body, alerts in batches:
+            now = time.perf_counter()
+            sent.update((timestamp, now) for timestamp in alerts)
+            client.post("/api/grid/ingest", content=body, headers=headers).raise_for_status()
+        seconds = time.perf_counter() - start
+        listener.join(10)
+
+    results = {
+        "mode": "http",
+        "url": url,
+        "rows": rows,
+        "batch_rows": batch_rows,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": int(rows / seconds),
+        "alerts_expected": expected,
+        "alert_latency_ms": _latency_summary(latencies)
+    }
+    _print_ingest(results)
+    return results
+
+
+def _print_ingest(results: Dict[str, Any]):
+    latency = results["alert_latency_ms"]
+    print(f"[BENCH] ingest {results['mode']:10s} {results['rows_per_sec']:>10,} rows/s  "
+          f"({results['rows']:,} rows in batches of {results['batch_rows']:,})")
+    if latency["samples"]:
+        print(f"[BENCH] ingest-to-alert {latency['samples']}/{results['alerts_expected']} alerts  "
+              f"p50 {latency['p50']:.3f} ms  p99 {latency['p99']:.3f} ms")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark grid data API hot paths")
+    parser.add_argument("benchmark", choices=["range", "lookup", "stream", "ingest"])
+    parser.add_argument("--data", default=None, help="CSV dataset path")
+    parser.add_argument("--rows", type=int, default=None, help="Tile the dataset to this many rows")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--timestamps", type=int, default=100_000, help="Timestamps per lookup request")
+    parser.add_argument("--clients", default="10,100,1000", help="Comma-separated subscriber counts (stream)")
+    parser.add_argument("--rate", type=float, default=10.0, help="Live feed rows per second (stream)")
+    parser.add_argument("--batch-rows", type=int, default=1000, help="Rows per ingest request (ingest)")
+    parser.add_argument("--url", default=None, help="Post to a running server instead of in process (ingest)")
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    from app.data_loader import load_data
+
+    data_file = args.data or os.path.join("data", "smart_city_energy_dataset.csv")
+    if not os.path.exists(data_file):
+        data_file = "smart_city_energy_dataset.csv"
+    df = load_data(data_file)
+    if args.rows and args.benchmark != "ingest":
+        df = tile_dataset(df, args.rows)
+
+    if args.benchmark == "lookup":
+        results = benchmark_lookup(df, args.timestamps, args.repeats)
+    elif args.benchmark == "stream":
+        clients = [int(count) for count in args.clients.split(",")]
+        results = benchmark_stream(df, clients, rate=args.rate)
+    elif args.benchmark == "ingest":
+        results = benchmark_ingest(df, args.rows or 200_000, args.batch_rows, args.url)
+    else:
+        results = benchmark_range(df, args.repeats)
+    report = {"benchmark": args.benchmark, "results": results}
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
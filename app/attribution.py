@@ -0,0 +1,339 @@
+"""
+Attribution Rule Engine
+Declarative root-cause, confidence and recommendation rules
+
+The rules live in a JSON table (app/attribution_rules.json by default):
+
+    root_causes       first match wins, in descending priority; a match
+                      may adjust the confidence score
+    confidence        base score, clamping bounds and adjustments that
+                      apply to every event whose conditions hold
+    recommendations   each rule adds its text when its conditions hold,
+                      or its "otherwise" text when they don't
+
+A rule's conditions are [feature, operator, value] triples, all of which
+must hold ("when") or any of which may hold ("any"). Tables are compiled
+into functions producing NumPy boolean masks, so one evaluation covers
+every anomaly row at once; analyze_grid_event evaluates the same table for
+a single row. The table file is re-read whenever it changes on disk, and
+an invalid edit keeps the previous rules in force.
+
+Configuration:
+    ATTRIBUTION_RULES_PATH  Rule table (default: app/attribution_rules.json)
+"""
+
+import json
+import os
+import threading
+from typing import Optional, Dict, Any, List, Callable
+
+import numpy as np
+import pandas as pd
+
+
+ATTRIBUTION_RULES_PATH = os.getenv(
+    "ATTRIBUTION_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "attribution_rules.json")
+)
+
+INTERVAL = pd.Timedelta(minutes=30)
+
+# Features a rule condition may reference
+FEATURES = (
+    'freq_change_hz',
+    'abs_freq_change_hz',
+    'solar_change_pct',
+    'abs_solar_change_pct',
+    'wind_change_pct',
+    'abs_wind_change_pct',
+    'cloud_change',
+    'frequency_hz',
+)
+
+OPERATORS = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+
+# Result for events without a row 30 minutes earlier (as analyze_grid_event)
+INSUFFICIENT_DATA = {
+    "root_cause": "Insufficient data",
+    "confidence_score": 0,
+    "recommendations": ["Collect more historical data"],
+}
+
+Mask = Callable[[Dict[str, np.ndarray]], np.ndarray]
+
+
+class RuleTableError(ValueError):
+    """Raised for a malformed attribution rule table."""
+
+
+def _compile_condition(condition) -> Mask:
+    try:
+        feature, op, value = condition
+    except (TypeError, ValueError):
+        raise RuleTableError(f"Condition must be [feature, operator, value]: {condition!r}")
+    if feature not in FEATURES:
+        raise RuleTableError(f"Unknown feature '{feature}' (allowed: {', '.join(FEATURES)})")
+    if op not in OPERATORS:
+        raise RuleTableError(f"Unknown operator '{op}'")
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise RuleTableError(f"Condition value must be a number: {condition!r}")
+    func, value = OPERATORS[op], float(value)
+    return lambda features: func(features[feature], value)
+
+
+def _compile_rule(rule: Dict[str, Any]) -> Mask:
+    """Combine a rule's "when" (all) and "any" conditions into one mask function."""
+    all_of = [_compile_condition(c) for c in rule.get("when", [])]
+    any_of = [_compile_condition(c) for c in rule.get("any", [])]
+    if not all_of and not any_of:
+        raise RuleTableError(f"Rule '{rule.get('name', '?')}' has no conditions")
+
+    def mask(features: Dict[str, np.ndarray]) -> np.ndarray:
+        result = np.ones(len(features['frequency_hz']), dtype=bool)
+        for condition in all_of:
+            result &= condition(features)
+        if any_of:
+            matched = np.zeros_like(result)
+            for condition in any_of:
+                matched |= condition(features)
+            result &= matched
+        return result
+
+    return mask
+
+
+def compile_rules(table: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate a rule table and compile its conditions to mask functions.
+
+    Args:
+        table: Parsed rule table
+
+    Returns:
+        Compiled table used by AttributionEngine.evaluate
+
+    Raises:
+        RuleTableError: If the table is malformed
+    """
+    try:
+        # Stable sort keeps file order among equal priorities
+        ordered = sorted(table["root_causes"], key=lambda r: -r.get("priority", 0))
+        root_causes = [
+            (r["name"], _compile_rule(r), r["root_cause"], int(r.get("confidence", 0)))
+            for r in ordered
+        ]
+        confidence = table.get("confidence", {})
+        adjustments = [(_compile_rule(a), int(a["delta"])) for a in confidence.get("adjustments", [])]
+        recommendations = [
+            (_compile_rule(r), r["text"], r.get("otherwise"))
+            for r in table.get("recommendations", [])
+        ]
+    except KeyError as e:
+        raise RuleTableError(f"Rule table is missing key {e}")
+    return {
+        "version": table.get("version"),
+        "root_causes": root_causes,
+        "default_root_cause": table.get("default_root_cause", "Unknown"),
+        "base": int(confidence.get("base", 100)),
+        "min": int(confidence.get("min", 0)),
+        "max": int(confidence.get("max", 100)),
+        "adjustments": adjustments,
+        "recommendations": recommendations,
+    }
+
+
+def compute_features(df: pd.DataFrame, positions: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Rule features for row positions, against the row 30 minutes earlier.
+
+    Percent changes are 0 when the prior output is not positive, as in
+    analyze_grid_event.
+
+    Args:
+        df: Grid data DataFrame (Timestamp index)
+        positions: Row positions of the events
+
+    Returns:
+        Dictionary of feature arrays plus "has_prior"
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    prior = df.index.get_indexer(df.index[positions] - INTERVAL)
+    has_prior = prior >= 0
+    prior = np.where(has_prior, prior, 0)
+
+    def column(name):
+        return df[name].to_numpy(dtype=float, na_value=np.nan)
+
+    def pct(values):
+        before, after = values[prior], values[positions]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = np.where(before > 0, (after - before) / before * 100, 0.0)
+        return np.where(has_prior, change, 0.0)
+
+    freq = column('Grid Frequency (Hz)')
+    cloud = column('Cloud Cover (%)')
+    freq_change = np.where(has_prior, freq[positions] - freq[prior], 0.0)
+    solar_pct = pct(column('Solar PV Output (kW)'))
+    wind_pct = pct(column('Wind Power Output (kW)'))
+
+    return {
+        'has_prior': has_prior,
+        'freq_change_hz': freq_change,
+        'abs_freq_change_hz': np.abs(freq_change),
+        'solar_change_pct': solar_pct,
+        'abs_solar_change_pct': np.abs(solar_pct),
+        'wind_change_pct': wind_pct,
+        'abs_wind_change_pct': np.abs(wind_pct),
+        'cloud_change': np.where(has_prior, cloud[positions] - cloud[prior], 0.0),
+        'frequency_hz': freq[positions],
+    }
+
+
+class AttributionEngine:
+    """
+    Hot-reloading evaluator for an attribution rule table.
+
+    Args:
+        path: Rule table JSON file
+    """
+
+    def __init__(self, path: str = ATTRIBUTION_RULES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[int] = None
+        self._compiled: Optional[Dict[str, Any]] = None
+        self.table: Dict[str, Any] = {}
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def rules(self) -> Dict[str, Any]:
+        """Compiled table, reloaded if the file changed since the last call."""
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._load(mtime)
+        return self._compiled
+
+    def _load(self, mtime: int):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                table = json.load(f)
+            compiled = compile_rules(table)
+        except (OSError, ValueError) as e:
+            # Keep serving the previous rules after a bad edit
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"[ATTRIBUTION] Rule table not loaded: {self.last_error}")
+            if self._compiled is None:
+                raise
+            self._mtime = mtime
+            return
+        self.table, self._compiled, self._mtime = table, compiled, mtime
+        self.last_error = None
+        self.reloads += 1
+        print(f"[ATTRIBUTION] Loaded rule table v{compiled['version']} "
+              f"({len(compiled['root_causes'])} root-cause rules)")
+
+    def evaluate(self, features: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        """
+        Evaluate the rules over many events at once.
+
+        Args:
+            features: Feature arrays from compute_features
+
+        Returns:
+            Dictionary with per-event arrays "rule", "root_cause",
+            "confidence" and a list of recommendation lists
+        """
+        rules = self.rules
+        n = len(features['frequency_hz'])
+
+        masks = [mask(features) for _, mask, _, _ in rules["root_causes"]]
+        rule = np.select(masks, [name for name, _, _, _ in rules["root_causes"]], default="") if masks \
+            else np.full(n, "")
+        root_cause = np.select(masks, [text for _, _, text, _ in rules["root_causes"]],
+                               default=rules["default_root_cause"]) if masks \
+            else np.full(n, rules["default_root_cause"])
+
+        confidence = np.full(n, rules["base"], dtype=np.int64)
+        for mask, delta in rules["adjustments"]:
+            confidence += np.where(mask(features), delta, 0)
+        if masks:
+            confidence += np.select(masks, [adj for _, _, _, adj in rules["root_causes"]], default=0)
+        confidence = np.clip(confidence, rules["min"], rules["max"])
+
+        columns = []
+        for mask, text, otherwise in rules["recommendations"]:
+            matched = mask(features)
+            columns.append(np.where(matched, text, otherwise or ""))
+        recommendations = [[str(text) for text in row if text] for row in zip(*columns)] if columns \
+            else [[] for _ in range(n)]
+
+        return {
+            "rule": rule,
+            "root_cause": root_cause,
+            "confidence": confidence,
+            "recommendations": recommendations
+        }
+
+    def attribute(self, df: pd.DataFrame, positions: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        Structured attribution for events (default: every anomaly row).
+
+        Args:
+            df: Grid data DataFrame
+            positions: Row positions to attribute
+
+        Returns:
+            List of dictionaries shaped like analyze_grid_event's
+            structured_analysis, plus timestamp and matched rule
+        """
+        if positions is None:
+            positions = np.flatnonzero(df['Is_Anomaly'].to_numpy(dtype=bool))
+        features = compute_features(df, positions)
+        result = self.evaluate(features)
+
+        events = []
+        for i, pos in enumerate(np.asarray(positions).tolist()):
+            event = {"timestamp": df.index[pos].strftime('%Y-%m-%d %H:%M:%S')}
+            if not features['has_prior'][i]:
+                event.update(rule=None, metrics={}, **INSUFFICIENT_DATA)
+            else:
+                event.update({
+                    "rule": str(result["rule"][i]) or None,
+                    "root_cause": str(result["root_cause"][i]),
+                    "confidence_score": int(result["confidence"][i]),
+                    "recommendations": result["recommendations"][i],
+                    "metrics": {
+                        "frequency_change_hz": round(float(features['freq_change_hz'][i]), 4),
+                        "solar_change_percent": round(float(features['solar_change_pct'][i]), 2),
+                        "wind_change_percent": round(float(features['wind_change_pct'][i]), 2),
+                        "cloud_cover_change": round(float(features['cloud_change'][i]), 2)
+                    }
+                })
+            events.append(event)
+        return events
+
+    def status(self) -> Dict[str, Any]:
+        """Loaded table, reload count and the last load error."""
+        rules = self.rules
+        return {
+            "path": self.path,
+            "version": rules["version"],
+            "root_cause_rules": [name for name, _, _, _ in rules["root_causes"]],
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "table": self.table
+        }
+
+
+# Process-wide engine shared by analyze_grid_event, the event index and the API
+attribution_engine = AttributionEngine()
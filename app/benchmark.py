@@ -0,0 +1,318 @@
+"""
+Agent Pipeline Benchmark
+Measures Python-side overhead of the agent pipeline against a replayed LLM
+
+Drives create_agent / get_or_create_agent and the Chainlit on_message
+handler through a fixed question set and reports time spent per layer:
+    prompt_build  agent bookkeeping before each LLM call (prompt formatting)
+    llm           waiting on the (stubbed) model
+    parse         turning model output into an action or final answer
+    tool          executing tools (python_repl_ast / typed tools)
+    other         everything else inside the agent invocation
+
+Usage:
+    python -m app.benchmark --latency-ms 200 --tokens-per-sec 40
+    python -m app.benchmark --transcript bench/transcript.jsonl --output bench/report.json
+    python -m app.benchmark --no-stub   # against the Ollama at OLLAMA_BASE_URL
+
+The stub must be running before app modules are imported, because the LLM
+base URL is read at import time; main() handles that ordering.
+"""
+
+import json
+import os
+import time
+from typing import Optional, Dict, Any, List
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+def default_questions(first_anomaly: str) -> List[str]:
+    """
+    Fixed benchmark question set.
+
+    Args:
+        first_anomaly: Timestamp string of an anomaly in the dataset
+
+    Returns:
+        List of questions
+    """
+    return [
+        f"Analyze the anomaly at {first_anomaly}",
+        f"What was the grid frequency at {first_anomaly}?",
+        "What are the most severe anomalies?",
+        "Summarize the recent grid status",
+    ]
+
+
+class LayerTimer(BaseCallbackHandler):
+    """
+    Callback that splits one agent invocation into per-layer wall time.
+
+    Time between the end of one step and the next LLM call is attributed
+    to prompt building; time between an LLM response and the resulting
+    action/finish is attributed to parsing.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.layers = {"prompt_build": 0.0, "llm": 0.0, "parse": 0.0, "tool": 0.0}
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.total = 0.0
+        self._root: Optional[UUID] = None
+        self._start = 0.0
+        self._mark = 0.0
+        self._llm_start = 0.0
+        self._tool_start = 0.0
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs):
+        if parent_run_id is None:
+            self._root = run_id
+            self._start = self._mark = time.perf_counter()
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        if run_id == self._root:
+            self.total = time.perf_counter() - self._start
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs):
+        self.on_chain_end({}, run_id=run_id)
+
+    def _llm_begin(self):
+        now = time.perf_counter()
+        self.layers["prompt_build"] += now - self._mark
+        self._llm_start = now
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._llm_begin()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._llm_begin()
+
+    def on_llm_end(self, response, **kwargs):
+        now = time.perf_counter()
+        self.layers["llm"] += now - self._llm_start
+        self.llm_calls += 1
+        self._mark = now
+
+    def on_agent_action(self, action, **kwargs):
+        now = time.perf_counter()
+        self.layers["parse"] += now - self._mark
+        self._mark = now
+
+    def on_agent_finish(self, finish, **kwargs):
+        self.on_agent_action(finish)
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self._tool_start = time.perf_counter()
+
+    def on_tool_end(self, output, **kwargs):
+        now = time.perf_counter()
+        self.layers["tool"] += now - self._tool_start
+        self.tool_calls += 1
+        self._mark = now
+
+    def on_tool_error(self, error, **kwargs):
+        self.on_tool_end(None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-layer milliseconds for the last invocation."""
+        layers_ms = {k: round(v * 1000, 2) for k, v in self.layers.items()}
+        layers_ms["other"] = round(max(0.0, self.total - sum(self.layers.values())) * 1000, 2)
+        return {
+            "total_ms": round(self.total * 1000, 2),
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "layers_ms": layers_ms
+        }
+
+
+def _mean(values: List[float]) -> float:
+    return round(sum(values) / len(values), 2) if values else 0.0
+
+
+def benchmark_setup(df) -> Dict[str, float]:
+    """
+    Time agent construction paths.
+
+    Returns:
+        Milliseconds for create_agent and cold/warm get_or_create_agent
+    """
+    from app import agent_setup
+
+    start = time.perf_counter()
+    agent_setup.create_agent(df)
+    create_ms = (time.perf_counter() - start) * 1000
+
+    agent_setup._cached_agent = None
+    start = time.perf_counter()
+    agent_setup.get_or_create_agent(df)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    agent_setup.get_or_create_agent(df)
+    warm_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "create_agent_ms": round(create_ms, 2),
+        "get_or_create_cold_ms": round(cold_ms, 2),
+        "get_or_create_warm_ms": round(warm_ms, 3)
+    }
+
+
+def benchmark_agent(agent, questions: List[str], repeats: int = 1) -> Dict[str, Any]:
+    """
+    Invoke the agent directly and collect per-layer timings.
+
+    Args:
+        agent: AgentExecutor from create_agent
+        questions: Question set
+        repeats: Passes over the question set
+
+    Returns:
+        Dictionary with per-question and averaged layer timings
+    """
+    timer = LayerTimer()
+    runs = []
+    for _ in range(repeats):
+        for question in questions:
+            timer.reset()
+            agent.invoke({"input": question}, config={"callbacks": [timer]})
+            runs.append(dict(timer.snapshot(), question=question))
+
+    layer_names = list(runs[0]["layers_ms"]) if runs else []
+    return {
+        "runs": runs,
+        "avg_total_ms": _mean([r["total_ms"] for r in runs]),
+        "avg_layers_ms": {name: _mean([r["layers_ms"][name] for r in runs]) for name in layer_names}
+    }
+
+
+async def benchmark_chainlit(agent, df, questions: List[str]) -> Dict[str, Any]:
+    """
+    Drive the Chainlit on_message handler in an HTTP context.
+
+    The handler overhead (step bookkeeping, regex, chart building) is the
+    handler wall time minus the agent invocation time.
+
+    Returns:
+        Dictionary with average handler and overhead milliseconds
+    """
+    import chainlit as cl
+    from chainlit.context import init_http_context
+    from app.chainlit_app import on_message
+
+    init_http_context()
+    cl.user_session.set("agent", agent)
+    cl.user_session.set("data", df)
+
+    timer = LayerTimer()
+    previous_callbacks = agent.callbacks
+    agent.callbacks = [timer]
+    runs = []
+    try:
+        for question in questions:
+            timer.reset()
+            start = time.perf_counter()
+            await on_message(cl.Message(content=question))
+            handler_ms = (time.perf_counter() - start) * 1000
+            runs.append({
+                "question": question,
+                "handler_ms": round(handler_ms, 2),
+                "agent_ms": round(timer.total * 1000, 2),
+                "overhead_ms": round(handler_ms - timer.total * 1000, 2)
+            })
+    finally:
+        agent.callbacks = previous_callbacks
+
+    return {
+        "runs": runs,
+        "avg_handler_ms": _mean([r["handler_ms"] for r in runs]),
+        "avg_overhead_ms": _mean([r["overhead_ms"] for r in runs])
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    """Print a benchmark report as a compact table."""
+    print("\n" + "="*60)
+    print("AGENT PIPELINE BENCHMARK")
+    print("="*60)
+    for key, value in report["setup"].items():
+        print(f"  {key:28s} {value:10.2f} ms")
+    print("-"*60)
+    print(f"  {'agent.invoke avg total':28s} {report['agent']['avg_total_ms']:10.2f} ms")
+    for layer, value in report["agent"]["avg_layers_ms"].items():
+        print(f"    {layer:26s} {value:10.2f} ms")
+    if "chainlit" in report:
+        print("-"*60)
+        print(f"  {'on_message avg total':28s} {report['chainlit']['avg_handler_ms']:10.2f} ms")
+        print(f"  {'on_message overhead':28s} {report['chainlit']['avg_overhead_ms']:10.2f} ms")
+    print("="*60)
+
+
+def main():
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Benchmark agent pipeline overhead")
+    parser.add_argument("--data", default=None, help="CSV dataset path")
+    parser.add_argument("--transcript", default=None, help="Replay transcript (JSONL)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--no-stub", action="store_true", help="Use the Ollama at OLLAMA_BASE_URL")
+    parser.add_argument("--skip-chainlit", action="store_true")
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    stub = None
+    if not args.no_stub:
+        from app.ollama_stub import OllamaStub
+        stub = OllamaStub(port=0, transcript_path=args.transcript,
+                          latency_ms=args.latency_ms, tokens_per_sec=args.tokens_per_sec).start()
+        os.environ["OLLAMA_BASE_URL"] = stub.url
+
+    from app.data_loader import load_data
+
+    data_file = args.data or os.path.join("data", "smart_city_energy_dataset.csv")
+    if not os.path.exists(data_file):
+        data_file = "smart_city_energy_dataset.csv"
+    df = load_data(data_file)
+
+    anomalies = df.index[df['Is_Anomaly'].to_numpy(dtype=bool)]
+    first = (anomalies[0] if len(anomalies) else df.index[1]).strftime('%Y-%m-%d %H:%M:%S')
+    questions = default_questions(first)
+
+    try:
+        from app.agent_setup import get_or_create_agent
+
+        report = {
+            "stub": stub is not None,
+            "latency_ms": args.latency_ms,
+            "tokens_per_sec": args.tokens_per_sec,
+            "questions": questions,
+            "setup": benchmark_setup(df)
+        }
+        agent = get_or_create_agent(df)
+        report["agent"] = benchmark_agent(agent, questions, repeats=args.repeats)
+        if not args.skip_chainlit:
+            report["chainlit"] = asyncio.run(benchmark_chainlit(agent, df, questions))
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -15,16 +15,30 @@ from plotly.subplots import make_subplots
 import pandas as pd
 from datetime import datetime, timedelta
 import asyncio
+import json
 
-from app.data_loader import load_data, get_latest_status, get_statistics
+from app.data_loader import load_data, get_latest_status, get_statistics, get_live_dataset
 from app.agent_setup import create_agent, get_or_create_agent
+from app.preanalysis import first_anomaly_timestamp, lookup_analysis
+from app.downsampling import downsample_frame, CHART_MAX_POINTS
+from app.telemetry_stream import telemetry
+from app.conversation_memory import ConversationMemory
+from app.circuit_breaker import (
+    llm_breaker, CircuitOpenError, rule_based_answer, DEGRADED_BANNER, AGENT_TIMEOUT_SECONDS
+)
+import httpx
 import os
+import re
 
 # Determine data file path
 DATA_FILE = os.path.join("data", "smart_city_energy_dataset.csv")
 if not os.path.exists(DATA_FILE):
     DATA_FILE = "smart_city_energy_dataset.csv"
 
+TIMESTAMP_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}')
+FIRST_ANOMALY_PATTERN = re.compile(r'\bfirst anomal', re.IGNORECASE)
+ANALYZE_PATTERN = re.compile(r'\banaly[sz]', re.IGNORECASE)
+
 
 def create_status_gauge(frequency: float, title: str = "Grid Frequency (Hz)") -> go.Figure:
     """
@@ -96,6 +110,13 @@ def create_trend_chart(df: pd.DataFrame, hours: int = 24) -> go.Figure:
     start_time = end_time - timedelta(hours=hours)
     recent_df = df.loc[start_time:end_time]
     
+    # At most CHART_MAX_POINTS per trace; anomaly rows are always kept
+    series = downsample_frame(
+        recent_df,
+        ['Grid Frequency (Hz)', 'Solar PV Output (kW)', 'Wind Power Output (kW)'],
+        max_points=CHART_MAX_POINTS
+    )
+    
     # Create subplots
     fig = make_subplots(
         rows=2, cols=1,
@@ -108,8 +129,8 @@ def create_trend_chart(df: pd.DataFrame, hours: int = 24) -> go.Figure:
     # Frequency plot
     fig.add_trace(
         go.Scatter(
-            x=recent_df.index,
-            y=recent_df['Grid Frequency (Hz)'],
+            x=series['Grid Frequency (Hz)'].index,
+            y=series['Grid Frequency (Hz)'],
             name='Frequency',
             line=dict(color='#3498db', width=2),
             mode='lines'
@@ -137,8 +158,8 @@ def create_trend_chart(df: pd.DataFrame, hours: int = 24) -> go.Figure:
     # Solar generation
     fig.add_trace(
         go.Scatter(
-            x=recent_df.index,
-            y=recent_df['Solar PV Output (kW)'],
+            x=series['Solar PV Output (kW)'].index,
+            y=series['Solar PV Output (kW)'],
             name='Solar',
             line=dict(color='#f39c12', width=2),
             mode='lines'
@@ -149,8 +170,8 @@ def create_trend_chart(df: pd.DataFrame, hours: int = 24) -> go.Figure:
     # Wind generation
     fig.add_trace(
         go.Scatter(
-            x=recent_df.index,
-            y=recent_df['Wind Power Output (kW)'],
+            x=series['Wind Power Output (kW)'].index,
+            y=series['Wind Power Output (kW)'],
             name='Wind',
             line=dict(color='#27ae60', width=2),
             mode='lines'
@@ -175,6 +196,30 @@ def create_trend_chart(df: pd.DataFrame, hours: int = 24) -> go.Figure:
     return fig
 
 
+async def watch_live_alerts():
+    """
+    Post an alert for every anomaly event on the live telemetry stream
+
+    Runs for the lifetime of a chat session when the stream is running
+    (Chainlit is mounted in the API process, so it shares the broadcaster).
+    """
+    subscriber = telemetry.subscribe(anomalies_only=True)
+    try:
+        while not subscriber.closed:
+            message = await subscriber.get()
+            if message is None or message.type != "anomaly_open":
+                continue
+            event = json.loads(message.json)
+            z_score = f"{event['z_score']:.2f}" if event.get('z_score') is not None else "n/a"
+            await cl.Message(
+                content=f"🚨 **Live anomaly** at {event['timestamp']}: "
+                        f"frequency {event['grid_frequency']:.4f} Hz (Z-Score {z_score})\n\n"
+                        f"Ask \"Analyze the anomaly at {event['timestamp']}\" for a root-cause analysis."
+            ).send()
+    finally:
+        telemetry.unsubscribe(subscriber)
+
+
 @cl.on_chat_start
 async def on_chat_start():
     """
@@ -187,16 +232,26 @@ async def on_chat_start():
         # 1. Load data
         loading_msg.content = "📊 Loading grid data..."
         await loading_msg.update()
-        df = load_data(DATA_FILE)
+        # Share the API server's frame (with ingested rows) when mounted in it
+        df = get_live_dataset()
+        if df is None:
+            df = load_data(DATA_FILE)
         
-        # 2. Create agent
+        cl.user_session.set("data", df)
+        cl.user_session.set("memory", ConversationMemory(df))
+        
+        # 2. Create agent (the chat still works in degraded mode without it)
         loading_msg.content = "🤖 Initializing AI Agent..."
         await loading_msg.update()
-        agent = get_or_create_agent(df)
+        try:
+            agent = await cl.make_async(get_or_create_agent)(df)
+        except Exception as agent_error:
+            print(f"[CHAINLIT] Agent unavailable, starting in degraded mode: {agent_error}")
+            llm_breaker.record_failure(agent_error)
+            agent = None
         
         # 3. Store in session
         cl.user_session.set("agent", agent)
-        cl.user_session.set("data", df)
         
         # 4. Get statistics
         stats = get_statistics(df)
@@ -247,6 +302,13 @@ Welcome to the enterprise-grade AI-powered grid monitoring system!
             elements=elements
         ).send()
         
+        # Follow the live stream for anomaly alerts
+        if telemetry.running:
+            cl.user_session.set("live_alerts", asyncio.create_task(watch_live_alerts()))
+        
+        if agent is None or llm_breaker.is_open:
+            await cl.Message(content=DEGRADED_BANNER).send()
+        
     except Exception as e:
         loading_msg.content = f"❌ **Initialization Error**\n\n```\n{str(e)}\n```\n\nPlease check:\n1. Ollama is running: `ollama serve`\n2. Model is available: `ollama list`\n3. Data file exists: {DATA_FILE}"
         await loading_msg.update()
@@ -259,11 +321,30 @@ async def on_message(message: cl.Message):
     """
     agent = cl.user_session.get("agent")
     df = cl.user_session.get("data")
+    memory = cl.user_session.get("memory")
+    if memory is None and df is not None:
+        memory = ConversationMemory(df)
+        cl.user_session.set("memory", memory)
     
-    if agent is None:
-        await cl.Message(content="❌ Agent not initialized. Please refresh the page.").send()
+    if df is None:
+        await cl.Message(content="❌ Data not loaded. Please refresh the page.").send()
         return
     
+    # Follow rows flushed in by /api/grid/ingest since the last message
+    live_df = get_live_dataset()
+    if live_df is not None and live_df is not df:
+        df = live_df
+        cl.user_session.set("data", df)
+        memory.df = df
+        if agent is not None:
+            try:
+                agent = await cl.make_async(get_or_create_agent)(df)
+            except Exception as agent_error:
+                print(f"[CHAINLIT] Agent unavailable, continuing in degraded mode: {agent_error}")
+                llm_breaker.record_failure(agent_error)
+                agent = None
+            cl.user_session.set("agent", agent)
+    
     # Create a parent step for the entire reasoning process
     async with cl.Step(name="🤖 AI Agent Processing", type="llm") as main_step:
         main_step.input = message.content
@@ -274,20 +355,55 @@ async def on_message(message: cl.Message):
                 thinking_step.input = message.content
                 
                 # Parse query for timestamp
-                import re
-                timestamp_match = re.search(r'\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}', message.content)
+                timestamp_match = TIMESTAMP_PATTERN.search(message.content)
+                event_ts = None
                 
                 if timestamp_match:
-                    ts = timestamp_match.group(0)
-                    thinking_step.output = f"Detected timestamp: {ts}"
+                    event_ts = timestamp_match.group(0)
+                    thinking_step.output = f"Detected timestamp: {event_ts}"
+                elif FIRST_ANOMALY_PATTERN.search(message.content):
+                    event_ts = first_anomaly_timestamp(df)
+                    thinking_step.output = f"First anomaly: {event_ts}"
+                elif memory.is_follow_up(message.content):
+                    thinking_step.output = f"Follow-up on {memory.focus_timestamp}"
                 else:
                     thinking_step.output = "General query - will analyze overall patterns"
+                
+                # Agent input carries the session context (recent turns,
+                # summary and already known events)
+                if event_ts:
+                    memory.track_timestamp(event_ts)
+                agent_input = memory.build_input(message.content)
+            
+            # Event analyses may already be done by the background pre-analysis
+            stored = None
+            if event_ts and ANALYZE_PATTERN.search(message.content):
+                stored = await cl.make_async(lookup_analysis)(df, event_ts)
             
-            # Invoke agent (synchronous call wrapped in async)
-            async with cl.Step(name="⚙️ Agent Execution", type="run", parent_id=main_step.id) as execution_step:
-                # Run synchronous agent in thread pool
-                response = await cl.make_async(agent.invoke)({"input": message.content})
-                execution_step.output = "Agent completed analysis"
+            if stored and stored["result"].get("agent_analysis"):
+                async with cl.Step(name="📦 Stored Analysis", type="tool", parent_id=main_step.id) as stored_step:
+                    response = {"output": stored["result"]["agent_analysis"]}
+                    stored_step.output = f"Served from analysis store ({stored['source']}, {stored['created_at']})"
+            else:
+                # Invoke agent (synchronous call wrapped in async)
+                async with cl.Step(name="⚙️ Agent Execution", type="run", parent_id=main_step.id) as execution_step:
+                    try:
+                        if agent is None:
+                            raise CircuitOpenError("AI agent not initialized")
+                        llm_breaker.check()
+                        # Run synchronous agent in thread pool, bounded so an
+                        # overloaded Ollama can't hold the chat for its full timeout
+                        response = await asyncio.wait_for(
+                            cl.make_async(agent.invoke)({"input": agent_input}),
+                            timeout=AGENT_TIMEOUT_SECONDS
+                        )
+                        execution_step.output = "Agent completed analysis"
+                    except (CircuitOpenError, asyncio.TimeoutError, httpx.HTTPError, ConnectionError) as llm_error:
+                        if isinstance(llm_error, asyncio.TimeoutError):
+                            llm_breaker.record_failure(f"agent exceeded {AGENT_TIMEOUT_SECONDS:.0f}s")
+                        fallback = await cl.make_async(rule_based_answer)(message.content, df, event_ts)
+                        response = {"output": f"{DEGRADED_BANNER}\n\n{fallback}"}
+                        execution_step.output = f"LLM unavailable ({type(llm_error).__name__}); rule-based fallback"
             
             # Extract output
             if isinstance(response, dict):
@@ -296,11 +412,15 @@ async def on_message(message: cl.Message):
                 agent_output = str(response)
             
             main_step.output = agent_output
+            memory.add_turn(
+                message.content, agent_output,
+                response.get('intermediate_steps') if isinstance(response, dict) else None
+            )
             
             # Check if analysis mentions specific timestamp
-            if timestamp_match:
+            if event_ts:
                 try:
-                    ts = pd.to_datetime(timestamp_match.group(0))
+                    ts = pd.to_datetime(event_ts)
                     
                     if ts in df.index:
                         # Create visualization for the analyzed timestamp
@@ -363,6 +483,9 @@ async def on_message(message: cl.Message):
 @cl.on_chat_end
 async def on_chat_end():
     """Handle chat session end"""
+    live_alerts = cl.user_session.get("live_alerts")
+    if live_alerts is not None:
+        live_alerts.cancel()
     print("[CHAINLIT] Chat session ended")
 
 
@@ -0,0 +1,238 @@
+"""
+LLM Circuit Breaker
+Fail fast to deterministic attribution while Ollama is down or overloaded
+
+Every LLM call reports its outcome and latency (via OllamaTimingCallback).
+The breaker opens after consecutive failures or when the windowed p95
+latency exceeds its limit. While open, agent calls are skipped and callers
+answer from the rule-based analyze_grid_event / typed tools with a
+degraded-mode banner; a background thread probes Ollama and closes the
+breaker once it responds again.
+
+Configuration:
+    LLM_BREAKER_FAILURES    Consecutive failures that open the breaker (default: 3)
+    LLM_BREAKER_P95_MS      Windowed p95 latency that opens it (default: 60000)
+    LLM_BREAKER_COOLDOWN    Seconds between recovery probes (default: 30)
+    AGENT_TIMEOUT_SECONDS   Longest a chat waits for the agent (default: 90)
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional, Dict, Any, Callable
+
+import pandas as pd
+
+
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+BREAKER_P95_MS = float(os.getenv("LLM_BREAKER_P95_MS", "60000"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+AGENT_TIMEOUT_SECONDS = float(os.getenv("AGENT_TIMEOUT_SECONDS", "90"))
+
+# LLM call latencies kept for percentiles
+LATENCY_WINDOW = 50
+
+# Samples needed before the latency rule may open the breaker
+MIN_LATENCY_SAMPLES = 5
+
+DEGRADED_BANNER = (
+    "⚠️ **Degraded mode** - the AI model is unavailable, so this answer comes from "
+    "the rule-based analysis engine. Recovery is being checked automatically."
+)
+
+SEVERE_QUERY_PATTERN = re.compile(r"\b(severe|worst|top|anomal|events?)\b", re.IGNORECASE)
+
+
+class CircuitOpenError(Exception):
+    """Raised when an LLM call is attempted while the breaker is open."""
+
+
+def _percentile(sorted_values, fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class CircuitBreaker:
+    """
+    Thread-safe closed/open breaker with background recovery probing.
+
+    Args:
+        name: Name used in logs and status
+        failure_threshold: Consecutive failures that open the breaker
+        p95_threshold_ms: Windowed p95 latency that opens the breaker
+        cooldown: Seconds between recovery probes while open
+        probe: Callable returning True when the backend is healthy again
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURES,
+        p95_threshold_ms: float = BREAKER_P95_MS,
+        cooldown: float = BREAKER_COOLDOWN,
+        probe: Optional[Callable[[], bool]] = None
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.p95_threshold_ms = p95_threshold_ms
+        self.cooldown = cooldown
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._state = "closed"
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._open_reason: Optional[str] = None
+        self._last_error: Optional[str] = None
+        self._totals = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+        self._probe_thread: Optional[threading.Thread] = None
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self._state == "open"
+
+    def allow(self) -> bool:
+        """Whether an LLM call may be attempted now (counts rejections)."""
+        with self._lock:
+            if self._state == "open":
+                self._totals["rejected"] += 1
+                return False
+            return True
+
+    def check(self):
+        """Raise CircuitOpenError if the breaker is open."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit open: {self._open_reason}")
+
+    def record_success(self, latency_ms: float):
+        """Record a completed call and its latency."""
+        with self._lock:
+            self._totals["successes"] += 1
+            self._consecutive_failures = 0
+            self._latencies.append(latency_ms)
+            if len(self._latencies) >= MIN_LATENCY_SAMPLES:
+                p95 = _percentile(sorted(self._latencies), 0.95)
+                if p95 > self.p95_threshold_ms:
+                    self._open(f"p95 latency {p95:.0f} ms above {self.p95_threshold_ms:.0f} ms")
+
+    def record_failure(self, error: Any):
+        """Record a failed call."""
+        with self._lock:
+            self._totals["failures"] += 1
+            self._consecutive_failures += 1
+            self._last_error = str(error)[:300]
+            if self._consecutive_failures >= self.failure_threshold:
+                self._open(f"{self._consecutive_failures} consecutive failures ({self._last_error})")
+
+    def reset(self):
+        """Close the breaker and forget the latency window."""
+        with self._lock:
+            if self._state == "open":
+                print(f"[CIRCUIT BREAKER] {self.name} closed - backend recovered")
+            self._state = "closed"
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._open_reason = None
+            self._latencies.clear()
+
+    def _open(self, reason: str):
+        # Caller holds the lock
+        if self._state == "open":
+            return
+        self._state = "open"
+        self._opened_at = time.time()
+        self._open_reason = reason
+        self._totals["opened"] += 1
+        print(f"[CIRCUIT BREAKER] {self.name} opened: {reason}")
+        if self.probe is not None and (self._probe_thread is None or not self._probe_thread.is_alive()):
+            self._probe_thread = threading.Thread(target=self._probe_loop, name=f"{self.name}-probe", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        while self.is_open:
+            time.sleep(self.cooldown)
+            try:
+                healthy = bool(self.probe())
+            except Exception:
+                healthy = False
+            if healthy:
+                self.reset()
+
+    def status(self) -> Dict[str, Any]:
+        """Breaker state, latency percentiles and counters."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "name": self.name,
+                "state": self._state,
+                "open_reason": self._open_reason,
+                "opened_at": datetime.fromtimestamp(self._opened_at).isoformat() if self._opened_at else None,
+                "consecutive_failures": self._consecutive_failures,
+                "last_error": self._last_error,
+                "latency_ms": {
+                    "samples": len(latencies),
+                    "p50": _percentile(latencies, 0.50),
+                    "p95": _percentile(latencies, 0.95),
+                    "p99": _percentile(latencies, 0.99)
+                },
+                **self._totals
+            }
+
+
+def _probe_ollama() -> bool:
+    from app.llm_client import DEFAULT_MODEL, warm_up
+    return warm_up(DEFAULT_MODEL)["ready"]
+
+
+# Process-wide breaker around Ollama calls
+llm_breaker = CircuitBreaker("ollama", probe=_probe_ollama)
+
+
+def rule_based_answer(question: str, df: pd.DataFrame, timestamp: Optional[str] = None) -> str:
+    """
+    Deterministic answer used while the LLM is unavailable.
+
+    Event questions get the analyze_grid_event report, questions about
+    anomalies get the most severe events, everything else the latest status.
+
+    Args:
+        question: User question
+        df: Grid data DataFrame
+        timestamp: Event timestamp referenced by the question, if any
+
+    Returns:
+        Markdown answer text
+    """
+    from main_analysis import analyze_grid_event
+    from app.analysis_tools import GridAnalysisTools
+    from app.data_loader import get_latest_status
+
+    if timestamp:
+        result = analyze_grid_event(timestamp, df, None)
+        if result["status"] == "anomaly":
+            return result["analysis"].strip()
+        if result["status"] == "normal":
+            return f"System Normal at {timestamp}: grid frequency {result['grid_frequency']:.4f} Hz."
+        return result["message"]
+
+    if SEVERE_QUERY_PATTERN.search(question):
+        top = GridAnalysisTools(df).top_events(5)
+        lines = [f"Most severe anomalies ({top['total_anomalies']} total):"]
+        for event in top["events"]:
+            lines.append(f"- {event['timestamp']}: {event['grid_frequency']} Hz (Z-Score {event['z_score']})")
+        return "\n".join(lines)
+
+    latest = get_latest_status(df)
+    return (
+        f"Latest grid status ({latest['timestamp']}): frequency {latest['grid_frequency']:.4f} Hz, "
+        f"solar {latest['solar_output']:.1f} kW, wind {latest['wind_output']:.1f} kW, "
+        f"{'ANOMALY' if latest['is_anomaly'] else 'normal'}."
+    )
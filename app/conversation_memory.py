@@ -0,0 +1,248 @@
+"""
+Conversation Memory
+Bounded, summarized per-session context for follow-up questions
+
+Each chat session keeps:
+    - the last few turns verbatim
+    - a rolling summary of older turns and of tool results, trimmed to a
+      token budget (extractive, so no extra LLM call is needed)
+    - structured state: referenced timestamps with their key metrics, so a
+      follow-up like "and what about wind?" is resolved without the agent
+      re-running get_row / compare for an event it already looked at
+
+The focus event is the one the user last asked about; timestamps that only
+appear in answers are remembered as known events but never move the focus.
+Only referential follow-ups ("why did it drop?", "what about wind?") are
+tied to it, so unrelated questions reach the agent unchanged.
+
+The rendered context is prepended to the agent input, after the static
+prompt prefix, so the prefix stays byte-identical for Ollama's KV cache.
+
+Configuration:
+    MEMORY_TURNS         Verbatim turns kept (default: 3)
+    MEMORY_TOKEN_BUDGET  Token budget for the whole rendered context (default: 400)
+"""
+
+import os
+import re
+from collections import deque, OrderedDict
+from typing import Optional, Dict, Any, List
+
+import pandas as pd
+
+from app.prompt_builder import estimate_tokens
+
+
+MEMORY_TURNS = int(os.getenv("MEMORY_TURNS", "3"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "400"))
+
+# Referenced events kept in structured state
+MAX_TRACKED_EVENTS = 5
+
+# Characters kept per verbatim answer and per summary line
+MAX_ANSWER_CHARS = 600
+MAX_SUMMARY_LINE_CHARS = 200
+
+# Separates the session context from the question in the agent input
+QUESTION_MARKER = "Current question: "
+
+TIMESTAMP_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}')
+
+# Questions that refer back to the event under discussion
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\s*(?:and|also|what about|how about|why|so)\b"
+    r"|\b(?:it|its|that|this|there|then|same|the (?:event|anomaly|incident|spike|drop|dip))\b",
+    re.IGNORECASE
+)
+
+# Columns recorded for every tracked event
+EVENT_COLUMNS = {
+    'Grid Frequency (Hz)': 'freq_hz',
+    'Solar PV Output (kW)': 'solar_kw',
+    'Wind Power Output (kW)': 'wind_kw',
+    'Cloud Cover (%)': 'cloud_pct',
+    'Wind Speed (m/s)': 'wind_speed',
+    'Z_Score': 'z',
+}
+
+
+def _first_sentence(text: str, limit: int = MAX_SUMMARY_LINE_CHARS) -> str:
+    """Collapse whitespace and keep the first sentence (capped)."""
+    text = ' '.join(text.split())
+    match = re.search(r'(?<=[.!?])\s', text)
+    if match:
+        text = text[:match.start()]
+    return text if len(text) <= limit else text[:limit - 3] + '...'
+
+
+class ConversationMemory:
+    """
+    Per-session memory with verbatim recent turns, a rolling summary and
+    structured event state.
+
+    Args:
+        df: Grid data DataFrame used to look up referenced events (optional)
+        max_turns: Verbatim turns kept
+        token_budget: Budget for the rendered context
+    """
+
+    def __init__(self, df: Optional[pd.DataFrame] = None, max_turns: int = MEMORY_TURNS,
+                 token_budget: int = MEMORY_TOKEN_BUDGET):
+        self.df = df
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.turns: deque = deque()
+        self.summary: List[str] = []
+        self.events: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._focus: Optional[str] = None
+
+    @property
+    def focus_timestamp(self) -> Optional[str]:
+        """Event of the most recent question that named one."""
+        return self._focus
+
+    def is_follow_up(self, question: str) -> bool:
+        """Whether a question without its own timestamp refers to the focus event."""
+        return (
+            self._focus is not None
+            and not TIMESTAMP_PATTERN.search(question)
+            and bool(FOLLOW_UP_PATTERN.search(question))
+        )
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def track_timestamp(self, timestamp: str, focus: bool = True):
+        """
+        Add (or refresh) a referenced event in the structured state.
+
+        Args:
+            timestamp: Event timestamp
+            focus: Make it the focus event (for events the user asked about)
+        """
+        try:
+            ts = pd.Timestamp(timestamp.replace('T', ' '))
+        except ValueError:
+            return
+        key = ts.strftime('%Y-%m-%d %H:%M:%S')
+        event = self.events.pop(key, None)
+        if event is None:
+            event = {}
+            if self.df is not None and ts in self.df.index:
+                row = self.df.loc[ts]
+                for column, short in EVENT_COLUMNS.items():
+                    if column in row.index and pd.notna(row[column]):
+                        event[short] = round(float(row[column]), 3)
+                event['anomaly'] = bool(row.get('Is_Anomaly', False))
+        self.events[key] = event
+        if focus:
+            self._focus = key
+        while len(self.events) > MAX_TRACKED_EVENTS:
+            self.events.popitem(last=False)
+
+    def add_turn(self, question: str, answer: str, intermediate_steps: Optional[List] = None):
+        """
+        Record a completed exchange.
+
+        Args:
+            question: User message
+            answer: Final agent answer
+            intermediate_steps: (AgentAction, observation) pairs from the agent
+        """
+        for timestamp in TIMESTAMP_PATTERN.findall(answer):
+            self.track_timestamp(timestamp, focus=False)
+        for timestamp in TIMESTAMP_PATTERN.findall(question):
+            self.track_timestamp(timestamp)
+
+        for action, observation in intermediate_steps or []:
+            tool = getattr(action, 'tool', '')
+            if tool.startswith('_'):
+                continue
+            tool_input = ' '.join(str(getattr(action, 'tool_input', '')).split())
+            line = f"Tool {tool}({tool_input[:80]}) -> {_first_sentence(str(observation), MAX_SUMMARY_LINE_CHARS - 40)}"
+            if line not in self.summary:
+                self.summary.append(line)
+
+        self.turns.append((question, answer))
+        while len(self.turns) > self.max_turns:
+            old_question, old_answer = self.turns.popleft()
+            self.summary.append(f"Q: {_first_sentence(old_question, 100)} A: {_first_sentence(old_answer)}")
+
+        self._trim()
+
+    def clear(self):
+        self.turns.clear()
+        self.summary.clear()
+        self.events.clear()
+        self._focus = None
+
+    # ------------------------------------------------------------------
+    # Rendering
+    # ------------------------------------------------------------------
+
+    def _render_state(self) -> str:
+        if not self.events:
+            return ""
+        lines = ["Known events (already looked up, no need to query again):"]
+        for timestamp, event in self.events.items():
+            metrics = ', '.join(f"{k}={v}" for k, v in event.items())
+            lines.append(f"- {timestamp}: {metrics}" if metrics else f"- {timestamp}")
+        return '\n'.join(lines) + '\n'
+
+    def _render_turns(self) -> str:
+        lines = []
+        for question, answer in self.turns:
+            if len(answer) > MAX_ANSWER_CHARS:
+                answer = answer[:MAX_ANSWER_CHARS - 3] + '...'
+            lines.append(f"User: {question}\nAssistant: {answer}")
+        return ('Recent turns:\n' + '\n'.join(lines) + '\n') if lines else ""
+
+    def render(self) -> str:
+        """Render the memory as a context block (empty for a new session)."""
+        parts = [self._render_state()]
+        if self.summary:
+            parts.append('Earlier in this conversation:\n' + '\n'.join(f"- {line}" for line in self.summary) + '\n')
+        parts.append(self._render_turns())
+        body = ''.join(parts)
+        return f"Conversation context:\n{body}\n" if body else ""
+
+    def _trim(self):
+        """Drop the oldest summary lines, then verbatim turns, until within budget."""
+        while estimate_tokens(self.render()) > self.token_budget:
+            if self.summary:
+                self.summary.pop(0)
+            elif len(self.turns) > 1:
+                old_question, old_answer = self.turns.popleft()
+                self.summary.append(f"Q: {_first_sentence(old_question, 100)} A: {_first_sentence(old_answer)}")
+            else:
+                break
+
+    def build_input(self, question: str) -> str:
+        """
+        Agent input for a new question, including the session context.
+
+        A referential follow-up without a timestamp is tied to the focus
+        event.
+
+        Args:
+            question: User message
+
+        Returns:
+            Text passed as the agent's "input"
+        """
+        context = self.render()
+        if self.is_follow_up(question):
+            question = f"{question} (follow-up; current event: {self._focus})"
+        if not context:
+            return question
+        return f"{context}{QUESTION_MARKER}{question}"
+
+    def stats(self) -> Dict[str, Any]:
+        """Sizes for monitoring."""
+        return {
+            "turns": len(self.turns),
+            "summary_lines": len(self.summary),
+            "events": len(self.events),
+            "context_tokens": estimate_tokens(self.render())
+        }
@@ -3,11 +3,24 @@ Smart Grid Data Loading Module (Refactored for FastAPI/Chainlit)
 Provides cached data loading functions for the Smart Microgrid System
 """
 
+import hashlib
+import time
+import weakref
 import pandas as pd
 from functools import lru_cache
 from datetime import datetime
 from typing import Optional
 
+from app.metrics import registry, FAST_LATENCY_BUCKETS
+
+
+data_load_seconds = registry.histogram(
+    "data_load_seconds", "Time to load and preprocess the dataset CSV", FAST_LATENCY_BUCKETS)
+detector_pass_seconds = registry.histogram(
+    "detector_pass_seconds", "Time of one anomaly detector pass", FAST_LATENCY_BUCKETS, ("detector",))
+detector_rows_total = registry.counter(
+    "detector_rows_total", "Rows scored by the anomaly detectors", ("detector",))
+
 
 @lru_cache(maxsize=1)
 def load_data(csv_path: str) -> pd.DataFrame:
@@ -25,6 +38,7 @@ def load_data(csv_path: str) -> pd.DataFrame:
         Cache size is 1 since we typically only load one dataset.
     """
     print(f"[DATA LOADER] Loading dataset from: {csv_path}")
+    start = time.perf_counter()
     
     # Load the CSV file
     df = pd.read_csv(csv_path)
@@ -50,6 +64,7 @@ def load_data(csv_path: str) -> pd.DataFrame:
     
     # Dynamic Anomaly Detection using Z-Score (Statistical Process Control)
     # This is more sophisticated than fixed thresholds
+    detector_start = time.perf_counter()
     window = 60  # 30 hours (assuming 30-min intervals)
     rolling_mean = df['Grid Frequency (Hz)'].rolling(window=window, min_periods=1).mean()
     rolling_std = df['Grid Frequency (Hz)'].rolling(window=window, min_periods=1).std()
@@ -60,9 +75,12 @@ def load_data(csv_path: str) -> pd.DataFrame:
     # Define anomaly: |Z-Score| > 3 OR frequency < 49.8 Hz (hybrid approach)
     df['Is_Anomaly'] = (z_score.abs() > 3) | (df['Grid Frequency (Hz)'] < 49.8)
     df['Z_Score'] = z_score  # Store for analysis
+    detector_pass_seconds.observe(time.perf_counter() - detector_start, "rolling_zscore")
+    detector_rows_total.inc(len(df), "rolling_zscore")
     
     # Sort dataframe by Timestamp
     df.sort_index(inplace=True)
+    data_load_seconds.observe(time.perf_counter() - start)
     
     print(f"[DATA LOADER] Dataset loaded successfully")
     print(f"  - Total rows: {len(df)}")
@@ -90,6 +108,56 @@ def get_anomaly_timestamps(df: pd.DataFrame, limit: Optional[int] = None) -> lis
     return [ts.strftime('%Y-%m-%d %H:%M:%S') for ts in anomaly_df.index]
 
 
+# id(df) -> (weak reference, version); the weakref guards against id reuse
+# and a finalizer drops the entry once the DataFrame is garbage collected
+_version_cache = {}
+
+
+def get_dataset_version(df: pd.DataFrame) -> str:
+    """
+    Get a fingerprint identifying the dataset contents.
+    
+    Derived from the column names and dtypes and a hash of every row
+    (index included), so it changes whenever any value changes. Cached
+    results (analysis store, prompt prefix, response ETags, ...) are
+    keyed by it.
+    
+    Args:
+        df: Grid data DataFrame
+        
+    Returns:
+        Short hex digest (memoized per DataFrame object)
+    """
+    cached = _version_cache.get(id(df))
+    if cached is not None and cached[0]() is df:
+        return cached[1]
+    
+    digest = hashlib.sha1()
+    digest.update('|'.join(f"{name}:{dtype}" for name, dtype in df.dtypes.items()).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    version = digest.hexdigest()[:16]
+    
+    _version_cache[id(df)] = (weakref.ref(df), version)
+    weakref.finalize(df, _version_cache.pop, id(df), None)
+    return version
+
+
+# Frame served by the API process, replaced on every ingest flush. The chat
+# UI is mounted in the same process and follows it (None without a server).
+_live_dataset: Optional[pd.DataFrame] = None
+
+
+def set_live_dataset(df: Optional[pd.DataFrame]):
+    """Publish the API server's current DataFrame (including ingested rows)."""
+    global _live_dataset
+    _live_dataset = df
+
+
+def get_live_dataset() -> Optional[pd.DataFrame]:
+    """The API server's current DataFrame, or None when no server runs in this process."""
+    return _live_dataset
+
+
 def get_latest_status(df: pd.DataFrame) -> dict:
     """
     Get the most recent grid status.
@@ -0,0 +1,473 @@
+"""
+Reference Document Index
+Offline chunking and BM25 retrieval over the bundled NREL reports
+
+Ingestion (offline, incremental):
+    Each document is extracted page by page and cut into overlapping
+    word-window chunks. Chunks are cached per document content hash in
+    DOC_INDEX_DIR/segments, so adding or changing a document only extracts
+    (and embeds) that document; the inverted index itself is cheap to
+    rebuild from the cached segments.
+
+Persisted index (DOC_INDEX_DIR):
+    manifest.json    documents, chunk ranges, BM25 parameters
+    vocab.json       term -> term id
+    chunks.json      chunk text with document name and page
+    term_ptr.npy     CSR row pointers (term id -> postings slice)
+    post_chunk.npy   chunk id per posting
+    post_tf.npy      term frequency per posting
+    chunk_len.npy    tokens per chunk
+    embeddings.npy   optional L2-normalized chunk embeddings (Ollama /api/embed)
+
+The arrays are opened with np.load(mmap_mode='r'), so a query touches only
+the postings of its terms and the index costs no load time.
+
+Usage:
+    python -m app.doc_index build [--embed-model nomic-embed-text] [docs...]
+    python -m app.doc_index search "frequency ride-through requirements"
+
+Configuration:
+    DOC_INDEX_DIR    Index directory (default: data/doc_index)
+    DOC_EMBED_MODEL  Embedding model used for hybrid search (default: unset)
+
+PDF extraction needs pypdf; plain-text and Markdown documents are read
+directly.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+
+DOC_INDEX_DIR = os.getenv("DOC_INDEX_DIR", os.path.join("data", "doc_index"))
+DOC_EMBED_MODEL = os.getenv("DOC_EMBED_MODEL") or None
+
+DEFAULT_DOCUMENTS = ["NREL.pdf", "NREL_FINAL.pdf"]
+
+INDEX_FORMAT = 1
+
+# Chunking (words per chunk, words shared with the previous chunk)
+CHUNK_WORDS = 180
+CHUNK_OVERLAP = 40
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Weight of the embedding score in hybrid search
+HYBRID_WEIGHT = 0.5
+
+# Upper bound on passages per query and characters per returned passage
+MAX_PASSAGES = 10
+MAX_PASSAGE_CHARS = 800
+
+EMBED_BATCH = 32
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be been but by can for from has have if in into is it its "
+    "may not of on or such that the their then there these this those to was were "
+    "which will with within would also than other more".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased terms without stopwords and single characters."""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def extract_pages(path: str) -> List[str]:
+    """
+    Text of every page of a document.
+
+    Args:
+        path: PDF, plain-text or Markdown file
+
+    Returns:
+        List of page texts (a text file is a single page)
+    """
+    if not path.lower().endswith(".pdf"):
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return [f.read()]
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("PDF ingestion requires pypdf (pip install pypdf)")
+    return [page.extract_text() or "" for page in PdfReader(path).pages]
+
+
+def chunk_pages(pages: List[str], chunk_words: int = CHUNK_WORDS,
+                overlap: int = CHUNK_OVERLAP) -> List[Dict[str, Any]]:
+    """
+    Overlapping word-window chunks of a document.
+
+    Args:
+        pages: Page texts
+        chunk_words: Words per chunk
+        overlap: Words shared with the previous chunk
+
+    Returns:
+        List of {"page", "text"} dictionaries (page is 1-based, where the chunk starts)
+    """
+    words, page_of = [], []
+    for number, text in enumerate(pages, 1):
+        page_words = text.split()
+        words.extend(page_words)
+        page_of.extend([number] * len(page_words))
+
+    chunks = []
+    step = max(1, chunk_words - overlap)
+    for start in range(0, len(words), step):
+        window = words[start:start + chunk_words]
+        if len(window) < overlap and chunks:
+            break
+        chunks.append({"page": page_of[start], "text": " ".join(window)})
+    return chunks
+
+
+def embed_texts(texts: List[str], model: str) -> np.ndarray:
+    """
+    L2-normalized embeddings from Ollama's /api/embed.
+
+    Args:
+        texts: Texts to embed
+        model: Ollama embedding model
+
+    Returns:
+        (len(texts), dim) float32 array
+    """
+    from app.llm_client import get_http_client
+
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH):
+        response = get_http_client().post(
+            "/api/embed", json={"model": model, "input": texts[start:start + EMBED_BATCH]}
+        )
+        response.raise_for_status()
+        vectors.extend(response.json()["embeddings"])
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def _model_slug(model: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", model)
+
+
+def _save_array(index_dir: str, name: str, array: np.ndarray):
+    tmp = os.path.join(index_dir, name + ".tmp.npy")
+    np.save(tmp, array)
+    os.replace(tmp, os.path.join(index_dir, name + ".npy"))
+
+
+def _save_json(path: str, payload: Any):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def build_index(documents: Optional[List[str]] = None, index_dir: str = DOC_INDEX_DIR,
+                embed_model: Optional[str] = DOC_EMBED_MODEL) -> Dict[str, Any]:
+    """
+    Build (or incrementally update) the persisted document index.
+
+    Documents whose content hash already has a cached segment are not
+    extracted again; embeddings are cached the same way per model.
+
+    Args:
+        documents: Document paths (default: the bundled NREL reports plus
+            every document already in the index)
+        index_dir: Index directory
+        embed_model: Ollama embedding model (None = BM25 only)
+
+    Returns:
+        Build summary with per-document chunk counts and timings
+    """
+    start = time.perf_counter()
+    segments_dir = os.path.join(index_dir, "segments")
+    os.makedirs(segments_dir, exist_ok=True)
+
+    manifest_path = os.path.join(index_dir, "manifest.json")
+    previous = []
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            previous = [d["path"] for d in json.load(f)["documents"]]
+    if documents is None:
+        documents = DEFAULT_DOCUMENTS
+    documents = list(dict.fromkeys([p for p in previous if os.path.exists(p)] + list(documents)))
+
+    entries, chunks, vectors = [], [], []
+    extracted = embedded = 0
+    for path in documents:
+        if not os.path.exists(path):
+            print(f"[DOC INDEX] Skipping missing document: {path}")
+            continue
+        digest = _file_hash(path)
+        segment_path = os.path.join(segments_dir, f"{digest}.json")
+        if os.path.exists(segment_path):
+            with open(segment_path, "r", encoding="utf-8") as f:
+                segment = json.load(f)
+        else:
+            print(f"[DOC INDEX] Extracting {path}")
+            pages = extract_pages(path)
+            segment = {"pages": len(pages), "chunks": chunk_pages(pages)}
+            _save_json(segment_path, segment)
+            extracted += 1
+
+        if embed_model:
+            vector_path = os.path.join(segments_dir, f"{digest}.{_model_slug(embed_model)}.npy")
+            if os.path.exists(vector_path):
+                vectors.append(np.load(vector_path))
+            else:
+                print(f"[DOC INDEX] Embedding {len(segment['chunks'])} chunks of {path}")
+                matrix = embed_texts([c["text"] for c in segment["chunks"]], embed_model)
+                np.save(vector_path, matrix)
+                vectors.append(matrix)
+                embedded += 1
+
+        name = os.path.basename(path)
+        entries.append({
+            "name": name,
+            "path": path,
+            "sha1": digest,
+            "pages": segment["pages"],
+            "chunk_start": len(chunks),
+            "chunk_end": len(chunks) + len(segment["chunks"])
+        })
+        chunks.extend({"doc": name, "page": c["page"], "text": c["text"]} for c in segment["chunks"])
+
+    # Inverted index in CSR form: postings grouped by term id
+    vocab: Dict[str, int] = {}
+    term_ids, chunk_ids, tfs = [], [], []
+    chunk_len = np.zeros(len(chunks), dtype=np.int32)
+    for chunk_id, chunk in enumerate(chunks):
+        counts = Counter(tokenize(chunk["text"]))
+        chunk_len[chunk_id] = sum(counts.values())
+        for term, tf in counts.items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            chunk_ids.append(chunk_id)
+            tfs.append(tf)
+
+    term_ids = np.asarray(term_ids, dtype=np.int64)
+    order = np.argsort(term_ids, kind="stable")
+    term_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=term_ptr[1:])
+
+    _save_array(index_dir, "term_ptr", term_ptr)
+    _save_array(index_dir, "post_chunk", np.asarray(chunk_ids, dtype=np.int32)[order])
+    _save_array(index_dir, "post_tf", np.minimum(np.asarray(tfs), 65535).astype(np.uint16)[order])
+    _save_array(index_dir, "chunk_len", chunk_len)
+    if vectors:
+        _save_array(index_dir, "embeddings", np.vstack(vectors))
+    elif os.path.exists(os.path.join(index_dir, "embeddings.npy")):
+        os.remove(os.path.join(index_dir, "embeddings.npy"))
+    _save_json(os.path.join(index_dir, "vocab.json"), vocab)
+    _save_json(os.path.join(index_dir, "chunks.json"), chunks)
+
+    manifest = {
+        "format": INDEX_FORMAT,
+        "built_at": datetime.now().isoformat(),
+        "documents": entries,
+        "chunks": len(chunks),
+        "terms": len(vocab),
+        "avg_chunk_len": float(chunk_len.mean()) if len(chunks) else 0.0,
+        "chunk_words": CHUNK_WORDS,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embedding_model": embed_model if vectors else None
+    }
+    # Written last: readers reload when the manifest changes
+    _save_json(manifest_path, manifest)
+
+    summary = {
+        "documents": [{"name": e["name"], "pages": e["pages"], "chunks": e["chunk_end"] - e["chunk_start"]}
+                      for e in entries],
+        "chunks": len(chunks),
+        "terms": len(vocab),
+        "extracted": extracted,
+        "embedded": embedded,
+        "build_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+    print(f"[DOC INDEX] {summary['chunks']} chunks, {summary['terms']} terms "
+          f"({extracted} extracted, {embedded} embedded) in {summary['build_ms']} ms")
+    return summary
+
+
+class DocumentIndex:
+    """
+    Read-only view of a persisted index with BM25 and hybrid search.
+
+    Args:
+        index_dir: Directory written by build_index
+    """
+
+    def __init__(self, index_dir: str = DOC_INDEX_DIR):
+        self.index_dir = index_dir
+        manifest_path = os.path.join(index_dir, "manifest.json")
+        self.mtime = os.stat(manifest_path).st_mtime_ns
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(index_dir, "vocab.json"), "r", encoding="utf-8") as f:
+            self.vocab: Dict[str, int] = json.load(f)
+        with open(os.path.join(index_dir, "chunks.json"), "r", encoding="utf-8") as f:
+            self.chunks: List[Dict[str, Any]] = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(index_dir, name + ".npy"), mmap_mode="r")
+
+        self.term_ptr = load("term_ptr")
+        self.post_chunk = load("post_chunk")
+        self.post_tf = load("post_tf")
+        self.chunk_len = np.asarray(load("chunk_len"), dtype=np.float32)
+        embeddings_path = os.path.join(index_dir, "embeddings.npy")
+        self.embeddings = np.load(embeddings_path, mmap_mode="r") if os.path.exists(embeddings_path) else None
+
+        n = max(1, len(self.chunks))
+        doc_freq = np.diff(np.asarray(self.term_ptr)).astype(np.float32)
+        self.idf = np.log1p((n - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_len = self.manifest["avg_chunk_len"] or 1.0
+        self._norm = BM25_K1 * (1 - BM25_B + BM25_B * self.chunk_len / avg_len)
+
+    def bm25_scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for a query."""
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            lo, hi = int(self.term_ptr[term_id]), int(self.term_ptr[term_id + 1])
+            ids = np.asarray(self.post_chunk[lo:hi])
+            tf = np.asarray(self.post_tf[lo:hi], dtype=np.float32)
+            scores[ids] += self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + self._norm[ids])
+        return scores
+
+    def search(self, query: str, k: int = 3, mode: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Top-k passages for a query.
+
+        Args:
+            query: Free-text query
+            k: Number of passages (max: 10)
+            mode: "bm25" or "hybrid" (default: hybrid when the index has
+                embeddings and DOC_EMBED_MODEL matches, else bm25)
+
+        Returns:
+            Dictionary with ranked passages (document, page, score, text)
+        """
+        start = time.perf_counter()
+        k = min(max(1, int(k)), MAX_PASSAGES)
+        model = self.manifest.get("embedding_model")
+        if mode is None:
+            mode = "hybrid" if self.embeddings is not None and model and model == DOC_EMBED_MODEL else "bm25"
+
+        scores = self.bm25_scores(query)
+        if mode == "hybrid":
+            if self.embeddings is None:
+                raise ValueError("Index was built without embeddings")
+            top = scores.max()
+            lexical = scores / top if top > 0 else scores
+            semantic = np.asarray(self.embeddings) @ embed_texts([query], model)[0]
+            scores = (1 - HYBRID_WEIGHT) * lexical + HYBRID_WEIGHT * semantic
+
+        k = min(k, len(scores))
+        top_ids = np.argpartition(-scores, k - 1)[:k] if k else np.array([], dtype=int)
+        top_ids = top_ids[np.argsort(-scores[top_ids], kind="stable")]
+
+        passages = []
+        for chunk_id in top_ids.tolist():
+            if scores[chunk_id] <= 0:
+                continue
+            chunk = self.chunks[chunk_id]
+            text = chunk["text"]
+            passages.append({
+                "document": chunk["doc"],
+                "page": chunk["page"],
+                "score": round(float(scores[chunk_id]), 4),
+                "text": text if len(text) <= MAX_PASSAGE_CHARS else text[:MAX_PASSAGE_CHARS - 3] + "..."
+            })
+
+        return {
+            "query": query,
+            "mode": mode,
+            "passages": passages,
+            "search_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Index contents for monitoring."""
+        return {
+            "documents": [d["name"] for d in self.manifest["documents"]],
+            "chunks": self.manifest["chunks"],
+            "terms": self.manifest["terms"],
+            "embedding_model": self.manifest.get("embedding_model"),
+            "built_at": self.manifest["built_at"]
+        }
+
+
+_document_index: Optional[DocumentIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_document_index(index_dir: str = DOC_INDEX_DIR) -> Optional[DocumentIndex]:
+    """
+    Shared index, reopened when a rebuild rewrote the manifest.
+
+    Returns:
+        DocumentIndex, or None when no index has been built
+    """
+    global _document_index
+    manifest_path = os.path.join(index_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with _index_lock:
+        if (_document_index is None or _document_index.index_dir != index_dir
+                or _document_index.mtime != os.stat(manifest_path).st_mtime_ns):
+            _document_index = DocumentIndex(index_dir)
+        return _document_index
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or query the reference document index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Extract, chunk and index documents")
+    build.add_argument("documents", nargs="*", help="Documents to add (default: bundled NREL reports)")
+    build.add_argument("--index-dir", default=DOC_INDEX_DIR)
+    build.add_argument("--embed-model", default=DOC_EMBED_MODEL, help="Ollama embedding model")
+    search = sub.add_parser("search", help="Query the index")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=3)
+    search.add_argument("--index-dir", default=DOC_INDEX_DIR)
+    search.add_argument("--mode", choices=["bm25", "hybrid"], default=None)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(json.dumps(build_index(args.documents or None, args.index_dir, args.embed_model), indent=2))
+        return
+
+    index = get_document_index(args.index_dir)
+    if index is None:
+        raise SystemExit(f"No index in {args.index_dir}; run: python -m app.doc_index build")
+    print(json.dumps(index.search(args.query, args.k, args.mode), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Series Downsampling
+Bounded-size time series for charts and the /api/grid/series endpoint
+
+Two decimation methods over the raw column arrays:
+
+    lttb     Largest-Triangle-Three-Buckets: one point per bucket, the one
+             forming the largest triangle with the previous pick and the
+             next bucket's mean. Keeps the visual shape of the line.
+    minmax   The minimum and maximum of every bucket. Keeps every spike,
+             at two points per bucket.
+
+Bucket statistics are computed with NumPy reductions over the whole
+window; LTTB walks the buckets in order (each pick depends on the previous
+one) but scores each bucket's points in one vectorized step.
+
+Rows flagged in a keep mask (the anomaly flags by default) are always part
+of the output, so anomaly markers sit on the drawn line. They count
+against the point budget, which is only exceeded when there are more
+anomalies than points.
+"""
+
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+
+# Default and maximum points per series
+DEFAULT_SERIES_POINTS = 1000
+MAX_SERIES_POINTS = 10000
+
+# Points per trace for the Chainlit and Streamlit charts
+CHART_MAX_POINTS = 1000
+
+METHODS = ("lttb", "minmax")
+
+# Series returned when /api/grid/series gets no column projection
+DEFAULT_SERIES_COLUMNS = ['Grid Frequency (Hz)', 'Solar PV Output (kW)', 'Wind Power Output (kW)']
+
+
+def _bucket_edges(start: int, stop: int, buckets: int) -> np.ndarray:
+    """Boundaries of `buckets` near-equal, non-empty buckets over [start, stop)."""
+    return np.unique(np.linspace(start, stop, buckets + 1).astype(np.int64))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Positions selected by Largest-Triangle-Three-Buckets.
+
+    Args:
+        x: Monotonic x values (float)
+        y: Values (NaN allowed; NaN points are only picked in all-NaN buckets)
+        max_points: Output size (at least 3)
+
+    Returns:
+        Sorted positions including the first and last point
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    max_points = max(3, max_points)
+
+    # Interior buckets over [1, n-1); the first and last points are fixed
+    edges = _bucket_edges(1, n - 1, max_points - 2)
+    starts, stops = edges[:-1], edges[1:]
+    counts = stops - starts
+
+    valid = ~np.isnan(y)
+    y_filled = np.where(valid, y, 0.0)
+    valid_counts = np.add.reduceat(valid.astype(np.int64), starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_y = np.add.reduceat(y_filled, starts) / valid_counts
+    mean_x = np.add.reduceat(x, starts) / counts
+    # The bucket after the last one is the final point
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y_filled[-1])
+
+    selected = np.empty(len(starts) + 2, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i, (lo, hi) in enumerate(zip(starts.tolist(), stops.tolist())):
+        xa, ya = x[a], y_filled[a]
+        cx, cy = next_x[i], next_y[i]
+        if np.isnan(cy):
+            cx, cy = x[hi - 1], ya
+        area = np.abs((xa - cx) * (y[lo:hi] - ya) - (xa - x[lo:hi]) * (cy - ya))
+        area[np.isnan(area)] = -1.0
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Positions of the minimum and maximum of each bucket.
+
+    Args:
+        y: Values (NaN ignored unless a bucket is all NaN)
+        max_points: Output size (two per bucket, at least 2)
+
+    Returns:
+        Sorted positions including the first and last point
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    edges = _bucket_edges(0, n, max(1, max_points // 2 - 1))
+    starts = edges[:-1]
+    bucket = np.repeat(np.arange(len(starts)), np.diff(edges))
+
+    nan = np.isnan(y)
+    low = np.where(nan, np.inf, y)
+    high = np.where(nan, -np.inf, y)
+    bucket_min = np.minimum.reduceat(low, starts)
+    bucket_max = np.maximum.reduceat(high, starts)
+
+    # First position per bucket where the value equals the bucket extreme
+    at_min = np.flatnonzero(low == bucket_min[bucket])
+    at_max = np.flatnonzero(high == bucket_max[bucket])
+    _, first_min = np.unique(bucket[at_min], return_index=True)
+    _, first_max = np.unique(bucket[at_max], return_index=True)
+
+    return np.unique(np.concatenate(([0, n - 1], at_min[first_min], at_max[first_max])))
+
+
+def downsample_indices(index: pd.DatetimeIndex, y: np.ndarray, max_points: int,
+                       method: str = "lttb", keep: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Positions to plot for one series.
+
+    Args:
+        index: Timestamps of the values
+        y: Values
+        max_points: Point budget
+        method: "lttb" or "minmax"
+        keep: Boolean mask of positions that must be included
+
+    Returns:
+        Sorted row positions
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of: {', '.join(METHODS)}")
+    y = np.asarray(y, dtype=float)
+    kept = np.flatnonzero(keep) if keep is not None else np.empty(0, dtype=np.int64)
+    budget = max(3, max_points - len(kept))
+
+    if method == "lttb":
+        ns = index.as_unit('ns').asi8
+        x = (ns - ns[0]) / 1e9 if len(ns) else np.empty(0)
+        positions = lttb_indices(x, y, budget)
+    else:
+        positions = minmax_indices(y, budget)
+    return np.union1d(positions, kept) if len(kept) else positions
+
+
+def downsample_frame(df: pd.DataFrame, columns: List[str], max_points: int = CHART_MAX_POINTS,
+                     method: str = "lttb", keep_anomalies: bool = True) -> Dict[str, pd.Series]:
+    """
+    Downsampled copies of DataFrame columns, for chart traces.
+
+    Args:
+        df: Grid data DataFrame (Timestamp index)
+        columns: Columns to downsample
+        max_points: Points per series
+        method: "lttb" or "minmax"
+        keep_anomalies: Always include Is_Anomaly rows
+
+    Returns:
+        Dictionary of column -> Series with at most ~max_points values
+    """
+    keep = df['Is_Anomaly'].to_numpy(dtype=bool) if keep_anomalies and 'Is_Anomaly' in df else None
+    series = {}
+    for col in columns:
+        values = df[col].to_numpy(dtype=float, na_value=np.nan)
+        positions = downsample_indices(df.index, values, max_points, method, keep)
+        series[col] = pd.Series(values[positions], index=df.index[positions], name=col)
+    return series
+
+
+def series_payload(store, lo: int, hi: int, columns: List[str], max_points: int,
+                   method: str = "lttb") -> Dict[str, Any]:
+    """
+    /api/grid/series body for rows [lo, hi) of a ColumnStore.
+
+    Args:
+        store: ColumnStore of the grid data
+        lo: First row position
+        hi: End row position (exclusive)
+        columns: Numeric columns to downsample
+        max_points: Points per series
+        method: "lttb" or "minmax"
+
+    Returns:
+        Dictionary with one {timestamp, values} pair per column and the
+        anomaly markers of the window
+    """
+    from app.grid_serialization import to_json_list
+
+    index = store.index[lo:hi]
+    keep = store.column('Is_Anomaly', lo, hi).astype(bool) if 'Is_Anomaly' in store.columns else None
+
+    series = {}
+    for col in columns:
+        values = store.column(col, lo, hi)
+        positions = downsample_indices(index, values, max_points, method, keep)
+        series[col] = {
+            "timestamp": store.timestamps[lo + positions].tolist(),
+            "values": to_json_list(values[positions])
+        }
+
+    anomalies = {"timestamp": []}
+    if keep is not None:
+        marked = np.flatnonzero(keep)
+        anomalies["timestamp"] = store.timestamps[lo + marked].tolist()
+        for col in columns:
+            anomalies[col] = to_json_list(store.column(col, lo, hi)[marked])
+
+    return {
+        "method": method,
+        "max_points": max_points,
+        "raw_points": hi - lo,
+        "series": series,
+        "anomalies": anomalies
+    }
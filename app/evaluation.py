@@ -0,0 +1,364 @@
+"""
+Agent Evaluation Suite
+Accuracy and latency of the agent on a versioned question bank
+
+Every question in the bank has an expected numeric answer computed
+directly from the dataset, so a prompt, model or routing change in
+create_agent can be judged on both correctness and speed. For each
+question the suite records whether the answer contains the expected
+number (within tolerance), latency, ReAct iterations and tokens (from
+the agent instrumentation); the summary has accuracy and mean/p95
+latency. Reports are JSON files that can be compared across runs.
+
+Usage:
+    python -m app.evaluation --output reports/eval.json
+    python -m app.evaluation --stub --transcript bench/transcript.jsonl
+    python -m app.evaluation --compare reports/old.json --output reports/new.json
+
+As with app.benchmark, the stub must be started before app modules that
+read OLLAMA_BASE_URL are imported; main() handles that ordering.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+
+# Bump when questions, expected-answer formulas, tolerances or scoring change
+QUESTION_BANK_VERSION = "1.1"
+
+# Dates and times are removed before numbers are extracted: answers quote
+# timestamps, and "2021-01-02 18:00:00" must not score as 2021, -1, -2, 18...
+DATETIME_PATTERN = re.compile(
+    r'\d{4}-\d{2}-\d{2}(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?'
+    r'|\b\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?'
+)
+# A minus sign only counts when it is not a hyphen after a digit or letter
+NUMBER_PATTERN = re.compile(r'(?:(?<![\w.])-)?\d+(?:,\d{3})*(?:\.\d+)?')
+
+FREQ = 'Grid Frequency (Hz)'
+SOLAR = 'Solar PV Output (kW)'
+WIND = 'Wind Power Output (kW)'
+CLOUD = 'Cloud Cover (%)'
+
+
+def _ts(value) -> str:
+    return pd.Timestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def bank_context(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Dataset-specific values the question templates refer to.
+
+    Args:
+        df: Grid data DataFrame
+
+    Returns:
+        Dictionary with first/most severe anomaly, its prior interval and
+        a one-day window
+    """
+    anomalies = df.index[df['Is_Anomaly'].to_numpy(dtype=bool)]
+    first = anomalies[0] if len(anomalies) else df.index[1]
+    z = df['Z_Score'].abs().where(df['Is_Anomaly'])
+    severe = z.idxmax() if z.notna().any() else first
+    prior = df.index[max(0, df.index.get_loc(first) - 1)]
+    day_start = df.index[0].normalize()
+    return {
+        "first_anomaly": _ts(first),
+        "prior": _ts(prior),
+        "most_severe": _ts(severe),
+        "day_start": _ts(day_start),
+        "day_end": _ts(day_start + pd.Timedelta(hours=23, minutes=30)),
+    }
+
+
+# Each entry: id, question template, expected-answer function, tolerance
+# (absolute "abs" and/or relative "rel"); templates use bank_context() keys.
+QUESTION_BANK: List[Dict[str, Any]] = [
+    {
+        "id": "freq_at_first_anomaly",
+        "template": "What was the grid frequency at {first_anomaly}? Answer with the value in Hz.",
+        "answer": lambda df, c: df.at[pd.Timestamp(c["first_anomaly"]), FREQ],
+        "abs": 0.01,
+    },
+    {
+        "id": "solar_at_first_anomaly",
+        "template": "What was the Solar PV Output at {first_anomaly}? Answer in kW.",
+        "answer": lambda df, c: df.at[pd.Timestamp(c["first_anomaly"]), SOLAR],
+        "abs": 0.1,
+    },
+    {
+        "id": "wind_change_first_anomaly",
+        "template": "By how many kW did Wind Power Output change from {prior} to {first_anomaly}?",
+        "answer": lambda df, c: df.at[pd.Timestamp(c["first_anomaly"]), WIND] - df.at[pd.Timestamp(c["prior"]), WIND],
+        "abs": 0.5,
+    },
+    {
+        "id": "anomaly_count",
+        "template": "How many anomalies were detected in the whole dataset?",
+        "answer": lambda df, c: int(df['Is_Anomaly'].sum()),
+        "abs": 0,
+    },
+    {
+        "id": "mean_frequency",
+        "template": "What is the average grid frequency over the whole dataset? Answer in Hz.",
+        "answer": lambda df, c: df[FREQ].mean(),
+        "abs": 0.01,
+    },
+    {
+        "id": "min_frequency",
+        "template": "What is the lowest grid frequency in the dataset? Answer in Hz.",
+        "answer": lambda df, c: df[FREQ].min(),
+        "abs": 0.01,
+    },
+    {
+        "id": "max_abs_z",
+        "template": "What is the largest absolute Z-Score among the anomalies?",
+        "answer": lambda df, c: df.loc[df['Is_Anomaly'], 'Z_Score'].abs().max(),
+        "abs": 0.05,
+    },
+    {
+        "id": "freq_at_most_severe",
+        "template": "What was the grid frequency at the most severe anomaly (highest |Z-Score|)? Answer in Hz.",
+        "answer": lambda df, c: df.at[pd.Timestamp(c["most_severe"]), FREQ],
+        "abs": 0.01,
+    },
+    {
+        "id": "window_mean_frequency",
+        "template": "What was the mean grid frequency between {day_start} and {day_end}?",
+        "answer": lambda df, c: df.loc[c["day_start"]:c["day_end"], FREQ].mean(),
+        "abs": 0.01,
+    },
+    {
+        "id": "solar_cloud_correlation",
+        "template": "What is the Pearson correlation between Solar PV Output and Cloud Cover? Give the coefficient.",
+        "answer": lambda df, c: df[SOLAR].corr(df[CLOUD]),
+        "abs": 0.02,
+    },
+]
+
+
+def bank_fingerprint() -> str:
+    """Hash of question ids, templates and tolerances (detects silent bank edits)."""
+    raw = json.dumps(
+        [[q["id"], q["template"], q.get("abs"), q.get("rel")] for q in QUESTION_BANK]
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def build_questions(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Render the bank for a dataset with expected answers.
+
+    Returns:
+        List of dictionaries with id, question, expected and tolerances
+    """
+    context = bank_context(df)
+    questions = []
+    for entry in QUESTION_BANK:
+        questions.append({
+            "id": entry["id"],
+            "question": entry["template"].format(**context),
+            "expected": round(float(entry["answer"](df, context)), 6),
+            "abs": entry.get("abs"),
+            "rel": entry.get("rel"),
+        })
+    return questions
+
+
+def extract_numbers(text: str) -> List[float]:
+    """All numbers in an answer (thousands separators removed, dates and times skipped)."""
+    text = DATETIME_PATTERN.sub(' ', text or '')
+    return [float(m.replace(',', '')) for m in NUMBER_PATTERN.findall(text)]
+
+
+def is_correct(numbers: List[float], expected: float, abs_tol: Optional[float] = None,
+               rel_tol: Optional[float] = None) -> bool:
+    """Whether any extracted number matches the expected value within tolerance."""
+    for value in numbers:
+        diff = abs(value - expected)
+        if abs_tol is not None and diff <= abs_tol + 1e-9:
+            return True
+        if rel_tol is not None and expected != 0 and diff / abs(expected) <= rel_tol:
+            return True
+    return False
+
+
+def _p95(values: List[float]) -> Optional[float]:
+    return round(float(np.percentile(values, 95)), 3) if values else None
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return round(float(np.mean(values)), 3) if values else None
+
+
+def run_evaluation(agent, df: pd.DataFrame, question_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Ask every bank question and score the answers.
+
+    Args:
+        agent: Agent from get_or_create_agent / create_agent
+        df: Grid data DataFrame the agent was built on
+        question_ids: Restrict to these question ids
+
+    Returns:
+        Report dictionary with per-question results and a summary
+    """
+    from app.agent_instrumentation import agent_instrumentation
+    from app.data_loader import get_dataset_version
+
+    questions = build_questions(df)
+    if question_ids:
+        questions = [q for q in questions if q["id"] in question_ids]
+
+    results = []
+    for q in questions:
+        marker = agent_instrumentation.recent[-1] if agent_instrumentation.recent else None
+        start = time.perf_counter()
+        error = None
+        try:
+            response = agent.invoke({"input": q["question"]})
+            answer = response.get("output", "") if isinstance(response, dict) else str(response)
+        except Exception as e:
+            answer, error = "", f"{type(e).__name__}: {e}"
+        latency = time.perf_counter() - start
+
+        # Traces recorded during this question (escalation can add two)
+        traces = list(agent_instrumentation.recent)
+        if marker is not None and marker in traces:
+            traces = traces[traces.index(marker) + 1:]
+        numbers = extract_numbers(answer)
+        results.append({
+            "id": q["id"],
+            "question": q["question"],
+            "expected": q["expected"],
+            "answer": answer[:500],
+            "numbers": numbers[:20],
+            "correct": is_correct(numbers, q["expected"], q["abs"], q["rel"]),
+            "latency_s": round(latency, 3),
+            "iterations": sum(t["iterations"] for t in traces),
+            "prompt_tokens": sum(t["prompt_tokens"] for t in traces),
+            "completion_tokens": sum(t["completion_tokens"] for t in traces),
+            "stop_reasons": [t["stop_reason"] for t in traces],
+            "error": error
+        })
+        print(f"[EVAL] {q['id']:28s} {'OK ' if results[-1]['correct'] else 'MISS'} {latency:7.2f}s")
+
+    latencies = [r["latency_s"] for r in results]
+    return {
+        "bank_version": QUESTION_BANK_VERSION,
+        "bank_fingerprint": bank_fingerprint(),
+        "dataset_version": get_dataset_version(df),
+        "started_at": datetime.now().isoformat(),
+        "results": results,
+        "summary": {
+            "questions": len(results),
+            "accuracy": round(sum(r["correct"] for r in results) / len(results), 3) if results else None,
+            "mean_latency_s": _mean(latencies),
+            "p95_latency_s": _p95(latencies),
+            "mean_iterations": _mean([r["iterations"] for r in results]),
+            "mean_prompt_tokens": _mean([r["prompt_tokens"] for r in results]),
+            "mean_completion_tokens": _mean([r["completion_tokens"] for r in results]),
+            "errors": sum(1 for r in results if r["error"])
+        }
+    }
+
+
+def compare_reports(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Summary deltas (new - old) between two reports.
+
+    Returns:
+        Dictionary of metric -> {old, new, delta}; flags bank mismatches
+    """
+    comparison = {"same_bank": old.get("bank_fingerprint") == new.get("bank_fingerprint"), "metrics": {}}
+    for key, new_value in new["summary"].items():
+        old_value = old.get("summary", {}).get(key)
+        delta = None
+        if isinstance(old_value, (int, float)) and isinstance(new_value, (int, float)):
+            delta = round(new_value - old_value, 3)
+        comparison["metrics"][key] = {"old": old_value, "new": new_value, "delta": delta}
+    return comparison
+
+
+def print_report(report: Dict[str, Any], comparison: Optional[Dict[str, Any]] = None):
+    """Print the summary (and deltas against a previous run)."""
+    print("\n" + "="*60)
+    print(f"AGENT EVALUATION (bank v{report['bank_version']}, {report['bank_fingerprint']})")
+    print("="*60)
+    for key, value in report["summary"].items():
+        line = f"  {key:24s} {value}"
+        if comparison and comparison["metrics"].get(key, {}).get("delta") is not None:
+            line += f"   (Δ {comparison['metrics'][key]['delta']:+})"
+        print(line)
+    if comparison and not comparison["same_bank"]:
+        print("  NOTE: compared report used a different question bank")
+    print("="*60)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate agent accuracy and latency")
+    parser.add_argument("--data", default=None, help="CSV dataset path")
+    parser.add_argument("--stub", action="store_true", help="Run against the local Ollama stub")
+    parser.add_argument("--transcript", default=None, help="Replay transcript for the stub (JSONL)")
+    parser.add_argument("--questions", default=None, help="Comma-separated question ids")
+    parser.add_argument("--compare", default=None, help="Previous report to compare against")
+    parser.add_argument("--output", default="evaluation_report.json", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    stub = None
+    if args.stub:
+        from app.ollama_stub import OllamaStub
+        stub = OllamaStub(port=0, transcript_path=args.transcript).start()
+        os.environ["OLLAMA_BASE_URL"] = stub.url
+
+    from app.data_loader import load_data
+    from app.agent_setup import get_or_create_agent, RoutedAgent
+    from app.prompt_builder import COMPACT_PROMPT
+    from app.llm_client import DEFAULT_MODEL, SMALL_MODEL
+
+    data_file = args.data or os.path.join("data", "smart_city_energy_dataset.csv")
+    if not os.path.exists(data_file):
+        data_file = "smart_city_energy_dataset.csv"
+    df = load_data(data_file)
+
+    try:
+        agent = get_or_create_agent(df)
+        report = run_evaluation(agent, df, args.questions.split(",") if args.questions else None)
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    report["config"] = {
+        "stub": stub is not None,
+        "model": DEFAULT_MODEL,
+        "small_model": SMALL_MODEL if isinstance(agent, RoutedAgent) else None,
+        "routing": isinstance(agent, RoutedAgent),
+        "compact_prompt": COMPACT_PROMPT
+    }
+
+    comparison = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            comparison = compare_reports(json.load(f), report)
+        report["comparison"] = comparison
+
+    print_report(report, comparison)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Similar-Incident Index
+Nearest-neighbor retrieval over anomaly event features
+
+Every anomaly row becomes an event with a compact feature vector:
+frequency change, solar/wind percent change and cloud change against the
+prior interval, time of day and season (as sin/cos pairs) and the duration
+of the anomaly run it belongs to. The standardized vectors are kept in a
+float32 array indexed by a small KD-tree, so "has this happened before?"
+is a tree query instead of a full-frame scan by the agent.
+
+Events appended after the last build are kept in a pending buffer that is
+searched brute-force; the tree is rebuilt once the buffer reaches
+REBUILD_THRESHOLD (or when appended rows extend an already indexed run).
+A new dataset version gets an updated copy of the latest index, so
+queries running against the previous version are never disturbed.
+"""
+
+import copy
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.attribution import attribution_engine, compute_features
+
+
+FEATURE_NAMES = [
+    'freq_change_hz',
+    'solar_change_pct',
+    'wind_change_pct',
+    'cloud_change',
+    'hour_sin',
+    'hour_cos',
+    'season_sin',
+    'season_cos',
+    'duration',
+]
+
+# Points per KD-tree leaf (leaves are scanned with one vectorized distance)
+LEAF_SIZE = 16
+
+# Pending (unindexed) events that trigger a tree rebuild
+REBUILD_THRESHOLD = 64
+
+# Upper bound on neighbours returned per query
+MAX_SIMILAR_EVENTS = 20
+
+# Dataset versions kept indexed (the server's live frame and the chat UI's frame)
+MAX_CACHED_INDEXES = 2
+
+
+class KDTree:
+    """
+    Static KD-tree with leaf buckets and k-nearest-neighbour queries.
+
+    Args:
+        points: (n, d) array of points
+        leaf_size: Maximum points per leaf
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = LEAF_SIZE):
+        self.points = points
+        self.leaf_size = leaf_size
+        # Node: (split_dim, split_value, left, right) or (-1, leaf indices, None, None)
+        self.nodes: List[Tuple] = []
+        if len(points):
+            self._build(np.arange(len(points)))
+
+    def _build(self, idx: np.ndarray) -> int:
+        node_id = len(self.nodes)
+        if len(idx) <= self.leaf_size:
+            self.nodes.append((-1, idx, None, None))
+            return node_id
+        subset = self.points[idx]
+        dim = int(np.argmax(subset.max(axis=0) - subset.min(axis=0)))
+        mid = len(idx) // 2
+        order = np.argpartition(subset[:, dim], mid)
+        self.nodes.append(None)
+        left = self._build(idx[order[:mid]])
+        right = self._build(idx[order[mid:]])
+        self.nodes[node_id] = (dim, float(subset[order[mid], dim]), left, right)
+        return node_id
+
+    def query(self, point: np.ndarray, k: int, allowed: Optional[np.ndarray] = None) -> List[Tuple[float, int]]:
+        """
+        k nearest points to `point`.
+
+        Args:
+            point: Query vector
+            k: Number of neighbours
+            allowed: Boolean mask of points that may be returned
+
+        Returns:
+            List of (distance, index) pairs, nearest first
+        """
+        best: List[Tuple[float, int]] = []  # max-heap of (-squared distance, index)
+        if self.nodes:
+            self._search(0, point, k, allowed, best)
+        return sorted((float(np.sqrt(-d)), i) for d, i in best)
+
+    def _search(self, node_id: int, point, k, allowed, best):
+        dim, value, left, right = self.nodes[node_id]
+        if dim < 0:
+            idx = value if allowed is None else value[allowed[value]]
+            if not len(idx):
+                return
+            dist = ((self.points[idx] - point) ** 2).sum(axis=1)
+            for d, i in zip(dist.tolist(), idx.tolist()):
+                if len(best) < k:
+                    heapq.heappush(best, (-d, i))
+                elif d < -best[0][0]:
+                    heapq.heapreplace(best, (-d, i))
+            return
+        diff = point[dim] - value
+        near, far = (left, right) if diff < 0 else (right, left)
+        self._search(near, point, k, allowed, best)
+        if len(best) < k or diff * diff < -best[0][0]:
+            self._search(far, point, k, allowed, best)
+
+
+class EventIndex:
+    """
+    Feature store and nearest-neighbour index over anomaly events.
+
+    Args:
+        df: Preprocessed grid data DataFrame (sorted Timestamp index)
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.rebuilds = 0
+        self._load(df)
+        self._rebuild()
+
+    # ------------------------------------------------------------------
+    # Features
+    # ------------------------------------------------------------------
+
+    def _load(self, df: pd.DataFrame):
+        self._df = df
+        self.index = df.index
+        self._freq = df['Grid Frequency (Hz)'].to_numpy(dtype=float, na_value=np.nan)
+        self._z = df['Z_Score'].to_numpy(dtype=float, na_value=np.nan)
+        self._is_anomaly = df['Is_Anomaly'].to_numpy(dtype=bool)
+        self.positions = np.flatnonzero(self._is_anomaly)
+        self._durations = self._run_lengths()
+
+    def _run_lengths(self) -> Dict[int, int]:
+        """Anomaly position -> length of the contiguous anomaly run containing it."""
+        pos = self.positions
+        if not len(pos):
+            return {}
+        breaks = np.flatnonzero(np.diff(pos) != 1) + 1
+        durations = {}
+        for run in np.split(pos, breaks):
+            for p in run.tolist():
+                durations[p] = len(run)
+        return durations
+
+    def features(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Raw feature vectors for row positions.
+
+        Returns:
+            (n, len(FEATURE_NAMES)) float32 array
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        changes = compute_features(self._df, positions)
+        ts = self.index[positions]
+        hour = 2 * np.pi * (ts.hour + ts.minute / 60) / 24
+        season = 2 * np.pi * ts.dayofyear / 365.25
+        duration = np.array([self._durations.get(p, 0) for p in positions.tolist()], dtype=float)
+
+        matrix = np.column_stack([
+            changes['freq_change_hz'], changes['solar_change_pct'], changes['wind_change_pct'],
+            changes['cloud_change'], np.sin(hour), np.cos(hour), np.sin(season), np.cos(season),
+            duration
+        ])
+        return np.nan_to_num(matrix).astype(np.float32)
+
+    # ------------------------------------------------------------------
+    # Index maintenance
+    # ------------------------------------------------------------------
+
+    def _rebuild(self):
+        """Recompute all event features, scaling and the tree."""
+        start = time.perf_counter()
+        raw = self.features(self.positions)
+        self._raw = raw
+        self._mean = raw.mean(axis=0) if len(raw) else np.zeros(len(FEATURE_NAMES), dtype=np.float32)
+        std = raw.std(axis=0) if len(raw) else np.ones(len(FEATURE_NAMES), dtype=np.float32)
+        self._scale = np.where(std > 0, std, 1.0).astype(np.float32)
+        self._scaled = (raw - self._mean) / self._scale
+        self._tree_size = len(raw)
+        self.tree = KDTree(self._scaled)
+        self.rebuilds += 1
+        self.build_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    def update(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Bring the index up to date with a DataFrame that gained rows.
+
+        Appended events go to the pending buffer; a changed history, an
+        extended anomaly run or a full buffer triggers a rebuild. Not safe
+        while other threads query this index: use updated() for that.
+
+        Args:
+            df: Grid data DataFrame (the indexed one plus appended rows)
+
+        Returns:
+            Dictionary with the number of new events and whether it rebuilt
+        """
+        old_rows, old_events = len(self.index), len(self.positions)
+        same_history = (
+            len(df) >= old_rows and old_rows > 0
+            and df.index[old_rows - 1] == self.index[old_rows - 1]
+        )
+        extends_run = same_history and bool(self._is_anomaly[old_rows - 1]) \
+            and len(df) > old_rows and bool(df['Is_Anomaly'].iat[old_rows])
+        self._load(df)
+
+        if not same_history or extends_run:
+            self._rebuild()
+            return {"new_events": len(self.positions) - old_events, "rebuilt": True}
+
+        pending = len(self.positions) - self._tree_size
+        if pending >= REBUILD_THRESHOLD:
+            self._rebuild()
+            return {"new_events": len(self.positions) - old_events, "rebuilt": True}
+
+        if len(self.positions) > old_events:
+            raw = self.features(self.positions[old_events:])
+            self._raw = np.vstack([self._raw, raw])
+            self._scaled = np.vstack([self._scaled, (raw - self._mean) / self._scale])
+        return {"new_events": len(self.positions) - old_events, "rebuilt": False}
+
+    def updated(self, df: pd.DataFrame) -> "EventIndex":
+        """
+        Copy of this index brought up to date with `df` (this one is unchanged).
+
+        update() only rebinds attributes (it never mutates arrays in place),
+        so a shallow copy shares the existing arrays until they are replaced.
+        """
+        index = copy.copy(self)
+        index.update(df)
+        return index
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _locate(self, ts: str) -> int:
+        target = pd.Timestamp(str(ts).strip().strip('"\''))
+        pos = int(self.index.searchsorted(target))
+        if pos >= len(self.index) or self.index[pos] != target:
+            raise KeyError(f"Timestamp {target} not found in dataset")
+        return pos
+
+    def similar_events(self, ts: str, k: int = 5, past_only: bool = True) -> Dict[str, Any]:
+        """
+        Past anomaly events most similar to the event at a timestamp.
+
+        Args:
+            ts: Timestamp string of the event (need not be an anomaly)
+            k: Number of events to return (max: 20)
+            past_only: Only return events before `ts`
+
+        Returns:
+            Dictionary with the query features and the nearest events, each
+            with its distance, Z-Score, duration and rule-based root cause
+        """
+        start = time.perf_counter()
+        k = min(max(1, int(k)), MAX_SIMILAR_EVENTS)
+        if isinstance(past_only, str):
+            past_only = past_only.strip().lower() not in ("false", "0", "no")
+        pos = self._locate(ts)
+
+        raw = self.features(np.array([pos]))
+        query = ((raw[0] - self._mean) / self._scale).astype(np.float32)
+        allowed = self.positions < pos if past_only else self.positions != pos
+
+        candidates = self.tree.query(query, k, allowed[:self._tree_size])
+        if len(self.positions) > self._tree_size:
+            pending = np.flatnonzero(allowed[self._tree_size:]) + self._tree_size
+            dist = np.sqrt(((self._scaled[pending] - query) ** 2).sum(axis=1))
+            candidates = sorted(candidates + list(zip(dist.tolist(), pending.tolist())))[:k]
+
+        # Root causes come from the live rule table, so rule edits apply immediately
+        neighbours = [int(self.positions[i]) for _, i in candidates]
+        attributions = attribution_engine.attribute(self._df, np.array(neighbours, dtype=np.int64))
+
+        events = []
+        for (distance, i), p, attribution in zip(candidates, neighbours, attributions):
+            events.append({
+                "timestamp": self.index[p].strftime('%Y-%m-%d %H:%M:%S'),
+                "distance": round(distance, 4),
+                "z_score": round(float(self._z[p]), 3) if np.isfinite(self._z[p]) else None,
+                "grid_frequency": round(float(self._freq[p]), 4),
+                "duration_intervals": self._durations.get(p, 0),
+                "root_cause": attribution["root_cause"],
+                "features": {name: round(float(v), 3) for name, v in zip(FEATURE_NAMES, self._raw[i])}
+            })
+
+        return {
+            "timestamp": self.index[pos].strftime('%Y-%m-%d %H:%M:%S'),
+            "is_anomaly": bool(self._is_anomaly[pos]),
+            "features": {name: round(float(v), 3) for name, v in zip(FEATURE_NAMES, raw[0])},
+            "indexed_events": int(len(self.positions)),
+            "events": events,
+            "search_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size and maintenance counters."""
+        return {
+            "events": int(len(self.positions)),
+            "tree_events": int(self._tree_size),
+            "pending_events": int(len(self.positions) - self._tree_size),
+            "tree_nodes": len(self.tree.nodes),
+            "rebuilds": self.rebuilds,
+            "build_ms": self.build_ms
+        }
+
+
+# Indexes by dataset version, most recently used last
+_indexes: "OrderedDict[str, EventIndex]" = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_event_index(df: pd.DataFrame) -> EventIndex:
+    """
+    EventIndex for a DataFrame, cached by dataset version.
+
+    A new version is derived incrementally from the most recently used
+    index (see EventIndex.update) instead of being built from scratch.
+
+    Args:
+        df: Grid data DataFrame
+
+    Returns:
+        EventIndex over the anomalies of `df`
+    """
+    from app.data_loader import get_dataset_version
+
+    version = get_dataset_version(df)
+    with _index_lock:
+        index = _indexes.get(version)
+        if index is None:
+            if _indexes:
+                index = next(reversed(_indexes.values())).updated(df)
+            else:
+                index = EventIndex(df)
+            _indexes[version] = index
+            while len(_indexes) > MAX_CACHED_INDEXES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(version)
+        return index
@@ -0,0 +1,131 @@
+"""
+Grid Data Client
+Read the bulk data endpoints straight into pandas DataFrames
+
+Arrow IPC responses are decoded batch by batch while they stream in, so
+dtypes (timestamps, bools, ints, nullable floats) survive the round trip
+without JSON parsing. JSON remains available for servers without pyarrow.
+
+Example:
+    from app.grid_client import GridClient
+    client = GridClient("http://localhost:8000")
+    frame = client.read_range("2021-01-01", "2021-02-01", columns=["Grid Frequency (Hz)"])
+    anomalies = client.read_anomalies()
+"""
+
+import io
+from typing import Optional, Dict, Any, List, Iterator
+
+import httpx
+import pandas as pd
+
+from app.grid_serialization import ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE
+
+
+class _StreamReader(io.RawIOBase):
+    """File-like view over an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+class GridClient:
+    """
+    Client for /api/grid/range and /api/grid/anomalies.
+
+    Args:
+        base_url: Server URL (e.g. http://localhost:8000)
+        format: "arrow" (default), "parquet" or "json"
+        timeout: Request timeout in seconds
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000", format: str = "arrow",
+                 timeout: float = 60.0, client: Optional[httpx.Client] = None):
+        if format not in ("arrow", "parquet", "json"):
+            raise ValueError("format must be 'arrow', 'parquet' or 'json'")
+        self.format = format
+        self._client = client or httpx.Client(base_url=base_url, timeout=timeout)
+
+    def close(self):
+        self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _accept(self) -> str:
+        return {"arrow": ARROW_STREAM_MEDIA_TYPE, "parquet": PARQUET_MEDIA_TYPE}.get(self.format, "application/json")
+
+    def _read_frame(self, path: str, params: Dict[str, Any]) -> pd.DataFrame:
+        """GET an endpoint and decode the body according to self.format."""
+        with self._client.stream("GET", path, params=params, headers={"Accept": self._accept()}) as response:
+            if response.status_code >= 400:
+                response.read()
+                response.raise_for_status()
+            if self.format == "arrow":
+                import pyarrow as pa
+                reader = pa.ipc.open_stream(pa.PythonFile(_StreamReader(response.iter_bytes()), mode='r'))
+                table = reader.read_all()
+            elif self.format == "parquet":
+                import pyarrow.parquet as pq
+                table = pq.read_table(io.BytesIO(response.read()))
+            else:
+                return self._json_frame(response.read())
+
+        frame = table.to_pandas()
+        return frame.set_index("timestamp")
+
+    @staticmethod
+    def _json_frame(body: bytes) -> pd.DataFrame:
+        import json
+        payload = json.loads(body)
+        records = payload.get("data", payload.get("results", []))
+        frame = pd.DataFrame(records)
+        if "timestamp" in frame.columns:
+            frame["timestamp"] = pd.to_datetime(frame["timestamp"])
+            frame = frame.set_index("timestamp")
+        return frame
+
+    def read_range(self, start: str, end: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Grid data for a time range as a DataFrame indexed by timestamp.
+
+        Args:
+            start: Start timestamp
+            end: End timestamp
+            columns: Column projection (default: all columns)
+        """
+        params = {"start": start, "end": end}
+        if columns:
+            params["columns"] = ",".join(columns)
+        return self._read_frame("/api/grid/range", params)
+
+    def read_anomalies(self, limit: Optional[int] = None, offset: int = 0) -> pd.DataFrame:
+        """
+        Anomaly events as a DataFrame indexed by timestamp.
+
+        Args:
+            limit: Maximum events (default: all for Arrow/Parquet)
+            offset: Events to skip
+        """
+        params: Dict[str, Any] = {"offset": offset}
+        if limit:
+            params["limit"] = limit
+        return self._read_frame("/api/grid/anomalies", params)
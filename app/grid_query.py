@@ -0,0 +1,500 @@
+"""
+Grid Query Language
+Safe filter expressions over the grid data, compiled to NumPy masks
+
+Expressions use a small Python-like syntax, parsed with the ast module and
+checked against a whitelist before anything runs:
+
+    frequency < 49.9 and diff(cloud, "1h") > 20
+    abs(z_score) >= 2.5 and hour >= 18 and time >= "2021-02-01"
+    `Wind Speed (m/s)` > 8 or (solar == 0 and not is_anomaly)
+
+    names        column aliases (see COLUMN_ALIASES), any column in
+                 backticks, and time, hour, weekday, month
+    operators    comparisons (chainable), and/or/not, & | ~, + - * /
+    functions    abs(x), lag(x, n), diff(x, n=1), pct_change(x, n=1),
+                 rolling_mean/min/max(x, n), between(x, low, high)
+
+Window arguments are a number of rows or a duration string ("1h", "90min");
+durations look up the row exactly that long before, like the attribution
+features. Comparisons with NaN are false. Compiled expressions are cached
+by text, and QueryEngine caches the matching row positions per dataset
+version, so paging through a result does not re-evaluate it.
+"""
+
+import ast
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+import numpy as np
+import pandas as pd
+
+from app.metrics import cache_requests_total
+
+
+# Short names for the dataset columns
+COLUMN_ALIASES = {
+    'frequency': 'Grid Frequency (Hz)',
+    'solar': 'Solar PV Output (kW)',
+    'wind': 'Wind Power Output (kW)',
+    'cloud': 'Cloud Cover (%)',
+    'wind_speed': 'Wind Speed (m/s)',
+    'temperature': 'Temperature (C)',
+    'humidity': 'Humidity (%)',
+    'curtailment': 'Curtailment Event Flag',
+    'is_anomaly': 'Is_Anomaly',
+    'z_score': 'Z_Score',
+}
+
+TIME_FIELDS = ('time', 'hour', 'weekday', 'month')
+
+MAX_EXPRESSION_LENGTH = 500
+MAX_EXPRESSION_NODES = 200
+MAX_WINDOW_ROWS = 10000
+
+# Matching row positions kept per engine (LRU)
+MAX_CACHED_RESULTS = 32
+
+_BACKTICK = re.compile(r'`([^`]+)`')
+
+_COMPARE = {
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater,
+    ast.GtE: np.greater_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_ARITHMETIC = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide,
+}
+
+
+class QueryError(ValueError):
+    """Raised for an expression that is malformed or not allowed."""
+
+
+class _Context:
+    """Arrays an expression is evaluated against."""
+
+    def __init__(self, store):
+        self.store = store
+        self.index_ns = store.index_ns
+        self._cache: Dict[str, np.ndarray] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        values = self._cache.get(name)
+        if values is None:
+            raw = self.store.column(name, 0, len(self.index_ns))
+            values = raw if raw.dtype.kind == 'b' else raw.astype(float)
+            self._cache[name] = values
+        return values
+
+    def time_field(self, name: str) -> np.ndarray:
+        values = self._cache.get(name)
+        if values is None:
+            if name == 'time':
+                values = self.index_ns
+            else:
+                index = self.store.index
+                values = {'hour': index.hour, 'weekday': index.dayofweek, 'month': index.month}[name]
+                values = np.asarray(values, dtype=float)
+            self._cache[name] = values
+        return values
+
+
+# A compiled node: (kind, evaluator). Kinds: "bool" mask, "number" array,
+# "time" epoch-ns array, "const" Python number, "string" literal.
+Node = Tuple[str, Any]
+
+
+class _Compiler:
+    def __init__(self, columns: Tuple[str, ...], placeholders: Dict[str, str]):
+        self.columns = set(columns)
+        self.placeholders = placeholders
+        self.referenced: List[str] = []
+
+    def compile(self, node) -> Node:
+        method = getattr(self, f"_{type(node).__name__}", None)
+        if method is None:
+            raise QueryError(f"'{type(node).__name__}' is not allowed in a query")
+        return method(node)
+
+    # -- leaves -------------------------------------------------------
+
+    def _Constant(self, node) -> Node:
+        value = node.value
+        if isinstance(value, bool):
+            return "const", float(value)
+        if isinstance(value, (int, float)):
+            return "const", float(value)
+        if isinstance(value, str):
+            return "string", value
+        raise QueryError(f"Unsupported literal {value!r}")
+
+    def _Name(self, node) -> Node:
+        name = self.placeholders.get(node.id, node.id)
+        if name in TIME_FIELDS and node.id not in self.placeholders:
+            return ("time" if name == 'time' else "number"), lambda ctx, n=name: ctx.time_field(n)
+        column = COLUMN_ALIASES.get(name, name) if node.id not in self.placeholders else name
+        if column not in self.columns:
+            raise QueryError(f"Unknown column '{name}'")
+        if column not in self.referenced:
+            self.referenced.append(column)
+        kind = "bool" if column == 'Is_Anomaly' else "number"
+        return kind, lambda ctx, c=column: ctx.column(c)
+
+    # -- operators ----------------------------------------------------
+
+    def _BoolOp(self, node) -> Node:
+        parts = [self._mask(v) for v in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return "bool", lambda ctx: combine.reduce([p(ctx) for p in parts])
+
+    def _UnaryOp(self, node) -> Node:
+        if isinstance(node.op, (ast.Not, ast.Invert)):
+            operand = self._mask(node.operand)
+            return "bool", lambda ctx: ~operand(ctx)
+        kind, operand = self.compile(node.operand)
+        if kind == "const":
+            return kind, -operand if isinstance(node.op, ast.USub) else operand
+        value = self._number((kind, operand))
+        if isinstance(node.op, ast.USub):
+            return "number", lambda ctx: -value(ctx)
+        if isinstance(node.op, ast.UAdd):
+            return "number", value
+        raise QueryError("Unsupported unary operator")
+
+    def _BinOp(self, node) -> Node:
+        if isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+            left, right = self._mask(node.left), self._mask(node.right)
+            combine = np.logical_and if isinstance(node.op, ast.BitAnd) else np.logical_or
+            return "bool", lambda ctx: combine(left(ctx), right(ctx))
+        func = _ARITHMETIC.get(type(node.op))
+        if func is None:
+            raise QueryError(f"Operator '{type(node.op).__name__}' is not allowed")
+        left, right = self.compile(node.left), self.compile(node.right)
+        if left[0] == "const" and right[0] == "const":
+            with np.errstate(all='ignore'):
+                return "const", float(func(left[1], right[1]))
+        a, b = self._number(left), self._number(right)
+
+        def run(ctx):
+            with np.errstate(all='ignore'):
+                return func(a(ctx), b(ctx))
+        return "number", run
+
+    def _Compare(self, node) -> Node:
+        operands = [self.compile(node.left)] + [self.compile(c) for c in node.comparators]
+        checks = []
+        for op, left, right in zip(node.ops, operands, operands[1:]):
+            func = _COMPARE.get(type(op))
+            if func is None:
+                raise QueryError(f"Operator '{type(op).__name__}' is not allowed")
+            a, b = self._comparable(left, right), self._comparable(right, left)
+            checks.append((func, a, b))
+
+        def run(ctx):
+            with np.errstate(invalid='ignore'):
+                masks = [func(a(ctx), b(ctx)) for func, a, b in checks]
+            return np.logical_and.reduce(masks) if len(masks) > 1 else masks[0]
+        return "bool", run
+
+    # -- functions ----------------------------------------------------
+
+    def _Call(self, node) -> Node:
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise QueryError("Only plain function calls with positional arguments are allowed")
+        name, args = node.func.id, node.args
+        handler = getattr(self, f"_fn_{name}", None)
+        if handler is None:
+            raise QueryError(f"Unknown function '{name}'")
+        return handler(args)
+
+    def _fn_abs(self, args) -> Node:
+        self._arity("abs", args, 1)
+        value = self._number(self.compile(args[0]))
+        return "number", lambda ctx: np.abs(value(ctx))
+
+    def _fn_lag(self, args) -> Node:
+        self._arity("lag", args, 2)
+        value, shift = self._number(self.compile(args[0])), self._window(args[1])
+        return "number", lambda ctx: shift(ctx, value(ctx))
+
+    def _fn_diff(self, args) -> Node:
+        self._arity("diff", args, 1, 2)
+        value = self._number(self.compile(args[0]))
+        shift = self._window(args[1]) if len(args) > 1 else self._window(ast.Constant(1))
+        return "number", lambda ctx: self._safe(np.subtract, value(ctx), shift(ctx, value(ctx)))
+
+    def _fn_pct_change(self, args) -> Node:
+        self._arity("pct_change", args, 1, 2)
+        value = self._number(self.compile(args[0]))
+        shift = self._window(args[1]) if len(args) > 1 else self._window(ast.Constant(1))
+
+        def run(ctx):
+            current = value(ctx)
+            before = shift(ctx, current)
+            with np.errstate(all='ignore'):
+                return np.where(before != 0, (current - before) / np.abs(before) * 100, np.nan)
+        return "number", run
+
+    def _rolling(self, name: str, args) -> Node:
+        self._arity(f"rolling_{name}", args, 2)
+        value = self._number(self.compile(args[0]))
+        rows = self._rows(args[1])
+        return "number", lambda ctx: getattr(pd.Series(value(ctx)).rolling(rows, min_periods=1), name)().to_numpy()
+
+    def _fn_rolling_mean(self, args) -> Node:
+        return self._rolling("mean", args)
+
+    def _fn_rolling_min(self, args) -> Node:
+        return self._rolling("min", args)
+
+    def _fn_rolling_max(self, args) -> Node:
+        return self._rolling("max", args)
+
+    def _fn_between(self, args) -> Node:
+        self._arity("between", args, 3)
+        value = self.compile(args[0])
+        low, high = self._comparable(self.compile(args[1]), value), self._comparable(self.compile(args[2]), value)
+        x = self._comparable(value, self.compile(args[1]))
+
+        def run(ctx):
+            values = x(ctx)
+            with np.errstate(invalid='ignore'):
+                return (values >= low(ctx)) & (values <= high(ctx))
+        return "bool", run
+
+    # -- helpers ------------------------------------------------------
+
+    @staticmethod
+    def _safe(func, a, b):
+        with np.errstate(all='ignore'):
+            return func(a, b)
+
+    @staticmethod
+    def _arity(name: str, args, low: int, high: Optional[int] = None):
+        high = low if high is None else high
+        if not low <= len(args) <= high:
+            expected = low if low == high else f"{low}-{high}"
+            raise QueryError(f"{name}() takes {expected} argument(s) ({len(args)} given)")
+
+    def _mask(self, node) -> Callable:
+        kind, value = self.compile(node)
+        if kind != "bool":
+            raise QueryError("and/or/not need conditions on both sides (e.g. frequency < 49.9)")
+        return value
+
+    @staticmethod
+    def _number(compiled: Node) -> Callable:
+        kind, value = compiled
+        if kind == "const":
+            return lambda ctx: value
+        if kind in ("number", "bool"):
+            return value
+        if kind == "time":
+            raise QueryError("time can only be compared with a timestamp string")
+        raise QueryError("Strings are only allowed as timestamps and durations")
+
+    @staticmethod
+    def _comparable(compiled: Node, other: Node) -> Callable:
+        """Evaluator for one side of a comparison (timestamp strings become epoch ns)."""
+        kind, value = compiled
+        if kind == "string":
+            if other[0] != "time":
+                raise QueryError(f"String '{value}' can only be compared with time")
+            try:
+                ns = pd.Timestamp(value).as_unit('ns').value
+            except ValueError as e:
+                raise QueryError(f"Invalid timestamp '{value}': {e}")
+            return lambda ctx: ns
+        if kind == "time":
+            if other[0] != "string" and other[0] != "time":
+                raise QueryError("time can only be compared with a timestamp string")
+            return value
+        return _Compiler._number(compiled)
+
+    def _rows(self, node) -> int:
+        kind, value = self.compile(node)
+        if kind != "const" or value != int(value) or not 1 <= value <= MAX_WINDOW_ROWS:
+            raise QueryError(f"Window must be a whole number of rows between 1 and {MAX_WINDOW_ROWS}")
+        return int(value)
+
+    def _window(self, node) -> Callable:
+        """Shift function for a lag: n rows, or a duration ("1h") looked up by timestamp."""
+        kind, value = self.compile(node)
+        if kind == "string":
+            try:
+                offset = pd.Timedelta(value).value
+            except ValueError as e:
+                raise QueryError(f"Invalid duration '{value}': {e}")
+            if offset <= 0:
+                raise QueryError("Durations must be positive")
+
+            def by_time(ctx, values):
+                index = ctx.index_ns
+                prior = np.searchsorted(index, index - offset)
+                found = (prior < len(index)) & (index[np.minimum(prior, len(index) - 1)] == index - offset)
+                return np.where(found, values[np.where(found, prior, 0)].astype(float), np.nan)
+            return by_time
+
+        rows = self._rows(node)
+
+        def by_rows(ctx, values):
+            shifted = np.full(len(values), np.nan)
+            shifted[rows:] = values[:-rows] if rows < len(values) else []
+            return shifted
+        return by_rows
+
+
+class CompiledQuery:
+    """A validated expression and its mask function."""
+
+    def __init__(self, expression: str, func: Callable, columns: List[str]):
+        self.expression = expression
+        self.columns = columns
+        self._func = func
+
+    def mask(self, store) -> np.ndarray:
+        """Boolean mask over every row of a ColumnStore."""
+        result = self._func(_Context(store))
+        if np.ndim(result) == 0:
+            return np.full(len(store.index_ns), bool(result))
+        return np.asarray(result, dtype=bool)
+
+
+@lru_cache(maxsize=256)
+def compile_query(expression: str, columns: Tuple[str, ...]) -> CompiledQuery:
+    """
+    Parse, validate and compile an expression (cached by text and schema).
+
+    Args:
+        expression: Query expression
+        columns: Dataset column names
+
+    Returns:
+        CompiledQuery
+
+    Raises:
+        QueryError: If the expression is malformed or not allowed
+    """
+    expression = expression.strip()
+    if not expression:
+        raise QueryError("Empty query")
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise QueryError(f"Query longer than {MAX_EXPRESSION_LENGTH} characters")
+
+    # `Full Column Name` -> placeholder identifier
+    placeholders: Dict[str, str] = {}
+
+    def substitute(match):
+        key = f"__col{len(placeholders)}"
+        placeholders[key] = match.group(1)
+        return key
+    source = _BACKTICK.sub(substitute, expression)
+
+    try:
+        tree = ast.parse(source, mode='eval')
+    except SyntaxError as e:
+        raise QueryError(f"Invalid query syntax: {e.msg}")
+    if sum(1 for _ in ast.walk(tree)) > MAX_EXPRESSION_NODES:
+        raise QueryError("Query is too complex")
+
+    compiler = _Compiler(columns, placeholders)
+    kind, func = compiler.compile(tree.body)
+    if kind != "bool":
+        raise QueryError("Query must be a condition (e.g. frequency < 49.9)")
+    return CompiledQuery(expression, func, compiler.referenced)
+
+
+class QueryEngine:
+    """
+    Query evaluation over a dataset, with matching positions cached per expression.
+
+    Args:
+        df: Grid data DataFrame
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        from app.grid_serialization import get_column_store
+
+        self.store = get_column_store(df)
+        self._columns = tuple(self.store.columns)
+        self._results: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, expression: str) -> CompiledQuery:
+        return compile_query(expression, self._columns)
+
+    def positions(self, expression: str) -> np.ndarray:
+        """Sorted row positions matching an expression."""
+        compiled = self.compile(expression)
+        with self._lock:
+            positions = self._results.get(compiled.expression)
+            if positions is not None:
+                self._results.move_to_end(compiled.expression)
+                cache_requests_total.inc(1, "query_results", "hit")
+                return positions
+        cache_requests_total.inc(1, "query_results", "miss")
+        positions = np.flatnonzero(compiled.mask(self.store))
+        with self._lock:
+            self._results[compiled.expression] = positions
+            while len(self._results) > MAX_CACHED_RESULTS:
+                self._results.popitem(last=False)
+        return positions
+
+    def summary(self, expression: str, limit: int = 10) -> Dict[str, Any]:
+        """
+        Match count, time span and the first matching rows (agent tool output).
+
+        Args:
+            expression: Query expression
+            limit: Rows to include (max: 20)
+
+        Returns:
+            Dictionary with the count, first/last match and the referenced
+            columns of the first rows
+        """
+        compiled = self.compile(expression)
+        positions = self.positions(expression)
+        limit = min(max(1, int(limit)), 20)
+        columns = [c for c in compiled.columns if c != 'Is_Anomaly'] or ['Grid Frequency (Hz)']
+        shown = positions[:limit]
+        data = self.store.take(shown, columns)
+        rows = [dict(zip(data, values)) for values in zip(*data.values())]
+        for row in rows:
+            for key, value in row.items():
+                if isinstance(value, float):
+                    row[key] = round(value, 4)
+        return {
+            "query": compiled.expression,
+            "matches": int(len(positions)),
+            "first": self.store.timestamps[positions[0]] if len(positions) else None,
+            "last": self.store.timestamps[positions[-1]] if len(positions) else None,
+            "rows": rows
+        }
+
+
+_engines: Dict[str, QueryEngine] = {}
+_engine_lock = threading.Lock()
+
+
+def get_query_engine(df: pd.DataFrame) -> QueryEngine:
+    """
+    QueryEngine for a DataFrame, cached by dataset version.
+
+    Args:
+        df: Grid data DataFrame
+
+    Returns:
+        Shared QueryEngine
+    """
+    from app.data_loader import get_dataset_version
+
+    version = get_dataset_version(df)
+    with _engine_lock:
+        engine = _engines.get(version)
+        if engine is None:
+            _engines.clear()
+            engine = _engines[version] = QueryEngine(df)
+        return engine
@@ -0,0 +1,389 @@
+"""
+Grid Data Serialization
+Column-wise encoding of DataFrame ranges for the REST API
+
+Column values are extracted once per dataset into NumPy arrays, and the
+timestamp strings are formatted once for the whole index, so serving a
+range is two binary searches plus slicing. Rows are assembled from column
+slices and encoded with orjson (stdlib json as a fallback); NaN becomes
+null instead of breaking the encoder.
+
+Large ranges can be streamed as NDJSON in bounded batches, so memory stays
+proportional to STREAM_BATCH_ROWS instead of the range size.
+
+Binary formats (negotiated from the Accept header or ?format=) keep dtypes
+for pandas/Arrow clients: Arrow IPC record batches built from the column
+arrays without copying numeric data, and Parquet with one row group per
+batch. Both are streamed batch by batch and need pyarrow.
+"""
+
+import io
+import json
+import threading
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson ships with langsmith
+    orjson = None
+
+
+# Rows encoded per NDJSON chunk
+STREAM_BATCH_ROWS = 1000
+
+# Rows per Arrow record batch / Parquet row group
+ARROW_BATCH_ROWS = 65536
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "arrow": ARROW_STREAM_MEDIA_TYPE,
+    "parquet": PARQUET_MEDIA_TYPE,
+}
+
+# Accept header media types -> format
+_ACCEPTED = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    ARROW_STREAM_MEDIA_TYPE: "arrow",
+    PARQUET_MEDIA_TYPE: "parquet",
+    "application/x-parquet": "parquet",
+    "application/parquet": "parquet",
+}
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Resolution modes of ColumnStore.lookup
+LOOKUP_MODES = ("exact", "previous", "next", "nearest")
+
+
+class UnsupportedFormatError(ValueError):
+    """Raised when a response format cannot be produced."""
+
+
+def negotiate_format(accept: Optional[str], format: Optional[str] = None) -> str:
+    """
+    Response format from an explicit ?format= or the Accept header.
+
+    Media types are taken in header order; anything unrecognised (including
+    */*) falls back to JSON.
+
+    Raises:
+        UnsupportedFormatError: For an unknown explicit format
+    """
+    if format:
+        if format not in MEDIA_TYPES:
+            raise UnsupportedFormatError(f"format must be one of: {', '.join(MEDIA_TYPES)}")
+        return format
+    for part in (accept or "").split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in _ACCEPTED:
+            return _ACCEPTED[media_type]
+    return "json"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise UnsupportedFormatError("Arrow and Parquet responses require pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+class _DrainingSink(io.RawIOBase):
+    """Write-only buffer whose contents are taken after every batch."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def to_json_list(values: np.ndarray) -> list:
+    """Python list of an array, with NaN as None."""
+    if values.dtype.kind == 'f':
+        missing = np.isnan(values)
+        if missing.any():
+            values = values.astype(object)
+            values[missing] = None
+    return values.tolist()
+
+
+def parse_timestamps(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse many timestamp strings to epoch nanoseconds.
+
+    The format is inferred once from the first value and applied to all of
+    them; only the values that don't fit it are re-parsed individually.
+
+    Returns:
+        (nanoseconds, positions of unparseable values)
+    """
+    raw = pd.Series(values, dtype=object)
+    parsed = pd.to_datetime(raw, errors='coerce')
+    retry = parsed.isna().to_numpy()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(raw[retry], errors='coerce', format='mixed')
+    invalid = np.flatnonzero(parsed.isna().to_numpy())
+    return parsed.dt.as_unit('ns').to_numpy().view(np.int64), invalid
+
+
+def dumps(payload: Any) -> bytes:
+    """Encode JSON as bytes (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+class ColumnStore:
+    """
+    Column arrays and preformatted timestamps of a grid DataFrame.
+
+    Args:
+        df: Grid data DataFrame (sorted Timestamp index)
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.index = df.index
+        self.columns = list(df.columns)
+        self.timestamps = np.asarray(df.index.strftime(TIMESTAMP_FORMAT), dtype=object)
+        # Epoch nanoseconds whatever the index resolution (pandas may use us)
+        self.index_ns = df.index.as_unit('ns').asi8
+        self._arrays = {col: df[col].to_numpy() for col in self.columns}
+
+    def resolve_columns(self, names: Optional[str]) -> List[str]:
+        """
+        Columns for a comma-separated projection (default: all).
+
+        Raises:
+            KeyError: For an unknown column name
+        """
+        if not names:
+            return list(self.columns)
+        selected = []
+        for name in names.split(','):
+            name = name.strip()
+            if not name or name == 'timestamp':
+                continue
+            if name not in self._arrays:
+                raise KeyError(f"Unknown column '{name}'")
+            selected.append(name)
+        return selected
+
+    def bounds(self, start: pd.Timestamp, end: pd.Timestamp) -> Tuple[int, int]:
+        """Row positions [lo, hi) of an inclusive time range."""
+        lo = int(self.index.searchsorted(start, side='left'))
+        hi = int(self.index.searchsorted(end, side='right'))
+        return lo, max(lo, hi)
+
+    def column(self, column: str, lo: int, hi: int) -> np.ndarray:
+        """Column array slice (a view, not a copy)."""
+        return self._arrays[column][lo:hi]
+
+    def values(self, column: str, lo: int, hi: int) -> list:
+        """Python values of a column slice (NaN as None)."""
+        return to_json_list(self._arrays[column][lo:hi])
+
+    def records(self, lo: int, hi: int, columns: List[str]) -> List[Dict[str, Any]]:
+        """Row dictionaries (columns first, then "timestamp", as before)."""
+        keys = columns + ['timestamp']
+        lists = [self.values(col, lo, hi) for col in columns] + [self.timestamps[lo:hi].tolist()]
+        return [dict(zip(keys, row)) for row in zip(*lists)]
+
+    def columnar(self, lo: int, hi: int, columns: List[str]) -> Dict[str, list]:
+        """One list per column plus "timestamp"."""
+        data = {'timestamp': self.timestamps[lo:hi].tolist()}
+        for col in columns:
+            data[col] = self.values(col, lo, hi)
+        return data
+
+    def lookup(self, targets_ns: np.ndarray, mode: str = "exact",
+               tolerance_ns: Optional[int] = None) -> np.ndarray:
+        """
+        Row positions for many timestamps in one vectorized pass.
+
+        Args:
+            targets_ns: Epoch nanoseconds to resolve (any order)
+            mode: "exact", "previous" (last row at or before), "next" (first
+                row at or after) or "nearest" (ties go to the later row, as in
+                pandas get_indexer)
+            tolerance_ns: Maximum distance to the resolved row
+
+        Returns:
+            Positions, -1 where nothing matched
+        """
+        if mode not in LOOKUP_MODES:
+            raise ValueError(f"mode must be one of: {', '.join(LOOKUP_MODES)}")
+        index, n = self.index_ns, len(self.index_ns)
+        targets_ns = np.asarray(targets_ns, dtype=np.int64)
+        if n == 0:
+            return np.full(len(targets_ns), -1, dtype=np.int64)
+
+        after = np.searchsorted(index, targets_ns, side='left')
+        if mode in ("exact", "next"):
+            positions = np.where(after < n, after, -1)
+        else:
+            before = np.searchsorted(index, targets_ns, side='right') - 1
+            positions = before
+            if mode == "nearest":
+                safe_before, safe_after = np.maximum(before, 0), np.minimum(after, n - 1)
+                dist_before = np.where(before >= 0, targets_ns - index[safe_before], np.iinfo(np.int64).max)
+                dist_after = np.where(after < n, index[safe_after] - targets_ns, np.iinfo(np.int64).max)
+                positions = np.where(dist_after <= dist_before, after, before)
+
+        found = positions >= 0
+        distance = np.abs(index[np.where(found, positions, 0)] - targets_ns)
+        if mode == "exact":
+            found &= distance == 0
+        elif tolerance_ns is not None:
+            found &= distance <= tolerance_ns
+        return np.where(found, positions, -1)
+
+    def take(self, positions: np.ndarray, columns: List[str]) -> Dict[str, list]:
+        """Column-wise values at positions ("timestamp" first), None where -1."""
+        missing = positions < 0
+        safe = np.where(missing, 0, positions)
+        any_missing = bool(missing.any())
+
+        def gather(values: np.ndarray) -> list:
+            values = values[safe]
+            if any_missing:
+                values = values.astype(float if values.dtype.kind == 'f' else object)
+                values[missing] = np.nan if values.dtype.kind == 'f' else None
+            return to_json_list(values)
+
+        data = {'timestamp': gather(self.timestamps)}
+        for col in columns:
+            data[col] = gather(self._arrays[col])
+        return data
+
+    def records_at(self, positions: np.ndarray, columns: List[str]) -> List[Dict[str, Any]]:
+        """Row dictionaries for row positions (same key order as records)."""
+        data = self.take(positions, columns)
+        keys = columns + ['timestamp']
+        return [dict(zip(keys, row)) for row in zip(*(data[key] for key in keys))]
+
+    def ndjson(self, lo: int, hi: int, columns: List[str],
+               batch_rows: int = STREAM_BATCH_ROWS) -> Iterator[bytes]:
+        """NDJSON rows, one encoded chunk per batch."""
+        for batch_lo in range(lo, hi, batch_rows):
+            records = self.records(batch_lo, min(hi, batch_lo + batch_rows), columns)
+            yield b'\n'.join(dumps(record) for record in records) + b'\n'
+
+    def ndjson_at(self, positions: np.ndarray, columns: List[str],
+                  batch_rows: int = STREAM_BATCH_ROWS) -> Iterator[bytes]:
+        """NDJSON rows for row positions, one encoded chunk per batch."""
+        for batch_lo in range(0, len(positions), batch_rows):
+            records = self.records_at(positions[batch_lo:batch_lo + batch_rows], columns)
+            yield b'\n'.join(dumps(record) for record in records) + b'\n'
+
+    # ------------------------------------------------------------------
+    # Binary formats
+    # ------------------------------------------------------------------
+
+    def _batches(self, rows, batch_rows: int):
+        """Row selectors (slices or position arrays) of at most batch_rows rows."""
+        if isinstance(rows, slice):
+            for lo in range(rows.start, rows.stop, batch_rows):
+                yield slice(lo, min(rows.stop, lo + batch_rows))
+        else:
+            for lo in range(0, len(rows), batch_rows):
+                yield rows[lo:lo + batch_rows]
+
+    def arrow_batch(self, rows, columns: List[str], names: Optional[Dict[str, str]] = None):
+        """
+        Arrow record batch for a slice (zero-copy numeric buffers) or positions.
+
+        Args:
+            rows: slice(lo, hi) or array of row positions
+            columns: Columns to include after "timestamp"
+            names: Optional output names per column
+        """
+        pa = _require_pyarrow()
+        names = names or {}
+        timestamps = self.index_ns[rows].view('datetime64[ns]')
+        arrays = [pa.array(timestamps, type=pa.timestamp('ns'))]
+        for col in columns:
+            values = self._arrays[col][rows]
+            # NaN -> null (validity bitmap only, the value buffer is shared)
+            arrays.append(pa.array(values, from_pandas=values.dtype.kind == 'f'))
+        return pa.RecordBatch.from_arrays(arrays, names=['timestamp'] + [names.get(c, c) for c in columns])
+
+    def arrow_ipc(self, rows, columns: List[str], names: Optional[Dict[str, str]] = None,
+                  batch_rows: int = ARROW_BATCH_ROWS) -> Iterator[bytes]:
+        """Arrow IPC stream, one chunk per record batch (schema in the first)."""
+        pa = _require_pyarrow()
+        sink = _DrainingSink()
+        writer = None
+        for selector in self._batches(rows, batch_rows):
+            batch = self.arrow_batch(selector, columns, names)
+            if writer is None:
+                writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), batch.schema)
+            writer.write_batch(batch)
+            yield sink.drain()
+        if writer is None:
+            batch = self.arrow_batch(slice(0, 0), columns, names)
+            writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), batch.schema)
+        writer.close()
+        yield sink.drain()
+
+    def parquet(self, rows, columns: List[str], names: Optional[Dict[str, str]] = None,
+                batch_rows: int = ARROW_BATCH_ROWS) -> Iterator[bytes]:
+        """Parquet file, one row group per batch, streamed as it is written."""
+        pa = _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        sink = _DrainingSink()
+        writer = None
+        for selector in self._batches(rows, batch_rows):
+            table = pa.Table.from_batches([self.arrow_batch(selector, columns, names)])
+            if writer is None:
+                writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), table.schema)
+            writer.write_table(table)
+            yield sink.drain()
+        if writer is None:
+            table = pa.Table.from_batches([self.arrow_batch(slice(0, 0), columns, names)])
+            writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), table.schema)
+        writer.close()
+        yield sink.drain()
+
+
+_stores: Dict[str, ColumnStore] = {}
+_store_lock = threading.Lock()
+
+
+def get_column_store(df: pd.DataFrame) -> ColumnStore:
+    """
+    ColumnStore for a DataFrame, cached by dataset version.
+
+    Args:
+        df: Grid data DataFrame
+
+    Returns:
+        Shared ColumnStore
+    """
+    from app.data_loader import get_dataset_version
+
+    version = get_dataset_version(df)
+    with _store_lock:
+        store = _stores.get(version)
+        if store is None:
+            _stores.clear()
+            store = _stores[version] = ColumnStore(df)
+        return store
@@ -0,0 +1,84 @@
+"""
+HTTP Metrics
+Per-route request counts, latency histograms and response sizes
+
+A plain ASGI middleware (not BaseHTTPMiddleware), so streaming responses
+such as the SSE endpoints pass through unbuffered. Requests are labelled
+with the route template (/api/grid/status/{timestamp}, not every concrete
+timestamp), which keeps the number of series bounded; requests that match
+no route share the "unmatched" label.
+
+The cost per request is two perf_counter calls and three registry updates;
+everything else happens when /metrics is scraped.
+
+Configuration:
+    METRICS_ENABLED   Set to "0" to skip the middleware (default: 1)
+"""
+
+import os
+import time
+
+from starlette.routing import Mount
+
+from app.metrics import registry, FAST_LATENCY_BUCKETS, SIZE_BUCKETS
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+requests_total = registry.counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Time from request to the last response byte",
+    FAST_LATENCY_BUCKETS, ("method", "route"))
+response_bytes = registry.histogram(
+    "http_response_size_bytes", "Response body size", SIZE_BUCKETS, ("method", "route"))
+# Only touched on the event loop thread, so a plain int (read at scrape time)
+_in_flight = 0
+registry.gauge("http_requests_in_flight", "HTTP requests being served", function=lambda: _in_flight)
+
+
+def route_label(scope) -> str:
+    """Route template of a handled request ("unmatched" when none matched)."""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return "unmatched"
+    if isinstance(route, Mount):
+        # Matched the mount but none of the mounted app's routes
+        return scope.get("root_path") or path
+    # Routes inside a mounted app (the Chainlit UI) are relative to the mount
+    return scope.get("root_path", "") + path
+
+
+class HTTPMetricsMiddleware:
+    """ASGI middleware recording http_* metrics for every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status, size = 500, 0
+
+        async def send_and_measure(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        global _in_flight
+        _in_flight += 1
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            _in_flight -= 1
+            method, route = scope["method"], route_label(scope)
+            requests_total.inc(1, method, route, status)
+            request_seconds.observe(time.perf_counter() - start, method, route)
+            response_bytes.observe(size, method, route)
@@ -0,0 +1,433 @@
+"""
+Telemetry Ingestion
+Validated row batches into a ring buffer, scored inline, flushed to the dataset
+
+POST /api/grid/ingest takes NDJSON (one row object per line, dataset
+column names) or an Arrow IPC stream. A batch is parsed into column
+arrays, validated as a whole (timestamps parseable, strictly increasing and
+after the last known row; numeric values; grid frequency present), scored
+and appended:
+
+    IncrementalZScore   The loader's rolling Z-Score (window of 60 rows,
+                        |Z| > 3 or frequency < 49.8 Hz) computed for the
+                        batch from the previous 59 frequencies plus the
+                        batch, with cumulative sums instead of a re-scan
+    RingBuffer          Fixed-capacity column arrays (one per column plus
+                        epoch-ns timestamps) holding the hot window; rows
+                        are written with at most two slice assignments
+
+Scored rows go to the live telemetry stream right away, so anomaly alerts
+don't wait for a flush. Pending rows are flushed to the in-memory dataset
+every INGEST_FLUSH_SECONDS, or early when the buffer is half full of
+unflushed rows. A flush produces a new DataFrame, so the column store,
+indexes and response caches keyed by the dataset version pick it up.
+
+Ingestion runs on the event loop thread (like the other handlers), so the
+buffer and detector state need no locking.
+
+Configuration:
+    INGEST_CAPACITY        Ring buffer rows (default: 100000)
+    INGEST_FLUSH_SECONDS   Seconds between flushes (default: 5)
+"""
+
+import io
+import json
+import os
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.data_loader import detector_pass_seconds, detector_rows_total
+from app.grid_serialization import TIMESTAMP_FORMAT, orjson, parse_timestamps
+
+
+INGEST_CAPACITY = int(os.getenv("INGEST_CAPACITY", "100000"))
+INGEST_FLUSH_SECONDS = float(os.getenv("INGEST_FLUSH_SECONDS", "5"))
+
+# Rows accepted per request
+MAX_INGEST_ROWS = 100_000
+
+# Detector parameters (same as load_data)
+ZSCORE_WINDOW = 60
+ZSCORE_THRESHOLD = 3.0
+MIN_FREQUENCY = 49.8
+
+FREQUENCY_COLUMN = 'Grid Frequency (Hz)'
+
+# Measurement columns accepted per row; all but the frequency are optional
+INGEST_COLUMNS = [
+    'Grid Frequency (Hz)', 'Solar PV Output (kW)', 'Wind Power Output (kW)',
+    'Cloud Cover (%)', 'Wind Speed (m/s)', 'Temperature (C)', 'Humidity (%)',
+    'Curtailment Event Flag'
+]
+
+
+class IngestError(ValueError):
+    """Raised when a batch is malformed or fails validation."""
+
+
+# ----------------------------------------------------------------------
+# Parsing and validation
+# ----------------------------------------------------------------------
+
+def parse_ndjson(body: bytes) -> Dict[str, list]:
+    """
+    Column lists of an NDJSON batch.
+
+    The lines are decoded in one call as a JSON array; only when that fails
+    are they decoded one by one to report the offending line.
+
+    Raises:
+        IngestError: On invalid JSON or a line that is not an object
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    lines = [line for line in body.splitlines() if line.strip()]
+    try:
+        rows = loads(b"[" + b",".join(lines) + b"]")
+    except ValueError:
+        rows = None
+    if rows is None or len(rows) != len(lines) or not all(type(row) is dict for row in rows):
+        for number, line in enumerate(lines, 1):
+            try:
+                row = loads(line)
+            except ValueError as e:
+                raise IngestError(f"Line {number}: invalid JSON ({e})")
+            if not isinstance(row, dict):
+                raise IngestError(f"Line {number}: expected a JSON object")
+        raise IngestError("Each line must hold exactly one JSON object")
+
+    # Keys in first-seen order; a key missing from a row reads as null
+    keys = dict.fromkeys(key for row in rows[:1] for key in row)
+    for row in rows:
+        if len(row) != len(keys) or not keys.keys() >= row.keys():
+            keys.update(dict.fromkeys(row))
+    return {key: [row.get(key) for row in rows] for key in keys}
+
+
+def parse_arrow(body: bytes) -> Dict[str, Any]:
+    """
+    Column arrays of an Arrow IPC stream.
+
+    Raises:
+        IngestError: When pyarrow is missing or the stream is invalid
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise IngestError("Arrow ingestion requires pyarrow (pip install pyarrow)")
+    try:
+        table = pa.ipc.open_stream(io.BytesIO(body)).read_all()
+    except (pa.ArrowInvalid, OSError) as e:
+        raise IngestError(f"Invalid Arrow IPC stream: {e}")
+    columns = {}
+    for name in table.column_names:
+        column = table.column(name)
+        if pa.types.is_timestamp(column.type):
+            columns[name] = column.cast(pa.timestamp('ns')).to_numpy(zero_copy_only=False)
+        else:
+            columns[name] = column.to_numpy(zero_copy_only=False)
+    return columns
+
+
+def validate_batch(columns: Dict[str, Any], after_ns: Optional[int] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Timestamps and float measurement arrays of a parsed batch.
+
+    Args:
+        columns: Parsed columns ("Timestamp" plus INGEST_COLUMNS)
+        after_ns: Timestamps must be later than this (last known row)
+
+    Returns:
+        (epoch-ns timestamps, column -> float64 values, NaN when missing)
+
+    Raises:
+        IngestError: Describing the first problem found
+    """
+    if not columns:
+        raise IngestError("Batch contains no rows")
+    unknown = [name for name in columns if name != 'Timestamp' and name not in INGEST_COLUMNS]
+    if unknown:
+        raise IngestError(f"Unknown columns: {', '.join(unknown)}")
+    if 'Timestamp' not in columns:
+        raise IngestError("Missing required column: Timestamp")
+    if FREQUENCY_COLUMN not in columns:
+        raise IngestError(f"Missing required column: {FREQUENCY_COLUMN}")
+
+    raw = columns['Timestamp']
+    count = len(raw)
+    if count == 0:
+        raise IngestError("Batch contains no rows")
+    if count > MAX_INGEST_ROWS:
+        raise IngestError(f"Batch exceeds {MAX_INGEST_ROWS} rows")
+
+    if isinstance(raw, np.ndarray) and raw.dtype.kind == 'M':
+        ts = raw.astype('datetime64[ns]').view(np.int64)
+        invalid = np.flatnonzero(np.isnat(raw))
+    else:
+        ts, invalid = parse_timestamps(raw)
+    if len(invalid):
+        raise IngestError(f"Row {invalid[0]}: invalid timestamp {raw[invalid[0]]!r}")
+    unordered = np.flatnonzero(np.diff(ts) <= 0)
+    if len(unordered):
+        raise IngestError(f"Row {unordered[0] + 1}: timestamps must be strictly increasing")
+    if after_ns is not None and ts[0] <= after_ns:
+        raise IngestError(
+            f"Row 0: timestamp {pd.Timestamp(ts[0]).strftime(TIMESTAMP_FORMAT)} is not after "
+            f"the last row ({pd.Timestamp(after_ns).strftime(TIMESTAMP_FORMAT)})"
+        )
+
+    values = {}
+    for name in INGEST_COLUMNS:
+        if name not in columns:
+            values[name] = np.full(count, np.nan)
+            continue
+        try:
+            # null becomes NaN; numeric strings are accepted
+            values[name] = np.asarray(columns[name], dtype=float)
+        except (ValueError, TypeError):
+            values[name] = None
+        if values[name] is None or values[name].shape != (count,):
+            raise IngestError(f"Column '{name}': values must be numbers")
+    missing = np.flatnonzero(np.isnan(values[FREQUENCY_COLUMN]))
+    if len(missing):
+        raise IngestError(f"Row {missing[0]}: {FREQUENCY_COLUMN} is required")
+    return ts, values
+
+
+# ----------------------------------------------------------------------
+# Detector and buffer
+# ----------------------------------------------------------------------
+
+class IncrementalZScore:
+    """
+    Rolling Z-Score over the last `window` frequencies, batch at a time.
+
+    Matches load_data: rolling mean and sample std with min_periods=1, the
+    current value included in its own window.
+    """
+
+    def __init__(self, window: int = ZSCORE_WINDOW):
+        self.window = window
+        self._tail = np.empty(0)
+        self.rows_scored = 0
+
+    def seed(self, frequencies: np.ndarray):
+        """Continue from existing data (its last window - 1 values)."""
+        self._tail = np.asarray(frequencies, dtype=float)[-(self.window - 1):].copy()
+
+    def score(self, frequencies: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Z-Scores and anomaly flags of the next values.
+
+        Returns:
+            (z_scores, is_anomaly)
+        """
+        start = time.perf_counter()
+        values = np.concatenate((self._tail, frequencies))
+        # Centre on the first value to keep the sum of squares well conditioned
+        centred = values - values[0]
+        sums = np.concatenate(([0.0], np.cumsum(centred)))
+        squares = np.concatenate(([0.0], np.cumsum(centred * centred)))
+
+        ends = np.arange(len(self._tail) + 1, len(values) + 1)
+        starts = np.maximum(0, ends - self.window)
+        n = ends - starts
+        total = sums[ends] - sums[starts]
+        mean = total / n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = (squares[ends] - squares[starts] - total * mean) / (n - 1)
+            std = np.sqrt(np.maximum(variance, 0.0))
+            z = (centred[ends - 1] - mean) / std
+        # A single value has no sample std (NaN in pandas)
+        z[n < 2] = np.nan
+
+        self._tail = values[-(self.window - 1):].copy()
+        self.rows_scored += len(frequencies)
+        is_anomaly = (np.abs(np.nan_to_num(z)) > ZSCORE_THRESHOLD) | (frequencies < MIN_FREQUENCY)
+        detector_pass_seconds.observe(time.perf_counter() - start, "incremental_zscore")
+        detector_rows_total.inc(len(frequencies), "incremental_zscore")
+        return z, is_anomaly
+
+
+class RingBuffer:
+    """
+    Fixed-capacity column arrays, oldest rows overwritten first.
+
+    Args:
+        capacity: Rows held
+        columns: Float column names
+    """
+
+    def __init__(self, capacity: int, columns: List[str]):
+        self.capacity = max(1, capacity)
+        self.timestamps = np.zeros(self.capacity, dtype=np.int64)
+        self.columns = {name: np.full(self.capacity, np.nan) for name in columns}
+        self.size = 0
+        self.total = 0
+        self.pending = 0
+        self.overwritten = 0
+        self._head = 0
+
+    def append(self, timestamps: np.ndarray, values: Dict[str, np.ndarray]):
+        """Append rows (only the last `capacity` are kept)."""
+        count = len(timestamps)
+        skip = max(0, count - self.capacity)
+        if self.pending + count > self.capacity:
+            self.overwritten += self.pending + count - self.capacity
+        for target, source in [(self.timestamps, timestamps)] + [
+                (self.columns[name], values[name]) for name in self.columns]:
+            self._write(target, source[skip:])
+        written = count - skip
+        self._head = (self._head + written) % self.capacity
+        self.size = min(self.capacity, self.size + written)
+        self.pending = min(self.capacity, self.pending + count)
+        self.total += count
+
+    def _write(self, target: np.ndarray, source: np.ndarray):
+        first = min(len(source), self.capacity - self._head)
+        target[self._head:self._head + first] = source[:first]
+        target[:len(source) - first] = source[first:]
+
+    def last(self, count: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """The newest `count` rows in time order (copies)."""
+        count = min(count, self.size)
+        positions = (self._head - count + np.arange(count)) % self.capacity
+        return self.timestamps[positions], {name: values[positions] for name, values in self.columns.items()}
+
+    def take_pending(self) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Rows appended since the last call, marking them flushed."""
+        rows = self.last(self.pending)
+        self.pending = 0
+        return rows
+
+
+class GridIngestor:
+    """
+    Ingestion pipeline: validate, score, buffer, publish, flush.
+
+    Args:
+        df: Dataset the ingested rows extend (seeds the detector)
+        capacity: Ring buffer rows
+    """
+
+    def __init__(self, df: pd.DataFrame, capacity: int = INGEST_CAPACITY):
+        self.buffer = RingBuffer(capacity, INGEST_COLUMNS + ['Z_Score', 'Is_Anomaly'])
+        self.detector = IncrementalZScore()
+        self.detector.seed(df[FREQUENCY_COLUMN].to_numpy(dtype=float))
+        self.last_ns: Optional[int] = int(df.index.as_unit('ns').asi8[-1]) if len(df) else None
+        self.batches = 0
+        self.rejected = 0
+        self.anomalies = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.last_flush: Optional[float] = None
+        self.ingest_seconds = 0.0
+
+    def ingest(self, columns: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate, score and buffer one parsed batch.
+
+        Returns:
+            Batch summary plus "rows" (the stream payloads of the batch)
+
+        Raises:
+            IngestError: When the batch fails validation (nothing is kept)
+        """
+        start = time.perf_counter()
+        try:
+            ts, values = validate_batch(columns, self.last_ns)
+        except IngestError:
+            self.rejected += 1
+            raise
+        z, is_anomaly = self.detector.score(values[FREQUENCY_COLUMN])
+        values['Z_Score'], values['Is_Anomaly'] = z, is_anomaly.astype(float)
+        self.buffer.append(ts, values)
+        self.last_ns = int(ts[-1])
+        self.batches += 1
+        anomalies = int(is_anomaly.sum())
+        self.anomalies += anomalies
+        self.ingest_seconds += time.perf_counter() - start
+
+        timestamps = pd.DatetimeIndex(ts).strftime(TIMESTAMP_FORMAT).tolist()
+        return {
+            "accepted": len(ts),
+            "anomalies": anomalies,
+            "anomaly_timestamps": [timestamps[i] for i in np.flatnonzero(is_anomaly).tolist()],
+            "first": timestamps[0],
+            "last": timestamps[-1],
+            "pending": self.buffer.pending,
+            "rows": self._stream_rows(timestamps, values, is_anomaly)
+        }
+
+    @staticmethod
+    def _stream_rows(timestamps: List[str], values: Dict[str, np.ndarray],
+                     is_anomaly: np.ndarray) -> List[Dict[str, Any]]:
+        from app.grid_serialization import to_json_list
+        from app.telemetry_stream import ROW_FIELDS
+
+        fields = {name: to_json_list(values[col]) for name, col in ROW_FIELDS.items() if col != 'Is_Anomaly'}
+        fields['is_anomaly'] = is_anomaly.tolist()
+        keys = ["timestamp"] + list(fields)
+        return [dict(zip(keys, row)) for row in zip(timestamps, *fields.values())]
+
+    @property
+    def needs_flush(self) -> bool:
+        return self.buffer.pending >= self.buffer.capacity // 2
+
+    def flush(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        The dataset extended with the pending rows (df itself when none).
+
+        Columns of df the ingest doesn't carry are left empty; integer and
+        boolean columns keep their dtype when the new rows have no gaps.
+        """
+        return self.extend(df, self.take_pending())
+
+    def take_pending(self) -> Optional[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+        """
+        Copy the pending rows out of the ring buffer (None when there are none).
+
+        Cheap and must run on the thread that ingests; extend() can then run
+        elsewhere (the server builds the new frame off the event loop).
+        """
+        if not self.buffer.pending:
+            return None
+        return self.buffer.take_pending()
+
+    def extend(self, df: pd.DataFrame,
+               rows: Optional[Tuple[np.ndarray, Dict[str, np.ndarray]]]) -> pd.DataFrame:
+        """The dataset extended with rows from take_pending() (df itself for None)."""
+        if rows is None:
+            return df
+        ts, values = rows
+        new = pd.DataFrame(values, index=pd.DatetimeIndex(ts.view('datetime64[ns]'), name=df.index.name))
+        new['Is_Anomaly'] = new['Is_Anomaly'].astype(bool)
+        new = new.reindex(columns=df.columns)
+        dtypes = {col: dtype for col, dtype in df.dtypes.items()
+                  if dtype.kind in 'iub' and not new[col].isna().any()}
+        combined = pd.concat([df, new.astype(dtypes)])
+        self.flushes += 1
+        self.rows_flushed += len(new)
+        self.last_flush = time.time()
+        return combined
+
+    def stats(self) -> Dict[str, Any]:
+        """Buffer fill, counters and mean validation + scoring time per row."""
+        return {
+            "capacity": self.buffer.capacity,
+            "buffered": self.buffer.size,
+            "pending": self.buffer.pending,
+            "overwritten_unflushed": self.buffer.overwritten,
+            "rows_ingested": self.buffer.total,
+            "batches": self.batches,
+            "rejected_batches": self.rejected,
+            "anomalies": self.anomalies,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "last_flush": self.last_flush,
+            "last_timestamp": pd.Timestamp(self.last_ns).strftime(TIMESTAMP_FORMAT) if self.last_ns else None,
+            "ingest_us_per_row": round(self.ingest_seconds / self.buffer.total * 1e6, 3)
+            if self.buffer.total else None
+        }
@@ -0,0 +1,362 @@
+"""
+Ollama Client Lifecycle Module
+Warm-up, keep-alive, connection reuse and per-call timing for local inference
+
+Configuration is read from environment variables so the same code can target
+a real Ollama server or a local stub:
+    OLLAMA_BASE_URL     Server URL (default: http://localhost:11434)
+    OLLAMA_SMALL_MODEL  Model for short factual queries (default: llama3.2:3b-instruct-q4_K_M)
+    OLLAMA_KEEP_ALIVE   How long Ollama keeps the model in RAM (default: 30m)
+    OLLAMA_NUM_CTX      Context window in tokens (default: 4096)
+    OLLAMA_NUM_PREDICT  Max generated tokens per call (default: 512)
+    OLLAMA_TIMEOUT      HTTP timeout in seconds (default: 120)
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.circuit_breaker import CircuitBreaker, llm_breaker
+from app.metrics import registry, LATENCY_BUCKETS
+
+
+DEFAULT_MODEL = "llama3:8b-instruct-q4_K_M"
+SMALL_MODEL = os.getenv("OLLAMA_SMALL_MODEL", "llama3.2:3b-instruct-q4_K_M")
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "512"))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+
+# Connection pool shared by every HTTP client talking to Ollama
+POOL_LIMITS = httpx.Limits(max_connections=8, max_keepalive_connections=4, keepalive_expiry=300)
+
+# Ollama reports durations in nanoseconds
+_NS_PER_MS = 1_000_000
+
+
+def client_kwargs(timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Keyword arguments for the httpx client inside ChatOllama.
+
+    Args:
+        timeout: HTTP timeout in seconds (default: OLLAMA_TIMEOUT)
+
+    Returns:
+        Dictionary with timeout and connection pool limits
+    """
+    return {"timeout": timeout or OLLAMA_TIMEOUT, "limits": POOL_LIMITS}
+
+
+_http_client: Optional[httpx.Client] = None
+_http_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Get the shared pooled HTTP client for direct Ollama API calls.
+
+    Returns:
+        httpx.Client bound to OLLAMA_BASE_URL
+    """
+    global _http_client
+    with _http_lock:
+        if _http_client is None or _http_client.is_closed:
+            _http_client = httpx.Client(base_url=OLLAMA_BASE_URL, **client_kwargs())
+        return _http_client
+
+
+def close_http_client():
+    """Close the shared HTTP client (called on server shutdown)."""
+    global _http_client
+    with _http_lock:
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+
+
+def model_available(model: str) -> bool:
+    """
+    Whether Ollama has a model installed (listed by /api/tags).
+
+    Returns:
+        False as well when Ollama is unreachable
+    """
+    try:
+        response = get_http_client().get("/api/tags", timeout=5)
+        response.raise_for_status()
+        models = response.json().get("models", [])
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"[LLM CLIENT] Could not list models: {e}")
+        return False
+    names = {name for m in models for name in (m.get("name"), m.get("model")) if name}
+    return model in names or f"{model}:latest" in names
+
+
+# Ollama's own default when keep_alive cannot be parsed
+_DEFAULT_KEEP_ALIVE_SECONDS = 300.0
+
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def keep_alive_seconds(keep_alive: str) -> float:
+    """
+    Parse an Ollama keep_alive value ("30m", "1h30m", "300", "-1").
+
+    Returns:
+        Seconds (inf for a negative value, which keeps the model loaded)
+    """
+    value = str(keep_alive).strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        parts = re.findall(r'(-?\d+(?:\.\d+)?)(ms|s|m|h)', value)
+        if not parts or ''.join(n + u for n, u in parts) != value:
+            return _DEFAULT_KEEP_ALIVE_SECONDS
+        seconds = sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+    return float("inf") if seconds < 0 else seconds
+
+
+# Model -> time until which Ollama keeps it loaded (last use + keep-alive)
+_warm_models: Dict[str, float] = {}
+
+
+def mark_warm(model: str, keep_alive: str = OLLAMA_KEEP_ALIVE):
+    """Record that a model was just used, restarting its keep-alive period."""
+    _warm_models[model] = time.time() + keep_alive_seconds(keep_alive)
+
+
+def warm_up(model: str = DEFAULT_MODEL, keep_alive: str = OLLAMA_KEEP_ALIVE) -> Dict[str, Any]:
+    """
+    Load a model into Ollama memory so the first real question is fast.
+
+    An empty prompt makes Ollama load the model and return immediately
+    without generating tokens.
+
+    Args:
+        model: Ollama model name
+        keep_alive: How long Ollama should keep the model loaded
+
+    Returns:
+        Dictionary with warm-up status and load timings
+    """
+    print(f"[LLM CLIENT] Warming up model: {model} (keep_alive={keep_alive})")
+    start = time.perf_counter()
+    try:
+        response = get_http_client().post(
+            "/api/generate",
+            json={"model": model, "prompt": "", "keep_alive": keep_alive, "stream": False}
+        )
+        response.raise_for_status()
+        body = response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"[LLM CLIENT] Warm-up failed: {e}")
+        return {"model": model, "ready": False, "error": str(e)}
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    mark_warm(model, keep_alive)
+    print(f"[LLM CLIENT] Model ready in {elapsed_ms:.0f} ms")
+
+    return {
+        "model": model,
+        "ready": True,
+        "elapsed_ms": round(elapsed_ms, 1),
+        "load_duration_ms": round(body.get("load_duration", 0) / _NS_PER_MS, 1)
+    }
+
+
+def is_warm(model: str = DEFAULT_MODEL) -> bool:
+    """
+    Check whether a model was used by this process within its keep-alive period.
+
+    After that Ollama unloads it, so the next call pays the load again.
+    """
+    return _warm_models.get(model, 0.0) > time.time()
+
+
+llm_phase_seconds = registry.histogram(
+    "llm_phase_seconds", "Ollama-reported duration of one call by phase", LATENCY_BUCKETS, ("model", "phase"))
+llm_tokens_total = registry.counter(
+    "llm_tokens_total", "Tokens evaluated (prompt) and generated (completion)", ("model", "kind"))
+
+
+class LLMTimingStats:
+    """
+    Thread-safe recorder of Ollama timings reported per call.
+
+    Keeps running totals per model and the most recent calls for inspection.
+    """
+
+    def __init__(self, history: int = 100):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=history)
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Number of LLM calls currently waiting on Ollama."""
+        return self._in_flight
+
+    def call_started(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def call_finished(self):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def record(self, model: str, info: Dict[str, Any]):
+        """
+        Record one call from an Ollama response body.
+
+        Args:
+            model: Model name that served the call
+            info: Ollama response metadata (durations in nanoseconds)
+        """
+        entry = {
+            "model": model,
+            "load_ms": info.get("load_duration", 0) / _NS_PER_MS,
+            "prompt_eval_ms": info.get("prompt_eval_duration", 0) / _NS_PER_MS,
+            "eval_ms": info.get("eval_duration", 0) / _NS_PER_MS,
+            "total_ms": info.get("total_duration", 0) / _NS_PER_MS,
+            "prompt_tokens": int(info.get("prompt_eval_count", 0) or 0),
+            "completion_tokens": int(info.get("eval_count", 0) or 0)
+        }
+        for phase in ("load", "prompt_eval", "eval", "total"):
+            llm_phase_seconds.observe(entry[f"{phase}_ms"] / 1000, model, phase)
+        llm_tokens_total.inc(entry["prompt_tokens"], model, "prompt")
+        llm_tokens_total.inc(entry["completion_tokens"], model, "completion")
+        with self._lock:
+            self._recent.append(entry)
+            totals = self._totals.setdefault(model, {
+                "calls": 0, "load_ms": 0.0, "prompt_eval_ms": 0.0, "eval_ms": 0.0,
+                "total_ms": 0.0, "prompt_tokens": 0, "completion_tokens": 0
+            })
+            totals["calls"] += 1
+            for key in ("load_ms", "prompt_eval_ms", "eval_ms", "total_ms",
+                        "prompt_tokens", "completion_tokens"):
+                totals[key] += entry[key]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarize recorded timings.
+
+        Returns:
+            Dictionary with per-model averages and the most recent call
+        """
+        with self._lock:
+            models = {}
+            for model, totals in self._totals.items():
+                calls = totals["calls"] or 1
+                models[model] = {
+                    "calls": totals["calls"],
+                    "avg_load_ms": round(totals["load_ms"] / calls, 1),
+                    "avg_prompt_eval_ms": round(totals["prompt_eval_ms"] / calls, 1),
+                    "avg_eval_ms": round(totals["eval_ms"] / calls, 1),
+                    "avg_total_ms": round(totals["total_ms"] / calls, 1),
+                    "avg_prompt_tokens": round(totals["prompt_tokens"] / calls, 1),
+                    "avg_completion_tokens": round(totals["completion_tokens"] / calls, 1)
+                }
+            last = dict(self._recent[-1]) if self._recent else None
+        return {"models": models, "last_call": last}
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """Return a copy of the most recent call entries."""
+        with self._lock:
+            return list(self._recent)
+
+    def reset(self):
+        """Clear all recorded timings."""
+        with self._lock:
+            self._recent.clear()
+            self._totals.clear()
+
+
+# Process-wide timing recorder
+llm_timings = LLMTimingStats()
+
+registry.gauge("llm_calls_in_flight", "LLM calls waiting on Ollama", function=lambda: llm_timings.in_flight)
+
+
+def ollama_response_info(response: LLMResult) -> List[Dict[str, Any]]:
+    """
+    Ollama metadata (durations, token counts, model) of every generation.
+
+    ChatOllama puts it in generation_info or in the message's
+    response_metadata depending on the langchain-ollama version.
+    """
+    infos = []
+    for generations in response.generations:
+        for generation in generations:
+            info = generation.generation_info or {}
+            if "eval_count" not in info and hasattr(generation, "message"):
+                info = generation.message.response_metadata or {}
+            infos.append(info)
+    return infos
+
+
+class OllamaTimingCallback(BaseCallbackHandler):
+    """
+    LangChain callback that records Ollama timings from every LLM response
+    and reports call outcomes to the circuit breaker.
+
+    Args:
+        stats: Timing recorder
+        breaker: Breaker the call outcomes are reported to
+        count_read_timeouts: Report read timeouts as failures. Off for LLMs
+            whose timeout is a latency budget (the routing SLA): a slow
+            answer there is escalated, it doesn't mean Ollama is down.
+    """
+
+    def __init__(self, stats: LLMTimingStats = llm_timings, breaker: CircuitBreaker = llm_breaker,
+                 count_read_timeouts: bool = True):
+        self.stats = stats
+        self.breaker = breaker
+        self.count_read_timeouts = count_read_timeouts
+        self._starts: Dict[Any, float] = {}
+
+    def _call_started(self, run_id: Any):
+        self._starts[run_id] = time.perf_counter()
+        self.stats.call_started()
+
+    def _elapsed_ms(self, run_id: Any) -> float:
+        start = self._starts.pop(run_id, None)
+        return (time.perf_counter() - start) * 1000 if start is not None else 0.0
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+        self._call_started(kwargs.get("run_id"))
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[Any], **kwargs: Any) -> None:
+        self._call_started(kwargs.get("run_id"))
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        self._elapsed_ms(kwargs.get("run_id"))
+        self.stats.call_finished()
+        if self.count_read_timeouts or not isinstance(error, httpx.ReadTimeout):
+            self.breaker.record_failure(error)
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.breaker.record_success(self._elapsed_ms(kwargs.get("run_id")))
+        self.stats.call_finished()
+        for info in ollama_response_info(response):
+            if "model" in info:
+                # ChatOllama calls use OLLAMA_KEEP_ALIVE, which restarts on every call
+                mark_warm(info["model"])
+            if "total_duration" in info:
+                self.stats.record(info.get("model", "unknown"), info)
+
+
+if __name__ == "__main__":
+    import sys
+    model = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_MODEL
+    print(f"Ollama server: {OLLAMA_BASE_URL}")
+    print(warm_up(model))
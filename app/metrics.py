@@ -0,0 +1,235 @@
+"""
+Metrics Registry
+Lightweight in-process counters and histograms
+
+Recording is a dictionary lookup plus a bisect under a lock, so metrics
+can be updated on hot paths; nothing is rendered until a snapshot is
+requested. Values that components already track (cache counters, queue
+depths) are exposed through callback metrics, read only at scrape time.
+
+render_prometheus() produces the Prometheus text exposition format for
+the /metrics endpoint.
+"""
+
+import math
+import threading
+from bisect import bisect_left
+from typing import Dict, Any, Tuple, Sequence, Optional, Callable, List, Union
+
+
+# Default buckets (seconds) for latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# Finer buckets (seconds) for HTTP handlers and in-process passes
+FAST_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Buckets (bytes) for response sizes
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# A callback returns one value, or a mapping of label values -> value
+Callback = Callable[[], Union[float, Dict[Tuple[str, ...], float]]]
+
+
+def _callback_samples(function: Callback) -> Dict[Tuple[str, ...], float]:
+    value = function()
+    if isinstance(value, dict):
+        return {tuple(str(v) for v in key): float(v) for key, v in value.items()}
+    return {(): float(value)}
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callback] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *labelvalues: str):
+        key = tuple(map(str, labelvalues))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Dict[Tuple[str, ...], float]:
+        if self.function is not None:
+            return _callback_samples(self.function)
+        with self._lock:
+            return dict(self._values)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"|".join(k) or "_": v for k, v in self.samples().items()}
+
+
+class Gauge(Counter):
+    """Value that can go up and down, set directly or read from a callback."""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labelvalues: str):
+        key = tuple(map(str, labelvalues))
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, *labelvalues: str):
+        self.inc(-amount, *labelvalues)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        key = tuple(map(str, labelvalues))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> Dict[Tuple[str, ...], Tuple[list, float, int]]:
+        """Per-label cumulative bucket counts, sum and count."""
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        result = {}
+        for key, (counts, total, count) in series.items():
+            cumulative, running = [], 0
+            for c in counts:
+                running += c
+                cumulative.append(running)
+            result[key] = (cumulative, total, count)
+        return result
+
+    def quantile(self, q: float, *labelvalues: str) -> Optional[float]:
+        """Upper bucket bound containing the q-quantile (None without data)."""
+        sample = self.samples().get(tuple(str(v) for v in labelvalues))
+        if not sample or sample[2] == 0:
+            return None
+        cumulative, _, count = sample
+        target = q * count
+        for bound, running in zip(self.buckets + (float("inf"),), cumulative):
+            if running >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict[str, Any]:
+        out = {}
+        for key, (cumulative, total, count) in self.samples().items():
+            out["|".join(key) or "_"] = {
+                "count": count,
+                "sum": round(total, 6),
+                "mean": round(total / count, 6) if count else None,
+                "buckets": {str(b): c for b, c in zip(self.buckets + ("+Inf",), cumulative)}
+            }
+        return out
+
+
+class MetricsRegistry:
+    """Named collection of metrics (get-or-create by name)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = (),
+                function: Optional[Callback] = None) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames, function)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (),
+              function: Optional[Callback] = None) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames, function)
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                  labelnames: Sequence[str] = ()) -> Histogram:
+        return self._get_or_create(Histogram, name, help, buckets, labelnames)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Any]:
+        """JSON-friendly view of every metric whose name starts with prefix."""
+        return {m.name: m.snapshot() for m in self.metrics() if m.name.startswith(prefix)}
+
+    def render_prometheus(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in sorted(self.metrics(), key=lambda m: m.name):
+            try:
+                lines.extend(_render(metric))
+            except Exception as e:
+                # A failing callback must not break the whole scrape
+                lines.append(f"# {metric.name} unavailable: {type(e).__name__}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(int(value)) if float(value).is_integer() and abs(value) < 1e15 else repr(float(value))
+
+
+def _render(metric) -> List[str]:
+    help_text = metric.help.replace("\\", "\\\\").replace("\n", "\\n")
+    lines = [f"# HELP {metric.name} {help_text}", f"# TYPE {metric.name} {metric.kind}"]
+    if metric.kind != "histogram":
+        for key, value in sorted(metric.samples().items()):
+            lines.append(f"{metric.name}{_labels(metric.labelnames, key)} {_number(value)}")
+        return lines
+    bounds = [_number(b) for b in metric.buckets] + ["+Inf"]
+    for key, (cumulative, total, count) in sorted(metric.samples().items()):
+        for bound, running in zip(bounds, cumulative):
+            le = f'le="{bound}"'
+            lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, key, le)} {running}")
+        lines.append(f"{metric.name}_sum{_labels(metric.labelnames, key)} {_number(total)}")
+        lines.append(f"{metric.name}_count{_labels(metric.labelnames, key)} {count}")
+    return lines
+
+
+# Process-wide registry
+registry = MetricsRegistry()
+
+# Shared by the in-process caches (response bodies, anomaly views, query results)
+cache_requests_total = registry.counter(
+    "cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
@@ -0,0 +1,402 @@
+"""
+Offline Ollama Stand-in
+Local stub server speaking the Ollama HTTP API, with record and replay modes
+
+Modes:
+    replay  Serve responses from a JSONL transcript with simulated latency
+            and token rate. Requests without a recorded answer fall back to
+            a scripted ReAct reply so agent runs always terminate.
+    record  Proxy requests to a real Ollama server and append every
+            request/response pair to the transcript.
+
+Usage:
+    python -m app.ollama_stub --mode replay --transcript bench/transcript.jsonl --port 11435
+    python -m app.ollama_stub --mode record --upstream http://localhost:11434
+
+Point the application at the stub with OLLAMA_BASE_URL=http://localhost:11435.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any, List
+
+import httpx
+
+
+DEFAULT_PORT = 11435
+
+# Models listed by /api/tags unless the stub is given its own list
+# (the app's default large and small model)
+STUB_MODELS = ["llama3:8b-instruct-q4_K_M", "llama3.2:3b-instruct-q4_K_M"]
+
+# Rough characters-per-token ratio used to fake prompt token counts
+_CHARS_PER_TOKEN = 4
+
+_TIMESTAMP_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}')
+
+
+def request_key(model: str, messages: List[Dict[str, Any]]) -> str:
+    """
+    Stable key identifying a chat request in a transcript.
+
+    Args:
+        model: Model name
+        messages: Ollama chat messages
+
+    Returns:
+        Hex digest over model, roles and contents
+    """
+    payload = json.dumps(
+        [model] + [[m.get("role"), m.get("content")] for m in messages],
+        ensure_ascii=False
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def scripted_reply(messages: List[Dict[str, Any]]) -> str:
+    """
+    Deterministic ReAct reply used when no recording matches.
+
+    The first step calls a typed analysis tool, the second gives a final
+    answer, so benchmark runs exercise tool execution and parsing.
+
+    Args:
+        messages: Ollama chat messages
+
+    Returns:
+        Assistant message content in ReAct format
+    """
+    prompt = messages[-1].get("content", "") if messages else ""
+    question_start = prompt.rfind("Question:")
+    question = prompt[question_start:] if question_start >= 0 else prompt
+
+    if "Observation:" in question:
+        return "Thought: I now know the final answer\nFinal Answer: Analysis complete (scripted stub reply)."
+
+    match = _TIMESTAMP_PATTERN.search(question)
+    if match:
+        return f"Thought: I should compare with the prior interval\nAction: compare\nAction Input: {match.group(0)}, 1"
+    return "Thought: I should look at the most severe events\nAction: top_events\nAction Input: 5"
+
+
+def stub_embedding(text: str, dim: int = 64) -> List[float]:
+    """
+    Deterministic hashed bag-of-words embedding for /api/embed.
+
+    Args:
+        text: Input text
+        dim: Vector dimension
+
+    Returns:
+        Embedding vector (texts sharing words get similar vectors)
+    """
+    vector = [0.0] * dim
+    for word in re.findall(r'[a-z0-9]+', text.lower()):
+        vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % dim] += 1.0
+    return vector
+
+
+class Transcript:
+    """
+    JSONL transcript of recorded chat exchanges.
+
+    Lookup is by exact request key only. A prompt that differs from the
+    recording (a changed prefix, model or history) is a miss, counted in
+    `misses`, rather than being answered with an unrelated recorded reply.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, Dict[str, Any]] = {}
+        self._ordered: List[Dict[str, Any]] = []
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+            print(f"[OLLAMA STUB] Loaded {len(self._ordered)} recorded exchanges from {path}")
+
+    def _add(self, entry: Dict[str, Any]):
+        self._by_key[entry["key"]] = entry
+        self._ordered.append(entry)
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Find a recorded exchange by key (None when nothing was recorded for it)."""
+        with self._lock:
+            entry = self._by_key.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def append(self, entry: Dict[str, Any]):
+        """Add an exchange and persist it to the transcript file."""
+        with self._lock:
+            self._add(entry)
+            if self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def __len__(self) -> int:
+        return len(self._ordered)
+
+
+class OllamaStub:
+    """
+    Threaded stub server implementing /api/chat, /api/generate, /api/embed,
+    /api/tags and /api/version.
+
+    Args:
+        port: Port to listen on (0 picks a free port)
+        mode: "replay" or "record"
+        transcript_path: JSONL transcript to read (replay) or append to (record)
+        upstream: Real Ollama URL used in record mode
+        latency_ms: Simulated prompt-evaluation delay before the first token
+        tokens_per_sec: Simulated generation rate (0 = instant)
+        model_overrides: Per-model behaviour, e.g.
+            {"llama3.2:3b": {"latency_ms": 500, "reply": "unparseable text"}}
+            to exercise model routing and escalation
+        models: Model names listed by /api/tags (default: STUB_MODELS
+            plus the model_overrides keys)
+    """
+
+    def __init__(
+        self,
+        port: int = DEFAULT_PORT,
+        mode: str = "replay",
+        transcript_path: Optional[str] = None,
+        upstream: str = "http://localhost:11434",
+        latency_ms: float = 0.0,
+        tokens_per_sec: float = 0.0,
+        model_overrides: Optional[Dict[str, Dict[str, Any]]] = None,
+        models: Optional[List[str]] = None
+    ):
+        if mode not in ("replay", "record"):
+            raise ValueError(f"Unknown stub mode: {mode}")
+        self.mode = mode
+        self.transcript = Transcript(transcript_path)
+        self.upstream = upstream
+        self.latency_ms = latency_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.model_overrides = model_overrides or {}
+        if models is None:
+            models = STUB_MODELS + [m for m in self.model_overrides if m not in STUB_MODELS]
+        self.models = models
+        self.requests_served = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "OllamaStub":
+        """Serve in a daemon thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"[OLLAMA STUB] {self.mode} mode listening on {self.url}")
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "OllamaStub":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # Chat handling
+    # ------------------------------------------------------------------
+
+    def _record(self, body: Dict[str, Any], key: str) -> Dict[str, Any]:
+        """Forward a chat request upstream and record the exchange."""
+        forwarded = dict(body, stream=False)
+        with httpx.Client(base_url=self.upstream, timeout=600) as client:
+            response = client.post("/api/chat", json=forwarded)
+            response.raise_for_status()
+            result = response.json()
+
+        metrics = {k: v for k, v in result.items() if k.endswith("_duration") or k.endswith("_count")}
+        self.transcript.append({
+            "key": key,
+            "model": body.get("model"),
+            "messages": body.get("messages", []),
+            "response": result.get("message", {}).get("content", ""),
+            "metrics": metrics
+        })
+        return result
+
+    def _replay_content(self, body: Dict[str, Any], key: str) -> str:
+        override = self.model_overrides.get(body.get("model", ""), {})
+        if "reply" in override:
+            return override["reply"]
+        entry = self.transcript.lookup(key)
+        if entry is not None:
+            return entry["response"]
+        return scripted_reply(body.get("messages", []))
+
+    def _timed_chunks(self, content: str):
+        """Yield whitespace-delimited tokens at the configured token rate."""
+        tokens = re.findall(r'\S+\s*|\s+', content) or [""]
+        delay = 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+        for token in tokens:
+            if delay:
+                time.sleep(delay)
+            yield token
+
+    def _final_metrics(self, model: str, prompt_chars: int, tokens: int,
+                       prompt_ns: int, eval_ns: int) -> Dict[str, Any]:
+        return {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": prompt_ns + eval_ns,
+            "load_duration": 0,
+            "prompt_eval_count": max(1, prompt_chars // _CHARS_PER_TOKEN),
+            "prompt_eval_duration": prompt_ns,
+            "eval_count": tokens,
+            "eval_duration": eval_ns
+        }
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload: Dict[str, Any], status: int = 200):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _write_chunk(self, payload: Dict[str, Any]):
+                data = (json.dumps(payload) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path == "/api/version":
+                    self._send_json({"version": "stub"})
+                elif self.path == "/api/tags":
+                    self._send_json({"models": [{"name": m, "model": m} for m in stub.models]})
+                else:
+                    self._send_json({"error": "not found"}, status=404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                stub.requests_served += 1
+
+                if self.path == "/api/generate":
+                    # Warm-up / load request: nothing to load
+                    self._send_json({"model": body.get("model"), "response": "", "done": True,
+                                     "load_duration": 0, "total_duration": 0})
+                elif self.path == "/api/chat":
+                    self._chat(body)
+                elif self.path == "/api/embed":
+                    inputs = body.get("input", [])
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    self._send_json({"model": body.get("model"),
+                                     "embeddings": [stub_embedding(text) for text in inputs]})
+                else:
+                    self._send_json({"error": "not found"}, status=404)
+
+            def _chat(self, body: Dict[str, Any]):
+                model = body.get("model", "")
+                messages = body.get("messages", [])
+                key = request_key(model, messages)
+                prompt_chars = sum(len(m.get("content") or "") for m in messages)
+
+                if stub.mode == "record":
+                    try:
+                        result = stub._record(body, key)
+                    except httpx.HTTPError as e:
+                        self._send_json({"error": f"upstream error: {e}"}, status=502)
+                        return
+                    self._send_json(result)
+                    return
+
+                start = time.perf_counter_ns()
+                latency_ms = stub.model_overrides.get(model, {}).get("latency_ms", stub.latency_ms)
+                if latency_ms:
+                    time.sleep(latency_ms / 1000)
+                prompt_ns = time.perf_counter_ns() - start
+                content = stub._replay_content(body, key)
+
+                if not body.get("stream", True):
+                    tokens = list(stub._timed_chunks(content))
+                    eval_ns = time.perf_counter_ns() - start - prompt_ns
+                    result = stub._final_metrics(model, prompt_chars, len(tokens), prompt_ns, eval_ns)
+                    result["message"] = {"role": "assistant", "content": content}
+                    self._send_json(result)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                created = datetime.now(timezone.utc).isoformat()
+                count = 0
+                for token in stub._timed_chunks(content):
+                    count += 1
+                    self._write_chunk({"model": model, "created_at": created, "done": False,
+                                       "message": {"role": "assistant", "content": token}})
+                eval_ns = time.perf_counter_ns() - start - prompt_ns
+                final = stub._final_metrics(model, prompt_chars, count, prompt_ns, eval_ns)
+                final["message"] = {"role": "assistant", "content": ""}
+                self._write_chunk(final)
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline Ollama stand-in (record/replay)")
+    parser.add_argument("--mode", choices=["replay", "record"], default="replay")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--transcript", default=None, help="JSONL transcript path")
+    parser.add_argument("--upstream", default="http://localhost:11434", help="Real Ollama URL (record mode)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated prompt-eval latency")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="Simulated generation rate")
+    args = parser.parse_args()
+
+    stub = OllamaStub(
+        port=args.port,
+        mode=args.mode,
+        transcript_path=args.transcript,
+        upstream=args.upstream,
+        latency_ms=args.latency_ms,
+        tokens_per_sec=args.tokens_per_sec
+    )
+    print(f"Set OLLAMA_BASE_URL={stub.url} to use the stub")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
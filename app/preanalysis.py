@@ -0,0 +1,138 @@
+"""
+Speculative Pre-Analysis
+Background analysis of the events operators are most likely to ask about
+
+When a dataset is loaded (or refreshed with new anomalies), the top-K
+anomalies ranked by |Z_Score| and recency, plus the first anomaly used by
+the chat's suggested question, are queued as background jobs on the
+AnalysisJobManager. Background jobs only run while no interactive analysis
+is pending and Ollama is idle, and their results land in the AnalysisStore,
+so the Chainlit and Streamlit analysis flows can answer instantly.
+
+Configuration:
+    PREANALYSIS        Set to 0 to disable speculative pre-analysis (default: 1)
+    PREANALYSIS_TOP_K  Number of events to pre-analyze (default: 5)
+"""
+
+import os
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.analysis_store import AnalysisStore, get_analysis_store, result_key
+from app.data_loader import get_dataset_version
+
+
+PREANALYSIS_ENABLED = os.getenv("PREANALYSIS", "1") != "0"
+PREANALYSIS_TOP_K = int(os.getenv("PREANALYSIS_TOP_K", "5"))
+
+# Score multiplier for the most recent event relative to the oldest one
+RECENCY_WEIGHT = 1.0
+
+
+def first_anomaly_timestamp(df: pd.DataFrame) -> Optional[str]:
+    """Timestamp of the earliest anomaly (None if there are none)."""
+    positions = np.flatnonzero(df['Is_Anomaly'].to_numpy(dtype=bool))
+    if len(positions) == 0:
+        return None
+    return df.index[positions[0]].strftime('%Y-%m-%d %H:%M:%S')
+
+
+def select_candidates(
+    df: pd.DataFrame,
+    top_k: int = PREANALYSIS_TOP_K,
+    recency_weight: float = RECENCY_WEIGHT
+) -> List[Tuple[str, float]]:
+    """
+    Rank anomalies for speculative analysis.
+
+    Score = (|Z_Score| + 1) * (1 + recency_weight * relative position), so
+    severe and recent events come first. The first anomaly is always
+    included (ranked first) because the chat suggests asking about it.
+
+    Args:
+        df: Grid data DataFrame with Is_Anomaly and Z_Score columns
+        top_k: Number of ranked events to return (besides the first anomaly)
+        recency_weight: Extra weight of the newest event
+
+    Returns:
+        List of (timestamp, score) tuples, best first
+    """
+    positions = np.flatnonzero(df['Is_Anomaly'].to_numpy(dtype=bool))
+    if len(positions) == 0 or top_k <= 0:
+        return []
+
+    z = np.abs(np.nan_to_num(df['Z_Score'].to_numpy(dtype=float)[positions]))
+    recency = positions / max(len(df) - 1, 1)
+    scores = (z + 1.0) * (1.0 + recency_weight * recency)
+
+    k = min(top_k, len(positions))
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best], kind='stable')]
+
+    ranked = [0] + [int(i) for i in best if i != 0]
+    top_score = float(scores.max())
+    candidates = []
+    for rank, i in enumerate(ranked):
+        # The first anomaly gets the top priority, the rest keep their order
+        score = top_score + 1.0 if rank == 0 else float(scores[i])
+        candidates.append((df.index[positions[i]].strftime('%Y-%m-%d %H:%M:%S'), score))
+    return candidates
+
+
+def schedule_preanalysis(manager, top_k: int = PREANALYSIS_TOP_K) -> Dict[str, Any]:
+    """
+    Queue background analyses for the current dataset of a job manager.
+
+    Safe to call repeatedly (e.g., after every refresh): events already in
+    the store or in flight are not queued again.
+
+    Args:
+        manager: AnalysisJobManager bound to the dataset
+        top_k: Number of ranked events to pre-analyze
+
+    Returns:
+        Dictionary with the dataset version and counts of queued / stored jobs
+    """
+    from app.analysis_jobs import QueueFullError
+
+    queued, stored = [], []
+    for timestamp, score in select_candidates(manager.df, top_k):
+        try:
+            job = manager.submit(timestamp=timestamp, priority=score, background=True)
+        except QueueFullError:
+            break
+        (stored if job.cached else queued).append(timestamp)
+
+    if queued:
+        print(f"[PRE-ANALYSIS] Queued {len(queued)} background analyses ({len(stored)} already stored)")
+    return {
+        "dataset_version": manager.dataset_version,
+        "queued": queued,
+        "already_stored": stored
+    }
+
+
+def lookup_analysis(
+    df: pd.DataFrame,
+    timestamp: str,
+    store: Optional[AnalysisStore] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetch a stored (pre-)analysis of an event for the chat UIs.
+
+    Args:
+        df: Grid data DataFrame the analysis must belong to
+        timestamp: Event timestamp
+        store: Store to read (default: the process-wide store)
+
+    Returns:
+        Stored entry with "result" (rule_analysis / agent_analysis), or None
+    """
+    try:
+        normalized = pd.Timestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+    store = store or get_analysis_store()
+    return store.get(result_key(get_dataset_version(df), normalized, None))
@@ -0,0 +1,358 @@
+"""
+Agent Prompt Builder
+Sectioned, cached and budgeted prompt prefix for the Grid Operator Agent
+
+The static prefix is rendered once per dataset schema and reused
+byte-for-byte, so Ollama can keep its KV cache for the shared prompt
+prefix across questions. Two modes are available:
+    full     Original verbose instructions; the pandas agent also appends
+             df.head() to the prompt
+    compact  Short instructions plus a precomputed schema summary instead
+             of raw rows; the live statistics (row count, time span,
+             min/mean/max) go in the suffix right before the question, so
+             ingested rows don't invalidate the cached prefix
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+import pandas as pd
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+from langchain_experimental.agents.agent_toolkits.pandas.prompt import SUFFIX_NO_DF
+
+
+# Enable compact mode by default with AGENT_COMPACT_PROMPT=1
+COMPACT_PROMPT = os.getenv("AGENT_COMPACT_PROMPT", "0") == "1"
+
+# Rows the pandas agent shows in full mode (langchain default)
+HEAD_ROWS = 5
+
+# Rough characters-per-token ratio for Llama-family tokenizers on English text
+CHARS_PER_TOKEN = 4
+
+
+ROLE_SECTION = """
+You are an expert grid operator analyzing smart city microgrid data.
+
+Your primary responsibilities:
+1. Analyze correlations between Grid Frequency drops and renewable generation changes
+2. Investigate how weather conditions (Cloud Cover, Wind Speed) impact Solar/Wind generation
+3. Identify curtailment risks and provide actionable recommendations
+4. Calculate percentage changes and trends in the data
+
+When analyzing anomalies:
+- Look for patterns: Does falling Grid Frequency correlate with drops in Solar PV Output or Wind Power Output?
+- Check weather: Did Cloud Cover increase? Did Wind Speed drop?
+- Consider timing: Is this during peak demand hours?
+- Assess risk: Is there a Curtailment Event Flag set?
+
+Always provide:
+1. Data-driven analysis with specific numbers
+2. Root cause identification
+3. Short, actionable recommendations
+
+"""
+
+INSTRUCTIONS_SECTION = """IMPORTANT Instructions:
+1. Use the python_repl_ast tool to execute Python code
+2. When filtering data, use df.loc[] with proper indexing
+3. The Timestamp is the INDEX - access it with df.index, not df['Timestamp']
+4. When asked to analyze a specific timestamp:
+   a) Use: df.loc['timestamp_value']
+   b) Compare with: df.loc['prior_timestamp']
+   c) Calculate percentage changes
+5. Output your analysis in structured format with clear sections
+
+TOOL USAGE REQUIREMENT:
+- When using Action: python_repl_ast, Action Input must be valid Python code as a string
+- Example:
+  Action: python_repl_ast
+  Action Input: "df.loc[:5, ['Grid Frequency (Hz)', 'Solar PV Output (kW)']]"
+"""
+
+TOOLS_SECTION = """
+PREFERRED TOOLS (faster and more reliable than python_repl_ast):
+- get_row: metrics at one timestamp
+- compare: change versus N intervals earlier (use for root-cause analysis)
+- window_stats: statistics over a time range
+- top_events: most severe anomalies
+- correlate: correlation between two columns
+- similar_events: past anomalies similar to an event, with their root causes
+- query_rows: count/list rows matching a condition (e.g. frequency < 49.9 and hour >= 18)
+Only fall back to python_repl_ast when none of these tools fit.
+Example:
+  Action: compare
+  Action Input: 2021-01-01 01:30:00, 1
+"""
+
+COMPACT_ROLE_SECTION = """
+You are an expert grid operator analyzing smart city microgrid data (30-minute intervals).
+Explain Grid Frequency anomalies from changes in Solar PV Output, Wind Power Output,
+Cloud Cover and Wind Speed. Answer with specific numbers, the root cause and short
+actionable recommendations.
+
+"""
+
+COMPACT_INSTRUCTIONS_SECTION = """Rules:
+- The Timestamp is the INDEX of df (use df.loc['YYYY-MM-DD HH:MM:SS'])
+- Use column names exactly as listed above
+- python_repl_ast Action Input must be valid Python code
+"""
+
+COMPACT_TOOLS_SECTION = """
+Prefer get_row, compare, window_stats, top_events, correlate, similar_events and query_rows over python_repl_ast.
+Example:
+  Action: compare
+  Action Input: 2021-01-01 01:30:00, 1
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of a prompt section.
+
+    Args:
+        text: Prompt text
+
+    Returns:
+        Approximate number of tokens
+    """
+    return int(math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Fingerprint of the DataFrame schema (column names and dtypes).
+
+    Args:
+        df: Grid data DataFrame
+
+    Returns:
+        Short hex digest
+    """
+    schema = '|'.join(f"{col}:{dtype}" for col, dtype in df.dtypes.items())
+    return hashlib.sha1(schema.encode('utf-8')).hexdigest()[:16]
+
+
+def _format_number(value: float) -> str:
+    """Format a statistic with 4 significant digits (deterministic)."""
+    if value is None or not math.isfinite(value):
+        return "nan"
+    return f"{value:.4g}"
+
+
+def build_schema_summary(df: pd.DataFrame) -> str:
+    """
+    Schema summary replacing df.head() in the compact prefix.
+
+    Only depends on the schema, so appended rows leave it unchanged.
+
+    Args:
+        df: Grid data DataFrame
+
+    Returns:
+        Summary text listing every column with its dtype
+    """
+    lines = ["DataFrame df: index Timestamp", "Columns (name [dtype]):"]
+    lines += [f"- {col} [{dtype}]" for col, dtype in df.dtypes.items()]
+    return '\n'.join(lines) + '\n\n'
+
+
+def build_data_summary(df: pd.DataFrame) -> str:
+    """
+    Live statistics for the compact prompt suffix.
+
+    Args:
+        df: Grid data DataFrame
+
+    Returns:
+        Summary text with the row count, time span and min/mean/max of
+        every numeric column
+    """
+    if len(df) == 0:
+        return "Current data: no rows\n"
+    lines = [
+        f"Current data: {len(df)} rows "
+        f"from {df.index.min():%Y-%m-%d %H:%M:%S} to {df.index.max():%Y-%m-%d %H:%M:%S}",
+        "Columns (name min/mean/max):"
+    ]
+    numeric = df.select_dtypes(include='number')
+    mins, means, maxs = numeric.min(), numeric.mean(), numeric.max()
+    for col in numeric.columns:
+        lines.append(
+            f"- {col} {_format_number(mins[col])}/"
+            f"{_format_number(means[col])}/{_format_number(maxs[col])}"
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def build_suffix(df: pd.DataFrame, compact: bool = COMPACT_PROMPT) -> Optional[str]:
+    """
+    Agent prompt suffix (the part after the tool list, ending in the question).
+
+    Args:
+        df: Grid data DataFrame
+        compact: Compact mode, which puts the live statistics here
+
+    Returns:
+        Suffix template, or None for the pandas agent's default (full mode,
+        which shows df.head())
+    """
+    if not compact:
+        return None
+    # Literal braces would be read as template variables
+    summary = build_data_summary(df).replace('{', '{{').replace('}', '}}')
+    return '\n' + summary + SUFFIX_NO_DF
+
+
+# Rendered prefixes, least recently used first: a few prompt modes per
+# schema, and old schemas age out after a reload with different columns.
+MAX_PREFIX_CACHE_ENTRIES = 8
+_prefix_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def build_prefix(df: pd.DataFrame, compact: bool = COMPACT_PROMPT, use_tools: bool = True) -> Dict[str, Any]:
+    """
+    Render (or fetch from cache) the static agent prefix.
+
+    Args:
+        df: Grid data DataFrame
+        compact: Use the compact prompt with a schema summary
+        use_tools: Include the typed analysis tool hints
+
+    Returns:
+        Dictionary with:
+            prefix: Rendered prefix text (identical across calls for the same key)
+            include_df_in_prompt: Whether the agent should append df.head()
+            sections: Estimated tokens per prompt section
+            prefix_tokens: Estimated tokens of the whole static prompt
+            fingerprint: Schema fingerprint used as cache key
+    """
+    fingerprint = schema_fingerprint(df)
+    key = (fingerprint, compact, use_tools)
+
+    with _cache_lock:
+        cached = _prefix_cache.get(key)
+        if cached is not None:
+            _prefix_cache.move_to_end(key)
+    if cached is not None:
+        return cached
+
+    if compact:
+        sections = {
+            "role": COMPACT_ROLE_SECTION,
+            "schema": build_schema_summary(df),
+            "instructions": COMPACT_INSTRUCTIONS_SECTION,
+        }
+        if use_tools:
+            sections["tools"] = COMPACT_TOOLS_SECTION
+    else:
+        column_list = '\n'.join([f"  - {col}" for col in df.columns])
+        sections = {
+            "role": ROLE_SECTION,
+            "columns": f"CRITICAL: EXACT DataFrame column names (use these EXACTLY as shown):\n{column_list}\n\n",
+            "instructions": INSTRUCTIONS_SECTION,
+        }
+        if use_tools:
+            sections["tools"] = TOOLS_SECTION
+
+    section_tokens = {name: estimate_tokens(text) for name, text in sections.items()}
+    if not compact:
+        # Appended by the pandas agent itself after the tool descriptions
+        section_tokens["data_preview"] = estimate_tokens(str(df.head(HEAD_ROWS).to_markdown()))
+
+    rendered = {
+        "prefix": ''.join(sections.values()),
+        "include_df_in_prompt": not compact,
+        "sections": section_tokens,
+        "prefix_tokens": sum(section_tokens.values()),
+        "fingerprint": fingerprint
+    }
+
+    with _cache_lock:
+        _prefix_cache[key] = rendered
+        while len(_prefix_cache) > MAX_PREFIX_CACHE_ENTRIES:
+            _prefix_cache.popitem(last=False)
+    return rendered
+
+
+def clear_prefix_cache():
+    """Drop all cached prefixes (e.g., after the dataset changes)."""
+    with _cache_lock:
+        _prefix_cache.clear()
+
+
+def measure_prompt_eval(text: str, model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Send a prompt to Ollama generating a single token and read prompt timings.
+
+    Args:
+        text: Prompt text
+        model: Ollama model name (default: the agent model)
+
+    Returns:
+        Dictionary with prompt_eval_count, prompt_eval_ms and wall time
+    """
+    from app.agent_setup import initialize_llm
+    from app.llm_client import DEFAULT_MODEL
+
+    llm = initialize_llm(model=model or DEFAULT_MODEL, temperature=0.0, num_predict=1)
+    start = time.perf_counter()
+    response = llm.invoke(text)
+    wall_ms = (time.perf_counter() - start) * 1000
+    meta = response.response_metadata or {}
+    return {
+        "prompt_eval_count": meta.get("prompt_eval_count"),
+        "prompt_eval_ms": round(meta.get("prompt_eval_duration", 0) / 1_000_000, 1),
+        "wall_ms": round(wall_ms, 1)
+    }
+
+
+def compare_prompt_modes(df: pd.DataFrame, measure: bool = False, model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Report prompt size for full vs compact mode, optionally with measured
+    prompt-evaluation time from Ollama.
+
+    Args:
+        df: Grid data DataFrame
+        measure: Send each prompt to Ollama and record prompt-eval timings
+        model: Ollama model name used when measuring
+
+    Returns:
+        Dictionary keyed by mode with token estimates (and measurements)
+    """
+    report = {}
+    for mode, compact in (("full", False), ("compact", True)):
+        rendered = build_prefix(df, compact=compact)
+        suffix = build_suffix(df, compact=compact)
+        entry = {
+            "prefix_tokens": rendered["prefix_tokens"],
+            "sections": rendered["sections"]
+        }
+        if suffix is not None:
+            entry["suffix_tokens"] = estimate_tokens(suffix)
+        if measure:
+            text = rendered["prefix"]
+            if rendered["include_df_in_prompt"]:
+                text += str(df.head(HEAD_ROWS).to_markdown())
+            if suffix is not None:
+                text += build_data_summary(df)
+            entry["measured"] = measure_prompt_eval(text, model=model)
+        report[mode] = entry
+    return report
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+    from app.data_loader import load_data
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    csv_file = args[0] if args else os.path.join("data", "smart_city_energy_dataset.csv")
+    measure = "--measure" in sys.argv
+    df = load_data(csv_file)
+    print(json.dumps(compare_prompt_modes(df, measure=measure), indent=2))
@@ -0,0 +1,124 @@
+"""
+Response Cache
+Pre-encoded JSON bodies with ETag revalidation for polled endpoints
+
+Dashboards poll /api/grid/statistics and /api/grid/status every few
+seconds. Their bodies only change with the dataset version, so each is
+computed and encoded once per key and served as bytes. The ETag is derived from the same key, so a
+request whose If-None-Match matches gets a 304 from the key alone, without
+reading the frame or the cached body.
+
+/api/health is deliberately not cached: its body carries the current time.
+
+Configuration:
+    RESPONSE_CACHE_MAX_AGE  Seconds a client/proxy may reuse a grid
+                            response before revalidating (default: 5)
+"""
+
+import os
+import threading
+from typing import Optional, Dict, Any, Callable, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.grid_serialization import dumps
+from app.metrics import cache_requests_total
+
+
+RESPONSE_CACHE_MAX_AGE = int(os.getenv("RESPONSE_CACHE_MAX_AGE", "5"))
+
+# Grid data: shared caches may serve it for max-age, then revalidate
+GRID_CACHE_CONTROL = f"public, max-age={RESPONSE_CACHE_MAX_AGE}, must-revalidate"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches an ETag (weak comparison).
+
+    Args:
+        if_none_match: Header value (comma-separated tags or *)
+        etag: Quoted entity tag of the current representation
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or tag.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """Encoded body and ETag per endpoint, valid while its key is unchanged."""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[str, bytes]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @staticmethod
+    def etag(name: str, key: str) -> str:
+        """Strong ETag for an endpoint's representation under a key."""
+        return f'"{name}-{key}"'
+
+    def body(self, name: str, key: str, build: Callable[[], Any]) -> bytes:
+        """
+        Encoded body for an endpoint, built only when the key changed.
+
+        Args:
+            name: Endpoint name
+            key: Cache key (dataset version, plus state the body depends on)
+            build: Produces the JSON payload
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                cache_requests_total.inc(1, "responses", "hit")
+                return entry[1]
+        body = dumps(build())
+        with self._lock:
+            self._entries[name] = (key, body)
+            self.misses += 1
+        cache_requests_total.inc(1, "responses", "miss")
+        return body
+
+    def response(self, request: Request, name: str, key: str, build: Callable[[], Any],
+                 cache_control: str = GRID_CACHE_CONTROL) -> Response:
+        """
+        200 with the cached body, or 304 when If-None-Match matches.
+
+        Args:
+            request: Incoming request (for If-None-Match)
+            name: Endpoint name
+            key: Cache key
+            build: Produces the JSON payload on a miss
+            cache_control: Cache-Control header value
+        """
+        etag = self.etag(name, key)
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            cache_requests_total.inc(1, "responses", "not_modified")
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body(name, key, build), media_type="application/json", headers=headers)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss and 304 counters."""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified
+        }
+
+
+# Process-wide cache for the polled endpoints
+response_cache = ResponseCache()
@@ -0,0 +1,325 @@
+"""
+Sandboxed Agent Code Execution
+Runs LLM-written pandas code in a pool of worker processes
+
+The dataset's numeric columns and index are copied once into a shared
+memory block; each worker attaches to it and rebuilds a read-only
+DataFrame from zero-copy NumPy views, so no data is pickled per call.
+Every execution gets a CPU-time limit, an address-space (memory) limit,
+a hard wall-clock timeout (the worker is killed and replaced) and a
+size-capped result. The server process and its GIL stay free while
+agent code crunches data.
+
+Configuration (environment variables):
+    AGENT_SANDBOX             Set to 0 to run agent code in-process (default: 1)
+    AGENT_SANDBOX_WORKERS     Worker processes per dataset (default: 2)
+    AGENT_SANDBOX_TIMEOUT     Hard timeout in seconds (default: 20)
+    AGENT_SANDBOX_CPU_SECONDS CPU-time limit per call (default: 10)
+    AGENT_SANDBOX_MEMORY_MB   Extra memory allowed per call (default: 1024)
+"""
+
+import atexit
+import multiprocessing as mp
+import os
+import queue
+import threading
+from multiprocessing import shared_memory
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain_core.tools import BaseTool
+
+from app.sandbox_worker import worker_main
+
+
+SANDBOX_ENABLED = os.getenv("AGENT_SANDBOX", "1") != "0"
+SANDBOX_WORKERS = int(os.getenv("AGENT_SANDBOX_WORKERS", "2"))
+SANDBOX_TIMEOUT = float(os.getenv("AGENT_SANDBOX_TIMEOUT", "20"))
+SANDBOX_CPU_SECONDS = int(os.getenv("AGENT_SANDBOX_CPU_SECONDS", "10"))
+SANDBOX_MEMORY_MB = int(os.getenv("AGENT_SANDBOX_MEMORY_MB", "1024"))
+
+# Maximum characters returned to the agent from one execution
+MAX_RESULT_CHARS = 4000
+
+# Time allowed for a new worker to import pandas and attach the dataset
+WORKER_START_TIMEOUT = 60
+
+_ALIGNMENT = 64
+
+
+class SandboxTimeout(Exception):
+    """Raised when agent code exceeds the hard wall-clock timeout."""
+
+
+# ----------------------------------------------------------------------
+# Shared-memory DataFrame
+# ----------------------------------------------------------------------
+
+class SharedFrame:
+    """
+    Columnar copy of a DataFrame in one shared memory block.
+
+    Numeric and boolean columns (plus the int64 index) live in shared
+    memory; other columns are small enough to ship once per worker.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        arrays: List[Tuple[str, np.ndarray]] = [("__index__", df.index.asi8)]
+        self.object_columns: Dict[str, pd.Series] = {}
+        for col in df.columns:
+            values = df[col].to_numpy()
+            if values.dtype.kind in "biuf":
+                arrays.append((col, values))
+            else:
+                self.object_columns[col] = df[col].reset_index(drop=True)
+
+        layout = []
+        offset = 0
+        for name, values in arrays:
+            values = np.ascontiguousarray(values)
+            layout.append((name, values.dtype.str, len(values), offset))
+            offset += -(-values.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for (name, dtype, length, start), (_, values) in zip(layout, arrays):
+            view = np.ndarray((length,), dtype=dtype, buffer=self.shm.buf, offset=start)
+            view[:] = values
+
+        self.meta = {
+            "shm_name": self.shm.name,
+            "layout": layout,
+            "columns": list(df.columns),
+            "index_name": df.index.name,
+            "index_dtype": str(df.index.dtype),
+        }
+        print(f"[SANDBOX] Shared dataset block: {offset / 1e6:.1f} MB ({len(arrays) - 1} columns)")
+
+    def close(self):
+        """Release and unlink the shared memory block."""
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# ----------------------------------------------------------------------
+# Parent side
+# ----------------------------------------------------------------------
+
+class _Worker:
+    def __init__(self, ctx, meta, object_columns):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=worker_main, args=(child_conn, meta, object_columns), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Block until the worker has attached the dataset."""
+        try:
+            return self.conn.poll(timeout) and self.conn.recv()[0] == "ready"
+        except (EOFError, OSError):
+            return False
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Fixed-size pool of sandbox worker processes bound to one dataset.
+
+    Args:
+        df: Grid data DataFrame to share with the workers
+        workers: Number of worker processes
+        timeout: Hard wall-clock timeout per execution (seconds)
+        cpu_seconds: CPU-time limit per execution
+        memory_mb: Additional memory allowed per execution
+        max_result_chars: Result size cap
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        workers: int = SANDBOX_WORKERS,
+        timeout: float = SANDBOX_TIMEOUT,
+        cpu_seconds: int = SANDBOX_CPU_SECONDS,
+        memory_mb: int = SANDBOX_MEMORY_MB,
+        max_result_chars: int = MAX_RESULT_CHARS
+    ):
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_result_chars = max_result_chars
+
+        self._ctx = mp.get_context("spawn")
+        self._shared = SharedFrame(df)
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Start all workers in parallel, then wait for them to attach
+        pending = [self._start_worker() for _ in range(max(1, workers))]
+        for worker in pending:
+            self._admit(worker)
+        print(f"[SANDBOX] Started {len(self._workers)} worker processes")
+
+    def _start_worker(self) -> _Worker:
+        worker = _Worker(self._ctx, self._shared.meta, self._shared.object_columns)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _admit(self, worker: _Worker):
+        """Put a started worker into the idle queue once it is ready."""
+        if worker.wait_ready(WORKER_START_TIMEOUT):
+            self._idle.put(worker)
+        else:
+            if not self._closed:
+                print("[SANDBOX] Worker failed to start")
+            self._retire(worker)
+
+    def _replace(self):
+        """Start a replacement worker without blocking the caller."""
+        if self._closed:
+            return
+        worker = self._start_worker()
+        threading.Thread(target=self._admit, args=(worker,), daemon=True).start()
+
+    def _retire(self, worker: _Worker):
+        worker.kill()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+
+    def execute(self, code: str, timeout: Optional[float] = None) -> str:
+        """
+        Run agent code in a worker and return its (size-capped) output.
+
+        Args:
+            code: Python code written by the agent
+            timeout: Override the hard timeout (seconds)
+
+        Returns:
+            Printed output and/or repr of the last expression, or an error line
+
+        Raises:
+            SandboxTimeout: If the code exceeds the hard timeout
+        """
+        if self._closed:
+            raise RuntimeError("Sandbox pool is closed")
+        timeout = timeout or self.timeout
+        try:
+            worker = self._idle.get(timeout=WORKER_START_TIMEOUT)
+        except queue.Empty:
+            raise SandboxTimeout("No sandbox worker available")
+        try:
+            worker.conn.send((code, self.cpu_seconds, self.memory_mb, self.max_result_chars))
+            if not worker.conn.poll(timeout):
+                raise SandboxTimeout(f"Execution exceeded {timeout:.0f}s timeout")
+            status, output = worker.conn.recv()
+        except (SandboxTimeout, EOFError, BrokenPipeError, OSError):
+            # Kill the stuck or crashed worker and replace it
+            self._retire(worker)
+            self._replace()
+            raise
+        self._idle.put(worker)
+        return output
+
+    def close(self):
+        """Stop all workers and release the shared memory block."""
+        self._closed = True
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+        self._shared.close()
+
+
+class SandboxedPythonTool(BaseTool):
+    """
+    Drop-in replacement for python_repl_ast that runs code in a SandboxPool.
+
+    Unlike the in-process tool, state doesn't carry over between calls: a
+    call may land on any worker and starts from a fresh namespace, which
+    the description tells the agent.
+    """
+
+    name: str = "python_repl_ast"
+    description: str = (
+        "A Python shell. Use this to execute python commands. "
+        "Input should be a valid python command. "
+        "Each call runs in a fresh namespace with only `df`, `pd` and `np` defined: "
+        "variables from earlier calls are not kept, so redo any setup in the same command. "
+        "When using this tool, sometimes output is abbreviated - "
+        "make sure it does not look abbreviated before using it in your answer."
+    )
+    pool: Any = None
+
+    def _run(self, query: str, run_manager=None) -> str:
+        try:
+            return self.pool.execute(query)
+        except SandboxTimeout as e:
+            return f"TimeoutError: {e}"
+        except (EOFError, BrokenPipeError, OSError):
+            return "WorkerError: sandbox worker crashed (likely memory limit); try a smaller computation"
+        except RuntimeError as e:
+            # The pool was replaced by one for a newer dataset version
+            return f"WorkerError: {e}"
+
+
+# Pool for the current dataset version. A new version (e.g. after an ingest
+# flush) replaces and closes the previous pool, like the anomaly index cache;
+# get_dataset_version() guards against a recycled id(df).
+_pools: Dict[str, SandboxPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_sandbox_pool(df: pd.DataFrame) -> SandboxPool:
+    """
+    Get the sandbox pool for a DataFrame, creating it on first use.
+
+    Args:
+        df: Grid data DataFrame
+
+    Returns:
+        SandboxPool sharing this DataFrame's dataset version
+    """
+    from app.data_loader import get_dataset_version
+
+    version = get_dataset_version(df)
+    with _pools_lock:
+        pool = _pools.get(version)
+        if pool is None:
+            stale = list(_pools.values())
+            _pools.clear()
+            pool = _pools[version] = SandboxPool(df)
+        else:
+            stale = []
+    for old in stale:
+        old.close()
+    return pool
+
+
+@atexit.register
+def shutdown_pools():
+    """Stop every sandbox pool (also called on server shutdown)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,160 @@
+"""
+Sandbox Worker Process
+Code executed inside the sandbox worker processes (see app.sandbox)
+
+Kept free of LangChain and server imports so workers start quickly.
+"""
+
+import ast
+import io
+import os
+import re
+from contextlib import redirect_stdout
+from multiprocessing import shared_memory
+from typing import Optional, Dict, Any
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource  # POSIX only
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+
+class CPUTimeExceeded(Exception):
+    """Raised inside a worker when the per-call CPU budget is spent."""
+
+
+def attach_frame(meta: Dict[str, Any], object_columns: Dict[str, pd.Series]):
+    """
+    Rebuild a read-only DataFrame from a shared memory block.
+
+    Returns:
+        Tuple of (SharedMemory handle, DataFrame)
+    """
+    shm = shared_memory.SharedMemory(name=meta["shm_name"])
+    columns = {}
+    index_values = None
+    for name, dtype, length, start in meta["layout"]:
+        view = np.ndarray((length,), dtype=dtype, buffer=shm.buf, offset=start)
+        view.flags.writeable = False
+        if name == "__index__":
+            index_values = view
+        else:
+            columns[name] = view
+
+    index = pd.DatetimeIndex(index_values.view(meta["index_dtype"]), name=meta["index_name"])
+    for name, series in object_columns.items():
+        columns[name] = series.to_numpy()
+    df = pd.DataFrame({col: columns[col] for col in meta["columns"]}, index=index, copy=False)
+    return shm, df
+
+
+def _sanitize(code: str) -> str:
+    """Strip markdown fences and wrapping quotes/backticks (like PythonAstREPLTool)."""
+    code = re.sub(r"^(\s|`)*(?i:python)?\s*", "", code)
+    code = re.sub(r"(\s|`)*$", "", code)
+    if len(code) >= 2 and code[0] == code[-1] and code[0] in "\"'":
+        code = code[1:-1]
+    return code
+
+
+def run_code(code: str, env: Dict[str, Any]) -> str:
+    """Execute statements and evaluate a trailing expression, capturing stdout."""
+    tree = ast.parse(_sanitize(code))
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        body = ast.Module(tree.body[:-1], type_ignores=[])
+        exec(compile(body, "<agent>", "exec"), env)
+        if not tree.body:
+            return buffer.getvalue()
+        last = tree.body[-1]
+        if isinstance(last, ast.Expr):
+            result = eval(compile(ast.Expression(last.value), "<agent>", "eval"), env)
+        else:
+            exec(compile(ast.Module([last], type_ignores=[]), "<agent>", "exec"), env)
+            result = None
+    printed = buffer.getvalue()
+    if result is None:
+        return printed
+    return printed + str(result)
+
+
+def _memory_in_use() -> Optional[int]:
+    """Current virtual memory size of this process in bytes (Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _apply_limits(cpu_seconds: int, memory_mb: int):
+    """Set per-call CPU and address-space soft limits (POSIX only)."""
+    if resource is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime)
+    _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (used + cpu_seconds, cpu_hard))
+
+    in_use = _memory_in_use()
+    if in_use is not None:
+        _, mem_hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (in_use + memory_mb * 1024 * 1024, mem_hard))
+
+
+def _clear_limits():
+    if resource is None:
+        return
+    for limit in (resource.RLIMIT_CPU, resource.RLIMIT_AS):
+        _, hard = resource.getrlimit(limit)
+        resource.setrlimit(limit, (hard, hard))
+
+
+def worker_main(conn, meta: Dict[str, Any], object_columns: Dict[str, pd.Series]):
+    """Worker loop: attach the shared frame, then execute code on request."""
+    import signal
+
+    if hasattr(signal, "SIGXCPU"):
+        def _on_cpu_limit(signum, frame):
+            raise CPUTimeExceeded("CPU time limit exceeded")
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+    shm, df = attach_frame(meta, object_columns)
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        code, cpu_seconds, memory_mb, max_chars = request
+        # Shallow copy: shares the read-only column views but keeps column
+        # additions from leaking into later calls
+        env = {"df": df.copy(deep=False), "pd": pd, "np": np}
+        try:
+            _apply_limits(cpu_seconds, memory_mb)
+            output = run_code(code, env)
+            status = "ok"
+        except CPUTimeExceeded as e:
+            output, status = f"CPUTimeExceeded: {e}", "error"
+        except MemoryError:
+            output, status = "MemoryError: memory limit exceeded", "error"
+        except Exception as e:
+            output, status = f"{type(e).__name__}: {e}", "error"
+        finally:
+            _clear_limits()
+
+        if len(output) > max_chars:
+            output = output[:max_chars] + f"\n... [truncated {len(output) - max_chars} chars]"
+        try:
+            conn.send((status, output))
+        except (BrokenPipeError, OSError):
+            break
+
+    shm.close()
@@ -8,16 +8,47 @@ This server provides:
 3. Automatic API documentation at /docs
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from pydantic import BaseModel
 from chainlit.utils import mount_chainlit
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Tuple
+import asyncio
+import json
 import os
 
-from app.data_loader import load_data, get_anomaly_timestamps, get_latest_status, get_statistics
+from app.data_loader import (
+    load_data, get_anomaly_timestamps, get_latest_status, get_statistics, get_dataset_version,
+    set_live_dataset
+)
+from app.llm_client import DEFAULT_MODEL, warm_up, is_warm, close_http_client, llm_timings
+from app.sandbox import shutdown_pools
+from app.circuit_breaker import llm_breaker
+from app.agent_instrumentation import agent_instrumentation
+from app.agent_setup import routing_stats, is_routing_active, ROUTING_ENABLED, ROUTING_SLA_SECONDS
+from app.analysis_store import get_analysis_store, close_analysis_store
+from app.analysis_jobs import AnalysisJobManager, QueueFullError
+from app.preanalysis import PREANALYSIS_ENABLED, schedule_preanalysis
+from app.event_index import get_event_index
+from app.attribution import attribution_engine
+from app.anomaly_index import get_anomaly_index
+from app.grid_query import get_query_engine, QueryError
+from app.response_cache import response_cache
+from app.metrics import registry, PROMETHEUS_CONTENT_TYPE
+from app.http_metrics import HTTPMetricsMiddleware, METRICS_ENABLED
+from app.telemetry_stream import telemetry, HEARTBEAT_SECONDS
+from app.ingest import GridIngestor, IngestError, parse_ndjson, parse_arrow, INGEST_FLUSH_SECONDS
+from app.grid_serialization import (
+    get_column_store, dumps, to_json_list, negotiate_format, UnsupportedFormatError, MEDIA_TYPES,
+    LOOKUP_MODES, parse_timestamps
+)
+from app.downsampling import (
+    series_payload, DEFAULT_SERIES_COLUMNS, DEFAULT_SERIES_POINTS, MAX_SERIES_POINTS, METHODS
+)
 
 # Initialize FastAPI application
 app = FastAPI(
@@ -37,9 +68,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route request metrics for /metrics
+if METRICS_ENABLED:
+    app.add_middleware(HTTPMetricsMiddleware)
+
 # Global DataFrame - loaded once at startup
 df: Optional[pd.DataFrame] = None
 
+# Background analysis jobs (results persist in the shared analysis store)
+analysis_jobs: Optional[AnalysisJobManager] = None
+
+# Live ingestion into the ring buffer, flushed into df periodically
+ingestor: Optional[GridIngestor] = None
+_flush_task: Optional[asyncio.Task] = None
+
+
+def _analysis_queue_depth():
+    if analysis_jobs is None:
+        return {}
+    stats = analysis_jobs.stats()
+    return {
+        ("interactive", "queued"): stats["queued"],
+        ("interactive", "running"): stats["running"],
+        ("background", "queued"): stats["background_queued"],
+        ("background", "running"): stats["background_running"]
+    }
+
+
+# Process state read when /metrics is scraped
+registry.gauge("analysis_queue_depth", "Analysis jobs waiting and running by queue", ("queue", "state"),
+               function=_analysis_queue_depth)
+registry.gauge("dataset_rows", "Rows in the loaded dataset", function=lambda: 0 if df is None else len(df))
+registry.gauge("llm_breaker_open", "1 while the LLM circuit breaker is open", function=lambda: int(llm_breaker.is_open))
+registry.gauge("stream_subscribers", "Live telemetry stream subscribers", function=lambda: telemetry.subscriber_count)
+registry.counter("stream_rows_published_total", "Rows fanned out to the live stream",
+                 function=lambda: telemetry.rows_published)
+registry.gauge("ingest_buffer_rows", "Ingest ring buffer rows by state", ("state",),
+               function=lambda: {} if ingestor is None else {
+                   ("buffered",): ingestor.buffer.size, ("pending",): ingestor.buffer.pending})
+registry.counter("ingest_rows_total", "Rows accepted by /api/grid/ingest",
+                 function=lambda: 0 if ingestor is None else ingestor.buffer.total)
+
 # Determine data file path
 DATA_FILE = os.path.join("data", "smart_city_energy_dataset.csv")
 if not os.path.exists(DATA_FILE):
@@ -50,18 +119,47 @@ if not os.path.exists(DATA_FILE):
 @app.on_event("startup")
 async def startup_event():
     """Load data on server startup"""
-    global df
+    global df, analysis_jobs, ingestor, _flush_task
     try:
         print("\n" + "="*60)
         print("SMART MICROGRID AI SYSTEM - STARTUP")
         print("="*60)
         df = load_data(DATA_FILE)
+        set_live_dataset(df)
         print("✅ Data loaded successfully")
+        print(f"✅ Similar-incident index ready ({get_event_index(df).stats()['events']} events)")
+        get_column_store(df)
+        get_anomaly_index(df)
+        await telemetry.start()
+        ingestor = GridIngestor(df)
+        _flush_task = asyncio.create_task(_flush_periodically())
+        analysis_jobs = AnalysisJobManager(df, get_analysis_store())
+        print("✅ Analysis job queue ready")
+        if PREANALYSIS_ENABLED:
+            schedule_preanalysis(analysis_jobs)
         print("✅ FastAPI server ready")
         print("="*60 + "\n")
     except Exception as e:
         print(f"❌ Error loading data: {e}")
         raise
+    
+    # Load the LLM into Ollama memory in the background so the first
+    # question doesn't pay the model load; startup doesn't wait for it
+    asyncio.get_running_loop().run_in_executor(None, warm_up, DEFAULT_MODEL)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop analysis workers and the telemetry stream, release pooled Ollama connections and sandbox workers"""
+    if _flush_task is not None:
+        _flush_task.cancel()
+    await telemetry.stop()
+    if analysis_jobs is not None:
+        # Wait (off the event loop) for running jobs before closing what they use
+        await asyncio.get_running_loop().run_in_executor(None, analysis_jobs.shutdown)
+    close_analysis_store()
+    close_http_client()
+    shutdown_pools()
 
 
 @app.get("/")
@@ -76,14 +174,28 @@ async def root():
             "chat_interface": "/chat",
             "grid_status": "/api/grid/status",
             "anomalies": "/api/grid/anomalies",
-            "statistics": "/api/grid/statistics"
+            "statistics": "/api/grid/statistics",
+            "series": "/api/grid/series",
+            "lookup": "/api/grid/lookup",
+            "query": "/api/grid/query",
+            "stream": "/api/grid/stream",
+            "ingest": "/api/grid/ingest",
+            "similar_events": "/api/grid/similar/{timestamp}",
+            "attributions": "/api/grid/attributions",
+            "readiness": "/api/health/ready",
+            "llm_timings": "/api/llm/timings",
+            "llm_routing": "/api/llm/routing",
+            "llm_breaker": "/api/llm/breaker",
+            "agent_metrics": "/api/agent/metrics",
+            "metrics": "/metrics",
+            "analysis": "/api/analysis"
         }
     }
 
 
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (not cached, so "timestamp" is always current)"""
     if df is None:
         raise HTTPException(status_code=503, detail="Data not loaded")
     
@@ -91,36 +203,135 @@ async def health_check():
         "status": "healthy",
         "data_loaded": True,
         "records": len(df),
+        "llm": "degraded" if llm_breaker.is_open else "available",
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    """
+    Readiness check - data loaded and LLM warmed up
+    
+    Triggers a warm-up if the model isn't loaded yet, so a load balancer
+    only routes traffic once the first question will be fast.
+    """
+    if df is None:
+        raise HTTPException(status_code=503, detail="Data not loaded")
+    
+    if not is_warm(DEFAULT_MODEL):
+        result = await asyncio.get_running_loop().run_in_executor(None, warm_up, DEFAULT_MODEL)
+        if not result["ready"]:
+            raise HTTPException(status_code=503, detail=f"LLM not ready: {result['error']}")
+    
+    return {
+        "status": "ready",
+        "data_loaded": True,
+        "llm_model": DEFAULT_MODEL,
+        "llm_warm": True,
         "timestamp": datetime.now().isoformat()
     }
 
 
+@app.get("/api/llm/timings")
+async def get_llm_timings():
+    """
+    Get Ollama timings (load, prompt eval, generation) recorded per LLM call
+    
+    Returns:
+        Per-model averages and the most recent call
+    """
+    return llm_timings.summary()
+
+
+@app.get("/api/agent/metrics")
+async def get_agent_metrics(recent: int = 5):
+    """
+    Get agent instrumentation: histograms of iterations, LLM/tool call
+    times and tokens, parse errors and stop reasons
+    
+    Args:
+        recent: Number of most recent invocation traces to include (max: 20)
+    
+    Returns:
+        Aggregated metrics and recent per-invocation traces
+    """
+    return agent_instrumentation.summary(recent=max(0, min(recent, 20)))
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Prometheus scrape endpoint
+
+    HTTP request counts, latency and size histograms per route, data load
+    and detector timings, cache hits/misses, analysis queue depth, LLM
+    and agent timings, and stream/ingest state, in the text exposition
+    format. Everything is rendered here; nothing runs between scrapes.
+    """
+    return Response(content=registry.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get("/api/llm/breaker")
+async def get_llm_breaker():
+    """
+    Get the LLM circuit breaker state
+    
+    Returns:
+        State (closed/open), open reason, latency percentiles and counters
+    """
+    return llm_breaker.status()
+
+
+@app.get("/api/llm/routing")
+async def get_llm_routing():
+    """
+    Get the model routing table (windowed latency and success per model)
+    
+    Returns:
+        Routing configuration and per-model statistics
+    """
+    return {
+        "enabled": ROUTING_ENABLED,
+        "active": is_routing_active(),
+        "sla_seconds": ROUTING_SLA_SECONDS,
+        "models": routing_stats.table()
+    }
+
+
 @app.get("/api/grid/statistics")
-async def get_grid_statistics():
+async def get_grid_statistics(request: Request):
     """
     Get overall grid statistics
     
+    Computed once per dataset version; the ETag is the version fingerprint,
+    so If-None-Match gets a 304 without recomputing.
+    
     Returns:
         Statistical summary of the grid data
     """
     if df is None:
         raise HTTPException(status_code=503, detail="Data not loaded")
     
-    return get_statistics(df)
+    return response_cache.response(request, "statistics", get_dataset_version(df),
+                                   lambda: get_statistics(df))
 
 
 @app.get("/api/grid/status")
-async def get_current_status():
+async def get_current_status(request: Request):
     """
     Get the most recent grid status
     
+    Cached per dataset version, with ETag/If-None-Match support.
+    
     Returns:
         Latest grid metrics
     """
     if df is None:
         raise HTTPException(status_code=503, detail="Data not loaded")
     
-    return get_latest_status(df)
+    return response_cache.response(request, "status", get_dataset_version(df),
+                                   lambda: get_latest_status(df))
 
 
 @app.get("/api/grid/status/{timestamp}")
@@ -159,100 +370,841 @@ async def get_grid_status_at_time(timestamp: str):
         raise HTTPException(status_code=404, detail=f"Timestamp {timestamp} not found")
 
 
+class LookupRequest(BaseModel):
+    """Body of POST /api/grid/lookup"""
+    timestamps: List[str]
+    mode: str = "exact"
+    tolerance: Optional[str] = None
+    columns: Optional[List[str]] = None
+
+
+# Upper bound on timestamps per lookup request
+MAX_LOOKUP_TIMESTAMPS = 1_000_000
+
+
+@app.post("/api/grid/lookup")
+async def lookup_grid_data(request: LookupRequest):
+    """
+    Resolve many timestamps to grid rows in one pass
+
+    Args:
+        request: Timestamps (any order, need not be on the 30-minute grid),
+            mode ("exact", "previous", "next" or "nearest"), optional
+            tolerance (e.g. "15min") and column projection
+
+    Returns:
+        Column-wise rows aligned with the request: data.timestamp is the
+        matched row (null when nothing matched within the tolerance)
+    """
+    if df is None:
+        raise HTTPException(status_code=503, detail="Data not loaded")
+    if len(request.timestamps) > MAX_LOOKUP_TIMESTAMPS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_LOOKUP_TIMESTAMPS} timestamps per request")
+    if request.mode not in LOOKUP_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(LOOKUP_MODES)}")
+
+    try:
+        tolerance_ns = pd.Timedelta(request.tolerance).value if request.tolerance else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid tolerance: {e}")
+    if tolerance_ns is not None and tolerance_ns < 0:
+        raise HTTPException(status_code=400, detail="tolerance must not be negative")
+
+    store = get_column_store(df)
+    try:
+        selected = store.resolve_columns(",".join(request.columns) if request.columns else None)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+
+    targets, invalid = parse_timestamps(request.timestamps)
+    if len(invalid):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid timestamp format at index {invalid[0]}: {request.timestamps[invalid[0]]!r}"
+        )
+
+    positions = store.lookup(targets, request.mode, tolerance_ns)
+    return Response(
+        content=dumps({
+            "mode": request.mode,
+            "tolerance": request.tolerance,
+            "count": len(positions),
+            "matched": int((positions >= 0).sum()),
+            "data": store.take(positions, selected)
+        }),
+        media_type="application/json"
+    )
+
+
+# Anomaly list fields (output name per dataset column)
+ANOMALY_FIELDS = {
+    'Grid Frequency (Hz)': 'grid_frequency',
+    'Solar PV Output (kW)': 'solar_output',
+    'Wind Power Output (kW)': 'wind_output',
+    'Z_Score': 'z_score',
+}
+
+
+def _negotiate(request: Request, format: Optional[str]) -> str:
+    try:
+        return negotiate_format(request.headers.get("accept"), format)
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _binary_response(fmt: str, store, rows, columns, names=None, filename: str = "grid", headers=None):
+    """Streamed Arrow IPC or Parquet response (406 without pyarrow)."""
+    try:
+        chunks = store.arrow_ipc(rows, columns, names) if fmt == "arrow" else store.parquet(rows, columns, names)
+        first = next(chunks)
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    headers = dict(headers or {})
+    if fmt == "parquet":
+        headers["Content-Disposition"] = f'attachment; filename="{filename}.parquet"'
+
+    def stream():
+        yield first
+        yield from chunks
+
+    return StreamingResponse(stream(), media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
 @app.get("/api/grid/anomalies")
-async def get_anomalies(limit: int = 10, offset: int = 0):
+async def get_anomalies(
+    request: Request,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    min_abs_z: Optional[float] = None,
+    max_frequency: Optional[float] = None,
+    sort: str = "time",
+    format: Optional[str] = None
+):
     """
     Get list of anomaly events
     
     Args:
-        limit: Maximum number of results (default: 10, max: 100)
-        offset: Number of results to skip (default: 0)
+        limit: Maximum number of results (JSON default: 10, max: 100;
+            Arrow/Parquet default: all)
+        offset: Number of results to skip (default: 0; ignored with a cursor)
+        cursor: next_cursor of a previous page
+        start: Earliest event timestamp
+        end: Latest event timestamp
+        min_abs_z: Minimum |Z-Score|
+        max_frequency: Maximum grid frequency (Hz)
+        sort: "time" (oldest first) or "severity" (highest |Z-Score| first)
+        format: "json", "arrow" or "parquet" (default: from the Accept header)
     
     Returns:
-        List of anomaly events with timestamps
+        Anomaly events matching the filters; total counts all matches and
+        next_cursor (also the X-Next-Cursor header) points at the next page
     """
     if df is None:
         raise HTTPException(status_code=503, detail="Data not loaded")
     
+    fmt = _negotiate(request, format)
+    binary = fmt in ("arrow", "parquet")
+    
     # Validate parameters
-    if limit > 100:
-        limit = 100
-    if limit < 1:
-        limit = 10
-    if offset < 0:
-        offset = 0
-    
-    # Get anomalies
-    anomaly_df = df[df['Is_Anomaly'] == True]
-    total_anomalies = len(anomaly_df)
-    
-    # Apply pagination
-    anomaly_df = anomaly_df.iloc[offset:offset+limit]
-    
-    # Convert to list of dictionaries
-    results = []
-    for ts, row in anomaly_df.iterrows():
-        results.append({
-            "timestamp": ts.strftime('%Y-%m-%d %H:%M:%S'),
-            "grid_frequency": float(row['Grid Frequency (Hz)']),
-            "solar_output": float(row['Solar PV Output (kW)']),
-            "wind_output": float(row['Wind Power Output (kW)']),
-            "z_score": float(row['Z_Score']) if pd.notna(row['Z_Score']) else None
-        })
+    if binary:
+        limit = limit if limit and limit > 0 else None
+    else:
+        if limit is None or limit < 1:
+            limit = 10
+        if limit > 100:
+            limit = 100
+    try:
+        start_ts = pd.to_datetime(start) if start else None
+        end_ts = pd.to_datetime(end) if end else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp format: {e}")
     
-    return {
-        "total": total_anomalies,
-        "limit": limit,
-        "offset": offset,
-        "results": results
-    }
+    try:
+        page = get_anomaly_index(df).page(
+            limit=limit, offset=offset, cursor=cursor, sort=sort, start=start_ts, end=end_ts,
+            min_abs_z=min_abs_z, max_frequency=max_frequency
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    positions = page["positions"]
+    headers = {"X-Total-Count": str(page["total"])}
+    if page["next_cursor"]:
+        headers["X-Next-Cursor"] = page["next_cursor"]
+    
+    store = get_column_store(df)
+    if binary:
+        return _binary_response(fmt, store, positions, list(ANOMALY_FIELDS), ANOMALY_FIELDS,
+                                "grid_anomalies", headers)
+    
+    # Build the page column-wise from the store (no frame access)
+    values = {name: to_json_list(store.column(col, 0, len(store.index))[positions])
+              for col, name in ANOMALY_FIELDS.items()}
+    keys = ["timestamp"] + list(values)
+    rows = zip(store.timestamps[positions].tolist(), *values.values())
+    
+    return Response(
+        content=dumps({
+            "total": page["total"],
+            "limit": limit,
+            "offset": page["offset"],
+            "sort": sort,
+            "next_cursor": page["next_cursor"],
+            "results": [dict(zip(keys, row)) for row in rows]
+        }),
+        media_type="application/json",
+        headers=headers
+    )
 
 
 @app.get("/api/grid/range")
-async def get_grid_data_range(start: str, end: str):
+async def get_grid_data_range(
+    request: Request,
+    start: str,
+    end: str,
+    columns: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
+    layout: str = "records"
+):
     """
     Get grid data for a time range
     
     Args:
         start: Start timestamp (ISO format)
         end: End timestamp (ISO format)
+        columns: Comma-separated column projection (default: all columns)
+        limit: Maximum rows in this page (default: the whole range)
+        cursor: Resume from the next_cursor of a previous page
+        format: "json", "ndjson" (streamed in bounded batches), "arrow"
+            (Arrow IPC stream) or "parquet"; default: from the Accept header
+        layout: "records" (one object per row) or "columns" (one list per
+            column); JSON only
     
     Returns:
-        Grid data within the specified range
+        Grid data within the specified range; with a limit, next_cursor
+        (also the X-Next-Cursor header) points at the following page
     """
     if df is None:
         raise HTTPException(status_code=503, detail="Data not loaded")
+    fmt = _negotiate(request, format)
+    if layout not in ("records", "columns"):
+        raise HTTPException(status_code=400, detail="layout must be 'records' or 'columns'")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
     
     try:
         start_ts = pd.to_datetime(start)
         end_ts = pd.to_datetime(end)
-        
-        # Validate range
-        if start_ts > end_ts:
-            raise HTTPException(status_code=400, detail="Start time must be before end time")
-        
-        # Extract data
-        range_df = df.loc[start_ts:end_ts]
-        
-        if len(range_df) == 0:
-            raise HTTPException(status_code=404, detail="No data found in specified range")
-        
-        # Convert to records format
-        results = []
-        for ts, row in range_df.iterrows():
-            record = row.to_dict()
-            record['timestamp'] = ts.strftime('%Y-%m-%d %H:%M:%S')
-            results.append(record)
-        
-        return {
+        resume_ts = pd.to_datetime(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp format: {e}")
+    
+    # Validate range
+    if start_ts > end_ts:
+        raise HTTPException(status_code=400, detail="Start time must be before end time")
+    
+    store = get_column_store(df)
+    try:
+        selected = store.resolve_columns(columns)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+    
+    lo, hi = store.bounds(start_ts, end_ts)
+    if hi == lo:
+        raise HTTPException(status_code=404, detail="No data found in specified range")
+    total = hi - lo
+    if resume_ts is not None:
+        lo = max(lo, int(store.index.searchsorted(resume_ts, side='left')))
+    
+    # A cursor past the range end gives an empty last page, never a negative one
+    page_end = max(lo, min(hi, lo + limit) if limit else hi)
+    next_cursor = store.timestamps[page_end] if page_end < hi else None
+    headers = {"X-Total-Count": str(total)}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    
+    if fmt in ("arrow", "parquet"):
+        return _binary_response(fmt, store, slice(lo, page_end), selected, filename="grid_range", headers=headers)
+    
+    if fmt == "ndjson":
+        return StreamingResponse(
+            store.ndjson(lo, page_end, selected),
+            media_type="application/x-ndjson",
+            headers=headers
+        )
+    
+    data = store.columnar(lo, page_end, selected) if layout == "columns" else store.records(lo, page_end, selected)
+    return Response(
+        content=dumps({
             "start": start,
             "end": end,
-            "count": len(results),
-            "data": results
-        }
-        
+            "count": page_end - lo,
+            "next_cursor": next_cursor,
+            "data": data
+        }),
+        media_type="application/json",
+        headers=headers
+    )
+
+
+@app.get("/api/grid/series")
+async def get_grid_series(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    columns: Optional[str] = None,
+    points: int = DEFAULT_SERIES_POINTS,
+    method: str = "lttb"
+):
+    """
+    Downsampled time series for charts
+
+    Args:
+        start: Start timestamp (default: first row)
+        end: End timestamp (default: last row)
+        columns: Comma-separated numeric columns (default: frequency,
+            solar and wind output)
+        points: Maximum points per series (default: 1000, max: 10000);
+            anomaly rows are always included
+        method: "lttb" (shape-preserving) or "minmax" (bucket extremes)
+
+    Returns:
+        One timestamp/values pair per column plus the anomaly markers
+    """
+    if df is None:
+        raise HTTPException(status_code=503, detail="Data not loaded")
+    if method not in METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of: {', '.join(METHODS)}")
+    if points < 3:
+        raise HTTPException(status_code=400, detail="points must be at least 3")
+    points = min(points, MAX_SERIES_POINTS)
+
+    store = get_column_store(df)
+    try:
+        start_ts = pd.to_datetime(start) if start else store.index[0]
+        end_ts = pd.to_datetime(end) if end else store.index[-1]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp format: {e}")
+    if start_ts > end_ts:
+        raise HTTPException(status_code=400, detail="Start time must be before end time")
+
+    try:
+        selected = store.resolve_columns(columns) if columns else list(DEFAULT_SERIES_COLUMNS)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+    non_numeric = [col for col in selected if store.column(col, 0, 0).dtype.kind not in 'fiub']
+    if non_numeric:
+        raise HTTPException(status_code=400, detail=f"Columns are not numeric: {', '.join(non_numeric)}")
+
+    lo, hi = store.bounds(start_ts, end_ts)
+    if hi == lo:
+        raise HTTPException(status_code=404, detail="No data found in specified range")
+
+    payload = series_payload(store, lo, hi, selected, points, method)
+    payload.update(start=store.timestamps[lo], end=store.timestamps[hi - 1])
+    return Response(content=dumps(payload), media_type="application/json")
+
+
+@app.get("/api/grid/query")
+async def query_grid_data(
+    request: Request,
+    expr: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    columns: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
+    layout: str = "records"
+):
+    """
+    Rows matching a filter expression
+
+    Args:
+        expr: Filter expression, e.g. frequency < 49.9 and diff(cloud, "1h") > 20
+            (see app/grid_query.py for the language)
+        start: Earliest timestamp
+        end: Latest timestamp
+        columns: Comma-separated column projection (default: all columns)
+        limit: Maximum rows in this page (default: all matches)
+        cursor: Resume from the next_cursor of a previous page
+        format: "json", "ndjson", "arrow" or "parquet" (default: from the
+            Accept header)
+        layout: "records" or "columns"; JSON only
+
+    Returns:
+        Matching rows; matches counts all of them and next_cursor (also the
+        X-Next-Cursor header) points at the following page
+    """
+    if df is None:
+        raise HTTPException(status_code=503, detail="Data not loaded")
+    fmt = _negotiate(request, format)
+    if layout not in ("records", "columns"):
+        raise HTTPException(status_code=400, detail="layout must be 'records' or 'columns'")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+
+    engine = get_query_engine(df)
+    store = engine.store
+    try:
+        selected = store.resolve_columns(columns)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+    try:
+        positions = engine.positions(expr)
+        bounds_ns = [pd.to_datetime(ts).as_unit('ns').value if ts else None for ts in (start, end, cursor)]
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp format: {e}")
+
+    # Time bounds and the cursor are binary searches over the matched rows
+    matched_ns = store.index_ns[positions]
+    start_ns, end_ns, resume_ns = bounds_ns
+    lo = int(np.searchsorted(matched_ns, start_ns, side='left')) if start_ns is not None else 0
+    hi = int(np.searchsorted(matched_ns, end_ns, side='right')) if end_ns is not None else len(positions)
+    total = max(0, hi - lo)
+    if resume_ns is not None:
+        lo = max(lo, int(np.searchsorted(matched_ns, resume_ns, side='left')))
+    page_end = max(lo, min(hi, lo + limit) if limit else hi)
+    page = positions[lo:page_end]
+    next_cursor = store.timestamps[positions[page_end]] if page_end < hi else None
+
+    headers = {"X-Total-Count": str(total)}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+
+    if fmt in ("arrow", "parquet"):
+        return _binary_response(fmt, store, page, selected, filename="grid_query", headers=headers)
+
+    if fmt == "ndjson":
+        return StreamingResponse(store.ndjson_at(page, selected), media_type="application/x-ndjson",
+                                 headers=headers)
+
+    data = store.take(page, selected) if layout == "columns" else store.records_at(page, selected)
+    return Response(
+        content=dumps({
+            "query": expr,
+            "matches": total,
+            "count": len(page),
+            "next_cursor": next_cursor,
+            "data": data
+        }),
+        media_type="application/json",
+        headers=headers
+    )
+
+
+@app.get("/api/grid/stream")
+async def stream_grid_telemetry(request: Request, anomalies_only: bool = False):
+    """
+    Live grid telemetry (Server-Sent Events)
+
+    Every new row is sent as a "row" event; anomaly runs produce
+    "anomaly_open" and "anomaly_close" events. A client that falls behind
+    gets a "lag" event with the number of dropped messages, and is
+    disconnected if it keeps falling behind. The same stream is available
+    over WebSocket at this path. Start a replay with
+    POST /api/grid/stream/replay to drive it from historical data.
+
+    Args:
+        anomalies_only: Skip "row" events for normal rows
+    """
+    subscriber = telemetry.subscribe(anomalies_only=anomalies_only)
+
+    async def event_stream():
+        try:
+            yield f"event: hello\ndata: {json.dumps({'subscriber': subscriber.id})}\n\n".encode("utf-8")
+            while not subscriber.closed:
+                message = await subscriber.get(HEARTBEAT_SECONDS)
+                if message is None:
+                    if subscriber.closed or await request.is_disconnected():
+                        break
+                    yield b": keepalive\n\n"
+                    continue
+                telemetry.record_latency(message)
+                yield message.sse
+            if subscriber.close_reason == "client too slow":
+                yield b'event: disconnect\ndata: {"reason":"client too slow"}\n\n'
+        finally:
+            telemetry.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.websocket("/api/grid/stream")
+async def websocket_grid_telemetry(websocket: WebSocket, anomalies_only: bool = False):
+    """Live grid telemetry over WebSocket (same messages as the SSE stream, as JSON text frames)"""
+    await websocket.accept()
+    subscriber = telemetry.subscribe(anomalies_only=anomalies_only)
+    try:
+        await websocket.send_text(json.dumps({"type": "hello", "subscriber": subscriber.id}))
+        while not subscriber.closed:
+            message = await subscriber.get(HEARTBEAT_SECONDS)
+            if message is None:
+                if not subscriber.closed:
+                    await websocket.send_text('{"type":"heartbeat"}')
+                continue
+            telemetry.record_latency(message)
+            await websocket.send_text(message.json)
+        await websocket.close(code=1013, reason=subscriber.close_reason or "closed")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        telemetry.unsubscribe(subscriber)
+
+
+@app.post("/api/grid/stream/replay")
+async def start_stream_replay(
+    speed: float = 1800.0,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    loop: bool = False
+):
+    """
+    Replay historical rows into the live stream
+
+    Args:
+        speed: Time compression (default: 1800, one 30-minute row per second)
+        start: First timestamp (default: first row)
+        end: Last timestamp (default: last row)
+        loop: Restart from the beginning after the last row
+
+    Returns:
+        Replay state
+    """
+    if df is None:
+        raise HTTPException(status_code=503, detail="Data not loaded")
+    if speed <= 0:
+        raise HTTPException(status_code=400, detail="speed must be positive")
+    try:
+        start_ts = pd.to_datetime(start) if start else None
+        end_ts = pd.to_datetime(end) if end else None
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid timestamp format: {e}")
+    if start_ts is not None and end_ts is not None and start_ts > end_ts:
+        raise HTTPException(status_code=400, detail="Start time must be before end time")
+
+    try:
+        return await telemetry.start_replay(df, speed, start_ts, end_ts, loop_forever=loop)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.delete("/api/grid/stream/replay")
+async def stop_stream_replay():
+    """Stop a running replay"""
+    return await telemetry.stop_replay()
+
+
+@app.get("/api/grid/stream/stats")
+async def get_stream_stats(clients: bool = False):
+    """
+    Live stream statistics
+
+    Args:
+        clients: Include per-subscriber queue depth and drop counters
+
+    Returns:
+        Subscriber count, published rows/messages, slow-client
+        disconnects, fan-out latency percentiles and replay state
+    """
+    return telemetry.stats(include_subscribers=clients)
+
+
+# Serializes flushes: each one extends the frame the previous one produced
+_flush_lock = asyncio.Lock()
+
+
+def _extend_dataset(current: pd.DataFrame, rows) -> Tuple[pd.DataFrame, bool]:
+    """
+    Build the flushed frame (runs in the executor).
+
+    Fingerprints the new frame and carries the stored event analyses over
+    to its version, so appending rows doesn't discard them.
+
+    Returns:
+        (new frame, whether the appended rows contain anomalies)
+    """
+    extended = ingestor.extend(current, rows)
+    get_analysis_store().carry_forward(get_dataset_version(current), get_dataset_version(extended))
+    return extended, bool(extended['Is_Anomaly'].iloc[len(current):].any())
+
+
+async def _flush_ingested() -> int:
+    """Append the ingested rows pending in the ring buffer to df; returns the rows added."""
+    global df
+    async with _flush_lock:
+        rows = ingestor.take_pending()
+        if rows is None:
+            return 0
+        loop = asyncio.get_running_loop()
+        before = len(df)
+        df, new_anomalies = await loop.run_in_executor(None, _extend_dataset, df, rows)
+        set_live_dataset(df)
+        if analysis_jobs is not None:
+            analysis_jobs.set_dataset(df)
+            if PREANALYSIS_ENABLED and new_anomalies:
+                await loop.run_in_executor(None, schedule_preanalysis, analysis_jobs)
+        return len(df) - before
+
+
+async def _flush_periodically():
+    while True:
+        await asyncio.sleep(INGEST_FLUSH_SECONDS)
+        try:
+            await _flush_ingested()
+        except Exception as e:
+            print(f"[INGEST] Flush failed: {e}")
+
+
+@app.post("/api/grid/ingest")
+async def ingest_grid_data(request: Request, flush: bool = False):
+    """
+    Append live measurements
+
+    The body is NDJSON (Content-Type application/x-ndjson, one object per
+    row with "Timestamp" and dataset column names) or an Arrow IPC stream
+    (application/vnd.apache.arrow.stream). Only "Timestamp" and
+    "Grid Frequency (Hz)" are required. Timestamps must be strictly
+    increasing and later than the last known row; an invalid batch is
+    rejected as a whole.
+
+    Rows are scored with the rolling Z-Score on arrival and published to
+    /api/grid/stream immediately; they appear in the other endpoints after
+    the next flush (every few seconds, or right away with flush=true).
+
+    Args:
+        flush: Flush the buffered rows into the dataset before returning
+
+    Returns:
+        Accepted row count, anomalies found and buffer state
+    """
+    if df is None or ingestor is None:
+        raise HTTPException(status_code=503, detail="Data not loaded")
+
+    body = await request.body()
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    try:
+        if media_type == MEDIA_TYPES["arrow"]:
+            columns = parse_arrow(body)
+        elif media_type in ("", "application/x-ndjson", "application/ndjson", "application/jsonl", "text/plain"):
+            columns = parse_ndjson(body)
+        else:
+            raise HTTPException(
+                status_code=415,
+                detail=f"Content-Type must be application/x-ndjson or {MEDIA_TYPES['arrow']}"
+            )
+        if ingestor.buffer.pending + len(columns.get('Timestamp', ())) > ingestor.buffer.capacity:
+            await _flush_ingested()
+        result = ingestor.ingest(columns)
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    telemetry.submit(result.pop("rows"))
+    if flush or ingestor.needs_flush:
+        result["flushed"] = await _flush_ingested()
+        result["pending"] = ingestor.buffer.pending
+    return Response(content=dumps(result), media_type="application/json")
+
+
+@app.get("/api/grid/ingest/stats")
+async def get_ingest_stats():
+    """Ring buffer fill, ingested/rejected/flushed counters and per-row ingest cost"""
+    if ingestor is None:
+        raise HTTPException(status_code=503, detail="Data not loaded")
+    return {**ingestor.stats(), "records": len(df), "flush_interval_seconds": INGEST_FLUSH_SECONDS}
+
+
+@app.get("/api/grid/similar/{timestamp}")
+async def get_similar_events(timestamp: str, k: int = 5, past_only: bool = True):
+    """
+    Past anomaly events most similar to the event at a timestamp
+
+    Args:
+        timestamp: ISO format timestamp of the event
+        k: Number of events (default: 5, max: 20)
+        past_only: Only return events before the timestamp (default: true)
+
+    Returns:
+        Nearest events with distances and root causes
+    """
+    if df is None:
+        raise HTTPException(status_code=503, detail="Data not loaded")
+
+    try:
+        return get_event_index(df).similar_events(timestamp, k, past_only)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0] if e.args else str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp format: {e}")
+
+
+@app.get("/api/grid/attributions")
+async def get_attributions(limit: int = 100, offset: int = 0):
+    """
+    Rule-based root cause, confidence and recommendations for every anomaly
+
+    Args:
+        limit: Maximum number of results (default: 100, max: 1000)
+        offset: Number of results to skip (default: 0)
+
+    Returns:
+        Attributions from the current rule table (evaluated in one pass)
+    """
+    if df is None:
+        raise HTTPException(status_code=503, detail="Data not loaded")
+
+    limit = min(max(1, limit), 1000)
+    offset = max(0, offset)
+    positions = np.flatnonzero(df['Is_Anomaly'].to_numpy(dtype=bool))
+    return {
+        "total": int(len(positions)),
+        "limit": limit,
+        "offset": offset,
+        "rules_version": attribution_engine.rules["version"],
+        "results": attribution_engine.attribute(df, positions[offset:offset + limit])
+    }
+
+
+@app.get("/api/attribution/rules")
+async def get_attribution_rules():
+    """Loaded attribution rule table, reload count and last load error"""
+    return attribution_engine.status()
+
+
+class AnalysisRequest(BaseModel):
+    """Body of POST /api/analysis"""
+    timestamp: Optional[str] = None
+    question: Optional[str] = None
+
+
+def _get_job(job_id: str):
+    if analysis_jobs is None:
+        raise HTTPException(status_code=503, detail="Analysis queue not running")
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Analysis job {job_id} not found")
+    return job
+
+
+@app.post("/api/analysis", status_code=202)
+async def submit_analysis(request: AnalysisRequest):
+    """
+    Queue an event analysis (rule-based attribution plus AI agent)
+    
+    Jobs run in a bounded worker pool, most severe anomalies first.
+    Results already in the analysis store are returned immediately.
+    
+    Args:
+        request: Timestamp to analyze and/or a question for the agent
+    
+    Returns:
+        Job id, status and polling/stream URLs
+    """
+    if analysis_jobs is None:
+        raise HTTPException(status_code=503, detail="Analysis queue not running")
+    
+    try:
+        job = analysis_jobs.submit(timestamp=request.timestamp, question=request.question)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    response = job.to_dict(include_result=job.finished)
+    response["status_url"] = f"/api/analysis/{job.id}"
+    response["events_url"] = f"/api/analysis/{job.id}/events"
+    return response
+
+
+@app.post("/api/analysis/preanalyze")
+async def trigger_preanalysis(top_k: Optional[int] = None):
+    """
+    Queue speculative background analyses of the top anomalies
+    
+    Called automatically at startup; call again after a data refresh.
+    Background jobs only run while no interactive analysis is pending.
+    
+    Args:
+        top_k: Number of events ranked by |Z_Score| and recency
+    
+    Returns:
+        Timestamps queued and those already in the store
+    """
+    if analysis_jobs is None:
+        raise HTTPException(status_code=503, detail="Analysis queue not running")
+    
+    if top_k is None:
+        return schedule_preanalysis(analysis_jobs)
+    return schedule_preanalysis(analysis_jobs, top_k=max(0, min(top_k, 100)))
+
+
+@app.get("/api/analysis/{job_id}")
+async def get_analysis(job_id: str):
+    """
+    Get the status (and result once finished) of an analysis job
+    
+    Args:
+        job_id: Id returned by POST /api/analysis
+    
+    Returns:
+        Job state, latest progress event and result
+    """
+    return _get_job(job_id).to_dict()
+
+
+@app.get("/api/analysis/{job_id}/events")
+async def stream_analysis_events(job_id: str):
+    """
+    Stream progress events of an analysis job (Server-Sent Events)
+    
+    Each progress step is sent as a "progress" event; the stream ends with
+    a "result" event carrying the full job state.
+    """
+    job = _get_job(job_id)
+    loop = asyncio.get_running_loop()
+    
+    async def event_stream():
+        # Woken from the worker thread through the loop; no thread is parked per client
+        changed = asyncio.Event()
+        
+        def wake():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(changed.set)
+        
+        job.add_listener(wake)
+        try:
+            seen = 0
+            while True:
+                changed.clear()
+                events = job.events[seen:]
+                seen += len(events)
+                for event in events:
+                    yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+                if job.finished and seen >= len(job.events):
+                    yield f"event: result\ndata: {json.dumps(job.to_dict(), default=str)}\n\n"
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), 15.0)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            job.remove_listener(wake)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 # Mount Chainlit application
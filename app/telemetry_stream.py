@@ -0,0 +1,419 @@
+"""
+Live Telemetry Stream
+Fan-out of new grid rows and anomaly events to SSE/WebSocket subscribers
+
+Sources (the replay task, or anything calling submit) put row batches in
+one inbox. A single fan-out loop turns each row into messages, encodes
+every message once (JSON and its SSE frame), and appends it to each
+subscriber's bounded queue, so the cost per subscriber is one append.
+
+Message types:
+    row            one grid row (key metrics, anomaly flag, Z-Score)
+    anomaly_open   first anomalous row after normal ones
+    anomaly_close  first normal row after an anomaly run (start, end,
+                   rows, peak |Z|)
+    lag            sent to a subscriber before its next message when older
+                   messages were dropped for it
+    replay_end     the replay reached its last row
+
+Backpressure is per subscriber: a full queue drops its oldest message (the
+client later gets a "lag" message with the count), and a client that
+falls more than SLOW_CLIENT_FACTOR queues behind is disconnected. A slow
+client never delays the fan-out loop or the other subscribers.
+
+Replay drives the stream from the loaded dataset at N x real time (the
+30-minute spacing divided by N) for demos and load tests.
+
+Configuration:
+    STREAM_QUEUE_SIZE   Messages buffered per subscriber (default: 1000)
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "1000"))
+
+# Dropped messages (in queue lengths) before a subscriber is disconnected
+SLOW_CLIENT_FACTOR = 10
+
+# Seconds between heartbeats on an idle connection
+HEARTBEAT_SECONDS = 15.0
+
+# Rows per replay batch at high speeds
+REPLAY_BATCH_ROWS = 1000
+
+# Fan-out latency samples kept for percentiles
+LATENCY_SAMPLES = 10000
+
+# Row fields: output name -> dataset column
+ROW_FIELDS = {
+    'grid_frequency': 'Grid Frequency (Hz)',
+    'solar_output': 'Solar PV Output (kW)',
+    'wind_output': 'Wind Power Output (kW)',
+    'z_score': 'Z_Score',
+    'is_anomaly': 'Is_Anomaly',
+}
+
+
+def stream_rows(store, lo: int, hi: int) -> List[Dict[str, Any]]:
+    """
+    "row" payloads for rows [lo, hi) of a ColumnStore.
+
+    Args:
+        store: ColumnStore of the grid data
+        lo: First row position
+        hi: End row position (exclusive)
+    """
+    from app.grid_serialization import to_json_list
+
+    columns = {name: to_json_list(store.column(col, lo, hi)) for name, col in ROW_FIELDS.items()
+               if col in store.columns}
+    keys = ["timestamp"] + list(columns)
+    return [dict(zip(keys, values)) for values in zip(store.timestamps[lo:hi].tolist(), *columns.values())]
+
+
+class StreamMessage:
+    """A message encoded once for every subscriber."""
+
+    __slots__ = ("type", "json", "sse", "created")
+
+    def __init__(self, type: str, payload: Dict[str, Any], created: float):
+        self.type = type
+        self.json = json.dumps({"type": type, **payload}, separators=(',', ':'))
+        self.sse = f"event: {type}\ndata: {self.json}\n\n".encode("utf-8")
+        self.created = created
+
+
+class Subscriber:
+    """
+    One client's bounded message queue.
+
+    Args:
+        max_queue: Messages buffered before the oldest are dropped
+        anomalies_only: Skip "row" messages for normal rows
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, max_queue: int = STREAM_QUEUE_SIZE, anomalies_only: bool = False):
+        self.id = next(self._ids)
+        self.max_queue = max(1, max_queue)
+        self.anomalies_only = anomalies_only
+        self.delivered = 0
+        self.dropped = 0
+        self.closed = False
+        self.close_reason: Optional[str] = None
+        self._queue: deque = deque()
+        self._ready = asyncio.Event()
+        self._unreported = 0
+        self._behind = 0
+
+    def offer(self, message: StreamMessage):
+        """Queue a message, dropping the oldest one when full (never blocks)."""
+        if self.closed:
+            return
+        if len(self._queue) >= self.max_queue:
+            self._queue.popleft()
+            self.dropped += 1
+            self._unreported += 1
+            self._behind += 1
+            if self._behind > self.max_queue * SLOW_CLIENT_FACTOR:
+                self.close("client too slow")
+                return
+        self._queue.append(message)
+        self._ready.set()
+
+    def close(self, reason: str = "closed"):
+        if not self.closed:
+            self.closed, self.close_reason = True, reason
+            self._queue.clear()
+            self._ready.set()
+
+    async def get(self, timeout: float = HEARTBEAT_SECONDS) -> Optional[StreamMessage]:
+        """
+        Next message, or None on timeout or once closed.
+
+        A "lag" message is returned first when messages were dropped.
+        """
+        while not self._queue and not self.closed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.closed:
+            return None
+        self._behind = 0
+        if self._unreported:
+            dropped, self._unreported = self._unreported, 0
+            return StreamMessage("lag", {"dropped": dropped}, time.perf_counter())
+        self.delivered += 1
+        return self._queue.popleft()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "queued": len(self._queue),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "anomalies_only": self.anomalies_only
+        }
+
+
+class TelemetryBroadcaster:
+    """
+    Single fan-out loop from row sources to all subscribers.
+
+    Args:
+        max_queue: Default per-subscriber queue size
+    """
+
+    def __init__(self, max_queue: int = STREAM_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self._subscribers: Dict[int, Subscriber] = {}
+        self._inbox: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._replay_task: Optional[asyncio.Task] = None
+        self._replay: Dict[str, Any] = {}
+        self._latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._event: Optional[Dict[str, Any]] = None
+        self.rows_published = 0
+        self.messages_published = 0
+        self.disconnected_slow = 0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        """Start the fan-out loop on the running event loop."""
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._inbox = asyncio.Queue()
+            self._task = asyncio.create_task(self._fan_out())
+
+    async def stop(self):
+        """Stop replay and the fan-out loop, and close every subscriber."""
+        await self.stop_replay()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for subscriber in list(self._subscribers.values()):
+            subscriber.close("server shutdown")
+        self._subscribers.clear()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # ------------------------------------------------------------------
+    # Subscribers and sources
+    # ------------------------------------------------------------------
+
+    def subscribe(self, anomalies_only: bool = False, max_queue: Optional[int] = None) -> Subscriber:
+        subscriber = Subscriber(max_queue or self.max_queue, anomalies_only)
+        self._subscribers[subscriber.id] = subscriber
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.close("unsubscribed")
+        self._subscribers.pop(subscriber.id, None)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def submit(self, rows: List[Dict[str, Any]]):
+        """Queue rows for fan-out (call from the event loop thread)."""
+        if self._inbox is not None and rows:
+            self._inbox.put_nowait((time.perf_counter(), "row", rows))
+
+    def submit_threadsafe(self, rows: List[Dict[str, Any]]):
+        """Queue rows for fan-out from another thread."""
+        if self._loop is not None and rows:
+            self._loop.call_soon_threadsafe(self.submit, rows)
+
+    def publish(self, type: str, payload: Dict[str, Any]):
+        """Send a non-row message to every subscriber, after the rows already queued."""
+        if self._inbox is not None:
+            self._inbox.put_nowait((time.perf_counter(), type, payload))
+
+    # ------------------------------------------------------------------
+    # Fan-out
+    # ------------------------------------------------------------------
+
+    async def _fan_out(self):
+        while True:
+            created, type, data = await self._inbox.get()
+            if type != "row":
+                self._deliver(StreamMessage(type, data, created), anomaly=True)
+                continue
+            rows = data
+            # Normal rows are only encoded when someone takes every row
+            all_rows = any(not s.anomalies_only for s in self._subscribers.values())
+            for row in rows:
+                anomaly = bool(row.get("is_anomaly"))
+                for type, payload in self._transitions(row, anomaly):
+                    self._deliver(StreamMessage(type, payload, created), anomaly=True)
+                if anomaly or all_rows:
+                    self._deliver(StreamMessage("row", row, created), anomaly=anomaly)
+            self.rows_published += len(rows)
+            # Let subscriber writers run between batches
+            await asyncio.sleep(0)
+
+    def _transitions(self, row: Dict[str, Any], anomaly: bool):
+        """anomaly_open / anomaly_close messages for a row."""
+        z = row.get("z_score")
+        abs_z = abs(z) if isinstance(z, (int, float)) else None
+        if anomaly and self._event is None:
+            self._event = {"start": row["timestamp"], "end": row["timestamp"], "rows": 1, "peak_abs_z": abs_z}
+            yield "anomaly_open", {
+                "timestamp": row["timestamp"],
+                "grid_frequency": row.get("grid_frequency"),
+                "z_score": z
+            }
+        elif anomaly:
+            event = self._event
+            event["end"], event["rows"] = row["timestamp"], event["rows"] + 1
+            if abs_z is not None and (event["peak_abs_z"] is None or abs_z > event["peak_abs_z"]):
+                event["peak_abs_z"] = abs_z
+        elif self._event is not None:
+            event, self._event = self._event, None
+            yield "anomaly_close", {**event, "closed_at": row["timestamp"]}
+
+    def _deliver(self, message: StreamMessage, anomaly: bool):
+        self.messages_published += 1
+        for subscriber in list(self._subscribers.values()):
+            if subscriber.anomalies_only and not anomaly:
+                continue
+            subscriber.offer(message)
+            if subscriber.closed:
+                self._subscribers.pop(subscriber.id, None)
+                self.disconnected_slow += 1
+
+    def record_latency(self, message: StreamMessage):
+        """Record submit-to-delivery latency of a message picked up by a client."""
+        self._latencies.append(time.perf_counter() - message.created)
+
+    # ------------------------------------------------------------------
+    # Replay
+    # ------------------------------------------------------------------
+
+    async def start_replay(self, df: pd.DataFrame, speed: float = 60.0,
+                           start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None,
+                           loop_forever: bool = False) -> Dict[str, Any]:
+        """
+        Replay dataset rows into the stream at `speed` x real time.
+
+        Args:
+            df: Grid data DataFrame
+            speed: Time compression (1800 = one 30-minute row per second)
+            start: First timestamp (default: first row)
+            end: Last timestamp (default: last row)
+            loop_forever: Restart from `start` after the last row
+
+        Returns:
+            Replay state
+        """
+        from app.grid_serialization import get_column_store
+
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        await self.start()
+        await self.stop_replay()
+
+        store = get_column_store(df)
+        lo, hi = store.bounds(start if start is not None else store.index[0],
+                              end if end is not None else store.index[-1])
+        if hi == lo:
+            raise ValueError("No data in the replay range")
+        self._replay = {
+            "speed": speed,
+            "start": store.timestamps[lo],
+            "end": store.timestamps[hi - 1],
+            "rows": hi - lo,
+            "sent": 0,
+            "loops": 0,
+            "running": True
+        }
+        self._replay_task = asyncio.create_task(self._run_replay(store, lo, hi, speed, loop_forever))
+        return dict(self._replay)
+
+    async def stop_replay(self) -> Dict[str, Any]:
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            try:
+                await self._replay_task
+            except asyncio.CancelledError:
+                pass
+            self._replay_task = None
+        self._replay["running"] = False
+        return dict(self._replay)
+
+    async def _run_replay(self, store, lo: int, hi: int, speed: float, loop_forever: bool):
+        loop = asyncio.get_running_loop()
+        # Due time of every row relative to the replay start
+        offsets = (store.index_ns[lo:hi] - store.index_ns[lo]) / 1e9 / speed
+        try:
+            while True:
+                began, sent = loop.time(), 0
+                while sent < len(offsets):
+                    due = int(np.searchsorted(offsets, loop.time() - began, side='right'))
+                    due = min(due, sent + REPLAY_BATCH_ROWS)
+                    if due > sent:
+                        self.submit(stream_rows(store, lo + sent, lo + due))
+                        self._replay["sent"] += due - sent
+                        sent = due
+                    if sent < len(offsets):
+                        await asyncio.sleep(max(0.0, min(offsets[sent] - (loop.time() - began), 1.0)))
+                self._replay["loops"] += 1
+                if not loop_forever:
+                    break
+            self.publish("replay_end", {"rows": self._replay["sent"]})
+        finally:
+            self._replay["running"] = False
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def stats(self, include_subscribers: bool = False) -> Dict[str, Any]:
+        """Subscriber count, throughput counters, fan-out latency and replay state."""
+        latencies = np.array(self._latencies) * 1000 if self._latencies else None
+        result = {
+            "running": self.running,
+            "subscribers": self.subscriber_count,
+            "rows_published": self.rows_published,
+            "messages_published": self.messages_published,
+            "disconnected_slow_clients": self.disconnected_slow,
+            "dropped_messages": sum(s.dropped for s in self._subscribers.values()),
+            "fanout_latency_ms": {
+                "samples": int(len(latencies)),
+                "p50": round(float(np.percentile(latencies, 50)), 3),
+                "p99": round(float(np.percentile(latencies, 99)), 3),
+                "max": round(float(latencies.max()), 3)
+            } if latencies is not None else None,
+            "replay": dict(self._replay) or None,
+            "open_event": dict(self._event) if self._event else None
+        }
+        if include_subscribers:
+            result["clients"] = [s.stats() for s in self._subscribers.values()]
+        return result
+
+
+# Process-wide broadcaster used by the API and the Chainlit dashboard
+telemetry = TelemetryBroadcaster()
@@ -0,0 +1,193 @@
+"""
+Shared pytest fixtures
+A small synthetic grid dataset, an in-process Ollama stub and analysis
+job managers with stand-in agents
+
+Run with: python -m pytest test_llm_client.py test_ollama_stub.py ...
+(test_system.py, test_api.py and test_enterprise.py are standalone
+scripts that need the real dataset and a running server or Ollama).
+"""
+
+import os
+import tempfile
+import threading
+
+# Agents in tests run code in-process; no sandbox worker pools
+os.environ.setdefault("AGENT_SANDBOX", "0")
+# Never write to the real data/analysis_results.db
+os.environ.setdefault("ANALYSIS_STORE_PATH", os.path.join(tempfile.mkdtemp(prefix="grid-tests-"), "analysis.db"))
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app import agent_setup, llm_client
+from app.agent_setup import create_agent
+from app.analysis_jobs import AnalysisJobManager
+from app.analysis_store import AnalysisStore
+from app.circuit_breaker import llm_breaker
+from app.llm_client import DEFAULT_MODEL
+from app.data_loader import load_data
+from app.ollama_stub import OllamaStub
+
+
+collect_ignore = ["test_system.py", "test_api.py", "test_enterprise.py"]
+
+# Rows of the synthetic dataset and positions of the injected frequency dips
+GRID_ROWS = 400
+ANOMALY_POSITIONS = (150, 260, 330)
+
+
+@pytest.fixture(scope="session")
+def grid_csv(tmp_path_factory):
+    """CSV in the dataset's format with a few injected frequency dips."""
+    rng = np.random.default_rng(7)
+    index = pd.date_range("2021-01-01", periods=GRID_ROWS, freq="30min")
+    hour = index.hour + index.minute / 60
+    frequency = 50.0 + rng.normal(0, 0.01, GRID_ROWS)
+    frequency[list(ANOMALY_POSITIONS)] = [49.70, 49.75, 49.65]
+    frame = pd.DataFrame({
+        "Timestamp": index.strftime("%Y-%m-%d %H:%M:%S"),
+        "Grid Frequency (Hz)": frequency,
+        "Solar PV Output (kW)": np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * 300,
+        "Wind Power Output (kW)": 150 + rng.normal(0, 20, GRID_ROWS),
+        "Cloud Cover (%)": rng.uniform(0, 100, GRID_ROWS),
+        "Wind Speed (m/s)": rng.uniform(2, 12, GRID_ROWS),
+        "Temperature (C)": rng.uniform(10, 25, GRID_ROWS),
+        "Humidity (%)": rng.uniform(40, 80, GRID_ROWS),
+        "Curtailment Event Flag": 0,
+    })
+    path = tmp_path_factory.mktemp("data") / "grid.csv"
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def grid_df(grid_csv):
+    return load_data(grid_csv)
+
+
+@pytest.fixture
+def api(monkeypatch, grid_df):
+    """
+    API client serving grid_df.
+
+    Startup events are not run, so no LLM warm-up, job workers or
+    telemetry; endpoints that need those set them up themselves.
+    """
+    from app import server
+    monkeypatch.setattr(server, "df", grid_df)
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def ollama_stub(monkeypatch):
+    """
+    Factory starting an OllamaStub and pointing the app's clients at it.
+
+    Keyword arguments go to OllamaStub. The breaker, warm state, routing
+    table and cached agent are reset around each test.
+    """
+    stubs = []
+
+    def start(**kwargs) -> OllamaStub:
+        stub = OllamaStub(port=0, **kwargs).start()
+        stubs.append(stub)
+        monkeypatch.setattr(llm_client, "OLLAMA_BASE_URL", stub.url)
+        monkeypatch.setattr(agent_setup, "OLLAMA_BASE_URL", stub.url)
+        _reset_clients()
+        return stub
+
+    _reset_state(monkeypatch)
+    yield start
+    for stub in stubs:
+        stub.stop()
+    _reset_clients()
+    llm_breaker.reset()
+
+
+def _reset_clients():
+    llm_client.close_http_client()
+    agent_setup.initialize_llm.cache_clear()
+
+
+def _reset_state(monkeypatch):
+    llm_breaker.reset()
+    agent_setup.routing_stats.reset()
+    monkeypatch.setattr(llm_client, "_warm_models", {})
+    monkeypatch.setattr(agent_setup, "_cached_agent", None)
+    monkeypatch.setattr(agent_setup, "_cached_df_id", None)
+
+
+@pytest.fixture
+def ollama_down(ollama_stub):
+    """Point the app's clients at a stopped stub: every LLM call fails to connect."""
+    ollama_stub().stop()
+
+
+@pytest.fixture
+def stub_agent(ollama_stub, grid_df):
+    """Factory for a grid_df agent on the large model, answered by a fresh stub."""
+
+    def make(**stub_kwargs):
+        stub = ollama_stub(**stub_kwargs)
+        return stub, create_agent(grid_df, model=DEFAULT_MODEL, use_sandbox=False)
+
+    return make
+
+
+class GatedAgent:
+    """Agent stand-in that records questions and blocks until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.questions = []
+
+    def invoke(self, input):
+        self.questions.append(input["input"])
+        self.started.set()
+        self.release.wait(10)
+        return {"output": f"answer to {input['input']}"}
+
+
+@pytest.fixture
+def gated_agent():
+    agent = GatedAgent()
+    yield agent
+    agent.release.set()
+
+
+@pytest.fixture
+def store():
+    store = AnalysisStore(":memory:")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def make_manager(grid_df, store):
+    """Factory for an AnalysisJobManager on grid_df whose jobs use the given agent."""
+    managers = []
+
+    def make(agent, workers: int = 1):
+        manager = AnalysisJobManager(grid_df, store, agent_factory=lambda df: agent, workers=workers)
+        managers.append(manager)
+        return manager
+
+    yield make
+    for manager in managers:
+        manager.shutdown(timeout=5)
+
+
+@pytest.fixture
+def wait_done():
+    """Function blocking until an AnalysisJob finished; returns the job."""
+
+    def wait(job, timeout: float = 30.0):
+        while not job.finished:
+            assert job.wait_for_event(len(job.events), timeout), f"job {job.id} did not finish"
+        return job
+
+    return wait
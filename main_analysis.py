@@ -3,10 +3,13 @@ Main Analysis Logic Module
 Phase 4: Defining Monitoring and Trigger Logic
 """
 
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 
+from app.attribution import attribution_engine, compute_features
+
 
 def analyze_grid_event(
     target_timestamp: str,
@@ -88,39 +91,13 @@ def analyze_grid_event(
         wind_change_pct = ((current_row['Wind Power Output (kW)'] - prior_row['Wind Power Output (kW)']) / prior_row['Wind Power Output (kW)'] * 100) if prior_row['Wind Power Output (kW)'] > 0 else 0
         cloud_change = current_row['Cloud Cover (%)'] - prior_row['Cloud Cover (%)']
         
-        # Calculate confidence score based on data quality and correlation strength
-        confidence = 100
-        if abs(freq_change) < 0.1:
-            confidence -= 20  # Small frequency change reduces confidence
-        if abs(solar_change_pct) > 50 or abs(wind_change_pct) > 50:
-            confidence -= 10  # Extreme changes may indicate data quality issues
-        
-        # Determine primary root cause
-        root_cause = "Unknown"
-        if solar_change_pct < -10 and cloud_change > 10:
-            root_cause = "Weather Impact: Cloud cover increase caused solar generation drop"
-            confidence += 15  # Strong correlation increases confidence
-        elif solar_change_pct < -10:
-            root_cause = "Solar Generation Drop: Significant decrease in solar output"
-        elif wind_change_pct < -10:
-            root_cause = "Wind Generation Drop: Significant decrease in wind power"
-        elif abs(solar_change_pct) > 10 or abs(wind_change_pct) > 10:
-            root_cause = "Renewable Generation Loss: Combined renewable capacity reduction"
-        
-        confidence = min(100, max(0, confidence))  # Clamp between 0-100
-        
-        # Generate recommendations based on severity
-        recommendations = []
-        if abs(freq_change) > 0.2:
-            recommendations.append("URGENT: Activate backup power sources immediately")
-        else:
-            recommendations.append("Monitor situation closely")
-        
-        if cloud_change > 10:
-            recommendations.append("Weather-related: Monitor forecasts for recovery timeline")
-        
-        if current_row['Grid Frequency (Hz)'] < 49.5:
-            recommendations.append("CRITICAL: Consider load shedding to stabilize frequency")
+        # Root cause, confidence and recommendations come from the
+        # declarative rule table (app/attribution_rules.json)
+        position = np.array([df.index.get_loc(target_dt)])
+        verdict = attribution_engine.evaluate(compute_features(df, position))
+        root_cause = str(verdict["root_cause"][0])
+        confidence = int(verdict["confidence"][0])
+        recommendations = verdict["recommendations"][0]
         
         # Create structured JSON output
         analysis_json = {
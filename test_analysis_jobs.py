@@ -0,0 +1,76 @@
+"""
+Analysis Job Tests
+Dedupe and priority of AnalysisJobManager and the progress event stream
+
+Run with: python -m pytest test_analysis_jobs.py
+"""
+
+import json
+import threading
+import time
+
+from app import server
+
+
+def test_duplicate_submissions_share_one_job(make_manager, gated_agent, wait_done):
+    manager = make_manager(gated_agent)
+
+    first = manager.submit(question="How many anomalies?")
+    assert manager.submit(question="how many anomalies?  ") is first
+    gated_agent.release.set()
+    wait_done(first)
+
+    assert first.status == "done"
+    assert gated_agent.questions == ["How many anomalies?"]
+    # Finished results come back from the store without running again
+    again = manager.submit(question="How many anomalies?")
+    assert again is not first and again.cached and again.status == "done"
+    assert len(gated_agent.questions) == 1
+
+
+def test_higher_severity_runs_first(make_manager, gated_agent, wait_done):
+    manager = make_manager(gated_agent)
+
+    blocker = manager.submit(question="blocker", priority=10)
+    assert gated_agent.started.wait(10)
+    low = manager.submit(question="low", priority=1)
+    high = manager.submit(question="high", priority=5)
+    gated_agent.release.set()
+    for job in (blocker, low, high):
+        wait_done(job)
+
+    assert gated_agent.questions == ["blocker", "high", "low"]
+
+
+def test_event_stream_follows_job_to_result(api, monkeypatch, make_manager, gated_agent):
+    manager = make_manager(gated_agent)
+    monkeypatch.setattr(server, "analysis_jobs", manager)
+    job_id = api.post("/api/analysis", json={"question": "How many anomalies?"}).json()["job_id"]
+    assert gated_agent.started.wait(10)
+
+    job = manager.get(job_id)
+
+    def release_once_listening():
+        # The rest of the job's events must wake the waiting stream
+        deadline = time.monotonic() + 10
+        while not job._listeners and time.monotonic() < deadline:
+            time.sleep(0.01)
+        gated_agent.release.set()
+
+    threading.Thread(target=release_once_listening, daemon=True).start()
+    stages, result, event = [], None, None
+    with api.stream("GET", f"/api/analysis/{job_id}/events") as response:
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "result":
+                    result = data
+                    break
+                stages.append(data["stage"])
+
+    assert stages == ["queued", "running", "agent", "done"]
+    assert result["status"] == "done"
+    assert result["result"]["agent_analysis"] == "answer to How many anomalies?"
+    assert job._listeners == []
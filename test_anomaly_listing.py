@@ -0,0 +1,49 @@
+"""
+Anomaly Listing Tests
+Filters and cursor pagination of /api/grid/anomalies
+
+Run with: python -m pytest test_anomaly_listing.py
+"""
+
+import pytest
+
+
+def _all_pages(api, **params):
+    seen, cursor, totals = [], None, set()
+    while True:
+        body = api.get("/api/grid/anomalies", params=dict(params, **({"cursor": cursor} if cursor else {}))).json()
+        seen += body["results"]
+        totals.add(body["total"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return seen, totals
+
+
+@pytest.mark.parametrize("sort", ["time", "severity"])
+def test_cursor_pages_list_every_anomaly_once(api, grid_df, sort):
+    anomalies = grid_df[grid_df['Is_Anomaly']]
+    results, totals = _all_pages(api, limit=1, sort=sort)
+
+    assert totals == {len(anomalies)}
+    timestamps = [row["timestamp"] for row in results]
+    assert sorted(timestamps) == anomalies.index.strftime("%Y-%m-%d %H:%M:%S").tolist()
+    if sort == "time":
+        assert timestamps == sorted(timestamps)
+    else:
+        severities = [abs(row["z_score"]) for row in results]
+        assert severities == sorted(severities, reverse=True)
+
+
+def test_filters_narrow_total_and_pages(api, grid_df):
+    anomalies = grid_df[grid_df['Is_Anomaly']]
+    expected = anomalies[anomalies['Grid Frequency (Hz)'] <= 49.7]
+    response = api.get("/api/grid/anomalies", params={"max_frequency": 49.7, "limit": 1})
+
+    assert response.headers["X-Total-Count"] == str(len(expected))
+    results, _ = _all_pages(api, max_frequency=49.7, limit=1)
+    assert [row["timestamp"] for row in results] == expected.index.strftime("%Y-%m-%d %H:%M:%S").tolist()
+
+
+def test_bad_cursor_and_sort_are_rejected(api):
+    assert api.get("/api/grid/anomalies", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert api.get("/api/grid/anomalies", params={"sort": "random"}).status_code == 400
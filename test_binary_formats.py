@@ -0,0 +1,66 @@
+"""
+Binary Format Tests
+Arrow IPC / Parquet negotiation for the bulk data endpoints
+
+Run with: python -m pytest test_binary_formats.py
+"""
+
+import io
+
+import pytest
+
+from app import grid_serialization
+from app.grid_serialization import ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE, UnsupportedFormatError
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+RANGE = {"start": "2021-01-01 00:00:00", "end": "2021-01-02 00:00:00", "columns": "Grid Frequency (Hz)"}
+
+
+def test_accept_header_selects_arrow(api):
+    response = api.get("/api/grid/range", params=dict(RANGE, limit=10),
+                       headers={"Accept": f"{ARROW_STREAM_MEDIA_TYPE}, application/json;q=0.5"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == ARROW_STREAM_MEDIA_TYPE
+    assert response.headers["X-Total-Count"] == "49"
+
+    table = pa.ipc.open_stream(response.content).read_all()
+    rows = api.get("/api/grid/range", params=dict(RANGE, limit=10)).json()["data"]
+    assert table.num_rows == 10
+    assert table.column("Grid Frequency (Hz)").to_pylist() == pytest.approx(
+        [row["Grid Frequency (Hz)"] for row in rows])
+    # Pages keep the same cursor header as JSON
+    assert response.headers["X-Next-Cursor"] == "2021-01-01 05:00:00"
+
+
+def test_json_first_in_accept_wins(api):
+    response = api.get("/api/grid/range", params=RANGE,
+                       headers={"Accept": f"application/json, {ARROW_STREAM_MEDIA_TYPE}"})
+    assert response.headers["content-type"].startswith("application/json")
+
+
+def test_format_parameter_selects_parquet(api, grid_df):
+    response = api.get("/api/grid/anomalies", params={"format": "parquet"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == PARQUET_MEDIA_TYPE
+    assert "grid_anomalies.parquet" in response.headers["content-disposition"]
+
+    table = pq.read_table(io.BytesIO(response.content))
+    assert {"grid_frequency", "z_score"} <= set(table.column_names)
+    # Binary formats return every match by default (JSON pages by 10)
+    assert table.num_rows == int(grid_df['Is_Anomaly'].sum())
+
+
+def test_unknown_format_is_a_bad_request(api):
+    assert api.get("/api/grid/range", params=dict(RANGE, format="xml")).status_code == 400
+
+
+def test_binary_format_without_pyarrow_is_not_acceptable(api, monkeypatch):
+    def missing():
+        raise UnsupportedFormatError("Arrow and Parquet responses require pyarrow")
+
+    monkeypatch.setattr(grid_serialization, "_require_pyarrow", missing)
+    response = api.get("/api/grid/query", params={"expr": "frequency < 50", "format": "arrow"})
+    assert response.status_code == 406
+    assert "pyarrow" in response.json()["detail"]
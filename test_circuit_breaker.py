@@ -0,0 +1,37 @@
+"""
+Circuit Breaker Tests
+Opening on LLM failures and the rule-based fallback of analysis jobs
+
+Run with: python -m pytest test_circuit_breaker.py
+"""
+
+import pytest
+
+from app.circuit_breaker import llm_breaker, CircuitOpenError
+
+
+def test_open_breaker_falls_back_to_rules_without_persisting(stub_agent, make_manager, grid_df, store, wait_done):
+    stub, agent = stub_agent()
+    stub.stop()
+
+    # Every failed call is reported to the breaker until it opens
+    for _ in range(llm_breaker.failure_threshold):
+        with pytest.raises(Exception):
+            agent.invoke({"input": "What is the latest frequency?"})
+    assert llm_breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        llm_breaker.check()
+
+    manager = make_manager(agent)
+    anomaly = grid_df.index[grid_df['Is_Anomaly']][0].strftime('%Y-%m-%d %H:%M:%S')
+    job = wait_done(manager.submit(timestamp=anomaly))
+
+    assert job.status == "done"
+    assert job.result["degraded"] is True
+    assert job.result["agent_analysis"] is None
+    assert job.result["rule_analysis"]["status"] == "anomaly"
+    assert store.get(job.key) is None
+
+    question = wait_done(manager.submit(question="Which were the most severe events?"))
+    assert question.result["degraded"] is True
+    assert question.result["rule_analysis"]["analysis"]
@@ -0,0 +1,40 @@
+"""
+Evaluation Scorer Tests
+Number extraction and tolerance checks used by app.evaluation
+
+Run with: python -m pytest test_evaluation.py
+"""
+
+from app.evaluation import extract_numbers, is_correct
+
+
+def test_timestamps_are_not_numbers():
+    # Regression: "2021-01-02 18:00:00" used to yield 2021, -1, -2, 18, 0, 0
+    answer = "At 2021-01-02 18:00:00 the grid frequency was 49.85 Hz."
+    assert extract_numbers(answer) == [49.85]
+
+
+def test_timestamp_does_not_match_small_expected_value():
+    answer = "The anomaly at 2021-01-02 18:00:00 is shown above."
+    assert not is_correct(extract_numbers(answer), -1, abs_tol=0.5)
+    assert not is_correct(extract_numbers(answer), 0, abs_tol=0)
+
+
+def test_times_and_iso_timestamps_are_skipped():
+    assert extract_numbers("Between 17:30 and 18:00 wind fell by -12.5 kW") == [-12.5]
+    assert extract_numbers("2021-01-02T18:00:00 reading: 3") == [3.0]
+
+
+def test_negative_numbers_and_thousands_separators():
+    assert extract_numbers("Change: -3.25 kW, total 1,234.5 kWh") == [-3.25, 1234.5]
+
+
+def test_hyphen_after_digit_is_not_a_sign():
+    assert extract_numbers("a range of 5-10 kW") == [5.0, 10.0]
+
+
+def test_is_correct_tolerances():
+    assert is_correct([49.851], 49.85, abs_tol=0.01)
+    assert not is_correct([49.9], 49.85, abs_tol=0.01)
+    assert is_correct([104.0], 100.0, rel_tol=0.05)
+    assert not is_correct([], 1.0, abs_tol=1.0)
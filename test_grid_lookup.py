@@ -0,0 +1,62 @@
+"""
+Lookup Endpoint Tests
+Exact and as-of resolution of many timestamps with /api/grid/lookup
+
+Run with: python -m pytest test_grid_lookup.py
+"""
+
+import pandas as pd
+import pytest
+
+FREQUENCY = "Grid Frequency (Hz)"
+
+# Request order is kept: unsorted, off-grid, before the first and after the last row
+TIMESTAMPS = [
+    "2021-01-01 01:10:00",
+    "2021-01-01 00:30:00",
+    "2021-01-01 01:20:00",
+    "2020-12-31 23:00:00",
+    "2021-01-09 09:00:00",
+]
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("exact", [None, "2021-01-01 00:30:00", None, None, None]),
+    ("previous", ["2021-01-01 01:00:00", "2021-01-01 00:30:00", "2021-01-01 01:00:00", None,
+                  "2021-01-09 07:30:00"]),
+    ("next", ["2021-01-01 01:30:00", "2021-01-01 00:30:00", "2021-01-01 01:30:00", "2021-01-01 00:00:00",
+              None]),
+    ("nearest", ["2021-01-01 01:00:00", "2021-01-01 00:30:00", "2021-01-01 01:30:00", "2021-01-01 00:00:00",
+                 "2021-01-09 07:30:00"]),
+])
+def test_modes_resolve_in_request_order(api, grid_df, mode, expected):
+    response = api.post("/api/grid/lookup", json={"timestamps": TIMESTAMPS, "mode": mode, "columns": [FREQUENCY]})
+    assert response.status_code == 200
+    body = response.json()
+
+    assert body["count"] == len(TIMESTAMPS)
+    assert body["matched"] == sum(ts is not None for ts in expected)
+    assert body["data"]["timestamp"] == expected
+    assert list(body["data"]) == ["timestamp", FREQUENCY]
+    for ts, value in zip(expected, body["data"][FREQUENCY]):
+        assert value == (None if ts is None else pytest.approx(grid_df.at[pd.Timestamp(ts), FREQUENCY]))
+
+
+def test_tolerance_limits_as_of_matches(api):
+    body = api.post("/api/grid/lookup", json={
+        "timestamps": TIMESTAMPS, "mode": "nearest", "tolerance": "15min"
+    }).json()
+    assert body["data"]["timestamp"] == [
+        "2021-01-01 01:00:00", "2021-01-01 00:30:00", "2021-01-01 01:30:00", None, None
+    ]
+
+
+@pytest.mark.parametrize("body", [
+    {"timestamps": ["2021-01-01"], "mode": "closest"},
+    {"timestamps": ["2021-01-01"], "mode": "nearest", "tolerance": "soon"},
+    {"timestamps": ["2021-01-01"], "mode": "nearest", "tolerance": "-5min"},
+    {"timestamps": ["2021-01-01", "yesterday-ish"]},
+    {"timestamps": ["2021-01-01"], "columns": ["No Such Column"]},
+])
+def test_invalid_requests_are_rejected(api, body):
+    assert api.post("/api/grid/lookup", json=body).status_code == 400
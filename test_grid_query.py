@@ -0,0 +1,43 @@
+"""
+Query Endpoint Tests
+Filter expressions and cursor pagination of /api/grid/query
+
+Run with: python -m pytest test_grid_query.py
+"""
+
+EXPR = "frequency < 50"
+
+
+def test_pages_cover_the_matches_once(api, grid_df):
+    expected = grid_df.index[grid_df['Grid Frequency (Hz)'] < 50].strftime("%Y-%m-%d %H:%M:%S").tolist()
+    seen, cursor = [], None
+    while True:
+        params = {"expr": EXPR, "limit": 50, **({"cursor": cursor} if cursor else {})}
+        response = api.get("/api/grid/query", params=params)
+        assert response.status_code == 200
+        body = response.json()
+        assert body["matches"] == len(expected)
+        assert response.headers["X-Total-Count"] == str(len(expected))
+        seen += [row["timestamp"] for row in body["data"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected
+
+
+def test_time_bounds_and_cursor_past_the_end(api, grid_df):
+    params = {"expr": EXPR, "start": "2021-01-02", "end": "2021-01-03"}
+    in_range = grid_df.loc["2021-01-02":"2021-01-03 00:00:00"]
+    expected = int((in_range['Grid Frequency (Hz)'] < 50).sum())
+    assert api.get("/api/grid/query", params=params).json()["matches"] == expected
+
+    body = api.get("/api/grid/query", params=dict(params, cursor="2021-02-01", limit=5)).json()
+    assert body["matches"] == expected
+    assert body["count"] == 0 and body["data"] == [] and body["next_cursor"] is None
+
+
+def test_invalid_expression_is_a_bad_request(api):
+    response = api.get("/api/grid/query", params={"expr": "frequency <"})
+    assert response.status_code == 400
+    assert api.get("/api/grid/query", params={"expr": "no_such_column > 1"}).status_code == 400
@@ -0,0 +1,41 @@
+"""
+Range Endpoint Tests
+Cursor pagination of /api/grid/range
+
+Run with: python -m pytest test_grid_range.py
+"""
+
+RANGE = {"start": "2021-01-01 00:00:00", "end": "2021-01-02 00:00:00"}  # 49 rows
+
+
+def test_pages_cover_the_range_once(api):
+    seen, cursor = [], None
+    while True:
+        params = dict(RANGE, limit=10, **({"cursor": cursor} if cursor else {}))
+        response = api.get("/api/grid/range", params=params)
+        assert response.status_code == 200
+        assert response.headers["X-Total-Count"] == "49"
+        body = response.json()
+        assert body["count"] == len(body["data"])
+        seen += [row["timestamp"] for row in body["data"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            assert "X-Next-Cursor" not in response.headers
+            break
+        assert response.headers["X-Next-Cursor"] == cursor
+
+    assert len(seen) == 49 and len(set(seen)) == 49
+    assert seen == sorted(seen)
+
+
+def test_cursor_past_the_end_is_an_empty_page(api):
+    response = api.get("/api/grid/range", params=dict(RANGE, limit=3, cursor="2021-01-05"))
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "49"
+    body = response.json()
+    assert body["count"] == 0 and body["data"] == [] and body["next_cursor"] is None
+
+
+def test_cursor_past_the_end_without_limit(api):
+    body = api.get("/api/grid/range", params=dict(RANGE, cursor="2021-01-05")).json()
+    assert body["count"] == 0 and body["data"] == []
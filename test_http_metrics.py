@@ -0,0 +1,47 @@
+"""
+HTTP Metrics Tests
+Route-template labels and the Prometheus /metrics endpoint
+
+Run with: python -m pytest test_http_metrics.py
+"""
+
+import re
+
+
+def _sample(text: str, name: str, **labels) -> float:
+    """Value of one series in the exposition text (0 when absent)."""
+    selector = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{re.escape(name)}\{{{re.escape(selector)}\}} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_requests_are_labelled_by_route_template(api):
+    route = "/api/grid/status/{timestamp}"
+    before = api.get("/metrics").text
+    for timestamp in ("2021-01-05 00:00:00", "2021-01-05 00:30:00", "2031-01-01 00:00:00"):
+        api.get(f"/api/grid/status/{timestamp}")
+    api.get("/no/such/route")
+
+    response = api.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+
+    def delta(name, **labels):
+        return _sample(text, name, **labels) - _sample(before, name, **labels)
+
+    assert delta("http_requests_total", method="GET", route=route, status="200") == 2
+    assert delta("http_requests_total", method="GET", route=route, status="404") == 1
+    assert delta("http_requests_total", method="GET", route="unmatched", status="404") == 1
+    assert delta("http_request_duration_seconds_count", method="GET", route=route) == 3
+    assert delta("http_response_size_bytes_count", method="GET", route=route) == 3
+    # Concrete paths never become labels
+    assert "2021-01-05" not in text
+
+
+def test_metrics_expose_every_family_once(api):
+    text = api.get("/metrics").text
+    families = re.findall(r"^# TYPE (\S+) (\S+)$", text, re.MULTILINE)
+    names = [name for name, _ in families]
+    assert len(names) == len(set(names))
+    assert {"http_requests_total", "http_request_duration_seconds", "http_requests_in_flight"} <= set(names)
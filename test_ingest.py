@@ -0,0 +1,119 @@
+"""
+Ingest Endpoint Tests
+Batch validation, buffering and flushing ingested rows into the dataset
+served by the API
+
+Run with: python -m pytest test_ingest.py
+"""
+
+import json
+import time
+
+import pytest
+
+from app import data_loader, server
+from app.analysis_jobs import AnalysisJobManager
+from app.analysis_store import get_analysis_store, result_key
+from app.data_loader import get_dataset_version
+from app.ingest import GridIngestor
+
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+
+class InstantAgent:
+    def invoke(self, input):
+        return {"output": f"answer to {input['input']}"}
+
+
+def _ndjson(rows) -> bytes:
+    return b"\n".join(json.dumps(row).encode() for row in rows)
+
+
+def _next_rows(df, frequencies):
+    start = df.index[-1]
+    return [{"Timestamp": (start + (i + 1) * (df.index[1] - df.index[0])).strftime("%Y-%m-%d %H:%M:%S"),
+             "Grid Frequency (Hz)": frequency}
+            for i, frequency in enumerate(frequencies)]
+
+
+@pytest.fixture
+def ingest_api(api, monkeypatch, grid_df):
+    """api with an ingestor and a job manager whose agent answers instantly."""
+    manager = AnalysisJobManager(grid_df, get_analysis_store(), agent_factory=lambda df: InstantAgent())
+    monkeypatch.setattr(server, "ingestor", GridIngestor(grid_df))
+    monkeypatch.setattr(server, "analysis_jobs", manager)
+    monkeypatch.setattr(data_loader, "_live_dataset", grid_df)
+    yield api
+    manager.shutdown(timeout=5)
+
+
+def test_invalid_batches_are_rejected_whole(ingest_api, grid_df):
+    rows = _next_rows(grid_df, [50.0, 50.01, 49.99])
+    rows[2]["Timestamp"] = rows[0]["Timestamp"]
+    response = ingest_api.post("/api/grid/ingest", content=_ndjson(rows), headers=NDJSON)
+    assert response.status_code == 400
+
+    stale = _next_rows(grid_df.iloc[:-1], [50.0])  # the last known timestamp again
+    assert ingest_api.post("/api/grid/ingest", content=_ndjson(stale), headers=NDJSON).status_code == 400
+
+    response = ingest_api.post("/api/grid/ingest", content=b'{"Timestamp": "2021-02-01"}\n{oops', headers=NDJSON)
+    assert response.status_code == 400 and "Line 2" in response.json()["detail"]
+
+    response = ingest_api.post("/api/grid/ingest", content=b"a,b", headers={"Content-Type": "text/csv"})
+    assert response.status_code == 415
+
+    stats = ingest_api.get("/api/grid/ingest/stats").json()
+    # Unparseable bodies never reach validation; only the first two count
+    assert stats["rows_ingested"] == 0 and stats["rejected_batches"] == 2
+    assert stats["records"] == len(grid_df)
+
+
+def test_rows_wait_in_the_buffer_until_flushed(ingest_api, grid_df):
+    rows = _next_rows(grid_df, [50.0, 50.01, 50.02])
+    response = ingest_api.post("/api/grid/ingest", content=_ndjson(rows[:2]), headers=NDJSON)
+    assert response.status_code == 200
+    assert response.json()["accepted"] == 2 and "flushed" not in response.json()
+    assert server.df is grid_df
+
+    stats = ingest_api.get("/api/grid/ingest/stats").json()
+    assert stats["pending"] == 2 and stats["records"] == len(grid_df)
+
+    response = ingest_api.post("/api/grid/ingest", params={"flush": "true"},
+                               content=_ndjson(rows[2:]), headers=NDJSON)
+    assert response.json()["flushed"] == 3
+    assert ingest_api.get("/api/grid/ingest/stats").json()["pending"] == 0
+    assert server.df.index[-1].strftime("%Y-%m-%d %H:%M:%S") == rows[-1]["Timestamp"]
+
+
+def test_flush_carries_stored_event_analyses_forward(ingest_api, grid_df):
+    store = get_analysis_store()
+    event = grid_df.index[grid_df['Is_Anomaly']][0].strftime('%Y-%m-%d %H:%M:%S')
+    old_version = get_dataset_version(grid_df)
+    store.put(result_key(old_version, event, None), old_version, event, None, {"agent_analysis": "stored"})
+    store.put(result_key(old_version, None, "how many?"), old_version, None, "how many?", {"agent_analysis": "3"})
+
+    response = ingest_api.post("/api/grid/ingest", params={"flush": "true"},
+                               content=_ndjson(_next_rows(grid_df, [50.0, 50.01])), headers=NDJSON)
+    assert response.status_code == 200
+    assert response.json()["flushed"] == 2
+
+    new_version = get_dataset_version(server.df)
+    assert new_version != old_version and len(server.df) == len(grid_df) + 2
+    assert data_loader.get_live_dataset() is server.df
+    assert store.get(result_key(new_version, event, None))["result"] == {"agent_analysis": "stored"}
+    # Answers about the whole dataset are stale once rows are appended
+    assert store.get(result_key(new_version, None, "how many?")) is None
+
+
+def test_flush_with_new_anomaly_schedules_preanalysis(ingest_api, grid_df, monkeypatch):
+    monkeypatch.setattr(server, "PREANALYSIS_ENABLED", True)
+    rows = _next_rows(grid_df, [50.0, 49.2])
+    response = ingest_api.post("/api/grid/ingest", params={"flush": "true"},
+                               content=_ndjson(rows), headers=NDJSON)
+    assert response.json()["anomalies"] == 1
+
+    key = result_key(get_dataset_version(server.df), rows[1]["Timestamp"], None)
+    deadline = time.monotonic() + 10
+    while get_analysis_store().get(key) is None:
+        assert time.monotonic() < deadline, "new anomaly was not pre-analyzed"
+        time.sleep(0.05)
@@ -0,0 +1,66 @@
+"""
+Ollama Client Tests
+Warm-up, keep-alive expiry and the readiness endpoint against OllamaStub
+
+Run with: python -m pytest test_llm_client.py
+"""
+
+import time
+
+from app import llm_client
+from app.llm_client import DEFAULT_MODEL, warm_up, is_warm, mark_warm, keep_alive_seconds
+
+
+def test_keep_alive_parsing():
+    assert keep_alive_seconds("30m") == 1800
+    assert keep_alive_seconds("1h30m") == 5400
+    assert keep_alive_seconds("300") == 300
+    assert keep_alive_seconds("0") == 0
+    assert keep_alive_seconds("-1") == float("inf")
+    assert keep_alive_seconds("soon") == 300  # Ollama's default
+
+
+def test_warm_up_marks_model_warm(ollama_stub):
+    ollama_stub()
+    assert not is_warm(DEFAULT_MODEL)
+    result = warm_up(DEFAULT_MODEL)
+    assert result["ready"] is True
+    assert is_warm(DEFAULT_MODEL)
+
+
+def test_warm_flag_expires_after_keep_alive(ollama_stub):
+    ollama_stub()
+    assert warm_up(DEFAULT_MODEL, keep_alive="0")["ready"]
+    assert not is_warm(DEFAULT_MODEL)
+
+    mark_warm(DEFAULT_MODEL, "30m")
+    assert is_warm(DEFAULT_MODEL)
+    llm_client._warm_models[DEFAULT_MODEL] = time.time() - 1
+    assert not is_warm(DEFAULT_MODEL)
+
+
+def test_warm_up_failure_is_not_ready(ollama_down):
+    result = warm_up(DEFAULT_MODEL)
+    assert result["ready"] is False
+    assert result["error"]
+    assert not is_warm(DEFAULT_MODEL)
+
+
+def test_readiness_warms_once_until_keep_alive_expires(ollama_stub, api):
+    stub = ollama_stub()
+    assert api.get("/api/health/ready").status_code == 200
+    served = stub.requests_served
+    assert served == 1
+
+    assert api.get("/api/health/ready").status_code == 200
+    assert stub.requests_served == served
+
+    llm_client._warm_models[DEFAULT_MODEL] = time.time() - 1
+    assert api.get("/api/health/ready").status_code == 200
+    assert stub.requests_served == served + 1
+
+
+def test_readiness_unavailable_without_ollama(ollama_down, api):
+    response = api.get("/api/health/ready")
+    assert response.status_code == 503
+    assert "LLM not ready" in response.json()["detail"]
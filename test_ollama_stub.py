@@ -0,0 +1,72 @@
+"""
+Ollama Stub Tests
+Transcript replay, misses, model overrides and a full agent run offline
+
+Run with: python -m pytest test_ollama_stub.py
+"""
+
+import json
+
+import httpx
+
+from app.llm_client import DEFAULT_MODEL
+from app.ollama_stub import request_key, STUB_MODELS
+
+
+def _chat(stub, model, messages):
+    response = httpx.post(f"{stub.url}/api/chat", json={"model": model, "messages": messages, "stream": False})
+    response.raise_for_status()
+    return response.json()["message"]["content"]
+
+
+def test_replays_recorded_exchange_by_key(ollama_stub, tmp_path):
+    messages = [{"role": "user", "content": "What is the grid frequency?"}]
+    transcript = tmp_path / "transcript.jsonl"
+    transcript.write_text(json.dumps({
+        "key": request_key(DEFAULT_MODEL, messages), "model": DEFAULT_MODEL,
+        "messages": messages, "response": "Final Answer: 50.01 Hz", "metrics": {}
+    }) + "\n")
+    stub = ollama_stub(transcript_path=str(transcript))
+
+    assert _chat(stub, DEFAULT_MODEL, messages) == "Final Answer: 50.01 Hz"
+    assert stub.transcript.hits == 1
+
+
+def test_key_mismatch_is_a_miss_not_the_next_entry(ollama_stub, tmp_path):
+    recorded = [{"role": "user", "content": "First recorded question"}]
+    transcript = tmp_path / "transcript.jsonl"
+    transcript.write_text(json.dumps({
+        "key": request_key(DEFAULT_MODEL, recorded), "model": DEFAULT_MODEL,
+        "messages": recorded, "response": "Final Answer: recorded", "metrics": {}
+    }) + "\n")
+    stub = ollama_stub(transcript_path=str(transcript))
+
+    content = _chat(stub, DEFAULT_MODEL, [{"role": "user", "content": "Question: something else"}])
+    assert content != "Final Answer: recorded"
+    assert content.startswith("Thought:")  # scripted ReAct fallback
+    assert stub.transcript.misses == 1
+    # The same model with different messages, or a different model, never matches
+    assert _chat(stub, "other-model", recorded) != "Final Answer: recorded"
+
+
+def test_tags_list_default_and_override_models(ollama_stub):
+    stub = ollama_stub(model_overrides={"tiny": {"reply": "x"}})
+    names = [m["name"] for m in httpx.get(f"{stub.url}/api/tags").json()["models"]]
+    assert names == STUB_MODELS + ["tiny"]
+
+    stub = ollama_stub(models=[DEFAULT_MODEL])
+    assert [m["name"] for m in httpx.get(f"{stub.url}/api/tags").json()["models"]] == [DEFAULT_MODEL]
+
+
+def test_model_override_reply(ollama_stub):
+    stub = ollama_stub(model_overrides={"tiny": {"reply": "not a ReAct step"}})
+    assert _chat(stub, "tiny", [{"role": "user", "content": "hi"}]) == "not a ReAct step"
+
+
+def test_agent_run_terminates_on_scripted_replies(stub_agent):
+    stub, agent = stub_agent()
+    response = agent.invoke({"input": "Which were the most severe events?"})
+
+    assert response["output"] == "Analysis complete (scripted stub reply)."
+    assert [action.tool for action, _ in response["intermediate_steps"]] == ["top_events"]
+    assert stub.requests_served == 2
@@ -0,0 +1,30 @@
+"""
+Pre-Analysis Tests
+Candidate ranking and background jobs yielding to interactive ones
+
+Run with: python -m pytest test_preanalysis.py
+"""
+
+from app.preanalysis import first_anomaly_timestamp, select_candidates
+
+
+def test_first_anomaly_ranks_first(grid_df):
+    candidates = select_candidates(grid_df, top_k=2)
+    assert candidates[0][0] == first_anomaly_timestamp(grid_df)
+    assert len({timestamp for timestamp, _ in candidates}) == len(candidates) <= 3
+    assert [score for _, score in candidates] == sorted((score for _, score in candidates), reverse=True)
+
+
+def test_interactive_submit_promotes_queued_background_job(make_manager, gated_agent, wait_done):
+    manager = make_manager(gated_agent)
+
+    blocker = manager.submit(question="blocker")
+    assert gated_agent.started.wait(10)
+    background = manager.submit(question="speculative", background=True)
+    promoted = manager.submit(question="speculative")
+    assert promoted is background and not background.background
+
+    gated_agent.release.set()
+    wait_done(blocker)
+    wait_done(background)
+    assert gated_agent.questions == ["blocker", "speculative"]
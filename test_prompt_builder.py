@@ -0,0 +1,31 @@
+"""
+Prompt Builder Tests
+The compact prefix stays byte-identical while rows are appended
+
+Run with: python -m pytest test_prompt_builder.py
+"""
+
+from app.agent_setup import create_agent
+from app.llm_client import DEFAULT_MODEL
+from app.prompt_builder import build_prefix, build_suffix
+
+
+def test_compact_prefix_ignores_appended_rows(grid_df):
+    grown = grid_df.iloc[:-10]
+    prefix = build_prefix(grown, compact=True)["prefix"]
+    assert build_prefix(grid_df, compact=True)["prefix"] == prefix
+    assert f"{len(grown)} rows" not in prefix and "Grid Frequency (Hz) [float64]" in prefix
+
+    assert f"{len(grown)} rows" in build_suffix(grown, compact=True)
+    assert f"{len(grid_df)} rows" in build_suffix(grid_df, compact=True)
+    assert build_suffix(grid_df, compact=False) is None
+
+
+def test_compact_agent_prompt_puts_statistics_before_the_question(ollama_stub, grid_df):
+    ollama_stub()
+    agent = create_agent(grid_df, model=DEFAULT_MODEL, compact_prompt=True, use_sandbox=False)
+    template = agent.agent.runnable.get_prompts()[0].template
+
+    assert template.startswith(build_prefix(grid_df, compact=True)["prefix"])
+    statistics = template.index(f"Current data: {len(grid_df)} rows")
+    assert template.index("get_row") < statistics < template.index("Question: {input}")
@@ -0,0 +1,44 @@
+"""
+Response Cache Tests
+Dataset fingerprints behind the ETags of the cached grid endpoints
+
+Run with: python -m pytest test_response_cache.py
+"""
+
+import gc
+
+from app import data_loader, server
+from app.data_loader import get_dataset_version
+
+
+def test_status_etag_revalidates(api):
+    first = api.get("/api/grid/status")
+    assert first.status_code == 200
+    again = api.get("/api/grid/status", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_any_changed_column_changes_the_etag(api, monkeypatch, grid_df):
+    etag = api.get("/api/grid/status").headers["ETag"]
+
+    # Same index and frequency: only the solar output of the latest row differs
+    changed = grid_df.copy()
+    changed.iloc[-1, changed.columns.get_loc("Solar PV Output (kW)")] += 1.0
+    assert get_dataset_version(changed) != get_dataset_version(grid_df)
+    monkeypatch.setattr(server, "df", changed)
+
+    response = api.get("/api/grid/status", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_version_cache_forgets_collected_frames(grid_df):
+    before = len(data_loader._version_cache)
+    frames = [grid_df.copy() for _ in range(3)]
+    for frame in frames:
+        get_dataset_version(frame)
+    assert len(data_loader._version_cache) == before + 3
+
+    del frames, frame
+    gc.collect()
+    assert len(data_loader._version_cache) == before
@@ -0,0 +1,86 @@
+"""
+Model Routing Tests
+Query classification, small-model answers and escalation against OllamaStub
+
+Run with: python -m pytest test_routing.py
+"""
+
+from app import agent_setup
+from app.agent_setup import RoutedAgent, classify_query, get_or_create_agent, routing_stats
+from app.circuit_breaker import llm_breaker
+from app.llm_client import DEFAULT_MODEL, SMALL_MODEL
+
+SIMPLE_QUESTION = "Which were the most severe events?"
+
+
+def _routed(grid_df, sla_seconds: float = 5.0) -> RoutedAgent:
+    return RoutedAgent(grid_df, sla_seconds=sla_seconds, use_sandbox=False)
+
+
+def test_classify_query():
+    assert classify_query(SIMPLE_QUESTION) == "simple"
+    assert classify_query("Why did the frequency drop at 2021-01-01 01:30:00?") == "complex"
+    assert classify_query(" ".join(["word"] * 30)) == "complex"
+
+
+def test_simple_query_answered_by_small_model(ollama_stub, grid_df):
+    ollama_stub()
+    response = _routed(grid_df).invoke({"input": SIMPLE_QUESTION})
+
+    assert response["routing"] == {"model": SMALL_MODEL, "reason": "simple query", "escalated": False}
+    assert routing_stats.snapshot(SMALL_MODEL)["samples"] == 1
+    assert routing_stats.snapshot(DEFAULT_MODEL)["samples"] == 0
+
+
+def test_complex_query_goes_to_large_model(ollama_stub, grid_df):
+    ollama_stub()
+    response = _routed(grid_df).invoke({"input": "Explain the root cause of the first anomaly"})
+    assert response["routing"]["model"] == DEFAULT_MODEL
+    assert response["routing"]["escalated"] is False
+
+
+def test_unparseable_small_reply_escalates(ollama_stub, grid_df):
+    ollama_stub(model_overrides={SMALL_MODEL: {"reply": "I am not sure what to do."}})
+    response = _routed(grid_df).invoke({"input": SIMPLE_QUESTION})
+
+    assert response["routing"]["model"] == DEFAULT_MODEL
+    assert response["routing"]["escalated"] is True
+    assert response["output"] == "Analysis complete (scripted stub reply)."
+
+
+def test_slow_small_model_is_cut_off_by_the_sla(ollama_stub, grid_df):
+    ollama_stub(model_overrides={SMALL_MODEL: {"latency_ms": 5000}})
+    response = _routed(grid_df, sla_seconds=1.0).invoke({"input": SIMPLE_QUESTION})
+
+    assert response["routing"]["escalated"] is True
+    assert "Timeout" in response["routing"]["reason"]
+    # The HTTP timeout bounds the single slow call, not just the step loop
+    assert routing_stats.snapshot(SMALL_MODEL)["avg_latency_s"] < 3.0
+
+
+def test_routing_disabled_when_small_model_missing(ollama_stub, grid_df):
+    ollama_stub(models=[DEFAULT_MODEL])
+    agent = get_or_create_agent(grid_df, model=DEFAULT_MODEL)
+    assert not isinstance(agent, RoutedAgent)
+    assert not agent_setup.is_routing_active()
+
+
+def test_routing_enabled_when_small_model_installed(ollama_stub, grid_df):
+    ollama_stub()
+    agent = get_or_create_agent(grid_df, model=DEFAULT_MODEL)
+    assert isinstance(agent, RoutedAgent)
+    assert agent_setup.is_routing_active()
+
+
+def test_sla_timeouts_do_not_open_the_breaker(ollama_stub, grid_df):
+    ollama_stub(model_overrides={SMALL_MODEL: {"latency_ms": 5000}})
+    agent = _routed(grid_df, sla_seconds=0.5)
+    failures = llm_breaker.status()["failures"]
+
+    for _ in range(llm_breaker.failure_threshold + 1):
+        response = agent.invoke({"input": SIMPLE_QUESTION})
+        assert response["routing"]["escalated"] is True
+        assert response["routing"]["model"] == DEFAULT_MODEL
+
+    assert not llm_breaker.is_open
+    assert llm_breaker.status()["failures"] == failures
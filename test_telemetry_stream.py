@@ -0,0 +1,91 @@
+"""
+Telemetry Stream Tests
+Fan-out of replayed rows to several WebSocket clients, and per-subscriber
+backpressure (lag messages, slow-client disconnect)
+
+Run with: python -m pytest test_telemetry_stream.py
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import server
+from app.telemetry_stream import Subscriber, StreamMessage, SLOW_CLIENT_FACTOR
+
+
+@pytest.fixture
+def live_api(ollama_stub, monkeypatch, grid_df):
+    """API client with the startup events run on grid_df (stream fan-out, flush task, job workers)."""
+    ollama_stub()
+    monkeypatch.setattr(server, "load_data", lambda path: grid_df)
+    monkeypatch.setattr(server, "PREANALYSIS_ENABLED", False)
+    # Restored after the test: startup rebinds these globals
+    for name in ("df", "analysis_jobs", "ingestor", "_flush_task"):
+        monkeypatch.setattr(server, name, getattr(server, name))
+    with TestClient(server.app) as client:
+        yield client
+
+
+def _receive_until_replay_end(ws):
+    messages = []
+    while True:
+        message = json.loads(ws.receive_text())
+        if message["type"] == "heartbeat":
+            continue
+        messages.append(message)
+        if message["type"] == "replay_end":
+            return messages
+
+
+def test_replay_fans_out_every_row_to_every_client(live_api, grid_df):
+    with live_api.websocket_connect("/api/grid/stream") as first, \
+            live_api.websocket_connect("/api/grid/stream") as second, \
+            live_api.websocket_connect("/api/grid/stream?anomalies_only=true") as alerts:
+        hellos = [json.loads(ws.receive_text()) for ws in (first, second, alerts)]
+        assert len({hello["subscriber"] for hello in hellos}) == 3
+
+        response = live_api.post("/api/grid/stream/replay", params={"speed": 1e9})
+        assert response.status_code == 200 and response.json()["rows"] == len(grid_df)
+
+        received = [_receive_until_replay_end(ws) for ws in (first, second, alerts)]
+
+    rows = [m["timestamp"] for m in received[0] if m["type"] == "row"]
+    assert rows == grid_df.index.strftime("%Y-%m-%d %H:%M:%S").tolist()
+    assert received[1] == received[0]
+
+    # The anomalies-only client gets the anomaly rows and their open/close events
+    alert_rows = [m for m in received[2] if m["type"] == "row"]
+    assert alert_rows and all(m["is_anomaly"] for m in alert_rows)
+    opened = [m["timestamp"] for m in received[2] if m["type"] == "anomaly_open"]
+    assert opened == [m["timestamp"] for m in received[0] if m["type"] == "anomaly_open"]
+    assert opened[0] == grid_df.index[grid_df['Is_Anomaly']][0].strftime("%Y-%m-%d %H:%M:%S")
+    assert live_api.get("/api/grid/stream/stats").json()["rows_published"] == len(grid_df)
+
+
+def _message(i: int) -> StreamMessage:
+    return StreamMessage("row", {"timestamp": str(i)}, 0.0)
+
+
+def test_full_queue_drops_oldest_and_reports_lag():
+    async def drain():
+        subscriber = Subscriber(max_queue=2)
+        for i in range(5):
+            subscriber.offer(_message(i))
+        return subscriber, [await subscriber.get(timeout=0.1) for _ in range(4)]
+
+    subscriber, messages = asyncio.run(drain())
+    assert json.loads(messages[0].json) == {"type": "lag", "dropped": 3}
+    assert [json.loads(m.json)["timestamp"] for m in messages[1:3]] == ["3", "4"]
+    assert messages[3] is None  # idle: the caller sends a heartbeat
+    assert subscriber.dropped == 3 and not subscriber.closed
+
+
+def test_client_that_keeps_falling_behind_is_disconnected():
+    subscriber = Subscriber(max_queue=2)
+    for i in range(2 + 2 * SLOW_CLIENT_FACTOR + 1):
+        subscriber.offer(_message(i))
+    assert subscriber.closed and subscriber.close_reason == "client too slow"
+    assert asyncio.run(subscriber.get(timeout=0.1)) is None